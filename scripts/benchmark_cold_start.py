@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+HuggingFace版のモデル読み込み（コールドスタート）の内訳ベンチマーク
+
+from_pretrained()による通常の読み込みと、準備済みモデル（dtype変換済み、mmapで読み込み）からの
+読み込みを、それぞれ新しいプロセスで実行し、次の段階ごとの時間を比較します。
+
+- ライブラリ: torch・transformersのインポート
+- トークナイザー: AutoTokenizer.from_pretrained()
+- リモートコード: モデルのリモートコード（モデルのクラス定義）のインポート
+- 重みの読み込み: チェックポイントのdtypeのままのfrom_pretrained()、または準備済みモデルのmmap
+- 変換: CPU推論のdtypeへの変換
+- 最初のページ: --page を指定した場合の1ページ目の推論（mmapで後回しになったディスクの読み込みを含む）
+
+OSのページキャッシュに重みが残っていると読み込みは速くなります。ディスクからの読み込みを
+計測する場合は、事前にページキャッシュを破棄してください（Linux: echo 3 > /proc/sys/vm/drop_caches）。
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+PHASES = (
+    ("libraries", "ライブラリ"),
+    ("tokenizer", "トークナイザー"),
+    ("remote_code", "リモートコード"),
+    ("weight_read", "重みの読み込み"),
+    ("conversion", "変換"),
+    ("first_page", "最初のページ"),
+)
+
+
+def measure_load(model_path: str, dtype: str, snapshot_dir: str, mode: str, page: str) -> dict:
+    """
+    1つの方法でモデルを読み込み、段階ごとの時間を計測する（子プロセスで実行）
+
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        dtype: CPU推論のdtype
+        snapshot_dir: 準備済みモデルの保存フォルダ
+        mode: "from_pretrained"、"prepare"（準備済みモデルを作成する）、または "snapshot"
+        page: 最初のページとして推論する画像（空文字列の場合は推論しない）
+
+    Returns:
+        段階ごとの時間（秒）の辞書
+    """
+    timings = {}
+    start = time.perf_counter()
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    timings["libraries"] = time.perf_counter() - start
+
+    from pdftexter.ocr import hf_wrapper
+    from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+    from pdftexter.ocr.model_registry import ModelRegistry
+    from pdftexter.ocr.snapshot import load_prepared_model, save_prepared_model, snapshot_path
+
+    snapshot = snapshot_path(model_path, dtype, hf_wrapper._library_versions(), snapshot_dir)
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+    timings["tokenizer"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hf_wrapper._import_remote_code(model_path)
+    timings["remote_code"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode == "snapshot":
+        model = load_prepared_model(snapshot, torch)
+        timings["weight_read"] = time.perf_counter() - start
+        timings["conversion"] = 0.0
+    else:
+        model = AutoModel.from_pretrained(
+            model_path, trust_remote_code=True, use_safetensors=True, torch_dtype="auto", low_cpu_mem_usage=True
+        )
+        timings["weight_read"] = time.perf_counter() - start
+        start = time.perf_counter()
+        model = model.to(getattr(torch, dtype)).eval()
+        timings["conversion"] = time.perf_counter() - start
+        if mode == "prepare":
+            save_prepared_model(model, snapshot, torch)
+
+    if page:
+        # 読み込んだモデルをレジストリに登録し、ラッパーに（読み込み直さずに）使わせる
+        profile = CPUInferenceProfile(dtype=dtype)
+        registry = ModelRegistry()
+        _, attn_implementation, device = hf_wrapper.resolve_load_options(profile)
+        registry.acquire((model_path, dtype, attn_implementation, device), lambda: (tokenizer, model))
+        wrapper = hf_wrapper.HuggingFaceOCRWrapper(model_path, registry=registry, cpu_profile=profile)
+        start = time.perf_counter()
+        wrapper.process_image(page)
+        timings["first_page"] = time.perf_counter() - start
+    return timings
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="HuggingFace版のモデル読み込みの内訳を、通常の読み込みと準備済みモデルで比較します"
+    )
+    parser.add_argument("model_path", type=str, help="DeepSeek-OCRモデルのパス")
+    parser.add_argument(
+        "--dtype", type=str, default="float32", choices=["float32", "bfloat16"], help="CPU推論のdtype"
+    )
+    parser.add_argument("--page", type=str, default="", help="最初のページとして推論する画像（省略可）")
+    parser.add_argument(
+        "--snapshot-dir", type=str, default=None, help="準備済みモデルの保存フォルダ（省略時は一時フォルダ）"
+    )
+    parser.add_argument("--child", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        result = measure_load(args.model_path, args.dtype, args.snapshot_dir, args.child, args.page)
+        print(json.dumps(result))
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        snapshot_dir = args.snapshot_dir or tmpdir
+        # 準備済みモデルの作成は計測に含めず、通常の読み込みの計測の後に行う
+        for mode in ("from_pretrained", "prepare", "snapshot"):
+            completed = subprocess.run(
+                [sys.executable, __file__, args.model_path, "--dtype", args.dtype, "--page", args.page,
+                 "--snapshot-dir", snapshot_dir, "--child", mode],
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+            )
+            if completed.returncode != 0:
+                print(f"{mode} 失敗しました:\n{completed.stderr.strip()[-500:]}")
+                continue
+            if mode != "prepare":
+                results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    rows = [(label, [results.get(mode, {}).get(key) for mode in ("from_pretrained", "snapshot")])
+            for key, label in PHASES]
+    rows.append(("合計", [sum(results[mode].values()) if mode in results else None
+                          for mode in ("from_pretrained", "snapshot")]))
+    print(f"{'段階':<12} {'from_pretrained(s)':>18} {'準備済み(s)':>12}")
+    for label, values in rows:
+        if all(value is None for value in values):
+            continue
+        cells = [f"{value:.2f}" if value is not None else "-" for value in values]
+        print(f"{label:<12} {cells[0]:>18} {cells[1]:>12}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+HuggingFace版のCPUワーカープロセス数のスケーリングベンチマーク
+
+ワーカープロセス数ごとに、モデルを読み込んでサンプルページを並行処理し、
+1分あたりの処理ページ数と、親プロセスとワーカープロセスの合計メモリを比較します。
+forkしたワーカーは重みを共有するため、RSSの単純な合計は共有分を重複して数えます。
+Linuxでは共有ページをプロセス数で按分したPSSの合計も表示します（実際のメモリ使用量に近い値）。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.utils.file import get_image_files
+
+
+def process_memory_mb(pid: int) -> dict:
+    """
+    プロセスのRSSとPSSを返す（Linuxのみ）
+
+    Args:
+        pid: プロセスID
+
+    Returns:
+        "rss"と"pss"（MB、取得できない場合は0）の辞書
+    """
+    memory = {"rss": 0.0, "pss": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    memory[key.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def run_workers(model_path: str, pages: list, num_workers: int, dtype: str) -> dict:
+    """
+    1つのワーカー数でモデルを読み込み、サンプルページを並行処理する（子プロセスで実行）
+
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        pages: サンプルページの画像パス
+        num_workers: ワーカープロセス数（1の場合はプールを使わずこのプロセスで推論する）
+        dtype: CPU推論のdtype
+
+    Returns:
+        計測結果の辞書
+    """
+    from pdftexter.ocr.cpu_pool import CPUWorkerPool
+    from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
+    from pdftexter.ocr.model_registry import ModelRegistry
+
+    wrapper = HuggingFaceOCRWrapper(
+        model_path, registry=ModelRegistry(), cpu_profile=CPUInferenceProfile(dtype=dtype)
+    )
+    backend = wrapper
+    pool = None
+    if num_workers > 1:
+        pool = CPUWorkerPool(wrapper, num_workers=num_workers).start()
+        backend = pool
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(backend.process_image, pages))
+    elapsed = time.perf_counter() - start
+
+    # ワーカーが処理を終えた直後（重み以外の作業メモリも確保された状態）で計測する
+    pids = [os.getpid()] + (pool.pids if pool is not None else [])
+    memories = [process_memory_mb(pid) for pid in pids]
+    if pool is not None:
+        pool.close()
+
+    return {
+        "pages_per_min": len(pages) / elapsed * 60,
+        "rss_mb": sum(m["rss"] for m in memories),
+        "pss_mb": sum(m["pss"] for m in memories),
+    }
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="HuggingFace版のCPUワーカープロセス数ごとの処理速度と合計メモリを比較します"
+    )
+    parser.add_argument("model_path", type=str, help="DeepSeek-OCRモデルのパス")
+    parser.add_argument("pages", type=str, help="サンプルページの画像フォルダ")
+    parser.add_argument("-n", "--max-pages", type=int, default=8, help="処理するページ数")
+    parser.add_argument(
+        "--workers", type=str, default="1,2,4", help="比較するワーカープロセス数（カンマ区切り）"
+    )
+    parser.add_argument(
+        "--dtype", type=str, default="float32", choices=["float32", "bfloat16"], help="CPU推論のdtype"
+    )
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    page_dir = Path(args.pages)
+    pages = [str(page_dir / f) for f in get_image_files(str(page_dir))][:args.max_pages]
+    if not pages:
+        print(f"エラー: 画像が見つかりません: {args.pages}", file=sys.stderr)
+        return 1
+
+    if args.child is not None:
+        result = run_workers(args.model_path, pages, args.child, args.dtype)
+        print(json.dumps(result))
+        return 0
+
+    print(f"{'workers':>7} {'pages/min':>10} {'speedup':>8} {'RSS sum(MB)':>12} {'PSS sum(MB)':>12}")
+    baseline = None
+    for num_workers in (int(n) for n in args.workers.split(",")):
+        # ワーカー数ごとに新しいプロセスでモデルを読み込み、前の計測のメモリが残らないようにする
+        completed = subprocess.run(
+            [sys.executable, __file__, args.model_path, args.pages,
+             "--max-pages", str(args.max_pages), "--dtype", args.dtype, "--child", str(num_workers)],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+        )
+        if completed.returncode != 0:
+            print(f"{num_workers:>7} 失敗しました:\n{completed.stderr.strip()[-500:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        baseline = baseline or result["pages_per_min"]
+        print(
+            f"{num_workers:>7} {result['pages_per_min']:>10.2f} {result['pages_per_min'] / baseline:>7.2f}x "
+            f"{result['rss_mb']:>12.0f} {result['pss_mb']:>12.0f}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+HuggingFace版のCPU推論プロファイルの比較ベンチマーク
+
+同じサンプルページに対して、CPU推論の設定（スレッド数・dtype・low_cpu_mem_usage・
+torch.compile）ごとにモデルの読み込み時間、1ページあたりの処理時間、ピークRSSを計測します。
+スレッド数やピークRSSが設定間で干渉しないよう、設定ごとに別プロセスで実行します。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.utils.file import get_image_files
+
+# 既定で比較する設定（名前 → CPUInferenceProfileの引数）
+DEFAULT_PROFILES = {
+    "baseline": {"dtype": "float32", "low_cpu_mem_usage": False},
+    "threads": {"dtype": "float32", "num_threads": os.cpu_count(), "interop_threads": 1},
+    "bf16": {"dtype": "bfloat16", "num_threads": os.cpu_count(), "interop_threads": 1},
+    "bf16+compile": {
+        "dtype": "bfloat16",
+        "num_threads": os.cpu_count(),
+        "interop_threads": 1,
+        "compile": True,
+    },
+}
+
+
+def peak_rss_mb() -> float:
+    """
+    このプロセスのピークRSSを返す
+
+    Returns:
+        ピークRSS（MB、取得できない環境では0）
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_profile(model_path: str, pages: list, profile_args: dict) -> dict:
+    """
+    1つの設定でモデルを読み込み、サンプルページを処理する（子プロセスで実行）
+
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        pages: サンプルページの画像パス
+        profile_args: CPUInferenceProfileの引数
+
+    Returns:
+        計測結果の辞書
+    """
+    from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
+    from pdftexter.ocr.model_registry import ModelRegistry
+
+    start = time.perf_counter()
+    wrapper = HuggingFaceOCRWrapper(
+        model_path,
+        registry=ModelRegistry(),
+        cpu_profile=CPUInferenceProfile(**profile_args),
+    )
+    load_s = time.perf_counter() - start
+
+    page_seconds = []
+    for page in pages:
+        start = time.perf_counter()
+        wrapper.process_image(page, prompt="<image>\nFree OCR.")
+        page_seconds.append(time.perf_counter() - start)
+
+    # 最初のページはtorch.compileのコンパイルやキャッシュの初期化を含むため分けて報告する
+    steady = page_seconds[1:] or page_seconds
+    return {
+        "load_s": load_s,
+        "first_page_s": page_seconds[0],
+        "s_per_page": statistics.mean(steady),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="HuggingFace版のCPU推論設定ごとの処理時間とピークRSSを比較します"
+    )
+    parser.add_argument("model_path", type=str, help="DeepSeek-OCRモデルのパス")
+    parser.add_argument("pages", type=str, help="サンプルページの画像フォルダ")
+    parser.add_argument("-n", "--max-pages", type=int, default=5, help="処理するページ数")
+    parser.add_argument(
+        "--profiles",
+        type=str,
+        default=",".join(DEFAULT_PROFILES),
+        help=f"比較する設定（カンマ区切り、{', '.join(DEFAULT_PROFILES)}）",
+    )
+    parser.add_argument("--child", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    page_dir = Path(args.pages)
+    pages = [str(page_dir / f) for f in get_image_files(str(page_dir))][:args.max_pages]
+    if not pages:
+        print(f"エラー: 画像が見つかりません: {args.pages}", file=sys.stderr)
+        return 1
+
+    if args.child:
+        result = run_profile(args.model_path, pages, DEFAULT_PROFILES[args.child])
+        print(json.dumps(result))
+        return 0
+
+    print(
+        f"{'profile':<14} {'load(s)':>8} {'1st page(s)':>12} {'s/page':>8} {'peak RSS(MB)':>13}"
+    )
+    for name in args.profiles.split(","):
+        completed = subprocess.run(
+            [sys.executable, __file__, args.model_path, args.pages,
+             "--max-pages", str(args.max_pages), "--child", name],
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            print(f"{name:<14} 失敗しました:\n{completed.stderr.strip()[-500:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(
+            f"{name:<14} {result['load_s']:>8.1f} {result['first_page_s']:>12.1f} "
+            f"{result['s_per_page']:>8.1f} {result['peak_rss_mb']:>13.0f}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
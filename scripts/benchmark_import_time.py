@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+CLI起動時のインポート時間の回帰ベンチマーク
+
+``python -X importtime`` で ``pdftexter --help`` と vLLM版の ``pdf-to-text`` の起動時に
+読み込まれるモジュールを計測し、予算を超えた場合や、torch・transformers・GUI系の
+重いモジュールが読み込まれた場合は終了コード1を返します。
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.bench.importtime import IMPORT_TARGETS, check_import_budgets
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="CLI起動時のインポート時間が予算内に収まっているか確認します"
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        choices=list(IMPORT_TARGETS),
+        help="計測対象（省略時はすべて）",
+    )
+    parser.add_argument(
+        "--help-budget",
+        type=float,
+        default=IMPORT_TARGETS["help"][1],
+        help="pdftexter --help のインポート時間の予算（ミリ秒）",
+    )
+    parser.add_argument(
+        "--pdf-to-text-budget",
+        type=float,
+        default=IMPORT_TARGETS["pdf-to-text"][1],
+        help="vLLM版 pdf-to-text のインポート時間の予算（ミリ秒）",
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="計測回数（最小値で判定）")
+    args = parser.parse_args()
+
+    passed, lines = check_import_budgets(
+        targets=args.targets or None,
+        budgets={"help": args.help_budget, "pdf-to-text": args.pdf_to_text_budget},
+        repeat=args.repeat,
+    )
+    print("\n".join(lines))
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+HuggingFace版の前処理の先読みのベンチマーク
+
+サンプルページを先読みあり・なしでそれぞれ1ページずつ処理し、処理時間と、
+推論（infer()）の外で過ごした時間（ページの読み込み・変換などで演算が止まっていた時間）を比較します。
+infer()の中の前処理のうち、タイルへの分割は先読みで短くなるため、infer()の合計時間も比較します。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.ocr.config import DeepSeekOCRConfig, OCRConfig, OutputConfig
+from pdftexter.ocr.deepseek import DeepSeekOCR
+from pdftexter.utils.file import get_image_files
+
+
+def run_pages(ocr: DeepSeekOCR, pages: list, prefetch: bool) -> dict:
+    """
+    先読みの設定を切り替えてサンプルページを処理する
+
+    Args:
+        ocr: 読み込み済みのDeepSeekOCR
+        pages: サンプルページの画像パス
+        prefetch: 先読みを有効にするか
+
+    Returns:
+        計測結果の辞書
+    """
+    ocr.config.deepseek_ocr.hf_prefetch = prefetch
+    first_page = len(ocr.run_stats.pages)
+    start = time.perf_counter()
+    for _, _, error in ocr._iter_page_results(pages, None):
+        if error is not None:
+            raise error
+    elapsed = time.perf_counter() - start
+
+    stats = ocr.run_stats.pages[first_page:]
+    infer_s = sum(p.request_s or 0.0 for p in stats)
+    return {
+        "elapsed": elapsed,
+        "infer": infer_s,
+        "idle": max(0.0, elapsed - infer_s),
+        "wait": sum(p.prefetch_wait_s or 0.0 for p in stats),
+    }
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="HuggingFace版の前処理の先読みの有無で、処理時間と推論の外の時間を比較します"
+    )
+    parser.add_argument("model_path", type=str, help="DeepSeek-OCRモデルのパス")
+    parser.add_argument("pages", type=str, help="サンプルページの画像フォルダ")
+    parser.add_argument("-n", "--max-pages", type=int, default=8, help="処理するページ数")
+    parser.add_argument(
+        "--resolution-mode", type=str, default="gundam", help="解像度モード（gundamでタイルに分割する）"
+    )
+    args = parser.parse_args()
+
+    page_dir = Path(args.pages)
+    pages = [str(page_dir / f) for f in get_image_files(str(page_dir))][:args.max_pages]
+    if not pages:
+        print(f"エラー: 画像が見つかりません: {args.pages}", file=sys.stderr)
+        return 1
+
+    config = OCRConfig(
+        deepseek_ocr=DeepSeekOCRConfig(
+            model_path=args.model_path,
+            use_huggingface=True,
+            use_worker=False,
+            resolution_mode=args.resolution_mode,
+        ),
+        output=OutputConfig(),
+    )
+    ocr = DeepSeekOCR(config, verify_setup=False)
+    try:
+        # 最初の1ページはモデルのウォームアップとして計測に含めない
+        run_pages(ocr, pages[:1], prefetch=False)
+        results = {label: run_pages(ocr, pages, prefetch) for label, prefetch in (("なし", False), ("あり", True))}
+    finally:
+        ocr.close()
+
+    print(f"{'先読み':<6} {'合計(s)':>8} {'infer(s)':>9} {'推論の外(s)':>12} {'待ち(s)':>8} {'pages/min':>10}")
+    for label, result in results.items():
+        print(
+            f"{label:<6} {result['elapsed']:>8.2f} {result['infer']:>9.2f} {result['idle']:>12.2f} "
+            f"{result['wait']:>8.2f} {len(pages) / result['elapsed'] * 60:>10.2f}"
+        )
+    idle_before, idle_after = results["なし"]["idle"], results["あり"]["idle"]
+    if idle_before > 0:
+        print(f"推論の外の時間: {(1 - idle_after / idle_before) * 100:.0f}% 削減")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
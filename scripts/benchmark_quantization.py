@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+HuggingFace版の動的int8量子化の比較ベンチマーク
+
+同じサンプルページを量子化しないモデル（float32）と動的int8量子化したモデルで処理し、
+モデルの読み込み時間、1ページあたりの処理時間、ピークRSS、文字誤り率（CER）を比較します。
+量子化したモデルは、量子化してキャッシュに保存する初回と、キャッシュから読み込む2回目の両方を計測します。
+CERは --reference の正解テキスト（ページ画像と同じ名前の .md / .txt）、
+指定がない場合は量子化しないモデルの出力を基準に計算します。
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.bench.accuracy import corpus_error_rate
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.utils.file import get_image_files
+
+# 計測する設定（名前 → CPUInferenceProfileの量子化方式）
+RUNS = (
+    ("float32", None),
+    ("int8 (量子化)", "int8-dynamic"),
+    ("int8 (キャッシュ)", "int8-dynamic"),
+)
+
+
+def peak_rss_mb() -> float:
+    """
+    このプロセスのピークRSSを返す
+
+    Returns:
+        ピークRSS（MB、取得できない環境では0）
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_model(model_path: str, pages: list, quantization: str, cache_dir: str) -> dict:
+    """
+    1つの設定でモデルを読み込み、サンプルページを処理する（子プロセスで実行）
+
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        pages: サンプルページの画像パス
+        quantization: 量子化方式（空文字列の場合は量子化しない）
+        cache_dir: 量子化済みモデルのキャッシュフォルダ
+
+    Returns:
+        計測結果とページごとのOCR結果の辞書
+    """
+    from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
+    from pdftexter.ocr.model_registry import ModelRegistry
+
+    profile = CPUInferenceProfile(
+        dtype="float32",
+        quantization=quantization or None,
+        quantization_cache_dir=cache_dir,
+    )
+    start = time.perf_counter()
+    wrapper = HuggingFaceOCRWrapper(model_path, registry=ModelRegistry(), cpu_profile=profile)
+    load_s = time.perf_counter() - start
+
+    page_seconds = []
+    texts = []
+    for page in pages:
+        start = time.perf_counter()
+        texts.append(wrapper.process_image(page))
+        page_seconds.append(time.perf_counter() - start)
+
+    return {
+        "load_s": load_s,
+        "s_per_page": statistics.mean(page_seconds),
+        "peak_rss_mb": peak_rss_mb(),
+        "texts": texts,
+    }
+
+
+def load_references(reference_dir: str, pages: list) -> list:
+    """
+    ページ画像に対応する正解テキストを読み込む
+
+    Args:
+        reference_dir: 正解テキストのフォルダ
+        pages: ページ画像のパス
+
+    Returns:
+        ページごとの正解テキスト（見つからないページはNone）
+    """
+    references = []
+    for page in pages:
+        text = None
+        for suffix in (".md", ".txt"):
+            path = Path(reference_dir) / (Path(page).stem + suffix)
+            if path.exists():
+                text = path.read_text(encoding="utf-8")
+                break
+        references.append(text)
+    return references
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="HuggingFace版の動的int8量子化の処理時間・メモリ・文字誤り率を比較します"
+    )
+    parser.add_argument("model_path", type=str, help="DeepSeek-OCRモデルのパス")
+    parser.add_argument("pages", type=str, help="サンプルページの画像フォルダ")
+    parser.add_argument("-n", "--max-pages", type=int, default=5, help="処理するページ数")
+    parser.add_argument(
+        "--reference", type=str, default=None, help="正解テキストのフォルダ（省略時はfloat32の出力を基準にする）"
+    )
+    parser.add_argument("--child", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    page_dir = Path(args.pages)
+    pages = [str(page_dir / f) for f in get_image_files(str(page_dir))][:args.max_pages]
+    if not pages:
+        print(f"エラー: 画像が見つかりません: {args.pages}", file=sys.stderr)
+        return 1
+
+    if args.child is not None:
+        result = run_model(args.model_path, pages, args.child, args.cache_dir)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0
+
+    results = {}
+    # 初回の量子化の時間を計測するため、空のキャッシュフォルダを使う
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, quantization in RUNS:
+            completed = subprocess.run(
+                [sys.executable, __file__, args.model_path, args.pages,
+                 "--max-pages", str(args.max_pages),
+                 "--child", quantization or "", "--cache-dir", cache_dir],
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+            )
+            if completed.returncode != 0:
+                print(f"{name} 失敗しました:\n{completed.stderr.strip()[-500:]}")
+                continue
+            results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    if args.reference:
+        references = load_references(args.reference, pages)
+    elif "float32" in results:
+        references = results["float32"]["texts"]
+    else:
+        references = [None] * len(pages)
+
+    print(f"{'model':<18} {'load(s)':>8} {'s/page':>8} {'peak RSS(MB)':>13} {'CER':>7} {'max CER':>8}")
+    for name, result in results.items():
+        pairs = [
+            (reference, text)
+            for reference, text in zip(references, result["texts"])
+            if reference is not None
+        ]
+        if pairs:
+            error = corpus_error_rate(pairs)
+            cer = f"{error['cer']:>7.2%} {error['max_page_cer']:>8.2%}"
+        else:
+            cer = f"{'-':>7} {'-':>8}"
+        print(
+            f"{name:<18} {result['load_s']:>8.1f} {result['s_per_page']:>8.1f} "
+            f"{result['peak_rss_mb']:>13.0f} {cer}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
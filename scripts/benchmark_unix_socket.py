@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unixドメインソケット / ループバックTCP のトランスポート比較ベンチマーク
+
+ローカルにOpenAI互換の代替サーバー（推論時間ゼロの設定）を
+TCPとUnixドメインソケットの両方で起動し、VLLMWrapper経由で同じ画像を
+繰り返し送信して、レイテンシとスループットを比較します。
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.stats import percentile
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+
+def run_benchmark(wrapper: VLLMWrapper, image_path: str, requests_count: int) -> dict:
+    """
+    同じ画像を繰り返し送信してレイテンシを計測する
+
+    Args:
+        wrapper: VLLMWrapperオブジェクト
+        image_path: 送信する画像のパス
+        requests_count: リクエスト回数
+
+    Returns:
+        計測結果の辞書
+    """
+    # リクエスト生成（画像のエンコード）は計測対象外にする
+    request_data = wrapper.create_request(image_path)
+    body_bytes = len(json.dumps(request_data))
+    api_url = f"{wrapper.server_url}/v1/chat/completions"
+
+    latencies = []
+    start_all = time.perf_counter()
+    for _ in range(requests_count):
+        start = time.perf_counter()
+        response = wrapper._http().post(api_url, json=request_data, timeout=wrapper.timeout)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start_all
+
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "mb_per_s": body_bytes * requests_count / elapsed / 1024 / 1024,
+        "body_kb": body_bytes / 1024,
+    }
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="Unixドメインソケットとループバック TCP のレイテンシ・スループットを比較します"
+    )
+    parser.add_argument("image", type=str, help="送信するページ画像")
+    parser.add_argument("-n", "--requests", type=int, default=50, help="リクエスト回数")
+    args = parser.parse_args()
+
+    # 推論時間を0にして、トランスポートのコストだけを計測する
+    server_config = FakeServerConfig(
+        latency_distribution="constant", latency_mean=0.0, output_tokens=(1, 1)
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tcp_server = FakeVLLMServer(server_config)
+        unix_server = FakeVLLMServer(server_config, socket_path=str(Path(tmpdir, "standin.sock")))
+        with tcp_server, unix_server:
+            print(f"{'transport':<10} {'mean(ms)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'MB/s':>8}")
+            for name, server in (("tcp", tcp_server), ("unix", unix_server)):
+                wrapper = VLLMWrapper(
+                    server_url=server.url, upload_format="original", upload_max_long_edge=None
+                )
+                result = run_benchmark(wrapper, args.image, args.requests)
+                print(
+                    f"{name:<10} {result['mean_ms']:>9.2f} {result['p50_ms']:>9.2f} "
+                    f"{result['p95_ms']:>9.2f} {result['mb_per_s']:>8.1f}"
+                )
+            print(f"リクエストサイズ: {result['body_kb']:.1f} KB")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+画像送信方法（base64 / file://）のベンチマークスクリプト
+
+ページ画像のフォルダを対象に、リクエスト生成時間とリクエストサイズを比較します。
+--server-urlを指定した場合は、vLLMサーバーへの送信を含めたレイテンシも計測します
+（fileモードではサーバーを --allowed-local-media-path 付きで起動してください）。
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+from pdftexter.utils.file import get_image_files
+
+
+def benchmark_mode(
+    wrapper: VLLMWrapper,
+    image_paths: list[str],
+    upload_mode: str,
+    call_server: bool,
+) -> dict:
+    """
+    1つの送信方法でベンチマークを実行する
+
+    Args:
+        wrapper: VLLMWrapperオブジェクト
+        image_paths: 画像ファイルのパスのリスト
+        upload_mode: 送信方法（"base64" or "file"）
+        call_server: サーバーへの送信も計測するか
+
+    Returns:
+        計測結果の辞書
+    """
+    wrapper.upload_mode = upload_mode
+    wrapper.local_media_enabled = upload_mode == "file"
+
+    build_times = []
+    body_sizes = []
+    call_times = []
+    for image_path in image_paths:
+        start = time.perf_counter()
+        request_data = wrapper.create_request(image_path)
+        body = json.dumps(request_data)
+        build_times.append(time.perf_counter() - start)
+        body_sizes.append(len(body))
+
+        if call_server:
+            start = time.perf_counter()
+            wrapper.call_vllm_api(image_path)
+            call_times.append(time.perf_counter() - start)
+
+    result = {
+        "mode": upload_mode,
+        "pages": len(image_paths),
+        "build_ms_mean": statistics.mean(build_times) * 1000,
+        "body_kb_mean": statistics.mean(body_sizes) / 1024,
+    }
+    if call_times:
+        result["call_s_mean"] = statistics.mean(call_times)
+        result["call_s_median"] = statistics.median(call_times)
+    # サーバーが拒否してbase64に切り替わった場合に分かるようにする
+    result["fell_back"] = upload_mode == "file" and not wrapper.local_media_enabled
+    return result
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="画像送信方法（base64 / file://）のリクエスト生成コストを比較します"
+    )
+    parser.add_argument("image_dir", type=str, help="ページ画像のフォルダ")
+    parser.add_argument(
+        "--server-url",
+        type=str,
+        help="vLLMサーバーのURL（指定時はサーバーへの送信も計測）",
+    )
+    parser.add_argument("--model-name", type=str, default="deepseek-ocr", help="モデル名")
+    parser.add_argument("--limit", type=int, default=20, help="計測するページ数の上限")
+    args = parser.parse_args()
+
+    image_dir = Path(args.image_dir)
+    image_paths = [str(image_dir / f) for f in get_image_files(str(image_dir))][: args.limit]
+    if not image_paths:
+        print(f"エラー: 画像が見つかりません: {image_dir}", file=sys.stderr)
+        return 1
+
+    wrapper = VLLMWrapper(server_url=args.server_url, model_name=args.model_name)
+
+    print(f"{'mode':<8} {'pages':>5} {'build(ms)':>10} {'body(KB)':>10} {'call(s)':>9}")
+    for mode in ("base64", "file"):
+        result = benchmark_mode(wrapper, image_paths, mode, call_server=bool(args.server_url))
+        call = f"{result['call_s_mean']:9.2f}" if "call_s_mean" in result else f"{'-':>9}"
+        note = "  (base64にフォールバック)" if result["fell_back"] else ""
+        print(
+            f"{result['mode']:<8} {result['pages']:>5} {result['build_ms_mean']:>10.2f} "
+            f"{result['body_kb_mean']:>10.1f} {call}{note}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+OCR結果の精度評価モジュール
+
+設定の比較（量子化の有無など）で、OCR結果の文字誤り率（CER）を計算します。
+"""
+
+from typing import Dict, Iterable, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """
+    比較の前にOCR結果を正規化する（空白の違いを誤りとして数えない）
+
+    Args:
+        text: OCR結果のテキスト
+
+    Returns:
+        空白文字を取り除いたテキスト
+    """
+    return "".join(text.split())
+
+
+def edit_distance(reference: str, hypothesis: str) -> int:
+    """
+    文字単位の編集距離（レーベンシュタイン距離）を計算する
+
+    Args:
+        reference: 正解のテキスト
+        hypothesis: 比較するテキスト
+
+    Returns:
+        挿入・削除・置換の最小回数
+    """
+    if len(reference) < len(hypothesis):
+        reference, hypothesis = hypothesis, reference
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_char != hyp_char),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    文字誤り率（CER）を計算する
+
+    Args:
+        reference: 正解のテキスト
+        hypothesis: 比較するテキスト
+
+    Returns:
+        編集距離 / 正解の文字数（正解が空の場合は、比較するテキストも空なら0、そうでなければ1）
+    """
+    reference = normalize_text(reference)
+    hypothesis = normalize_text(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return edit_distance(reference, hypothesis) / len(reference)
+
+
+def corpus_error_rate(pairs: Iterable[Tuple[str, str]]) -> Dict[str, float]:
+    """
+    複数ページの文字誤り率をまとめて計算する
+
+    Args:
+        pairs: （正解, 比較するテキスト）の組
+
+    Returns:
+        "cer"（全ページの編集距離の合計 / 正解の文字数の合計）と
+        "max_page_cer"（ページ単位の最大値）の辞書
+    """
+    total_distance = 0
+    total_chars = 0
+    max_page_cer = 0.0
+    for reference, hypothesis in pairs:
+        max_page_cer = max(max_page_cer, character_error_rate(reference, hypothesis))
+        reference = normalize_text(reference)
+        total_distance += edit_distance(reference, normalize_text(hypothesis))
+        total_chars += len(reference)
+    return {
+        "cer": total_distance / total_chars if total_chars else 0.0,
+        "max_page_cer": max_page_cer,
+    }
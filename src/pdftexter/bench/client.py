@@ -0,0 +1,214 @@
+"""
+vLLMクライアント経路の負荷試験ハーネス
+
+VLLMWrapper（またはDeepSeekOCR）を指定した同時実行数で駆動し、
+スループットとレイテンシのパーセンタイルを同時実行数ごとに集計します。
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from pdftexter.ocr.stats import percentile
+
+
+class LoadTestResult:
+    """1つの同時実行数での負荷試験結果"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        latencies: List[float],
+        errors: int,
+        elapsed: float,
+    ):
+        """
+        初期化
+
+        Args:
+            concurrency: 同時実行数
+            latencies: 成功したリクエストのレイテンシ（秒）
+            errors: 失敗したリクエスト数
+            elapsed: 全体の経過時間（秒）
+        """
+        self.concurrency = concurrency
+        self.latencies = latencies
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def completed(self) -> int:
+        """成功したリクエスト数"""
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """スループット（ページ/秒）"""
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency(self, q: float) -> float:
+        """
+        レイテンシのパーセンタイル値を返す
+
+        Args:
+            q: パーセンタイル（0-100）
+
+        Returns:
+            レイテンシ（秒）
+        """
+        return percentile(self.latencies, q)
+
+
+def run_load_test(
+    call: Callable[[], object],
+    concurrency: int,
+    total_requests: int,
+) -> LoadTestResult:
+    """
+    指定した同時実行数で呼び出しを繰り返す
+
+    Args:
+        call: 1ページ分の処理を行う呼び出し
+        concurrency: 同時実行数
+        total_requests: 合計リクエスト数
+
+    Returns:
+        LoadTestResultオブジェクト
+    """
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(_: int) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start_all = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(total_requests)))
+    elapsed = time.perf_counter() - start_all
+
+    return LoadTestResult(concurrency, latencies, errors, elapsed)
+
+
+def create_sample_page(output_dir: str, size: Sequence[int] = (1240, 1754)) -> str:
+    """
+    負荷試験用の合成ページ画像を作成する
+
+    Args:
+        output_dir: 画像を保存するディレクトリ
+        size: 画像サイズ（幅, 高さ）。デフォルトはA4・150DPI相当
+
+    Returns:
+        画像ファイルのパス
+    """
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", tuple(size), color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for y in range(80, size[1] - 80, 36):
+        draw.line([(80, y), (size[0] - 80, y)], fill=(40, 40, 40), width=12)
+    image_path = Path(output_dir, "bench_page.png")
+    image.save(image_path, "PNG")
+    return str(image_path)
+
+
+def make_page_call(server_url: str, image_path: str, via: str = "wrapper") -> Callable[[], object]:
+    """
+    1ページ分のOCR呼び出しを作成する
+
+    Args:
+        server_url: vLLMサーバー（または代替サーバー）のURL
+        image_path: 送信するページ画像
+        via: "wrapper"の場合はVLLMWrapper、"ocr"の場合はDeepSeekOCRを経由する
+
+    Returns:
+        引数なしの呼び出し
+    """
+    if via == "ocr":
+        from pdftexter.ocr.config import DeepSeekOCRConfig, OCRConfig, OutputConfig
+        from pdftexter.ocr.deepseek import DeepSeekOCR
+
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(model_path="", vllm_server_url=server_url),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        return lambda: ocr.process_image(image_path)
+
+    from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+    wrapper = VLLMWrapper(server_url=server_url)
+    return lambda: wrapper.call_vllm_api(image_path)
+
+
+def format_results(results: Sequence[LoadTestResult]) -> str:
+    """
+    負荷試験結果を表形式の文字列にする
+
+    Args:
+        results: 同時実行数ごとの結果
+
+    Returns:
+        表形式の文字列
+    """
+    lines = [
+        f"{'inflight':>8} {'ok':>6} {'err':>5} {'pages/s':>8} "
+        f"{'p50(s)':>8} {'p90(s)':>8} {'p99(s)':>8} {'max(s)':>8}"
+    ]
+    for r in results:
+        lines.append(
+            f"{r.concurrency:>8} {r.completed:>6} {r.errors:>5} {r.throughput:>8.2f} "
+            f"{r.latency(50):>8.3f} {r.latency(90):>8.3f} {r.latency(99):>8.3f} "
+            f"{r.latency(100):>8.3f}"
+        )
+    return "\n".join(lines)
+
+
+def run_client_benchmark(
+    server_url: str,
+    concurrency_levels: Sequence[int],
+    requests_per_level: int,
+    image_path: Optional[str] = None,
+    via: str = "wrapper",
+) -> List[LoadTestResult]:
+    """
+    同時実行数を変えながら負荷試験を実行する
+
+    Args:
+        server_url: vLLMサーバー（または代替サーバー）のURL
+        concurrency_levels: 試す同時実行数のリスト
+        requests_per_level: 同時実行数ごとのリクエスト数
+        image_path: 送信するページ画像（Noneの場合は合成画像を使用）
+        via: "wrapper" または "ocr"
+
+    Returns:
+        同時実行数ごとのLoadTestResultのリスト
+    """
+    with tempfile.TemporaryDirectory(prefix="pdftexter_bench_") as tmpdir:
+        if image_path is None:
+            image_path = create_sample_page(tmpdir)
+        call = make_page_call(server_url, image_path, via=via)
+
+        results = []
+        for concurrency in concurrency_levels:
+            result = run_load_test(call, concurrency, requests_per_level)
+            print(
+                f"  同時実行数 {concurrency}: {result.throughput:.2f} pages/s "
+                f"(p50 {result.latency(50):.3f}s)",
+                file=sys.stderr,
+            )
+            results.append(result)
+    return results
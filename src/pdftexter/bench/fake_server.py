@@ -0,0 +1,519 @@
+"""
+OpenAI互換のローカル代替サーバー（vLLMのスタンドイン）
+
+GPUサーバーなしでvLLMクライアント経路をテスト・ベンチマークするための軽量サーバーです。
+``/v1/chat/completions``（``stream: true`` のSSEを含む）、``/health``、
+``/metrics``（vLLMと同名のPrometheusメトリクスの一部）を提供し、
+レイテンシ分布・トークン生成速度・エラー注入・同時実行数の上限
+（vLLMのバッチ処理の模倣）を設定できます。
+"""
+
+import json
+import math
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pdftexter.bench.latency import LATENCY_DISTRIBUTIONS
+
+
+class FakeServerConfig:
+    """代替サーバーの動作設定"""
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_mean: float = 0.3,
+        latency_stddev: float = 0.1,
+        token_rate: float = 200.0,
+        output_tokens: Tuple[int, int] = (200, 800),
+        max_num_seqs: int = 8,
+        batch_slowdown: float = 0.05,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (500, 503),
+        retry_after: Optional[float] = None,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 30.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            latency_distribution: プレフィル（最初のトークンまで）の時間の分布
+                （constant, uniform, exponential, lognormal）
+            latency_mean: プレフィル時間の平均（秒）
+            latency_stddev: プレフィル時間の標準偏差（秒、uniform/lognormalで使用）
+            token_rate: 1シーケンスあたりのデコード速度（トークン/秒）
+            output_tokens: 生成トークン数の範囲（最小, 最大）。max_tokensで打ち切られる
+            max_num_seqs: 同時に処理するリクエスト数の上限（超過分はキューで待機）
+            batch_slowdown: 同時処理数が1増えるごとのデコード速度の低下率
+            error_rate: エラーを返す確率（0.0-1.0）
+            error_statuses: エラー時に返すHTTPステータスコードの候補
+            retry_after: 429/503で返すRetry-Afterの秒数（Noneの場合は付与しない）
+            hang_rate: 応答せずにhang_seconds秒待機する確率（タイムアウトの再現用）
+            hang_seconds: ハング時の待機時間（秒）
+            seed: 乱数のシード
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"latency_distribution must be one of {LATENCY_DISTRIBUTIONS}: {latency_distribution}"
+            )
+        self.latency_distribution = latency_distribution
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.max_num_seqs = max_num_seqs
+        self.batch_slowdown = batch_slowdown
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+
+
+class FakeVLLMServer:
+    """
+    OpenAI互換の代替サーバー
+
+    コンテキストマネージャとして使用すると、別スレッドで起動・停止します::
+
+        with FakeVLLMServer(FakeServerConfig(latency_mean=0.1)) as server:
+            wrapper = VLLMWrapper(server_url=server.url)
+    """
+
+    def __init__(
+        self,
+        config: Optional[FakeServerConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        socket_path: Optional[str] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            config: 動作設定（Noneの場合はデフォルト）
+            host: 待ち受けるホスト（TCPの場合）
+            port: 待ち受けるポート（0の場合は空きポートを自動選択）
+            socket_path: Unixドメインソケットのパス（指定時はTCPの代わりに使用）
+        """
+        self.config = config or FakeServerConfig()
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.healthy = True
+
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.config.max_num_seqs)
+        self._lock = threading.Lock()
+        self._server: Optional[socketserver.BaseServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # サーバー側の計測値
+        self.running = 0
+        self.waiting = 0
+        self.max_running = 0
+        self.requests_total = 0
+        self.errors_total = 0
+        self.completion_tokens_total = 0
+        self.cancelled_total = 0
+
+    @property
+    def url(self) -> str:
+        """クライアントから接続するためのURL"""
+        if self.socket_path:
+            # Unixドメインソケットを使わない場合にrequestsを読み込まないよう、ここでインポートする
+            from pdftexter.ocr.transport import make_unix_socket_url
+
+            return make_unix_socket_url(self.socket_path)
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "FakeVLLMServer":
+        """
+        サーバーを別スレッドで起動する
+
+        Returns:
+            自身（メソッドチェーン用）
+        """
+        handler = _make_handler(self)
+        if self.socket_path:
+            self._server = _UnixHTTPServer(self.socket_path, handler)
+        else:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+            self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """サーバーを現在のスレッドで起動する（Ctrl+Cで停止）"""
+        self.start()
+        try:
+            while self._thread is not None and self._thread.is_alive():
+                self._thread.join(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """サーバーを停止する"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeVLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def sample_prefill_seconds(self) -> float:
+        """
+        プレフィル時間をサンプリングする
+
+        Returns:
+            プレフィル時間（秒）
+        """
+        cfg = self.config
+        with self._rng_lock:
+            if cfg.latency_distribution == "constant":
+                value = cfg.latency_mean
+            elif cfg.latency_distribution == "uniform":
+                value = self._rng.uniform(
+                    cfg.latency_mean - cfg.latency_stddev, cfg.latency_mean + cfg.latency_stddev
+                )
+            elif cfg.latency_distribution == "exponential":
+                value = self._rng.expovariate(1 / cfg.latency_mean) if cfg.latency_mean > 0 else 0.0
+            else:
+                # 平均・標準偏差が指定値になるよう対数正規分布のパラメータを求める
+                if cfg.latency_mean <= 0:
+                    value = 0.0
+                else:
+                    variance = cfg.latency_stddev ** 2
+                    sigma2 = math.log(1 + variance / cfg.latency_mean ** 2)
+                    mu = math.log(cfg.latency_mean) - sigma2 / 2
+                    value = self._rng.lognormvariate(mu, math.sqrt(sigma2))
+        return max(0.0, value)
+
+    def sample_output_tokens(self, max_tokens: int) -> Tuple[int, str]:
+        """
+        生成トークン数をサンプリングする
+
+        Args:
+            max_tokens: リクエストのmax_tokens
+
+        Returns:
+            (生成トークン数, finish_reason)のタプル
+        """
+        low, high = self.config.output_tokens
+        with self._rng_lock:
+            wanted = self._rng.randint(low, high)
+        if wanted > max_tokens:
+            return max_tokens, "length"
+        return wanted, "stop"
+
+    def sample_error(self) -> Optional[str]:
+        """
+        注入するエラーを決定する
+
+        Returns:
+            "hang"、エラーのステータスコード文字列、またはNone
+        """
+        cfg = self.config
+        with self._rng_lock:
+            roll = self._rng.random()
+            if roll < cfg.hang_rate:
+                return "hang"
+            if roll < cfg.hang_rate + cfg.error_rate and cfg.error_statuses:
+                return str(self._rng.choice(cfg.error_statuses))
+        return None
+
+    def decode_rate(self) -> float:
+        """
+        現在の同時処理数でのデコード速度を返す
+
+        Returns:
+            1シーケンスあたりのトークン/秒
+        """
+        with self._lock:
+            running = max(1, self.running)
+        return self.config.token_rate / (1 + self.config.batch_slowdown * (running - 1))
+
+    def acquire_slot(self) -> None:
+        """処理スロットを確保する（上限に達している場合は待機）"""
+        with self._lock:
+            self.waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def render_metrics(self) -> str:
+        """
+        vLLMと同名のPrometheusメトリクスを出力する
+
+        KVキャッシュ使用率は、処理中のリクエスト数 / max_num_seqs で近似します。
+
+        Returns:
+            Prometheusのテキスト形式
+        """
+        with self._lock:
+            running, waiting = self.running, self.waiting
+            completion_tokens = self.completion_tokens_total
+        labels = '{model_name="deepseek-ocr"}'
+        cache_usage = running / self.config.max_num_seqs if self.config.max_num_seqs else 0.0
+        return (
+            "# TYPE vllm:num_requests_running gauge\n"
+            f"vllm:num_requests_running{labels} {running}\n"
+            "# TYPE vllm:num_requests_waiting gauge\n"
+            f"vllm:num_requests_waiting{labels} {waiting}\n"
+            "# TYPE vllm:gpu_cache_usage_perc gauge\n"
+            f"vllm:gpu_cache_usage_perc{labels} {cache_usage}\n"
+            "# TYPE vllm:generation_tokens_total counter\n"
+            f"vllm:generation_tokens_total{labels} {completion_tokens}\n"
+        )
+
+    def release_slot(self) -> None:
+        """処理スロットを解放する"""
+        with self._lock:
+            self.running -= 1
+        self._slots.release()
+
+
+def generate_tokens(num_tokens: int) -> List[str]:
+    """
+    指定トークン数相当のダミーテキストをトークン単位で生成する
+
+    Args:
+        num_tokens: トークン数（1単語 = 1トークンとみなす）
+
+    Returns:
+        トークン文字列のリスト（区切りの空白・改行を含む）
+    """
+    tokens = []
+    for i in range(num_tokens):
+        if i == num_tokens - 1:
+            sep = ""
+        elif i % 12 == 11:
+            sep = "\n"
+        else:
+            sep = " "
+        tokens.append(f"word{i % 97}{sep}")
+    return tokens
+
+
+def generate_text(num_tokens: int) -> str:
+    """
+    指定トークン数相当のダミーテキストを生成する
+
+    Args:
+        num_tokens: トークン数（1単語 = 1トークンとみなす）
+
+    Returns:
+        ダミーテキスト
+    """
+    return "".join(generate_tokens(num_tokens))
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unixドメインソケットで待ち受けるHTTPサーバー"""
+
+    daemon_threads = True
+
+
+def _make_handler(server: FakeVLLMServer) -> type:
+    """
+    代替サーバー用のリクエストハンドラクラスを作成する
+
+    Args:
+        server: FakeVLLMServerオブジェクト
+
+    Returns:
+        BaseHTTPRequestHandlerのサブクラス
+    """
+
+    class FakeVLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def address_string(self) -> str:
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send_json(
+            self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+        ) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                if server.healthy:
+                    self._send_json(200, {"status": "ok"})
+                else:
+                    self._send_json(503, {"status": "unhealthy"})
+            elif self.path == "/metrics":
+                body = server.render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            if self.path != "/v1/chat/completions":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(raw)
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid JSON"}})
+                return
+
+            with server._lock:
+                server.requests_total += 1
+
+            error = server.sample_error()
+            if error == "hang":
+                time.sleep(server.config.hang_seconds)
+                return
+            if error is not None:
+                status = int(error)
+                headers = {}
+                if status in (429, 503) and server.config.retry_after is not None:
+                    headers["Retry-After"] = str(server.config.retry_after)
+                with server._lock:
+                    server.errors_total += 1
+                self._send_json(status, {"error": {"message": f"injected error {status}"}}, headers)
+                return
+
+            self._complete(request, len(raw))
+
+        def _send_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_event(self, payload: Any) -> None:
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self._send_chunk(f"data: {data}\n\n".encode("utf-8"))
+
+        def _complete(self, request: Dict[str, Any], request_bytes: int) -> None:
+            max_tokens = int(request.get("max_tokens") or 4096)
+            num_tokens, finish_reason = server.sample_output_tokens(max_tokens)
+            prompt_tokens = 256 + request_bytes // 4096
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": num_tokens,
+                "total_tokens": prompt_tokens + num_tokens,
+            }
+            completion_id = f"fake-{time.time_ns()}"
+            model = request.get("model", "deepseek-ocr")
+
+            queued_at = time.perf_counter()
+            server.acquire_slot()
+            try:
+                started_at = time.perf_counter()
+                prefill = server.sample_prefill_seconds()
+                time.sleep(prefill)
+                if request.get("stream"):
+                    self._stream_tokens(request, completion_id, model, num_tokens, finish_reason, usage)
+                    return
+                decode = num_tokens / server.decode_rate() if num_tokens else 0.0
+                time.sleep(decode)
+            finally:
+                server.release_slot()
+
+            with server._lock:
+                server.completion_tokens_total += num_tokens
+
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": generate_text(num_tokens)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+                "metrics": {
+                    "queue_time": started_at - queued_at,
+                    "prefill_time": prefill,
+                    "decode_time": decode,
+                },
+            })
+
+        def _stream_tokens(
+            self,
+            request: Dict[str, Any],
+            completion_id: str,
+            model: str,
+            num_tokens: int,
+            finish_reason: str,
+            usage: Dict[str, int],
+        ) -> None:
+            """SSE（チャンク転送）でトークンを1つずつ送信する"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(delta: Dict[str, Any], reason: Optional[str] = None) -> Dict[str, Any]:
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+                }
+
+            sent = 0
+            try:
+                self._send_event(chunk({"role": "assistant", "content": ""}))
+                interval = 1 / server.decode_rate()
+                for token in generate_tokens(num_tokens):
+                    time.sleep(interval)
+                    self._send_event(chunk({"content": token}))
+                    sent += 1
+                self._send_event(chunk({}, finish_reason))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._send_event({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [],
+                        "usage": usage,
+                    })
+                self._send_event("[DONE]")
+                self._send_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                # クライアントが途中で切断した（キャンセル）
+                with server._lock:
+                    server.cancelled_total += 1
+                self.close_connection = True
+            finally:
+                with server._lock:
+                    server.completion_tokens_total += sent
+
+    return FakeVLLMHandler
@@ -0,0 +1,156 @@
+"""
+CLI起動時のインポート時間計測モジュール
+
+``python -X importtime`` で別プロセスのCLI起動を計測し、インポート時間の予算超過と、
+起動時に読み込まれてはいけない重いモジュール（torch、transformers、GUI系）の混入を検出します。
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# CLIの起動時（HuggingFace版・GUI操作・代替サーバーを使わない場合）に読み込まれてはいけないモジュール
+HEAVY_MODULES = (
+    "torch", "transformers", "tkinter", "pyautogui", "reportlab", "cv2", "pdftexter.bench.fake_server",
+)
+
+# 計測対象（名前 → (実行するコード, インポート時間の予算ミリ秒)）
+IMPORT_TARGETS: Dict[str, Tuple[str, float]] = {
+    "help": (
+        "from pdftexter.cli.__main__ import main\n"
+        "sys.argv = ['pdftexter', '--help']\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n",
+        150.0,
+    ),
+    "pdf-to-text": (
+        "from pdftexter.cli.pdf_to_text import main\n"
+        "from pdftexter.ocr.deepseek import DeepSeekOCR\n",
+        1000.0,
+    ),
+}
+
+# 読み込まれたモジュール一覧の前に出力する区切り（ヘルプなどの出力と区別する）
+_MODULES_MARKER = "--- loaded modules ---"
+
+# 計測用プロセスで実行するコードの雛形（sysは計測前に読み込み済みのため計測に影響しない）
+_PROBE_TEMPLATE = (
+    "import sys\n"
+    "{code}"
+    "print({marker!r})\n"
+    "print('\\n'.join(sorted(sys.modules)))\n"
+)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    ``-X importtime`` の出力のうち、インタプリタ起動後に読み込まれた最上位のモジュールを取り出す
+
+    Args:
+        stderr: 計測したプロセスの標準エラー出力
+
+    Returns:
+        （モジュール名, 自身のマイクロ秒, 累積のマイクロ秒）のリスト
+    """
+    entries: List[Tuple[str, int, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        try:
+            self_time = int(self_us)
+            cumulative = int(cumulative_us)
+        except ValueError:
+            # 見出し行
+            continue
+        # 字下げされた行は、直後に出力される親モジュールの累積時間に含まれる
+        if name.startswith("  "):
+            continue
+        name = name.strip()
+        if name == "site":
+            # siteまではインタプリタ自体の起動
+            entries = []
+            continue
+        entries.append((name, self_time, cumulative))
+    return entries
+
+
+def measure_import_time(code: str, python: Optional[str] = None) -> Dict[str, object]:
+    """
+    別プロセスでコードを実行し、インポート時間と読み込まれたモジュールを計測する
+
+    Args:
+        code: 実行するコード（sysはインポート済み）
+        python: 使用するPythonインタプリタ（Noneの場合は実行中のインタプリタ）
+
+    Returns:
+        "total_ms"（インポート時間の合計）、"slowest"（累積時間の長い最上位モジュール）、
+        "heavy_modules"（読み込まれたHEAVY_MODULES）の辞書
+
+    Raises:
+        RuntimeError: 計測用プロセスが失敗した場合
+    """
+    # インストールせずにソースツリーから実行している場合も同じパッケージを計測する
+    package_root = str(Path(__file__).resolve().parents[2])
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", _PROBE_TEMPLATE.format(code=code, marker=_MODULES_MARKER)],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"計測用プロセスが失敗しました:\n{result.stderr[-2000:]}")
+
+    entries = parse_importtime(result.stderr)
+    modules = set(result.stdout.rpartition(_MODULES_MARKER)[2].split())
+    return {
+        "total_ms": sum(cumulative for _, _, cumulative in entries) / 1000,
+        "slowest": sorted(entries, key=lambda entry: entry[2], reverse=True)[:5],
+        "heavy_modules": [name for name in HEAVY_MODULES if name in modules],
+    }
+
+
+def check_import_budgets(
+    targets: Optional[Sequence[str]] = None,
+    budgets: Optional[Dict[str, float]] = None,
+    repeat: int = 3,
+    python: Optional[str] = None,
+) -> Tuple[bool, List[str]]:
+    """
+    各計測対象のインポート時間が予算内で、重いモジュールを読み込んでいないか確認する
+
+    Args:
+        targets: 計測対象の名前（IMPORT_TARGETSのキー、Noneの場合はすべて）
+        budgets: 予算（ミリ秒）の上書き
+        repeat: 計測回数（最小値で判定し、ディスクキャッシュなどの揺らぎを除く）
+        python: 使用するPythonインタプリタ
+
+    Returns:
+        （すべて合格したか, 表示用の行リスト）のタプル
+    """
+    passed = True
+    lines: List[str] = []
+    for name in targets or list(IMPORT_TARGETS):
+        code, default_budget = IMPORT_TARGETS[name]
+        budget = (budgets or {}).get(name, default_budget)
+        runs = [measure_import_time(code, python=python) for _ in range(max(1, repeat))]
+        best = min(runs, key=lambda run: run["total_ms"])
+        ok = best["total_ms"] <= budget and not best["heavy_modules"]
+        passed = passed and ok
+        lines.append(
+            f"{'OK' if ok else 'NG'} {name}: {best['total_ms']:.1f}ms（予算 {budget:.0f}ms）"
+        )
+        if best["heavy_modules"]:
+            lines.append(f"    読み込まれた重いモジュール: {', '.join(best['heavy_modules'])}")
+        for module, _, cumulative in best["slowest"]:
+            lines.append(f"    {module}: {cumulative / 1000:.1f}ms")
+    return passed, lines
@@ -0,0 +1,8 @@
+"""
+代替サーバーのレイテンシ分布の定義
+
+CLIの引数定義から参照するため、標準ライブラリを含めて何もインポートしないモジュールに分けています
+（fake_server.pyはhttp.serverなどを読み込むため、--helpの起動が遅くなる）。
+"""
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
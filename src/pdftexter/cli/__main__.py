@@ -9,9 +9,8 @@ import sys
 from pathlib import Path
 from typing import Optional
 
-from pdftexter.cli.pdf_to_text import main as pdf_to_text_main
-from pdftexter.kindle.screenshot import KindleScreenshot
-from pdftexter.pdf.converter import PDFConverter
+# サブコマンドの依存（OCRバックエンド、GUIのtkinter・pyautoguiなど）は読み込みが重く、
+# ヘッドレス環境では読み込めないものもあるため、各サブコマンドの実行時にインポートする
 
 
 def kindle_to_pdf_cli(args: argparse.Namespace) -> int:
@@ -42,6 +41,8 @@ def pdf_to_text_cli(args: argparse.Namespace) -> int:
     Returns:
         終了コード
     """
+    from pdftexter.cli.pdf_to_text import main as pdf_to_text_main
+    
     # pdf_to_textモジュールのmain関数を呼び出し
     # 引数を再構築
     sys.argv = ["pdf-to-text", args.input] + (
@@ -58,6 +59,14 @@ def pdf_to_text_cli(args: argparse.Namespace) -> int:
         ["--no-progress"] if args.no_progress else []
     ) + (
         ["--skip-verify"] if args.skip_verify else []
+    ) + (
+        ["--stream"] if args.stream else []
+    ) + (
+        ["--warmup"] if args.warmup else []
+    ) + (
+        ["--resolution-mode", args.resolution_mode] if args.resolution_mode else []
+    ) + (
+        ["--stats-json", args.stats_json] if args.stats_json else []
     )
     
     return pdf_to_text_main()
@@ -73,6 +82,9 @@ def full_workflow_cli(args: argparse.Namespace) -> int:
     Returns:
         終了コード
     """
+    from pdftexter.cli.pdf_to_text import main as pdf_to_text_main
+    from pdftexter.pdf.converter import PDFConverter
+    
     print("Kindle → PDF → Text の一括処理")
     print("=" * 50)
     
@@ -148,6 +160,165 @@ def full_workflow_cli(args: argparse.Namespace) -> int:
     return 0
 
 
+def _add_fake_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    代替サーバーの動作設定の引数を追加する
+    
+    Args:
+        parser: 引数を追加するパーサー
+    """
+    # fake_serverはhttp.serverなどを読み込むため、引数定義では分布の一覧だけを参照する
+    from pdftexter.bench.latency import LATENCY_DISTRIBUTIONS
+    
+    group = parser.add_argument_group("代替サーバーの設定")
+    group.add_argument(
+        "--latency-distribution",
+        choices=LATENCY_DISTRIBUTIONS,
+        default="lognormal",
+        help="プレフィル時間の分布",
+    )
+    group.add_argument("--latency-mean", type=float, default=0.3, help="プレフィル時間の平均（秒）")
+    group.add_argument(
+        "--latency-stddev", type=float, default=0.1, help="プレフィル時間の標準偏差（秒）"
+    )
+    group.add_argument(
+        "--token-rate", type=float, default=200.0, help="1シーケンスあたりの生成速度（トークン/秒）"
+    )
+    group.add_argument("--min-tokens", type=int, default=200, help="生成トークン数の最小値")
+    group.add_argument("--max-tokens", type=int, default=800, help="生成トークン数の最大値")
+    group.add_argument("--max-num-seqs", type=int, default=8, help="サーバーの同時処理数の上限")
+    group.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す確率")
+    group.add_argument(
+        "--error-statuses",
+        type=str,
+        default="500,503",
+        help="エラー時に返すステータスコード（カンマ区切り）",
+    )
+    group.add_argument("--retry-after", type=float, help="429/503で返すRetry-After（秒）")
+    group.add_argument("--seed", type=int, help="乱数のシード")
+
+
+def _fake_server_config_from_args(args: argparse.Namespace):
+    """
+    コマンドライン引数から代替サーバーの設定を作成する
+    
+    Args:
+        args: コマンドライン引数
+        
+    Returns:
+        FakeServerConfigオブジェクト
+    """
+    from pdftexter.bench.fake_server import FakeServerConfig
+    
+    return FakeServerConfig(
+        latency_distribution=args.latency_distribution,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        token_rate=args.token_rate,
+        output_tokens=(args.min_tokens, args.max_tokens),
+        max_num_seqs=args.max_num_seqs,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s.strip()],
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def bench_client_cli(args: argparse.Namespace) -> int:
+    """
+    vLLMクライアント経路の負荷試験
+    
+    --server-url未指定時はローカルの代替サーバーを起動して計測します。
+    
+    Args:
+        args: コマンドライン引数
+        
+    Returns:
+        終了コード
+    """
+    from pdftexter.bench.client import format_results, run_client_benchmark
+    from pdftexter.bench.fake_server import FakeVLLMServer
+    
+    concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    
+    fake_server = None
+    server_url = args.server_url
+    if server_url is None:
+        fake_server = FakeVLLMServer(_fake_server_config_from_args(args)).start()
+        server_url = fake_server.url
+        print(f"代替サーバーを起動しました: {server_url}", file=sys.stderr)
+    
+    try:
+        results = run_client_benchmark(
+            server_url=server_url,
+            concurrency_levels=concurrency_levels,
+            requests_per_level=args.requests,
+            image_path=args.image,
+            via=args.via,
+        )
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    
+    print(format_results(results))
+    return 0
+
+
+def bench_server_cli(args: argparse.Namespace) -> int:
+    """
+    OpenAI互換の代替サーバーを起動する
+    
+    Args:
+        args: コマンドライン引数
+        
+    Returns:
+        終了コード
+    """
+    from pdftexter.bench.fake_server import FakeVLLMServer
+    
+    server = FakeVLLMServer(
+        _fake_server_config_from_args(args),
+        host=args.host,
+        port=args.port,
+        socket_path=args.unix_socket,
+    )
+    server.start()
+    print(f"代替サーバーを起動しました: {server.url}（Ctrl+Cで停止）")
+    server.serve_forever()
+    return 0
+
+
+def worker_cli(args: argparse.Namespace) -> int:
+    """
+    HuggingFace版の常駐OCRワーカーを起動する
+    
+    Args:
+        args: コマンドライン引数
+        
+    Returns:
+        終了コード
+    """
+    from pdftexter.ocr.config import load_config
+    from pdftexter.ocr.worker import build_worker_supervisor, find_worker
+    
+    try:
+        config = load_config(args.config)
+    except Exception as e:
+        print(f"エラー: 設定ファイルの読み込みに失敗しました: {e}", file=sys.stderr)
+        return 1
+    
+    supervisor = build_worker_supervisor(
+        config, url=args.url, inference_timeout=args.inference_timeout
+    )
+    if find_worker(supervisor.url):
+        print(f"エラー: ワーカーは既に起動しています: {supervisor.url}", file=sys.stderr)
+        return 1
+    
+    print(f"ワーカーを起動します: {supervisor.url}（モデルの読み込み後に受け付けを開始、Ctrl+Cで停止）")
+    supervisor.serve_forever()
+    return 0
+
+
 def main() -> int:
     """
     メイン関数
@@ -168,6 +339,12 @@ def main() -> int:
   
   # Kindle → PDF → Text の一括処理（画像フォルダから開始）
   pdftexter full input_folder -o output.md
+  
+  # HuggingFace版のモデルを常駐させる（以降のpdf-to-textは自動的にワーカーを使用）
+  pdftexter worker
+  
+  # vLLMクライアント経路の負荷試験（ローカルの代替サーバーを使用）
+  pdftexter bench client --concurrency 1,4,16
         """,
     )
     
@@ -210,6 +387,24 @@ def main() -> int:
     pdf_text_parser.add_argument(
         "--skip-verify", action="store_true", help="OCRセットアップの検証をスキップ"
     )
+    pdf_text_parser.add_argument(
+        "--stream", action="store_true", help="vLLMの応答をストリーミングで受信する"
+    )
+    pdf_text_parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="PDFの画像変換と並行して合成ページを処理させ、最初のページの遅延を抑える",
+    )
+    pdf_text_parser.add_argument(
+        "--resolution-mode",
+        choices=["tiny", "small", "base", "large", "gundam", "auto"],
+        help="DeepSeek-OCRの解像度モード（auto: ページごとに選ぶ）",
+    )
+    pdf_text_parser.add_argument(
+        "--stats-json",
+        type=str,
+        help="ページごとの計測値とトークン使用量の集計をJSONファイルに保存する",
+    )
     pdf_text_parser.set_defaults(func=pdf_to_text_cli)
     
     # kindle-to-markdown サブコマンド（PDFレビュー機能付き）
@@ -314,6 +509,75 @@ def main() -> int:
     )
     full_parser.set_defaults(func=full_workflow_cli)
     
+    # worker サブコマンド（HuggingFace版の常駐ワーカー）
+    worker_parser = subparsers.add_parser(
+        "worker",
+        help="HuggingFace版のモデルを読み込んだまま常駐し、OCRリクエストを受け付ける",
+    )
+    worker_parser.add_argument(
+        "-c", "--config", type=str, help="OCR設定ファイルのパス"
+    )
+    worker_parser.add_argument(
+        "--url",
+        type=str,
+        help="待ち受けるURL（http+unix://... またはhttp://127.0.0.1:ポート、省略時は設定値）",
+    )
+    worker_parser.add_argument(
+        "--inference-timeout",
+        type=float,
+        help="ハングとみなして再起動するまでの1ページの推論時間（秒、省略時は設定値）",
+    )
+    worker_parser.set_defaults(func=worker_cli)
+    
+    # bench サブコマンド（負荷試験・ベンチマーク）
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="ベンチマーク・負荷試験",
+    )
+    bench_subparsers = bench_parser.add_subparsers(dest="bench_command", required=True)
+    
+    bench_client_parser = bench_subparsers.add_parser(
+        "client",
+        help="vLLMクライアント経路の負荷試験（同時実行数ごとのスループット・レイテンシ）",
+    )
+    bench_client_parser.add_argument(
+        "--server-url",
+        type=str,
+        help="計測対象のサーバーURL（省略時はローカルの代替サーバーを起動）",
+    )
+    bench_client_parser.add_argument(
+        "--image", type=str, help="送信するページ画像（省略時は合成画像）"
+    )
+    bench_client_parser.add_argument(
+        "--concurrency",
+        type=str,
+        default="1,2,4,8,16",
+        help="試す同時実行数（カンマ区切り）",
+    )
+    bench_client_parser.add_argument(
+        "--requests", type=int, default=32, help="同時実行数ごとのリクエスト数"
+    )
+    bench_client_parser.add_argument(
+        "--via",
+        choices=["wrapper", "ocr"],
+        default="wrapper",
+        help="VLLMWrapperを直接呼ぶか、DeepSeekOCR経由で呼ぶか",
+    )
+    _add_fake_server_arguments(bench_client_parser)
+    bench_client_parser.set_defaults(func=bench_client_cli)
+    
+    bench_server_parser = bench_subparsers.add_parser(
+        "server",
+        help="OpenAI互換の代替サーバーを起動（/v1/chat/completions, /health）",
+    )
+    bench_server_parser.add_argument("--host", type=str, default="127.0.0.1", help="待ち受けるホスト")
+    bench_server_parser.add_argument("--port", type=int, default=8000, help="待ち受けるポート")
+    bench_server_parser.add_argument(
+        "--unix-socket", type=str, help="Unixドメインソケットのパス（指定時はTCPの代わりに使用）"
+    )
+    _add_fake_server_arguments(bench_server_parser)
+    bench_server_parser.set_defaults(func=bench_server_cli)
+    
     args = parser.parse_args()
     
     if not args.command:
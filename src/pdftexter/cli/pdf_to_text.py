@@ -3,6 +3,7 @@ PDF→Text変換CLIモジュール
 """
 
 import argparse
+import json
 import sys
 from pathlib import Path
 from typing import Optional
@@ -25,6 +26,25 @@ def progress_callback(current: int, total: int) -> None:
         print()  # 最後に改行
 
 
+def make_stream_progress_callback() -> callable:
+    """
+    ストリーミング時のページ内進捗表示コールバックを作成する
+    
+    Returns:
+        （ページ番号, テキスト片）を受け取るコールバック関数
+    """
+    state = {"page": 0, "chars": 0}
+    
+    def token_callback(page: int, text: str) -> None:
+        if page != state["page"]:
+            state["page"] = page
+            state["chars"] = 0
+        state["chars"] += len(text)
+        print(f"処理中... ページ {page}（{state['chars']}文字）", end="\r")
+    
+    return token_callback
+
+
 def main() -> int:
     """
     メイン関数
@@ -84,11 +104,31 @@ def main() -> int:
         action="store_true",
         help="一時画像を保持する（デバッグ用）",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="vLLMの応答をストリーミングで受信し、ページの生成途中から書き込む",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="PDFの画像変換と並行して合成ページを処理させ、最初のページの遅延を抑える",
+    )
+    parser.add_argument(
+        "--resolution-mode",
+        choices=["tiny", "small", "base", "large", "gundam", "auto"],
+        help="DeepSeek-OCRの解像度モード（auto: ページごとに選ぶ、省略時は設定ファイルの値）",
+    )
     parser.add_argument(
         "--resume",
         action="store_true",
         help="中断した処理を再開する（進捗ファイルから続きから開始）",
     )
+    parser.add_argument(
+        "--stats-json",
+        type=str,
+        help="ページごとの計測値とトークン使用量の集計をJSONファイルに保存する",
+    )
     
     args = parser.parse_args()
     
@@ -113,13 +153,20 @@ def main() -> int:
         config = load_config(args.config) if args.config else load_config()
         # 出力形式を設定に反映
         config.deepseek_ocr.output_format = args.format
+        if args.stream:
+            config.deepseek_ocr.stream = True
+        if args.warmup:
+            config.deepseek_ocr.warmup = True
+        if args.resolution_mode:
+            config.deepseek_ocr.resolution_mode = args.resolution_mode
     except Exception as e:
         print(f"エラー: 設定ファイルの読み込みに失敗しました: {e}", file=sys.stderr)
         return 1
     
-    # DeepSeek-OCRの初期化（セットアップ検証を実行）
+    # DeepSeek-OCRの初期化（モデルの読み込み・セットアップ検証はPDFの画像変換と並行して行う。
+    # CPUワーカーのプールを使う場合は、ワーカーをforkするためここで読み込みを終える）
     try:
-        ocr = DeepSeekOCR(config, verify_setup=not args.skip_verify)
+        ocr = DeepSeekOCR(config, verify_setup=not args.skip_verify, background_init=True)
     except RuntimeError as e:
         print(f"エラー: {e}", file=sys.stderr)
         print("\nヒント: --skip-verify オプションでセットアップ検証をスキップできます", file=sys.stderr)
@@ -134,6 +181,9 @@ def main() -> int:
         print(f"出力先: {output_path}")
         
         callback = None if args.no_progress else progress_callback
+        token_callback = None
+        if not args.no_progress and config.deepseek_ocr.stream:
+            token_callback = make_stream_progress_callback()
         
         output_file = ocr.process_pdf_to_file(
             pdf_path=str(input_path),
@@ -143,16 +193,33 @@ def main() -> int:
             progress_callback=callback,
             keep_temp_images=args.keep_temp_images,
             resume=args.resume,
+            token_callback=token_callback,
         )
         
         print(f"完了: {output_file}")
+        print(ocr.run_stats.format_summary(), file=sys.stderr)
+        if args.stats_json:
+            with open(args.stats_json, "w", encoding="utf-8") as f:
+                json.dump(ocr.run_stats.to_dict(), f, ensure_ascii=False, indent=2)
+            print(f"統計を保存しました: {args.stats_json}", file=sys.stderr)
         return 0
         
     except Exception as e:
+        if ocr.backend_error is not None:
+            # バックグラウンドでの初期化の失敗（セットアップ検証・モデルの読み込み）
+            if isinstance(e, RuntimeError):
+                print(f"エラー: {e}", file=sys.stderr)
+                print("\nヒント: --skip-verify オプションでセットアップ検証をスキップできます", file=sys.stderr)
+            else:
+                print(f"エラー: DeepSeek-OCRの初期化に失敗しました: {e}", file=sys.stderr)
+            return 1
         print(f"エラー: OCR処理に失敗しました: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        # HuggingFace版のモデルは同じプロセス内の次の呼び出しで再利用できるよう、参照だけを解放する
+        ocr.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+"""
+同時実行数の適応制御モジュール
+
+OCRリクエストの同時実行数（インフライト数）をAIMD方式で調整します。
+レイテンシが基準から大きく外れない間は同時実行数を少しずつ増やし、
+レイテンシの上昇・429/503・タイムアウトを観測したら乗算的に減らします。
+vLLMのPrometheusメトリクス（``/metrics``）が取得できる場合は、待機中のリクエスト数と
+KVキャッシュ使用率からサーバーの飽和を検知して上限を絞ります。
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from pdftexter.ocr.endpoints import Endpoint
+
+# サーバーの混雑を示すHTTPステータスコード
+OVERLOAD_STATUSES = (429, 503)
+
+# 枠の待機中に中止の通知を確認する間隔（秒）
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def parse_prometheus_metrics(text: str) -> Dict[str, float]:
+    """
+    Prometheusのテキスト形式をメトリクス名ごとの合計値に変換する
+
+    ラベルが異なる系列（モデル名など）は合計します。
+
+    Args:
+        text: ``/metrics`` の応答本文
+
+    Returns:
+        メトリクス名 → 値 の辞書
+    """
+    metrics: Dict[str, float] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name_part, _, value_part = line.rpartition(" ")
+        name = name_part.split("{", 1)[0].strip()
+        try:
+            value = float(value_part)
+        except ValueError:
+            continue
+        metrics[name] = metrics.get(name, 0.0) + value
+    return metrics
+
+
+def fetch_server_load(endpoints: Sequence[Endpoint], timeout: float = 2.0) -> Optional[Dict[str, float]]:
+    """
+    vLLMサーバーの負荷（処理中・待機中のリクエスト数、KVキャッシュ使用率）を取得する
+
+    Args:
+        endpoints: 取得対象のエンドポイント
+        timeout: ``/metrics`` のタイムアウト（秒）
+
+    Returns:
+        "running", "waiting"（全エンドポイントの合計）と "kv_cache_usage"（最大値）の辞書。
+        どのエンドポイントからも取得できない場合はNone
+    """
+    load = {"running": 0.0, "waiting": 0.0, "kv_cache_usage": 0.0}
+    found = False
+    for endpoint in endpoints:
+        try:
+            response = endpoint.http().get(f"{endpoint.url}/metrics", timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException:
+            continue
+        metrics = parse_prometheus_metrics(response.text)
+        if "vllm:num_requests_running" not in metrics:
+            continue
+        found = True
+        load["running"] += metrics["vllm:num_requests_running"]
+        load["waiting"] += metrics.get("vllm:num_requests_waiting", 0.0)
+        # vLLMのバージョンによってメトリクス名が異なる
+        usage = metrics.get("vllm:kv_cache_usage_perc", metrics.get("vllm:gpu_cache_usage_perc", 0.0))
+        load["kv_cache_usage"] = max(load["kv_cache_usage"], usage)
+    return load if found else None
+
+
+def classify_failure(exception: Exception) -> str:
+    """
+    失敗したリクエストを同時実行数の制御用に分類する
+
+    Args:
+        exception: リクエストで発生した例外
+
+    Returns:
+        "timeout"、"overload"（429/503）、または "error"（同時実行数とは無関係な失敗）
+    """
+    if isinstance(exception, requests.Timeout):
+        return "timeout"
+    response = getattr(exception, "response", None)
+    if response is not None and response.status_code in OVERLOAD_STATUSES:
+        return "overload"
+    return "error"
+
+
+class ConcurrencyLimiter:
+    """
+    AIMD方式の同時実行数リミッター（スレッドセーフ）
+
+    acquire()で枠を確保し、release()で結果（レイテンシ・失敗の種類）を報告します。
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.7,
+        baseline_window: int = 100,
+        kv_cache_high: float = 0.9,
+        verbose: bool = True,
+    ):
+        """
+        初期化
+
+        Args:
+            initial_limit: 同時実行数の初期値
+            min_limit: 同時実行数の下限
+            max_limit: 同時実行数の上限
+            latency_tolerance: 基準レイテンシ（直近の最小値）の何倍を超えたら減らすか
+            decrease_factor: 減らす際に掛ける係数
+            baseline_window: 基準レイテンシの計算に使う直近の観測数
+            kv_cache_high: 待機中のリクエストがある状態で、この使用率以上ならサーバーが飽和しているとみなす
+            verbose: 同時実行数を変更するたびに標準エラー出力に表示するか
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.kv_cache_high = kv_cache_high
+        self.verbose = verbose
+
+        self.initial_limit = min(max(initial_limit, min_limit), max_limit)
+        self.limit = float(self.initial_limit)
+        self.inflight = 0
+        self.peak_limit = self.initial_limit
+        self.decreases = 0
+        self.decisions: List[Tuple[float, int, str]] = []  # (経過秒, 変更後の同時実行数, 理由)
+
+        self._latencies: Deque[float] = deque(maxlen=baseline_window)
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._cond = threading.Condition()
+        self._metrics_thread: Optional[threading.Thread] = None
+        self._metrics_stop = threading.Event()
+
+    @property
+    def current_limit(self) -> int:
+        """現在の同時実行数の上限（整数）"""
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(
+        self, timeout: Optional[float] = None, cancel_event: Optional[threading.Event] = None
+    ) -> bool:
+        """
+        同時実行の枠を確保する（上限に達している場合は空くまで待機）
+
+        Args:
+            timeout: 待機する最大時間（秒、Noneの場合は無制限）
+            cancel_event: セットされたら待機を打ち切るイベント
+
+        Returns:
+            枠を確保できた場合True。timeoutを過ぎた場合やcancel_eventがセットされた場合はFalse
+        """
+        wait_until = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.inflight >= self.current_limit:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                wait = None
+                if wait_until is not None:
+                    wait = wait_until - time.monotonic()
+                    if wait <= 0:
+                        return False
+                if cancel_event is not None:
+                    # Event.set()はこのConditionを通知しないため、一定間隔で確認する
+                    wait = CANCEL_POLL_INTERVAL if wait is None else min(wait, CANCEL_POLL_INTERVAL)
+                self._cond.wait(wait)
+            self.inflight += 1
+            return True
+
+    def release(self, latency: Optional[float] = None, outcome: str = "ok") -> None:
+        """
+        同時実行の枠を解放し、結果に応じて同時実行数を調整する
+
+        Args:
+            latency: 成功したリクエストのレイテンシ（秒）
+            outcome: "ok"、"overload"（429/503）、"timeout"、"error"（調整しない）
+        """
+        with self._cond:
+            was_saturated = self.inflight >= self.current_limit
+            self.inflight -= 1
+            if outcome == "overload":
+                self._decrease("サーバーが混雑を通知（429/503）")
+            elif outcome == "timeout":
+                self._decrease("タイムアウト")
+            elif outcome == "ok" and latency is not None:
+                self._latencies.append(latency)
+                baseline = min(self._latencies)
+                if len(self._latencies) >= 5 and latency > baseline * self.latency_tolerance:
+                    self._decrease(f"レイテンシ上昇 {latency:.2f}秒（基準 {baseline:.2f}秒）")
+                elif was_saturated:
+                    # 上限まで使い切っている場合のみ増やす（1周期あたり+1）
+                    self._set(self.limit + 1 / self.limit, "レイテンシ安定")
+            self._cond.notify_all()
+
+    def apply_server_load(self, load: Dict[str, float]) -> None:
+        """
+        サーバーのメトリクスに基づいて同時実行数を調整する
+
+        Args:
+            load: fetch_server_load()の戻り値
+        """
+        with self._cond:
+            waiting = load.get("waiting", 0.0)
+            usage = load.get("kv_cache_usage", 0.0)
+            if waiting > 0 and usage >= self.kv_cache_high:
+                # KVキャッシュが埋まり待ちが発生している：処理中の数を超えて送っても待つだけ
+                running = int(load.get("running", 0.0))
+                if running < self.current_limit:
+                    self._set(
+                        max(running, self.min_limit),
+                        f"サーバー飽和（待機 {waiting:.0f}件, KVキャッシュ {usage * 100:.0f}%）",
+                    )
+            elif waiting > 0:
+                self._decrease(f"サーバーで待機中のリクエスト {waiting:.0f}件")
+            self._cond.notify_all()
+
+    def _decrease(self, reason: str) -> None:
+        """同時実行数を乗算的に減らす（ロックを取得した状態で呼ぶこと）"""
+        now = time.monotonic()
+        # 1回の混雑で連続して減らしすぎないよう、基準レイテンシ程度の間隔を空ける
+        interval = max(1.0, min(self._latencies) if self._latencies else 0.0)
+        if now - self._last_decrease < interval:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self._set(self.limit * self.decrease_factor, reason)
+
+    def _set(self, value: float, reason: str) -> None:
+        """同時実行数を変更して記録する（ロックを取得した状態で呼ぶこと）"""
+        old = self.current_limit
+        self.limit = min(max(value, float(self.min_limit)), float(self.max_limit))
+        new = self.current_limit
+        if new == old:
+            return
+        self.peak_limit = max(self.peak_limit, new)
+        self.decisions.append((time.monotonic() - self._started, new, reason))
+        if self.verbose:
+            print(f"同時実行数: {old} → {new}（{reason}）", file=sys.stderr)
+
+    def start_metrics_polling(self, endpoints: Sequence[Endpoint], interval: float) -> None:
+        """
+        バックグラウンドで定期的に ``/metrics`` を取得して同時実行数に反映する
+
+        Args:
+            endpoints: 取得対象のエンドポイント
+            interval: 取得間隔（秒）
+        """
+        if self._metrics_thread is not None:
+            return
+        self._metrics_stop.clear()
+
+        def run() -> None:
+            while not self._metrics_stop.wait(interval):
+                load = fetch_server_load(endpoints)
+                if load is not None:
+                    self.apply_server_load(load)
+
+        self._metrics_thread = threading.Thread(target=run, name="pdftexter-metrics", daemon=True)
+        self._metrics_thread.start()
+
+    def stop_metrics_polling(self) -> None:
+        """定期的な ``/metrics`` の取得を停止する"""
+        if self._metrics_thread is None:
+            return
+        self._metrics_stop.set()
+        self._metrics_thread.join()
+        self._metrics_thread = None
+
+    def summary_lines(self) -> List[str]:
+        """
+        同時実行数の調整結果を表示用の行リストとして返す
+
+        Returns:
+            サマリーの各行
+        """
+        return [
+            f"同時実行数: 初期 {self.initial_limit} → 最終 {self.current_limit}"
+            f"（最大 {self.peak_limit}, 変更 {len(self.decisions)}回, 減少 {self.decreases}回）"
+        ]
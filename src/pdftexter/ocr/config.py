@@ -4,25 +4,226 @@ OCR設定管理モジュール
 
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
 import yaml
 from pydantic import BaseModel, Field, field_validator
 
 
+class VLLMEndpointConfig(BaseModel):
+    """vLLMエンドポイント（レプリカ）設定クラス"""
+    
+    url: str = Field(..., description="vLLMサーバーのURL（http+unix:// 形式も可）")
+    weight: float = Field(1.0, description="振り分けの重み（大きいほど多くのページを受け持つ）")
+    
+    @field_validator("weight")
+    @classmethod
+    def validate_weight(cls, v: float) -> float:
+        """重みの検証"""
+        if v <= 0:
+            raise ValueError("weight must be positive")
+        return v
+
+
 class DeepSeekOCRConfig(BaseModel):
     """DeepSeek-OCR設定クラス"""
     
     model_path: str = Field(..., description="DeepSeek-OCRモデルのパス（ローカル推論時）")
     model_name: str = Field("deepseek-ocr", description="vLLM APIで使用するモデル名")
     vllm_server_url: Optional[str] = Field(None, description="vLLMサーバーのURL（Noneの場合はローカル実行）")
+    vllm_endpoints: List[VLLMEndpointConfig] = Field(
+        default_factory=list,
+        description="複数のvLLMレプリカに振り分ける場合のエンドポイント一覧（指定時はvllm_server_urlより優先）",
+    )
+    endpoint_failure_threshold: int = Field(3, description="エンドポイントを切り離すまでの連続失敗回数")
+    endpoint_cooldown: float = Field(30, description="切り離したエンドポイントに再び振り分けるまでの時間（秒）")
+    endpoint_health_check_interval: Optional[float] = Field(
+        10, description="エンドポイントの/healthを確認する間隔（秒、Noneの場合は確認しない。複数指定時のみ）"
+    )
+    max_concurrent_pages: int = Field(
+        1, description="同時にOCR処理するページ数の上限（1の場合は1ページずつ順に処理）"
+    )
+    adaptive_concurrency: bool = Field(
+        False,
+        description="レイテンシ・429/503・タイムアウト・サーバーのメトリクスに応じて"
+        "同時実行数をmax_concurrent_pagesまでの範囲で自動調整するか",
+    )
+    concurrency_initial: int = Field(2, description="自動調整する場合の同時実行数の初期値")
+    concurrency_latency_tolerance: float = Field(
+        2.0, description="基準レイテンシの何倍を超えたら同時実行数を減らすか"
+    )
+    concurrency_metrics_interval: Optional[float] = Field(
+        5, description="vLLMの/metricsを取得する間隔（秒、Noneの場合は取得しない）"
+    )
+    hedge_requests: bool = Field(
+        False, description="遅いページに同じリクエストを別のエンドポイントへも送り、先に完了した方を採用するか"
+    )
+    hedge_latency_percentile: float = Field(
+        95, description="ヘッジを送るまでの待ち時間に使う観測レイテンシのパーセンタイル"
+    )
+    hedge_max_ratio: float = Field(0.05, description="全リクエストに対するヘッジの最大割合")
+    hedge_min_samples: int = Field(20, description="ヘッジを有効にするのに必要なレイテンシの観測数")
+    hedge_min_delay: float = Field(1.0, description="ヘッジを送るまでの最小の待ち時間（秒）")
     use_huggingface: bool = Field(False, description="HuggingFace Transformers版を使用するか（vLLMサーバー不要）")
-    max_tokens: int = Field(4096, description="最大トークン数")
+    use_worker: bool = Field(
+        True,
+        description="HuggingFace版の設定で、常駐ワーカー（pdftexter worker）が起動していれば"
+        "モデルを読み込まずにワーカーを使用するか",
+    )
+    worker_url: Optional[str] = Field(
+        None,
+        description="常駐ワーカーのURL（Noneの場合はUnixドメインソケットの既定のパス、Windowsでは"
+        "http://127.0.0.1:8765）",
+    )
+    worker_inference_timeout: float = Field(
+        600,
+        description="常駐ワーカー・CPUワーカープロセスで1ページの推論がこの時間（秒）を超えたら"
+        "ハングとみなして再起動する",
+    )
+    hf_num_workers: int = Field(
+        1,
+        description="HuggingFace版のCPU推論で、モデルを共有してページを並行処理するワーカープロセス数"
+        "（1の場合はこのプロセスで推論する。forkが使える環境のみ）",
+    )
+    hf_worker_threads: Optional[int] = Field(
+        None, description="CPUワーカープロセスごとの演算スレッド数（Noneの場合は割り当てたコア数）"
+    )
+    hf_prefetch: bool = Field(
+        True,
+        description="HuggingFace版で、次のページの画像の読み込みとタイルへの分割を"
+        "推論と並行して済ませておくか（ワーカープロセスを使う場合は無効）",
+    )
+    cpu_num_threads: Optional[int] = Field(
+        None, description="HuggingFace版のCPU推論の演算スレッド数（Noneの場合はtorchの既定値）"
+    )
+    cpu_interop_threads: Optional[int] = Field(
+        None, description="HuggingFace版のCPU推論の演算間スレッド数（Noneの場合はtorchの既定値）"
+    )
+    cpu_dtype: str = Field(
+        "auto",
+        description="HuggingFace版のCPU推論の重みのdtype"
+        "（auto: bfloat16の演算命令を持つCPUではbfloat16, float32, bfloat16）",
+    )
+    low_cpu_mem_usage: bool = Field(
+        True, description="HuggingFace版で、重みを一時的に二重に確保せずに読み込むか"
+    )
+    torch_compile: bool = Field(
+        False, description="HuggingFace版で、モデルのforwardをtorch.compileでコンパイルするか"
+    )
+    quantization: Optional[str] = Field(
+        None,
+        description="HuggingFace版のCPU推論で、言語モデルのLinear層を量子化する方式"
+        "（int8-dynamic、Noneの場合は量子化しない）",
+    )
+    quantization_cache_dir: Optional[str] = Field(
+        None,
+        description="量子化済みモデルのキャッシュフォルダ（Noneの場合は~/.cache/pdftexter/quantized）",
+    )
+    prepared_snapshot: bool = Field(
+        False,
+        description="HuggingFace版のCPU推論で、dtypeを変換したモデルを初回の読み込み後に保存し、"
+        "次回からmmapで読み込んで起動を速くするか",
+    )
+    prepared_snapshot_dir: Optional[str] = Field(
+        None,
+        description="準備済みモデルの保存フォルダ（Noneの場合は~/.cache/pdftexter/prepared）",
+    )
+    hf_model_idle_timeout: Optional[float] = Field(
+        None,
+        description="HuggingFace版で、どこからも使われなくなったモデルを解放するまでの時間"
+        "（秒、Noneの場合はプロセスの終了まで保持し、同じプロセス内で再利用する）",
+    )
+    resolution_mode: str = Field(
+        "gundam",
+        description="DeepSeek-OCRの解像度モード（tiny, small, base, large, gundam, "
+        "auto: ページの大きさと文字の密度からページごとに選ぶ）",
+    )
+    max_tokens: int = Field(4096, description="最大トークン数（adaptive_max_tokens有効時は予算の上限）")
+    adaptive_max_tokens: bool = Field(
+        False,
+        description="ページごとに必要なトークン数を見積もってmax_tokensを決め、"
+        "打ち切られたページは予算を増やして再試行するか（vLLM版のみ）",
+    )
+    token_budget_estimator: str = Field(
+        "ink", description="トークン数の見積もり方法（ink: ページ画像のインク量, previous_page: 直前のページの出力長）"
+    )
+    token_budget_headroom: float = Field(1.5, description="見積もったトークン数に掛ける余裕の倍率")
+    token_budget_min: int = Field(256, description="ページごとのmax_tokensの下限")
     temperature: float = Field(0.1, description="温度パラメータ")
+    stream: bool = Field(
+        False, description="vLLMの応答をストリーミング（SSE）で受信し、ページ途中から書き込むか"
+    )
     output_format: str = Field("markdown", description="出力形式（markdown or plain）")
     timeout: int = Field(300, description="タイムアウト時間（秒）")
-    max_retries: int = Field(3, description="最大リトライ回数")
-    retry_delay: int = Field(5, description="リトライ間隔（秒）")
+    warmup: bool = Field(
+        False,
+        description="PDFの画像変換と並行して合成ページを処理させ、サーバー・モデルのキャッシュを温めるか",
+    )
+    page_deadline: bool = Field(
+        False,
+        description="観測したページの処理時間から期限を決め、期限を超えたページを"
+        "縮退ラダーに従って軽い設定で再処理するか（vLLM版のみ）",
+    )
+    deadline_percentile: float = Field(99, description="期限の基準にするページ処理時間のパーセンタイル")
+    deadline_multiplier: float = Field(2.0, description="基準の処理時間に掛ける倍率")
+    deadline_min: float = Field(30, description="期限の下限（秒）")
+    deadline_min_samples: int = Field(
+        10, description="観測値から期限を決めるのに必要なページ数（それまではtimeoutを期限とする）"
+    )
+    degradation_ladder: List[str] = Field(
+        default_factory=lambda: ["low_resolution", "free_ocr", "tight_budget"],
+        description="期限を超えたページに順に適用する縮退の段（low_resolution, free_ocr, tight_budget）",
+    )
+    degradation_long_edge: int = Field(1024, description="low_resolution段で送る画像の長辺（ピクセル）")
+    degradation_max_tokens: int = Field(1024, description="tight_budget段のmax_tokensの上限")
+    max_retries: int = Field(3, description="最大試行回数（初回を含む）")
+    retry_delay: float = Field(5, description="リトライの基準待機時間（秒、指数バックオフの初期値）")
+    retry_max_delay: float = Field(60, description="リトライ待機時間の上限（秒）")
+    retry_budget_per_document: Optional[int] = Field(
+        None, description="1ドキュメントあたりのリトライ回数の上限（Noneの場合は無制限）"
+    )
+    upload_max_long_edge: Optional[int] = Field(
+        1920, description="vLLMへ送信する画像の長辺の最大ピクセル数（Noneの場合は縮小しない）"
+    )
+    upload_format: str = Field("png", description="vLLMへ送信する画像の形式（original, png, jpeg）")
+    upload_jpeg_quality: int = Field(90, description="JPEG形式で送信する場合の品質（1-95）")
+    upload_png_compress_level: int = Field(1, description="PNG形式で送信する場合の圧縮レベル（0-9）")
+    upload_mode: str = Field(
+        "base64",
+        description="画像の送信方法（base64: データURL, file: file:// URL。"
+        "fileはvLLMの--allowed-local-media-pathが必要）",
+    )
+    local_media_path_map: Dict[str, str] = Field(
+        default_factory=dict,
+        description="fileモードでのパス変換表（クライアント側の接頭辞 → サーバー側の接頭辞）",
+    )
+    loop_detection: bool = Field(
+        False, description="生成ループ（同じ行・パターンの繰り返し）を検出して生成を打ち切るか"
+    )
+    loop_max_repeated_lines: int = Field(10, description="ループとみなす同一行の連続回数")
+    loop_max_repeated_structural_lines: int = Field(
+        50, description="ループとみなす構造的な行（表の空行・区切り行、リーダー罫など文字を含まない行）の連続回数"
+    )
+    loop_min_repeat_chars: int = Field(
+        512, description="ループとみなす周期パターンの繰り返し部分の最小文字数"
+    )
+    loop_retry: bool = Field(
+        False, description="ループを検出したページをサンプリング設定を変えて1回だけ再試行するか"
+    )
+    loop_retry_temperature: float = Field(0.5, description="ループ再試行時の温度パラメータ")
+    loop_retry_repetition_penalty: float = Field(1.05, description="ループ再試行時の繰り返しペナルティ")
+    
+    def endpoint_list(self) -> List[VLLMEndpointConfig]:
+        """
+        使用するvLLMエンドポイントの一覧を返す
+        
+        Returns:
+            vllm_endpointsが指定されていればその一覧、なければvllm_server_url
+            （未指定の場合は http://localhost:8000）のみの一覧
+        """
+        if self.vllm_endpoints:
+            return list(self.vllm_endpoints)
+        return [VLLMEndpointConfig(url=self.vllm_server_url or "http://localhost:8000")]
     
     @field_validator("output_format")
     @classmethod
@@ -39,6 +240,129 @@ class DeepSeekOCRConfig(BaseModel):
         if not 0.0 <= v <= 2.0:
             raise ValueError("temperature must be between 0.0 and 2.0")
         return v
+    
+    @field_validator("loop_max_repeated_lines", "loop_max_repeated_structural_lines", "loop_min_repeat_chars")
+    @classmethod
+    def validate_loop_thresholds(cls, v: int) -> int:
+        """ループ検出の閾値の検証"""
+        if v < 2:
+            raise ValueError("loop detection thresholds must be at least 2")
+        return v
+    
+    @field_validator("max_concurrent_pages", "concurrency_initial")
+    @classmethod
+    def validate_concurrency(cls, v: int) -> int:
+        """同時実行数の検証"""
+        if v < 1:
+            raise ValueError("concurrency must be at least 1")
+        return v
+    
+    @field_validator("hedge_latency_percentile")
+    @classmethod
+    def validate_hedge_latency_percentile(cls, v: float) -> float:
+        """ヘッジのパーセンタイルの検証"""
+        if not 0 < v <= 100:
+            raise ValueError("hedge_latency_percentile must be between 0 and 100")
+        return v
+    
+    @field_validator("hedge_max_ratio")
+    @classmethod
+    def validate_hedge_max_ratio(cls, v: float) -> float:
+        """ヘッジの最大割合の検証"""
+        if not 0 <= v <= 1:
+            raise ValueError("hedge_max_ratio must be between 0 and 1")
+        return v
+    
+    @field_validator("token_budget_estimator")
+    @classmethod
+    def validate_token_budget_estimator(cls, v: str) -> str:
+        """トークン数の見積もり方法の検証"""
+        if v not in ["ink", "previous_page"]:
+            raise ValueError("token_budget_estimator must be 'ink' or 'previous_page'")
+        return v
+    
+    @field_validator("token_budget_headroom")
+    @classmethod
+    def validate_token_budget_headroom(cls, v: float) -> float:
+        """見積もりの余裕の倍率の検証"""
+        if v < 1.0:
+            raise ValueError("token_budget_headroom must be at least 1.0")
+        return v
+    
+    @field_validator("degradation_ladder")
+    @classmethod
+    def validate_degradation_ladder(cls, v: List[str]) -> List[str]:
+        """縮退ラダーの検証"""
+        for rung in v:
+            if rung not in ["low_resolution", "free_ocr", "tight_budget"]:
+                raise ValueError(
+                    "degradation_ladder entries must be 'low_resolution', 'free_ocr' or 'tight_budget'"
+                )
+        return v
+    
+    @field_validator("resolution_mode")
+    @classmethod
+    def validate_resolution_mode(cls, v: str) -> str:
+        """解像度モードの検証"""
+        if v not in ["tiny", "small", "base", "large", "gundam", "auto"]:
+            raise ValueError("resolution_mode must be 'tiny', 'small', 'base', 'large', 'gundam' or 'auto'")
+        return v
+    
+    @field_validator("hf_num_workers")
+    @classmethod
+    def validate_hf_num_workers(cls, v: int) -> int:
+        """CPUワーカープロセス数の検証"""
+        if v < 1:
+            raise ValueError("hf_num_workers must be at least 1")
+        return v
+    
+    @field_validator("cpu_dtype")
+    @classmethod
+    def validate_cpu_dtype(cls, v: str) -> str:
+        """CPU推論のdtypeの検証"""
+        if v not in ["auto", "float32", "bfloat16"]:
+            raise ValueError("cpu_dtype must be 'auto', 'float32' or 'bfloat16'")
+        return v
+    
+    @field_validator("quantization")
+    @classmethod
+    def validate_quantization(cls, v: Optional[str]) -> Optional[str]:
+        """量子化方式の検証"""
+        if v is not None and v not in ["int8-dynamic"]:
+            raise ValueError("quantization must be 'int8-dynamic' or null")
+        return v
+    
+    @field_validator("upload_format")
+    @classmethod
+    def validate_upload_format(cls, v: str) -> str:
+        """アップロード画像形式の検証"""
+        if v not in ["original", "png", "jpeg"]:
+            raise ValueError("upload_format must be 'original', 'png' or 'jpeg'")
+        return v
+    
+    @field_validator("upload_mode")
+    @classmethod
+    def validate_upload_mode(cls, v: str) -> str:
+        """画像送信方法の検証"""
+        if v not in ["base64", "file"]:
+            raise ValueError("upload_mode must be 'base64' or 'file'")
+        return v
+    
+    @field_validator("upload_jpeg_quality")
+    @classmethod
+    def validate_upload_jpeg_quality(cls, v: int) -> int:
+        """JPEG品質の検証"""
+        if not 1 <= v <= 95:
+            raise ValueError("upload_jpeg_quality must be between 1 and 95")
+        return v
+    
+    @field_validator("upload_png_compress_level")
+    @classmethod
+    def validate_upload_png_compress_level(cls, v: int) -> int:
+        """PNG圧縮レベルの検証"""
+        if not 0 <= v <= 9:
+            raise ValueError("upload_png_compress_level must be between 0 and 9")
+        return v
 
 
 class OutputConfig(BaseModel):
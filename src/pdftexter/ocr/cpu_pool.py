@@ -0,0 +1,611 @@
+"""
+HuggingFace版のCPU推論のマルチプロセスプール
+
+CPUでの推論は1ページを複数スレッドで並列化しても、スレッド数に比例しては速くなりません。
+親プロセスでモデルを一度だけ読み込んでからワーカープロセスをforkし、各ワーカーを
+コアの部分集合に固定して別々のページを処理させることで、コア数を使い切ります。
+forkした子プロセスは親のモデルの重みをコピーオンライトで共有するため、
+ワーカー数を増やしてもメモリは重み1つ分に近いまま増えません。
+
+親プロセスはプールの開始後にウォームアップやページを渡すスレッドを動かすため、そこから
+forkし直すと、子プロセスが他のスレッドの保持していたロックを引き継いでデッドロックする
+おそれがあります。そこで開始時に一度だけ、スレッドを持たないzygoteプロセスをforkし、
+ワーカーの起動・再起動のforkはすべてzygoteプロセスが行います。
+
+forkはUnix（Linux・macOS）でのみ使用できます。Windowsではプールを作成できません。
+"""
+
+import gc
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import traceback
+from concurrent.futures import Future
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pdftexter.ocr.memory_image import PageImage
+from pdftexter.ocr.repetition import RepetitionDetector
+from pdftexter.ocr.resolution import ResolutionMode
+from pdftexter.ocr.stats import PageStats
+
+
+def fork_supported() -> bool:
+    """
+    この環境でワーカープロセスをforkできるか判定する
+
+    Returns:
+        fork方式のプロセス起動と、プロセス間のファイル記述子の受け渡しが使える場合True
+    """
+    return "fork" in multiprocessing.get_all_start_methods() and reduction.HAVE_SEND_HANDLE
+
+
+def available_cores() -> List[int]:
+    """
+    このプロセスが使用できるCPUコアの番号を返す
+
+    Returns:
+        コア番号のリスト（コアの固定ができない環境では0からCPU数-1まで）
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores: Sequence[int], num_workers: int) -> List[List[int]]:
+    """
+    CPUコアをワーカーごとの重ならない部分集合に分ける
+
+    Args:
+        cores: 使用できるコアの番号
+        num_workers: ワーカー数
+
+    Returns:
+        ワーカーごとのコア番号のリスト（コアがワーカー数より少ない場合は1コアずつ共有する）
+    """
+    if len(cores) < num_workers:
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+    size, extra = divmod(len(cores), num_workers)
+    subsets = []
+    start = 0
+    for i in range(num_workers):
+        end = start + size + (1 if i < extra else 0)
+        subsets.append(list(cores[start:end]))
+        start = end
+    return subsets
+
+
+def _worker_main(backend: Any, conn: Any, cores: List[int], num_threads: int) -> None:
+    """
+    ワーカープロセスの本体（zygoteプロセスからforkした子プロセスで実行）
+
+    親プロセスから (画像, プロンプト, ページ統計, 引数) を受け取ってbackend.process_image()を実行し、
+    (テキスト, ページ統計, 検出器, 例外) を返します。Noneを受け取ると終了します。
+
+    Args:
+        backend: 親プロセスで読み込んだバックエンド（HuggingFaceOCRWrapper）
+        conn: 親プロセスとのパイプ
+        cores: このワーカーを固定するコア番号
+        num_threads: torchの演算スレッド数
+    """
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(num_threads)
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        image, prompt, page_stats, kwargs = task
+        try:
+            text = backend.process_image(image, prompt, page_stats=page_stats, **kwargs)
+            reply = (text, page_stats, kwargs.get("detector"), None)
+        except Exception as e:
+            reply = (None, page_stats, kwargs.get("detector"), e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # 例外などがpickleできない場合は、内容を文字列にして返す
+            conn.send((None, page_stats, None, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+def _kill_and_reap(pid: int) -> Optional[int]:
+    """
+    子プロセスを強制終了して回収する
+
+    Args:
+        pid: 子プロセスのPID
+
+    Returns:
+        終了コード（シグナルで終了した場合は負のシグナル番号、回収できなかった場合はNone）
+    """
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    try:
+        _, status = os.waitpid(pid, 0)
+    except ChildProcessError:
+        return None
+    return os.waitstatus_to_exitcode(status)
+
+
+def _zygote_main(backend: Any, conn: Any) -> None:
+    """
+    ワーカープロセスをforkするzygoteプロセスの本体（プールの開始時に一度だけforkして実行）
+
+    スレッドを起動せずに親プロセスからの要求だけを処理するため、このプロセスからのforkは
+    ロックを引き継ぐことがありません。受け付ける要求は次の2つで、Noneを受け取るか親プロセスが
+    終了すると、起動したワーカーを終了させて終了します。
+
+    - ("spawn", コア番号, スレッド数)：続けてsend_handle()で受け取ったパイプでワーカーをforkし、PIDを返す
+    - ("kill", PID)：ワーカーを強制終了して回収し、終了コードを返す
+
+    Args:
+        backend: 親プロセスで読み込んだバックエンド（HuggingFaceOCRWrapper）
+        conn: 親プロセスとのパイプ（ファイル記述子を受け渡せる双方向のもの）
+    """
+    workers = set()
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            request = None
+        if request is None:
+            for pid in workers:
+                _kill_and_reap(pid)
+            return
+        if request[0] == "spawn":
+            _, cores, num_threads = request
+            fd = reduction.recv_handle(conn)
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                exitcode = 0
+                try:
+                    _worker_main(backend, Connection(fd), cores, num_threads)
+                except BaseException:
+                    traceback.print_exc()
+                    exitcode = 1
+                finally:
+                    # zygoteプロセスの後処理を実行しないよう、そのまま終了する
+                    os._exit(exitcode)
+            os.close(fd)
+            workers.add(pid)
+            conn.send(pid)
+        elif request[0] == "kill":
+            pid = request[1]
+            workers.discard(pid)
+            conn.send(_kill_and_reap(pid))
+
+
+class _Zygote:
+    """zygoteプロセスと、それにワーカーのforkを依頼する親プロセス側の窓口"""
+
+    def __init__(self, backend: Any, context: Any):
+        """
+        初期化
+
+        Args:
+            backend: モデルを読み込み済みのバックエンド
+            context: fork方式のmultiprocessingのコンテキスト
+        """
+        self.backend = backend
+        self.context = context
+        self.process: Optional[Any] = None
+        self.conn: Optional[Any] = None
+
+    def start(self) -> None:
+        """zygoteプロセスをforkする"""
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_zygote_main,
+            args=(self.backend, child_conn),
+            name="pdftexter-cpu-zygote",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self.process = process
+        self.conn = parent_conn
+
+    def spawn(self, worker_conn: Any, cores: List[int], num_threads: int) -> int:
+        """
+        ワーカープロセスをforkさせる
+
+        Args:
+            worker_conn: ワーカーに渡すパイプの端
+            cores: ワーカーを固定するコア番号
+            num_threads: ワーカーのtorchの演算スレッド数
+
+        Returns:
+            ワーカープロセスのPID
+
+        Raises:
+            RuntimeError: zygoteプロセスが終了している場合
+        """
+        try:
+            self.conn.send(("spawn", cores, num_threads))
+            reduction.send_handle(self.conn, worker_conn.fileno(), self.process.pid)
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise RuntimeError("CPUワーカーを起動するzygoteプロセスが終了しています") from e
+
+    def kill(self, pid: int) -> Optional[int]:
+        """
+        ワーカープロセスを強制終了して回収させる
+
+        Args:
+            pid: ワーカープロセスのPID
+
+        Returns:
+            ワーカーの終了コード（zygoteプロセスが終了している場合などはNone）
+        """
+        try:
+            self.conn.send(("kill", pid))
+            return self.conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def stop(self, timeout: float) -> None:
+        """
+        zygoteプロセスに終了を指示し、終了しなければ強制終了する
+
+        Args:
+            timeout: 終了を待つ時間（秒）
+        """
+        process = self.process
+        if process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+
+class _WorkerSlot:
+    """1つのワーカープロセスと、それにページを渡す親プロセス側のスレッド"""
+
+    def __init__(self, pool: "CPUWorkerPool", index: int, cores: List[int]):
+        """
+        初期化
+
+        Args:
+            pool: 所属するプール
+            index: ワーカー番号
+            cores: ワーカーを固定するコア番号
+        """
+        self.pool = pool
+        self.index = index
+        self.cores = cores
+        self.pid: Optional[int] = None
+        self.conn: Optional[Any] = None
+        self.thread = threading.Thread(
+            target=self._run, name=f"cpu-pool-worker-{index}", daemon=True
+        )
+
+    def spawn(self) -> None:
+        """ワーカープロセスを起動する（forkはzygoteプロセスが行う）"""
+        parent_conn, child_conn = self.pool._context.Pipe()
+        try:
+            self.pid = self.pool._zygote.spawn(child_conn, self.cores, self.pool.threads_per_worker)
+        finally:
+            child_conn.close()
+        self.conn = parent_conn
+
+    def kill(self) -> Optional[int]:
+        """
+        ワーカープロセスを強制終了する
+
+        Returns:
+            ワーカーの終了コード（起動していない場合はNone）
+        """
+        exitcode = None
+        if self.pid is not None:
+            exitcode = self.pool._zygote.kill(self.pid)
+        if self.conn is not None:
+            self.conn.close()
+        self.pid = None
+        self.conn = None
+        return exitcode
+
+    def stop(self, timeout: float) -> None:
+        """
+        ワーカープロセスに終了を指示し、終了しなければ強制終了する
+
+        Args:
+            timeout: 終了を待つ時間（秒）
+        """
+        if self.pid is None:
+            return
+        try:
+            self.conn.send(None)
+            # ワーカーが終了するとパイプが閉じられる
+            self.conn.poll(timeout)
+        except (BrokenPipeError, OSError):
+            pass
+        self.kill()
+
+    def _run(self) -> None:
+        """キューからページを取り出してワーカープロセスに渡す"""
+        while True:
+            task = self.pool._tasks.get()
+            if task is None:
+                return
+            future, payload, barrier = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            if barrier is not None:
+                # 1つのワーカーが2回ウォームアップしないよう、全ワーカーが1件ずつ受け取るまで待つ
+                try:
+                    barrier.wait(self.pool.inference_timeout)
+                except threading.BrokenBarrierError:
+                    pass
+            try:
+                reply = self._call(payload)
+            except BaseException as e:
+                future.set_exception(e)
+                continue
+            future.set_result(reply)
+
+    def _call(self, payload: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """
+        1ページをワーカープロセスで処理する
+
+        Args:
+            payload: (画像, プロンプト, ページ統計, 引数)
+
+        Returns:
+            (テキスト, ページ統計, 検出器, 例外)
+
+        Raises:
+            TimeoutError: 推論がinference_timeoutを超えた場合（ワーカーは再起動する）
+            RuntimeError: ワーカープロセスが異常終了した場合（ワーカーは再起動する）
+        """
+        if self.pid is None:
+            self.pool._respawn(self, None)
+        try:
+            self.conn.send(payload)
+            if self.conn.poll(self.pool.inference_timeout):
+                return self.conn.recv()
+        except (EOFError, OSError):
+            with self.pool._lock:
+                exitcode = self.kill()
+            self.pool._respawn(self, f"ワーカープロセスが終了しました（終了コード {exitcode}）")
+            raise RuntimeError(f"CPUワーカー{self.index}が異常終了しました（終了コード {exitcode}）")
+        self.pool._respawn(self, f"推論が{self.pool.inference_timeout:.0f}秒を超えました")
+        raise TimeoutError(f"CPUワーカー{self.index}の推論が{self.pool.inference_timeout:.0f}秒を超えました")
+
+
+class CPUWorkerPool:
+    """
+    モデルをコピーオンライトで共有するCPU推論のワーカープロセスのプール
+
+    HuggingFaceOCRWrapperと同じprocess_image()を持ち、複数のスレッドから呼び出すと
+    空いているワーカーが順にページを処理します。ハングしたワーカーと異常終了した
+    ワーカーはzygoteプロセスから再びforkします。
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        num_workers: int,
+        threads_per_worker: Optional[int] = None,
+        inference_timeout: float = 600.0,
+        cores: Optional[Sequence[int]] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            backend: モデルを読み込み済みのバックエンド（HuggingFaceOCRWrapper）
+            num_workers: ワーカープロセス数
+            threads_per_worker: 各ワーカーのtorchの演算スレッド数（Noneの場合は割り当てたコア数）
+            inference_timeout: 1ページの推論がこの時間（秒）を超えたらハングとみなして再起動する
+            cores: 使用するコアの番号（Noneの場合はこのプロセスが使用できるすべてのコア）
+
+        Raises:
+            RuntimeError: forkが使えない環境の場合
+        """
+        if not fork_supported():
+            raise RuntimeError("この環境ではワーカープロセスをforkできません")
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1: {num_workers}")
+        self.backend = backend
+        self.num_workers = num_workers
+        self.inference_timeout = inference_timeout
+        self.restarts = 0
+        self.pages = 0
+
+        core_subsets = split_cores(list(cores) if cores is not None else available_cores(), num_workers)
+        self.threads_per_worker = threads_per_worker or len(core_subsets[0])
+        self._context = multiprocessing.get_context("fork")
+        self._zygote = _Zygote(backend, self._context)
+        # (Future, 引数, ウォームアップ用のBarrier)。Noneはページを渡すスレッドの終了指示
+        self._tasks: "queue.Queue[Optional[Tuple[Future, Tuple[Any, ...], Any]]]" = queue.Queue()
+        self._slots = [_WorkerSlot(self, i, subset) for i, subset in enumerate(core_subsets)]
+        # forkとワーカーの終了処理が同時に走らないようにする
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    @property
+    def pids(self) -> List[int]:
+        """起動中のワーカープロセスのPID"""
+        return [slot.pid for slot in self._slots if slot.pid is not None]
+
+    def start(self) -> "CPUWorkerPool":
+        """
+        zygoteプロセスをforkし、ワーカープロセスを起動する
+
+        fork後の子プロセスでガベージコレクションが共有中のオブジェクトに書き込み、
+        コピーオンライトのページを複製してしまわないよう、fork前に既存のオブジェクトを凍結します。
+
+        親プロセスから直接forkするのはこの1回だけです。他のスレッド（ウォームアップ、
+        バックエンドの準備など）を起動する前に、メインスレッドから呼び出してください
+        （スレッドがある状態でforkすると、Pythonが DeprecationWarning で警告します）。
+
+        Returns:
+            このプール
+        """
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            gc.collect()
+            gc.freeze()
+            self._zygote.start()
+            for slot in self._slots:
+                slot.spawn()
+        for slot in self._slots:
+            slot.thread.start()
+        return self
+
+    def _respawn(self, slot: _WorkerSlot, reason: Optional[str]) -> None:
+        """
+        ワーカープロセスを強制終了し、zygoteプロセスから再びforkする
+
+        Args:
+            slot: 再起動するワーカー
+            reason: 再起動の理由（表示用、Noneの場合は表示しない）
+        """
+        with self._lock:
+            slot.kill()
+            if self._closed:
+                raise RuntimeError("CPUワーカープールは終了しています")
+            if reason is not None:
+                print(f"CPUワーカー{slot.index}を再起動します（{reason}）", file=sys.stderr)
+                self.restarts += 1
+            slot.spawn()
+
+    def process_image(
+        self,
+        image_path: PageImage,
+        prompt: str = "<image>\n<|grounding|>Convert the document to markdown.",
+        page_stats: Optional[PageStats] = None,
+        detector: Optional[RepetitionDetector] = None,
+        generation_overrides: Optional[Dict[str, Any]] = None,
+        resolution: Optional[ResolutionMode] = None,
+    ) -> str:
+        """
+        空いているワーカープロセスで画像をOCR処理する
+
+        ページ統計と検出器はワーカーで更新したものを呼び出し元のオブジェクトに反映します。
+
+        Args:
+            image_path: 画像ファイルのパス、またはメモリ上の画像（PILの画像・RGB順のNumPy配列）
+            prompt: プロンプトテキスト
+            page_stats: 計測値を記録するページ統計（省略可）
+            detector: 生成ループの検出器（省略時は検出しない）
+            generation_overrides: generate()に渡すサンプリング設定の上書き
+            resolution: 解像度モード（Noneの場合はGundamモード）
+
+        Returns:
+            OCR結果のテキスト（Markdown形式）
+
+        Raises:
+            TimeoutError: 推論がinference_timeoutを超えた場合
+            RuntimeError: プールが終了している場合、またはワーカープロセスが異常終了した場合
+        """
+        if self._closed:
+            raise RuntimeError("CPUワーカープールは終了しています")
+        self.start()
+        kwargs = {
+            "detector": detector,
+            "generation_overrides": generation_overrides,
+            "resolution": resolution,
+        }
+        future: Future = Future()
+        self._tasks.put((future, (image_path, prompt, page_stats, kwargs), None))
+        text, worker_stats, worker_detector, error = future.result()
+
+        if page_stats is not None and worker_stats is not None:
+            page_stats.update_from(worker_stats)
+        if detector is not None and worker_detector is not None:
+            vars(detector).update(vars(worker_detector))
+        if error is not None:
+            raise error
+        self.pages += 1
+        return text
+
+    def warm_up(self, image_path: PageImage, prompt: str) -> None:
+        """
+        すべてのワーカープロセスで1回ずつ推論し、ワーカーごとのキャッシュを温める
+
+        推論はワーカーだけで行い、親プロセス・zygoteプロセスでは推論しません
+        （演算スレッドのプールを作ってからforkしないようにするため）。再起動したワーカーは
+        温まっていない状態から始まります。処理したページ数には数えません。
+
+        Args:
+            image_path: 合成ページの画像
+            prompt: 実際のページで使用するプロンプト
+
+        Raises:
+            RuntimeError: プールが終了している場合、またはワーカープロセスが異常終了した場合
+            TimeoutError: 推論がinference_timeoutを超えた場合
+        """
+        if self._closed:
+            raise RuntimeError("CPUワーカープールは終了しています")
+        self.start()
+        barrier = threading.Barrier(self.num_workers)
+        futures: List[Future] = []
+        for _ in range(self.num_workers):
+            future: Future = Future()
+            self._tasks.put((future, (image_path, prompt, None, {}), barrier))
+            futures.append(future)
+        for future in futures:
+            error = future.result()[3]
+            if error is not None:
+                raise error
+
+    def summary_lines(self) -> List[str]:
+        """
+        プールの処理結果を表示用の行リストとして返す
+
+        Returns:
+            サマリーの各行
+        """
+        return [
+            f"CPUワーカー: {self.num_workers}プロセス × {self.threads_per_worker}スレッド"
+            f"（処理 {self.pages}ページ, 再起動 {self.restarts}回）"
+        ]
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        ワーカープロセスを終了する
+
+        Args:
+            timeout: 各ワーカーの終了を待つ時間（秒）
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            started = self._started
+        if not started:
+            return
+        for _ in self._slots:
+            self._tasks.put(None)
+        for slot in self._slots:
+            slot.thread.join(timeout)
+        with self._lock:
+            for slot in self._slots:
+                slot.stop(timeout)
+            self._zygote.stop(timeout)
+        gc.unfreeze()
@@ -0,0 +1,162 @@
+"""
+HuggingFace版のCPU推論プロファイル
+
+GPUのないホストでは、HuggingFace版は既定のfloat32・既定のスレッド数で推論します。
+スレッド数（intra-op/inter-op）、bfloat16（対応CPUのみ）、low_cpu_mem_usageでの読み込み、
+torch.compile、動的int8量子化をまとめて設定できるようにします。
+"""
+
+import os
+import sys
+from typing import Any, Dict, Optional
+
+from pdftexter.ocr.quantization import QUANTIZATION_MODES
+
+CPU_DTYPES = ("auto", "float32", "bfloat16")
+
+# bfloat16の演算命令を示す/proc/cpuinfoのフラグ（x86: AVX512-BF16/AMX, Arm: BF16拡張）
+_BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16", "bf16")
+
+
+def cpu_supports_bfloat16() -> bool:
+    """
+    CPUがbfloat16の演算命令を持つか判定する
+
+    命令を持たないCPUでもbfloat16で推論はできますが、float32より遅くなります。
+
+    Returns:
+        bfloat16の演算命令を持つ場合True（/proc/cpuinfoがない環境など、判定できない場合はFalse）
+    """
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = set(line.split(":", 1)[1].split())
+                    return any(flag in flags for flag in _BF16_CPU_FLAGS)
+    except OSError:
+        pass
+    return False
+
+
+class CPUInferenceProfile:
+    """CPU推論の設定"""
+
+    def __init__(
+        self,
+        num_threads: Optional[int] = None,
+        interop_threads: Optional[int] = None,
+        dtype: str = "auto",
+        low_cpu_mem_usage: bool = True,
+        compile: bool = False,
+        quantization: Optional[str] = None,
+        quantization_cache_dir: Optional[str] = None,
+        prepared_snapshot: bool = False,
+        snapshot_dir: Optional[str] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            num_threads: 演算（intra-op）のスレッド数（Noneの場合はtorchの既定値）
+            interop_threads: 演算間（inter-op）のスレッド数（Noneの場合はtorchの既定値）
+            dtype: 重みのdtype（"auto": bfloat16の演算命令を持つCPUではbfloat16、
+                それ以外はfloat32）
+            low_cpu_mem_usage: 重みを一時的に二重に確保せずに読み込むか
+            compile: モデルのforwardをtorch.compileでコンパイルするか
+            quantization: 量子化方式（"int8-dynamic"、Noneの場合は量子化しない）。
+                量子化する場合、dtypeの設定は使用せずfloat32から量子化する
+            quantization_cache_dir: 量子化済みモデルのキャッシュフォルダ（Noneの場合は既定のフォルダ）
+            prepared_snapshot: dtypeを変換したモデルを保存し、次回からmmapで読み込むか
+                （量子化したモデルはquantization_cache_dirのキャッシュを常に使用する）
+            snapshot_dir: 準備済みモデルの保存フォルダ（Noneの場合は既定のフォルダ）
+
+        Raises:
+            ValueError: dtypeまたは量子化方式が不正な場合
+        """
+        if dtype not in CPU_DTYPES:
+            raise ValueError(f"dtype must be one of {CPU_DTYPES}: {dtype}")
+        if quantization is not None and quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {QUANTIZATION_MODES}: {quantization}")
+        self.num_threads = num_threads
+        self.interop_threads = interop_threads
+        self.dtype = dtype
+        self.low_cpu_mem_usage = low_cpu_mem_usage
+        self.compile = compile
+        self.quantization = quantization
+        self.quantization_cache_dir = quantization_cache_dir
+        self.prepared_snapshot = prepared_snapshot
+        self.snapshot_dir = snapshot_dir
+
+    @classmethod
+    def from_config(cls, config: Any) -> "CPUInferenceProfile":
+        """
+        DeepSeekOCRConfigからプロファイルを作成する
+
+        Args:
+            config: DeepSeekOCRConfigオブジェクト
+
+        Returns:
+            CPUInferenceProfileオブジェクト
+        """
+        return cls(
+            num_threads=config.cpu_num_threads,
+            interop_threads=config.cpu_interop_threads,
+            dtype=config.cpu_dtype,
+            low_cpu_mem_usage=config.low_cpu_mem_usage,
+            compile=config.torch_compile,
+            quantization=config.quantization,
+            quantization_cache_dir=config.quantization_cache_dir,
+            prepared_snapshot=config.prepared_snapshot,
+            snapshot_dir=config.prepared_snapshot_dir,
+        )
+
+    def resolve_dtype(self) -> str:
+        """
+        CPUで使用するdtypeを決める
+
+        Returns:
+            "float32"、"bfloat16"、または量子化方式（"int8-dynamic"）
+        """
+        if self.quantization is not None:
+            return self.quantization
+        if self.dtype == "auto":
+            return "bfloat16" if cpu_supports_bfloat16() else "float32"
+        return self.dtype
+
+    def apply_threads(self, torch: Any) -> None:
+        """
+        torchのスレッド数を設定する（プロセス全体に影響する）
+
+        Args:
+            torch: torchモジュール
+        """
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError:
+                # inter-opのスレッドプールは最初の並列処理の後は変更できない
+                print(
+                    "警告: inter-opスレッド数は既に並列処理が始まっているため変更できません",
+                    file=sys.stderr,
+                )
+
+    def describe(self, torch: Any) -> Dict[str, Any]:
+        """
+        実際に適用された設定を表示用に返す
+
+        Args:
+            torch: torchモジュール
+
+        Returns:
+            設定名 → 値 の辞書
+        """
+        return {
+            "threads": torch.get_num_threads(),
+            "interop_threads": torch.get_num_interop_threads(),
+            "dtype": self.resolve_dtype(),
+            "low_cpu_mem_usage": self.low_cpu_mem_usage,
+            "compile": self.compile,
+            "cpu_count": os.cpu_count(),
+        }
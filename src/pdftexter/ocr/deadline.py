@@ -0,0 +1,119 @@
+"""
+ページ単位の処理期限モジュール
+
+固定のタイムアウト（既定300秒）では、詰まったページが失敗と判定されるまでに
+リトライを含めて15分以上かかります。観測したページの処理時間から期限を決め、
+期限を超えたページは解像度・プロンプト・トークン予算を段階的に落として
+（縮退ラダー）再処理します。
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Sequence, Tuple
+
+from pdftexter.ocr.stats import percentile
+
+# 縮退ラダーの段（指定した順に、前の段の設定に重ねて適用する）
+DEGRADATION_RUNGS = ("low_resolution", "free_ocr", "tight_budget")
+
+# 縮退しない最初の段の名前
+FULL_RUNG = "full"
+
+# free_ocr段で使用する軽量なプロンプト
+FREE_OCR_PROMPT = "<image>\nFree OCR."
+
+
+class DeadlineExceeded(TimeoutError):
+    """ページの処理期限を超えた場合に送出される例外"""
+
+
+class DeadlinePolicy:
+    """観測したページの処理時間から期限を決めるクラス（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        max_deadline: float,
+        latency_percentile: float = 99.0,
+        multiplier: float = 2.0,
+        min_deadline: float = 30.0,
+        min_samples: int = 10,
+        window: int = 200,
+    ):
+        """
+        初期化
+
+        Args:
+            max_deadline: 期限の上限（秒、観測数が足りない間はこの値を使う）
+            latency_percentile: 期限の基準にする処理時間のパーセンタイル
+            multiplier: 基準の処理時間に掛ける倍率
+            min_deadline: 期限の下限（秒）
+            min_samples: 観測値から期限を決めるのに必要な観測数
+            window: パーセンタイルの計算に使う直近の観測数
+        """
+        self.max_deadline = max_deadline
+        self.latency_percentile = latency_percentile
+        self.multiplier = multiplier
+        self.min_deadline = min(min_deadline, max_deadline)
+        self.min_samples = min_samples
+
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_latency(self, latency: float) -> None:
+        """
+        縮退せずに完了したページの処理時間を記録する
+
+        Args:
+            latency: 処理時間（秒）
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def deadline(self) -> float:
+        """
+        次のページの処理期限を返す
+
+        Returns:
+            期限（秒）
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.max_deadline
+            base = percentile(list(self._latencies), self.latency_percentile)
+        return min(self.max_deadline, max(self.min_deadline, base * self.multiplier))
+
+
+def build_degradation_ladder(
+    rungs: Sequence[str],
+    low_resolution_long_edge: int = 1024,
+    tight_max_tokens: int = 1024,
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    縮退ラダーの各段の設定を作成する
+
+    各段は前の段の設定を引き継ぎます（例: free_ocr段は低解像度のまま送る）。
+
+    Args:
+        rungs: 縮退の段の名前（DEGRADATION_RUNGSのいずれか）
+        low_resolution_long_edge: low_resolution段で送る画像の長辺（ピクセル）
+        tight_max_tokens: tight_budget段のmax_tokensの上限
+
+    Returns:
+        （段の名前, 推論設定）のリスト。最初は縮退しない段（設定は空）
+
+    Raises:
+        ValueError: 不明な段の名前が指定された場合
+    """
+    ladder: List[Tuple[str, Dict[str, Any]]] = [(FULL_RUNG, {})]
+    options: Dict[str, Any] = {}
+    for rung in rungs:
+        if rung == "low_resolution":
+            options["upload_max_long_edge"] = low_resolution_long_edge
+        elif rung == "free_ocr":
+            options["prompt"] = FREE_OCR_PROMPT
+        elif rung == "tight_budget":
+            options["max_tokens"] = tight_max_tokens
+        else:
+            raise ValueError(f"unknown degradation rung: {rung}")
+        ladder.append((rung, dict(options)))
+    return ladder
@@ -5,64 +5,157 @@ DeepSeek-OCR統合モジュール
 import os
 import shutil
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+from pdftexter.ocr.concurrency import ConcurrencyLimiter
 from pdftexter.ocr.config import OCRConfig, load_config
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.ocr.deadline import DeadlineExceeded, DeadlinePolicy, build_degradation_ladder
+from pdftexter.ocr.endpoints import EndpointPool
+from pdftexter.ocr.hedging import HedgePolicy
+from pdftexter.ocr.memory_image import PageImage, is_image_path
+from pdftexter.ocr.prefetch import PagePrefetcher
+from pdftexter.ocr.repetition import RepetitionDetector
+from pdftexter.ocr.resolution import ResolutionMode, resolve_resolution_mode
+from pdftexter.ocr.retry import RetryBudget, RetryPolicy
+from pdftexter.ocr.stats import PageStats, RunStats
+from pdftexter.ocr.token_budget import TokenBudget
 from pdftexter.ocr.vllm_wrapper import VLLMWrapper
-from pdftexter.pdf.processor import extract_pdf_pages_as_images, validate_pdf
-
-# HuggingFace版のインポート（オプション）
-try:
-    from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
-    HF_AVAILABLE = True
-except ImportError:
-    HF_AVAILABLE = False
-    HuggingFaceOCRWrapper = None
+from pdftexter.ocr.warmup import WARMUP_MAX_TOKENS, create_warmup_page
+from pdftexter.pdf.processor import (
+    PdfPageImages,
+    extract_pdf_pages_as_images,
+    rasterize_pdf_pages,
+    validate_pdf,
+)
 
 
 class DeepSeekOCR:
     """DeepSeek-OCR統合クラス"""
     
-    def __init__(self, config: Optional[OCRConfig] = None, verify_setup: bool = True):
+    def __init__(
+        self,
+        config: Optional[OCRConfig] = None,
+        verify_setup: bool = True,
+        background_init: bool = False,
+    ):
         """
         初期化
         
         Args:
             config: OCR設定オブジェクト（Noneの場合はデフォルト設定を使用）
             verify_setup: セットアップを検証するか（デフォルト: True）
+            background_init: バックエンドの準備（HuggingFace版のモデルの読み込み、vLLM版の
+                セットアップ検証）をバックグラウンドで行うか。PDFの検証・画像変換と並行して準備し、
+                準備の失敗は最初のOCR処理（またはwait_until_ready()）で送出する。
+                HuggingFace版でCPUワーカーのプール（hf_num_workers > 1）を使う場合は無視する
             
         Raises:
-            RuntimeError: セットアップが完了していない場合
+            RuntimeError: セットアップが完了していない場合（background_initがFalseの場合）
         """
+        self._created_at = time.perf_counter()
         self.config = config or load_config()
+        self.run_stats = RunStats()
+        self.startup_timings: Dict[str, float] = {}
+        self.run_stats.add_summary_source(self._startup_summary_lines)
+        self._warmed_up = False
+        self._warmup_lock = threading.Lock()
+        self.retry_budget = RetryBudget(self.config.deepseek_ocr.retry_budget_per_document)
         
         # HuggingFace版を使用するかどうか
         self.use_hf = self.config.deepseek_ocr.use_huggingface
         
+        # HuggingFace版の常駐ワーカー（pdftexter worker）が起動していれば、
+        # モデルを読み込まずにvLLM版と同じプロトコルでワーカーへ送る
+        self.worker_url = None
+        if self.use_hf and self.config.deepseek_ocr.use_worker:
+            from pdftexter.ocr.worker import find_worker, resolve_worker_url
+            
+            worker_url = resolve_worker_url(self.config.deepseek_ocr.worker_url)
+            if find_worker(worker_url, model_path=self.config.deepseek_ocr.model_path):
+                print(f"常駐ワーカーを使用します: {worker_url}", file=sys.stderr)
+                self.worker_url = worker_url
+                self.use_hf = False
+        
+        # ページ単位の処理期限と縮退ラダー（HuggingFace版は推論を中断できないため対象外）
+        self.deadline_policy = None
+        self.degradation_ladder = build_degradation_ladder(
+            self.config.deepseek_ocr.degradation_ladder,
+            low_resolution_long_edge=self.config.deepseek_ocr.degradation_long_edge,
+            tight_max_tokens=self.config.deepseek_ocr.degradation_max_tokens,
+        )
+        if self.config.deepseek_ocr.page_deadline and not self.use_hf:
+            self.deadline_policy = DeadlinePolicy(
+                max_deadline=self.config.deepseek_ocr.timeout,
+                latency_percentile=self.config.deepseek_ocr.deadline_percentile,
+                multiplier=self.config.deepseek_ocr.deadline_multiplier,
+                min_deadline=self.config.deepseek_ocr.deadline_min,
+                min_samples=self.config.deepseek_ocr.deadline_min_samples,
+            )
+        
+        # ページごとのmax_tokensの見積もり（HuggingFace版はinfer()がmax_new_tokensを固定するため対象外）
+        self.token_budget = None
+        if self.config.deepseek_ocr.adaptive_max_tokens and not self.use_hf:
+            self.token_budget = TokenBudget(
+                max_tokens=self.config.deepseek_ocr.max_tokens,
+                min_tokens=self.config.deepseek_ocr.token_budget_min,
+                headroom=self.config.deepseek_ocr.token_budget_headroom,
+                estimator=self.config.deepseek_ocr.token_budget_estimator,
+            )
+        
+        self.hf_wrapper = None
+        self.hf_pool = None
+        self.vllm_wrapper = None
+        self._backend_error: Optional[BaseException] = None
+        self._backend_thread: Optional[threading.Thread] = None
+        if background_init and self.use_hf and self.config.deepseek_ocr.hf_num_workers > 1:
+            # CPUワーカーのプールは他のスレッドがない状態でforkする必要があるため、
+            # バックグラウンドのスレッドではなく呼び出し元のスレッドで準備する
+            background_init = False
+        if background_init:
+            self._backend_thread = threading.Thread(
+                target=self._init_backend_in_background,
+                args=(verify_setup,),
+                name="pdftexter-backend-init",
+                daemon=True,
+            )
+            self._backend_thread.start()
+        else:
+            self._init_backend(verify_setup)
+    
+    def _init_backend(self, verify_setup: bool) -> None:
+        """
+        バックエンド（HuggingFace版のモデル、vLLM版のクライアント）を準備する
+        
+        Args:
+            verify_setup: vLLM版のセットアップを検証するか
+            
+        Raises:
+            RuntimeError: セットアップが完了していない場合
+        """
+        start = time.perf_counter()
         if self.use_hf:
             # HuggingFace Transformers版を使用（vLLMサーバー不要）
-            if not HF_AVAILABLE:
-                raise ImportError(
-                    "HuggingFace Transformers版を使用するには、transformersが必要です。\n"
-                    "以下のコマンドでインストールしてください:\n"
-                    "  pip install transformers pillow torch\n"
-                    "または:\n"
-                    "  uv pip install transformers pillow torch"
-                )
-            
-            if HuggingFaceOCRWrapper is None:
-                raise RuntimeError("HuggingFaceOCRWrapperが利用できません")
+            # torch・transformersの読み込みは重いため、HuggingFace版を使う場合のみインポートする
+            # （transformersが未インストールの場合はHuggingFaceOCRWrapperがImportErrorを送出する）
+            from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
             
+            # 同じプロセス内で読み込み済みのモデルがあれば共有する（close()で参照を解放）
             self.hf_wrapper = HuggingFaceOCRWrapper(
-                model_path=self.config.deepseek_ocr.model_path
+                model_path=self.config.deepseek_ocr.model_path,
+                idle_timeout=self.config.deepseek_ocr.hf_model_idle_timeout,
+                cpu_profile=CPUInferenceProfile.from_config(self.config.deepseek_ocr),
             )
+            self.hf_pool = self._create_hf_pool()
             self.vllm_wrapper = None
         else:
             # vLLM版を使用（従来の方法）
-            # セットアップの検証
-            if verify_setup:
+            # セットアップの検証（常駐ワーカーはモデルを読み込み済みのため不要）
+            if verify_setup and self.worker_url is None:
                 from pdftexter.ocr.model_checker import verify_ocr_setup
                 is_ready, message = verify_ocr_setup()
                 if not is_ready:
@@ -71,63 +164,734 @@ class DeepSeekOCR:
             # モデル名を設定から取得
             model_name = self.config.deepseek_ocr.model_name
             
+            # 複数のvLLMレプリカがある場合は、未処理リクエスト数の少ないものへ振り分ける
+            endpoint_urls = [(e.url, e.weight) for e in self.config.deepseek_ocr.endpoint_list()]
+            if self.worker_url is not None:
+                endpoint_urls = [(self.worker_url, 1.0)]
+            endpoints = EndpointPool.from_urls(
+                endpoint_urls,
+                failure_threshold=self.config.deepseek_ocr.endpoint_failure_threshold,
+                cooldown=self.config.deepseek_ocr.endpoint_cooldown,
+            )
+            health_check_interval = self.config.deepseek_ocr.endpoint_health_check_interval
+            if len(endpoints) > 1 and health_check_interval:
+                endpoints.start_health_checks(health_check_interval)
+            self.run_stats.add_summary_source(endpoints.summary_lines)
+            
+            hedge_policy = None
+            if self.config.deepseek_ocr.hedge_requests:
+                hedge_policy = HedgePolicy(
+                    latency_percentile=self.config.deepseek_ocr.hedge_latency_percentile,
+                    max_ratio=self.config.deepseek_ocr.hedge_max_ratio,
+                    min_samples=self.config.deepseek_ocr.hedge_min_samples,
+                    min_delay=self.config.deepseek_ocr.hedge_min_delay,
+                )
+                self.run_stats.add_summary_source(hedge_policy.summary_lines)
+            
+            # 同時実行数の自動調整（max_concurrent_pagesを上限とする）
+            concurrency_limiter = None
+            if self.config.deepseek_ocr.adaptive_concurrency:
+                concurrency_limiter = ConcurrencyLimiter(
+                    initial_limit=self.config.deepseek_ocr.concurrency_initial,
+                    max_limit=self.config.deepseek_ocr.max_concurrent_pages,
+                    latency_tolerance=self.config.deepseek_ocr.concurrency_latency_tolerance,
+                )
+                metrics_interval = self.config.deepseek_ocr.concurrency_metrics_interval
+                if metrics_interval:
+                    concurrency_limiter.start_metrics_polling(endpoints.endpoints, metrics_interval)
+                self.run_stats.add_summary_source(concurrency_limiter.summary_lines)
+            
             self.vllm_wrapper = VLLMWrapper(
                 server_url=self.config.deepseek_ocr.vllm_server_url,
+                endpoints=endpoints,
+                hedge_policy=hedge_policy,
+                concurrency_limiter=concurrency_limiter,
                 model_name=model_name,
                 timeout=self.config.deepseek_ocr.timeout,
                 max_retries=self.config.deepseek_ocr.max_retries,
                 retry_delay=self.config.deepseek_ocr.retry_delay,
+                retry_policy=RetryPolicy(
+                    max_attempts=self.config.deepseek_ocr.max_retries,
+                    base_delay=self.config.deepseek_ocr.retry_delay,
+                    max_delay=self.config.deepseek_ocr.retry_max_delay,
+                ),
+                stream=self.config.deepseek_ocr.stream,
+                upload_max_long_edge=self.config.deepseek_ocr.upload_max_long_edge,
+                upload_format=self.config.deepseek_ocr.upload_format,
+                upload_jpeg_quality=self.config.deepseek_ocr.upload_jpeg_quality,
+                upload_png_compress_level=self.config.deepseek_ocr.upload_png_compress_level,
+                # 常駐ワーカーは同じホストで動作するため、画像はエンコードせずパスで渡す
+                upload_mode="file" if self.worker_url is not None else self.config.deepseek_ocr.upload_mode,
+                local_media_path_map=self.config.deepseek_ocr.local_media_path_map,
             )
             self.hf_wrapper = None
+            self.hf_pool = None
+        self.startup_timings["backend_s"] = time.perf_counter() - start
+    
+    def _init_backend_in_background(self, verify_setup: bool) -> None:
+        """バックグラウンドスレッドでバックエンドを準備し、失敗した場合は例外を保持する"""
+        try:
+            self._init_backend(verify_setup)
+        except BaseException as e:
+            self._backend_error = e
+    
+    @property
+    def backend_error(self) -> Optional[BaseException]:
+        """バックグラウンドでのバックエンドの準備中に発生した例外（発生していない場合はNone）"""
+        return self._backend_error
+    
+    def wait_until_ready(self) -> None:
+        """
+        バックエンドの準備が完了するまで待つ（バックグラウンドで準備していない場合は何もしない）
+        
+        Raises:
+            RuntimeError: セットアップが完了していない場合など、バックエンドの準備中に発生した例外
+        """
+        if self._backend_thread is not None:
+            self._backend_thread.join()
+        if self._backend_error is not None:
+            raise self._backend_error
+    
+    def _wait_for_pdf_start(self, prepare_start: float) -> None:
+        """
+        PDFの検証・画像変換の後、バックエンドの準備を待って起動の経過時間を記録する
+        
+        Args:
+            prepare_start: PDFの検証を開始した時刻（time.perf_counter()）
+        """
+        wait_start = time.perf_counter()
+        self.wait_until_ready()
+        if "ocr_start_s" in self.startup_timings:
+            return
+        now = time.perf_counter()
+        self.startup_timings["pdf_prepare_s"] = wait_start - prepare_start
+        self.startup_timings["backend_wait_s"] = now - wait_start
+        self.startup_timings["ocr_start_s"] = now - self._created_at
+    
+    def _prefetch_while_preparing(self, pages: Any, index: int) -> None:
+        """
+        バックエンドの準備中であれば、最初に処理するページを先に画像に変換しておく
+        
+        Args:
+            pages: rasterize_pdf_pages()が返したページ画像のシーケンス
+            index: 最初に処理するページのインデックス（0始まり）
+        """
+        if self._backend_thread is None or not self._backend_thread.is_alive():
+            return
+        if isinstance(pages, PdfPageImages) and 0 <= index < len(pages):
+            pages.prefetch(index)
+    
+    def _startup_summary_lines(self) -> List[str]:
+        """
+        起動からOCR開始までの経過時間を表示用の行リストとして返す
+        
+        Returns:
+            サマリーの各行（PDFを処理していない場合は空）
+        """
+        timings = self.startup_timings
+        if "ocr_start_s" not in timings:
+            return []
+        if self._backend_thread is None:
+            bottleneck = "逐次"
+        elif timings["backend_wait_s"] >= 0.05:
+            bottleneck = "律速: バックエンドの準備"
+        else:
+            bottleneck = "律速: PDFの検証・画像変換"
+        return [
+            f"起動: OCR開始まで {timings['ocr_start_s']:.1f}秒"
+            f"（バックエンドの準備 {timings.get('backend_s', 0.0):.1f}秒, "
+            f"PDFの検証・画像変換 {timings['pdf_prepare_s']:.1f}秒, "
+            f"準備の待ち {timings['backend_wait_s']:.1f}秒, {bottleneck}）"
+        ]
+    
+    def close(self) -> None:
+        """
+        HuggingFace版のモデルの参照を解放し、vLLM版のバックグラウンドの監視を停止する
+        
+        vLLM版では、エンドポイントのヘルスチェックと ``/metrics`` の取得のスレッドを停止します。
+        HuggingFace版のモデルは同じプロセス内の他のインスタンスと共有されているため、すぐには破棄されず、
+        hf_model_idle_timeoutの経過後（またはrelease_models()の呼び出し時）に解放されます。
+        """
+        if self._backend_thread is not None:
+            self._backend_thread.join()
+        if self.vllm_wrapper is not None:
+            self.vllm_wrapper.close()
+        if self.hf_pool is not None:
+            self.hf_pool.close()
+        if self.hf_wrapper is not None:
+            self.hf_wrapper.close()
+    
+    def _create_hf_pool(self) -> Optional[Any]:
+        """
+        HuggingFace版のCPU推論のワーカープロセスのプールを作成する
+        
+        Returns:
+            CPUWorkerPool（hf_num_workersが1の場合、GPUで推論する場合、forkが使えない環境ではNone）
+        """
+        num_workers = self.config.deepseek_ocr.hf_num_workers
+        if num_workers <= 1:
+            return None
+        from pdftexter.ocr.cpu_pool import CPUWorkerPool, fork_supported
+        
+        if self.hf_wrapper.device != "cpu":
+            print("警告: hf_num_workersはCPU推論でのみ有効です。このプロセスで推論します", file=sys.stderr)
+            return None
+        if not fork_supported():
+            print("警告: この環境ではワーカープロセスをforkできないため、このプロセスで推論します", file=sys.stderr)
+            return None
+        # 推論を始める前（OpenMPのスレッドプールが作られる前）にzygoteプロセスをforkする
+        # （以降のワーカーのforkはzygoteプロセスが行う）
+        pool = CPUWorkerPool(
+            self.hf_wrapper,
+            num_workers=num_workers,
+            threads_per_worker=self.config.deepseek_ocr.hf_worker_threads,
+            inference_timeout=self.config.deepseek_ocr.worker_inference_timeout,
+        ).start()
+        self.run_stats.add_summary_source(pool.summary_lines)
+        return pool
+    
+    def _resolve_prompt(self, prompt: Optional[str]) -> str:
+        """
+        プロンプトが省略された場合に出力形式に応じたデフォルトを返す
+        
+        Args:
+            prompt: プロンプトテキスト（Noneの場合はデフォルト）
+            
+        Returns:
+            使用するプロンプト
+        """
+        if prompt is not None:
+            return prompt
+        if self.config.deepseek_ocr.output_format == "markdown":
+            return "<image>\n<|grounding|>Convert the document to markdown."
+        return "<image>\nFree OCR."
+    
+    def warm_up(self, prompt: Optional[str] = None) -> Optional[float]:
+        """
+        合成ページを処理させてサーバー・モデルのキャッシュを温める
+        
+        実際のページと同じ大きさ・プロンプトの合成ページを使います。vLLM版ではすべての
+        エンドポイントに送信し、HuggingFace版ではモデルで1回推論します（CPUワーカーのプールを
+        使う場合は、このプロセスでは推論せずに各ワーカーで1回ずつ推論します）。
+        実行統計には記録せず、2回目以降の呼び出しは何もしません。
+        
+        Args:
+            prompt: 実際のページで使用するプロンプト（Noneの場合はデフォルト）
+            
+        Returns:
+            ウォームアップにかかった時間（秒）。実行済みまたは失敗した場合はNone
+        """
+        with self._warmup_lock:
+            if self._warmed_up:
+                return None
+            self._warmed_up = True
+        
+        try:
+            self.wait_until_ready()
+        except Exception:
+            # バックエンドの準備の失敗はOCR処理の側で報告する
+            return None
+        
+        import tempfile
+        
+        prompt = self._resolve_prompt(prompt)
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="pdftexter_warmup_") as tmpdir:
+            image_path = create_warmup_page(os.path.join(tmpdir, "warmup.png"))
+            try:
+                if self.hf_pool is not None:
+                    self.hf_pool.warm_up(image_path, prompt)
+                elif self.use_hf:
+                    self.hf_wrapper.process_image(image_path=image_path, prompt=prompt)
+                elif self.vllm_wrapper.warm_up(image_path, prompt, max_tokens=WARMUP_MAX_TOKENS):
+                    return None
+            except Exception as e:
+                print(f"警告: ウォームアップに失敗しました: {e}", file=sys.stderr)
+                return None
+        elapsed = time.perf_counter() - start
+        print(f"ウォームアップが完了しました（{elapsed:.1f}秒）", file=sys.stderr)
+        return elapsed
+    
+    def _start_warm_up(self, prompt: Optional[str]) -> Optional[threading.Thread]:
+        """
+        設定が有効な場合、ウォームアップをバックグラウンドで開始する
+        
+        PDFの画像変換と並行して実行し、ウォームアップの時間を隠します。
+        
+        Args:
+            prompt: 実際のページで使用するプロンプト
+            
+        Returns:
+            ウォームアップのスレッド（無効または実行済みの場合はNone）。
+            最初のページを処理する前にjoin()すること
+        """
+        if not self.config.deepseek_ocr.warmup or self._warmed_up:
+            return None
+        thread = threading.Thread(
+            target=self.warm_up, args=(prompt,), name="pdftexter-warmup", daemon=True
+        )
+        thread.start()
+        return thread
     
     def process_image(
         self,
-        image_path: str,
+        image_path: PageImage,
         prompt: Optional[str] = None,
+        page_stats: Optional[PageStats] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        on_reset: Optional[Callable[[], None]] = None,
     ) -> str:
         """
         画像ファイルをOCR処理する
         
+        解像度モード（resolution_mode）に従ってページの解像度を決め、使用したモードを
+        ページ統計に記録します。処理期限（page_deadline）が有効な場合、期限を超えたページは
+        縮退ラダーの次の段（低解像度・Free OCRプロンプト・小さいトークン予算）で処理し直し、
+        結果を生成した段をページ統計に記録します。
+        
         Args:
-            image_path: 画像ファイルのパス
+            image_path: 画像ファイルのパス、またはメモリ上の画像（PILの画像・RGB順のNumPy配列、
+                HuggingFace版のみ）
             prompt: プロンプトテキスト（Noneの場合はデフォルト）
+            page_stats: 計測値を記録するページ統計（省略可）
+            on_token: 結果のテキスト片を受け取るコールバック。vLLM版でstreamが有効な場合は
+                生成途中から逐次呼ばれ、それ以外は完了時に結果全体で1回呼ばれる
+            on_reset: ストリーミング途中のリトライで、それまでのテキスト片を破棄する際に呼ばれる
             
         Returns:
             OCR結果のテキスト（Markdown形式）
             
         Raises:
             FileNotFoundError: 画像ファイルが見つからない場合
+            ValueError: vLLM版でメモリ上の画像を指定した場合
             requests.RequestException: API呼び出しに失敗した場合
+            DeadlineExceeded: 縮退ラダーの最後の段でも処理期限を超えた場合
         """
-        image_file = Path(image_path)
-        if not image_file.exists():
-            raise FileNotFoundError(f"画像ファイルが見つかりません: {image_path}")
+        self.wait_until_ready()
+        if is_image_path(image_path):
+            image_file = Path(image_path)
+            if not image_file.exists():
+                raise FileNotFoundError(f"画像ファイルが見つかりません: {image_path}")
+            image_path = str(image_file)
+        elif not self.accepts_memory_images:
+            raise ValueError("vLLM版では画像ファイルのパスを指定してください")
         
-        # デフォルトプロンプト
-        if prompt is None:
-            if self.config.deepseek_ocr.output_format == "markdown":
-                prompt = "<image>\n<|grounding|>Convert the document to markdown."
+        prompt = self._resolve_prompt(prompt)
+        resolution = resolve_resolution_mode(self.config.deepseek_ocr.resolution_mode, image_path)
+        if page_stats is not None:
+            page_stats.resolution_mode = resolution.name
+        
+        if page_stats is None and (self.token_budget is not None or self.deadline_policy is not None):
+            # 打ち切りの判定や縮退の記録に使うため、呼び出し元が省略した場合も計測する
+            page_stats = PageStats()
+        
+        start = time.perf_counter()
+        try:
+            if self.deadline_policy is None:
+                return self._process_rung(
+                    image_path, prompt, page_stats, on_token, on_reset, resolution=resolution
+                )
+            
+            # 期限を超えたページは、縮退ラダーの次の段（より軽い設定）で処理し直す
+            for index, (rung, options) in enumerate(self.degradation_ladder):
+                deadline = self.deadline_policy.deadline()
+                if index == 0:
+                    page_stats.deadline_s = deadline
+                rung_start = time.perf_counter()
+                try:
+                    result = self._process_rung(
+                        image_path, prompt, page_stats, on_token, on_reset,
+                        rung_options=options, deadline=deadline, resolution=resolution,
+                    )
+                except DeadlineExceeded:
+                    page_stats.deadline_misses += 1
+                    if on_reset is not None:
+                        on_reset()
+                    if index == len(self.degradation_ladder) - 1:
+                        raise
+                    print(
+                        f"警告: ページ {page_stats.page_num} が処理期限（{deadline:.0f}秒）を超えたため、"
+                        f"{self.degradation_ladder[index + 1][0]} で再処理します",
+                        file=sys.stderr,
+                    )
+                    continue
+                page_stats.degradation = rung
+                if index == 0:
+                    self.deadline_policy.record_latency(time.perf_counter() - rung_start)
+                return result
+        finally:
+            if page_stats is not None:
+                page_stats.latency_s = time.perf_counter() - start
+    
+    def _process_rung(
+        self,
+        image_path: PageImage,
+        prompt: str,
+        page_stats: Optional[PageStats],
+        on_token: Optional[Callable[[str], None]],
+        on_reset: Optional[Callable[[], None]],
+        rung_options: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        resolution: Optional[ResolutionMode] = None,
+    ) -> str:
+        """
+        縮退ラダーの1段分の設定でページをOCR処理する
+        
+        トークン予算の見積もりと打ち切り時の再試行、生成ループ時の再試行を含みます。
+        
+        Args:
+            image_path: 画像ファイルのパス（HuggingFace版ではメモリ上の画像も可）
+            prompt: プロンプトテキスト
+            page_stats: 計測値を記録するページ統計（省略可）
+            on_token: 結果のテキスト片を受け取るコールバック
+            on_reset: 書き込み済みのテキスト片を破棄させるコールバック
+            rung_options: 段の設定（prompt, upload_max_long_edge, max_tokensの上書き）
+            deadline: 各推論の処理期限（秒、Noneの場合は期限なし）
+            resolution: ページの解像度モード（Noneの場合はバックエンドの既定）
+            
+        Returns:
+            OCR結果のテキスト
+            
+        Raises:
+            DeadlineExceeded: 処理期限を超えた場合
+        """
+        rung_options = rung_options or {}
+        prompt = rung_options.get("prompt", prompt)
+        max_tokens_limit = min(
+            self.config.deepseek_ocr.max_tokens,
+            rung_options.get("max_tokens", self.config.deepseek_ocr.max_tokens),
+        )
+        infer_options: Dict[str, Any] = {}
+        if deadline is not None:
+            infer_options["deadline"] = deadline
+        if rung_options.get("upload_max_long_edge") is not None:
+            infer_options["upload_max_long_edge"] = rung_options["upload_max_long_edge"]
+        if resolution is not None:
+            infer_options["resolution"] = resolution
+        
+        detector = self._create_repetition_detector()
+        max_tokens = max_tokens_limit
+        ink = None
+        if self.token_budget is not None:
+            max_tokens, ink = self.token_budget.estimate(image_path)
+            max_tokens = min(max_tokens, max_tokens_limit)
+            page_stats.token_budget = max_tokens
+        result = self._infer_within_budget(
+            image_path, prompt, page_stats, on_token, on_reset, detector, max_tokens,
+            max_tokens_limit=max_tokens_limit, infer_options=infer_options,
+        )
+        
+        # ループを検出したページはサンプリング設定を変えて1回だけ再試行する
+        if detector is not None and detector.detected and self.config.deepseek_ocr.loop_retry:
+            print("生成ループを検出したページをサンプリング設定を変えて再試行します", file=sys.stderr)
+            if page_stats is not None:
+                page_stats.loop_retried = True
+            if on_reset is not None:
+                on_reset()
+            retry_detector = self._create_repetition_detector()
+            retry_result = self._infer_within_budget(
+                image_path,
+                prompt,
+                page_stats,
+                on_token,
+                on_reset,
+                retry_detector,
+                max_tokens,
+                overrides=self._loop_retry_overrides(),
+                max_tokens_limit=max_tokens_limit,
+                infer_options=infer_options,
+            )
+            if retry_detector.detected and len(retry_result) < len(result):
+                # 再試行でもループした場合は、繰り返しより前の部分が長い方を採用する
+                if on_token is not None and on_reset is not None:
+                    on_reset()
+                    on_token(result)
             else:
-                prompt = "<image>\nFree OCR."
+                result = retry_result
         
-        # HuggingFace版またはvLLM版を使用
+        # 打ち切られずに完了したページの出力長で見積もりを補正する
+        if (
+            self.token_budget is not None
+            and page_stats.completion_tokens
+            and not page_stats.truncated
+            and not page_stats.loop_detected
+        ):
+            self.token_budget.record(ink, page_stats.completion_tokens)
+        
+        return result
+    
+    def _infer_within_budget(
+        self,
+        image_path: PageImage,
+        prompt: str,
+        page_stats: Optional[PageStats],
+        on_token: Optional[Callable[[str], None]],
+        on_reset: Optional[Callable[[], None]],
+        detector: Optional[RepetitionDetector],
+        max_tokens: int,
+        overrides: Optional[Dict[str, Any]] = None,
+        max_tokens_limit: Optional[int] = None,
+        infer_options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        max_tokensで打ち切られた場合に予算を増やして再試行しながら推論する
+        
+        適応制御が無効な場合や、生成ループで打ち切った場合は再試行しません。
+        
+        Args:
+            image_path: 画像ファイルのパス（HuggingFace版ではメモリ上の画像も可）
+            prompt: プロンプトテキスト
+            page_stats: 計測値を記録するページ統計（適応制御の有効時は必須）
+            on_token: 結果のテキスト片を受け取るコールバック
+            on_reset: 書き込み済みのテキスト片を破棄させるコールバック
+            detector: 生成ループの検出器（省略時は検出しない）
+            max_tokens: 最初の推論のmax_tokens
+            overrides: サンプリング設定の上書き（ループ再試行時）
+            max_tokens_limit: 再試行で増やすmax_tokensの上限（Noneの場合は予算の上限）
+            infer_options: _infer()に渡す追加の引数（処理期限・画像の解像度・解像度モード）
+            
+        Returns:
+            OCR結果のテキスト
+        """
+        infer_options = infer_options or {}
+        result = self._infer(
+            image_path, prompt, page_stats, on_token, on_reset,
+            detector=detector, overrides=overrides, max_tokens=max_tokens, **infer_options,
+        )
+        if self.token_budget is not None and max_tokens_limit is None:
+            max_tokens_limit = self.token_budget.max_tokens
+        while (
+            self.token_budget is not None
+            and page_stats.truncated
+            and not (detector is not None and detector.detected)
+            and max_tokens < max_tokens_limit
+        ):
+            max_tokens = min(self.token_budget.grow(max_tokens), max_tokens_limit)
+            print(
+                f"ページ {page_stats.page_num} がmax_tokensで打ち切られたため、"
+                f"{max_tokens}トークンに増やして再試行します",
+                file=sys.stderr,
+            )
+            page_stats.budget_retries += 1
+            page_stats.finish_reason = None
+            if on_reset is not None:
+                on_reset()
+            if detector is not None:
+                detector.reset()
+            result = self._infer(
+                image_path, prompt, page_stats, on_token, on_reset,
+                detector=detector, overrides=overrides, max_tokens=max_tokens, **infer_options,
+            )
+        return result
+    
+    def _create_repetition_detector(self) -> Optional[RepetitionDetector]:
+        """
+        設定に従って生成ループの検出器を作成する
+        
+        Returns:
+            RepetitionDetectorオブジェクト（ループ検出が無効な場合はNone）
+        """
+        if not self.config.deepseek_ocr.loop_detection:
+            return None
+        return RepetitionDetector(
+            max_repeated_lines=self.config.deepseek_ocr.loop_max_repeated_lines,
+            max_repeated_structural_lines=self.config.deepseek_ocr.loop_max_repeated_structural_lines,
+            min_repeat_chars=self.config.deepseek_ocr.loop_min_repeat_chars,
+        )
+    
+    def _loop_retry_overrides(self) -> Dict[str, Any]:
+        """
+        ループ再試行時のサンプリング設定を返す
+        
+        Returns:
+            バックエンドに渡すサンプリング設定の上書き
+        """
+        overrides: Dict[str, Any] = {
+            "temperature": self.config.deepseek_ocr.loop_retry_temperature,
+            "repetition_penalty": self.config.deepseek_ocr.loop_retry_repetition_penalty,
+        }
+        if self.use_hf:
+            # HuggingFace版のinfer()は貪欲法で生成するため、サンプリングを有効にする
+            overrides["do_sample"] = True
+        return overrides
+    
+    def _infer(
+        self,
+        image_path: PageImage,
+        prompt: str,
+        page_stats: Optional[PageStats],
+        on_token: Optional[Callable[[str], None]],
+        on_reset: Optional[Callable[[], None]],
+        detector: Optional[RepetitionDetector] = None,
+        overrides: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        deadline: Optional[float] = None,
+        upload_max_long_edge: Optional[int] = None,
+        resolution: Optional[ResolutionMode] = None,
+    ) -> str:
+        """
+        HuggingFace版またはvLLM版で1回分の推論を実行する
+        
+        Args:
+            image_path: 画像ファイルのパス（HuggingFace版ではメモリ上の画像も可）
+            prompt: プロンプトテキスト
+            page_stats: 計測値を記録するページ統計（省略可）
+            on_token: 結果のテキスト片を受け取るコールバック
+            on_reset: 書き込み済みのテキスト片を破棄させるコールバック
+            detector: 生成ループの検出器（省略時は検出しない）
+            overrides: サンプリング設定の上書き（ループ再試行時）
+            max_tokens: 最大トークン数（Noneの場合は設定値。vLLM版のみ）
+            deadline: 処理期限（秒、vLLM版のみ）
+            upload_max_long_edge: 送信する画像の長辺の最大ピクセル数の上書き（vLLM版のみ）
+            resolution: 解像度モード（Noneの場合はバックエンドの既定）。HuggingFace版ではinfer()の
+                解像度の引数に、vLLM版ではサーバー側でタイルに分割させない画像の縮小に変換する
+            
+        Returns:
+            OCR結果のテキスト
+        """
         if self.use_hf:
             # HuggingFace Transformers版（直接推論）
-            result = self.hf_wrapper.process_image(
-                image_path=str(image_file),
+            backend = self.hf_pool or self.hf_wrapper
+            result = backend.process_image(
+                image_path=image_path,
                 prompt=prompt,
+                page_stats=page_stats,
+                detector=detector,
+                generation_overrides=overrides,
+                resolution=resolution,
             )
-        else:
-            # vLLM APIを呼び出し
-            result = self.vllm_wrapper.call_vllm_api(
-                image_path=str(image_file),
-                prompt=prompt,
-                max_tokens=self.config.deepseek_ocr.max_tokens,
-                temperature=self.config.deepseek_ocr.temperature,
+            if on_token is not None:
+                on_token(result)
+            return result
+        
+        # vLLM版のサーバーはGundamモード固定のため、他のモードは画像の縮小で再現する
+        if resolution is not None and resolution.upload_long_edge is not None:
+            upload_max_long_edge = min(
+                upload_max_long_edge or resolution.upload_long_edge, resolution.upload_long_edge
             )
         
+        # vLLM APIを呼び出し
+        result = self.vllm_wrapper.call_vllm_api(
+            image_path=image_path,
+            prompt=prompt,
+            max_tokens=max_tokens or self.config.deepseek_ocr.max_tokens,
+            temperature=self.config.deepseek_ocr.temperature,
+            page_stats=page_stats,
+            retry_budget=self.retry_budget,
+            on_token=on_token,
+            on_reset=on_reset,
+            detector=detector,
+            sampling_overrides=overrides,
+            deadline=deadline,
+            upload_max_long_edge=upload_max_long_edge,
+        )
+        if on_token is not None and not self.vllm_wrapper.stream:
+            on_token(result)
         return result
     
+    @property
+    def accepts_memory_images(self) -> bool:
+        """メモリ上のページ画像を直接処理できるか（プロセス内で推論するHuggingFace版のみ）"""
+        return self.use_hf
+    
+    @property
+    def page_concurrency(self) -> int:
+        """同時にOCR処理するページ数（HuggingFace版はワーカープロセス数、プールを使わない場合は1）"""
+        if self.use_hf:
+            return self.hf_pool.num_workers if self.hf_pool is not None else 1
+        return self.config.deepseek_ocr.max_concurrent_pages
+    
+    @property
+    def prefetch_enabled(self) -> bool:
+        """次のページの前処理を推論と並行して行うか（ワーカープロセスを使わないHuggingFace版のみ）"""
+        return self.use_hf and self.hf_pool is None and self.config.deepseek_ocr.hf_prefetch
+    
+    def _prepare_page(self, image_path: PageImage) -> PageImage:
+        """
+        ページの前処理のうち、推論と切り離せる部分を済ませる（先読みのスレッドで実行）
+        
+        Args:
+            image_path: ページ画像のパス、またはメモリ上の画像
+            
+        Returns:
+            process_image()に渡すページ画像
+        """
+        resolution = resolve_resolution_mode(self.config.deepseek_ocr.resolution_mode, image_path)
+        return self.hf_wrapper.prepare_image(image_path, resolution)
+    
+    def _iter_pages(
+        self, image_paths: Sequence[PageImage], start: int = 0
+    ) -> Iterator[Tuple[PageImage, Optional[float], Optional[float]]]:
+        """
+        ページ画像を順に返す（先読みが有効な場合は、次のページの前処理を並行して行う）
+        
+        Args:
+            image_paths: ページ画像のシーケンス
+            start: 最初に返すページのインデックス（それより前のページは参照しない）
+            
+        Yields:
+            (ページ画像, 先読みした前処理の時間, 前処理の完了を待った時間)のタプル。
+            先読みしない場合は時間がNone
+        """
+        if self.prefetch_enabled:
+            yield from PagePrefetcher(image_paths, self._prepare_page, start=start)
+            return
+        for index in range(start, len(image_paths)):
+            yield image_paths[index], None, None
+    
+    def _iter_page_results(
+        self,
+        image_paths: Sequence[PageImage],
+        prompt: Optional[str],
+        start_page: int = 1,
+        document: Optional[str] = None,
+    ) -> Iterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        ページを並行してOCR処理し、結果をページ順に返す
+        
+        同時に処理するページ数はpage_concurrencyまでで、同時実行数の自動調整が有効な場合は
+        さらにリミッターがリクエスト数を絞ります。1ページずつ処理する場合は、先読みが有効なら
+        次のページの前処理を推論と並行して行います。
+        
+        Args:
+            image_paths: ページ画像のパス（HuggingFace版ではメモリ上の画像も可）のシーケンス
+            prompt: プロンプトテキスト（Noneの場合はデフォルト）
+            start_page: 処理を始めるページ番号（1始まり、それより前のページは処理しない）
+            document: 統計に記録するドキュメント名
+            
+        Yields:
+            (ページ番号, OCR結果, 例外)のタプル。失敗したページは結果がNone
+        """
+        def run(
+            page_num: int,
+            image_path: PageImage,
+            preprocess_s: Optional[float] = None,
+            wait_s: Optional[float] = None,
+        ) -> Tuple[int, Optional[str], Optional[Exception]]:
+            page_stats = PageStats(page_num=page_num)
+            page_stats.document = document
+            page_stats.preprocess_s = preprocess_s
+            page_stats.prefetch_wait_s = wait_s
+            try:
+                return page_num, self.process_image(image_path, prompt, page_stats=page_stats), None
+            except Exception as e:
+                return page_num, None, e
+            finally:
+                self.run_stats.add_page(page_stats)
+        
+        if self.page_concurrency == 1:
+            for page_num, page in enumerate(self._iter_pages(image_paths, start_page - 1), start_page):
+                yield run(page_num, *page)
+            return
+        
+        # executor.map()は入力を先に全て取り出すため、ページ画像はワーカーの中で参照する
+        # （PdfPageImagesでは参照した時点で変換されるため、全ページを一度に変換しないようにする）
+        with ThreadPoolExecutor(max_workers=self.page_concurrency) as executor:
+            yield from executor.map(
+                lambda index: run(index + 1, image_paths[index]),
+                range(start_page - 1, len(image_paths)),
+            )
+    
     def process_pdf(
         self,
         pdf_path: str,
@@ -152,42 +916,56 @@ class DeepSeekOCR:
             FileNotFoundError: PDFファイルが見つからない場合
             ValueError: PDFファイルが無効な場合
         """
-        # PDFの検証
+        # PDFの検証（バックグラウンドで準備中のバックエンドと並行して行う）
+        prepare_start = time.perf_counter()
         is_valid, error_msg = validate_pdf(pdf_path)
         if not is_valid:
             raise ValueError(error_msg or "PDFファイルが無効です")
         
+        # リトライ予算はドキュメントごとにリセットする
+        self.retry_budget = RetryBudget(self.config.deepseek_ocr.retry_budget_per_document)
+        
         # 出力ディレクトリの設定
+        # （HuggingFace版は、中間画像を保持しない場合はページ画像をPNGに保存せずメモリ上で渡す）
+        in_memory = self.accepts_memory_images and output_dir is None and not keep_temp_images
         is_temp_dir = False
-        if output_dir is None:
+        if output_dir is None and not in_memory:
             import tempfile
             output_dir = tempfile.mkdtemp(prefix="pdftexter_ocr_")
             is_temp_dir = True
-        else:
+        elif output_dir is not None:
             os.makedirs(output_dir, exist_ok=True)
         
         try:
+            # ウォームアップはPDFの画像変換と並行して行い、最初のページの前に完了を待つ
+            warmup_thread = self._start_warm_up(prompt)
             # PDFを画像に変換
-            image_paths = extract_pdf_pages_as_images(pdf_path, output_dir)
+            if in_memory:
+                image_paths = rasterize_pdf_pages(pdf_path)
+                self._prefetch_while_preparing(image_paths, 0)
+            else:
+                image_paths = extract_pdf_pages_as_images(pdf_path, output_dir)
+            self._wait_for_pdf_start(prepare_start)
+            if warmup_thread is not None:
+                warmup_thread.join()
             total_pages = len(image_paths)
             
-            # 各ページをOCR処理（一枚ずつ順次処理）
-            # 注意: 現在の実装では、vLLM APIに一枚ずつ画像を送信します
-            # バッチ処理が必要な場合は、vLLM APIの仕様に応じて実装を変更してください
+            # 各ページをOCR処理
             results: List[str] = []
             failed_pages: List[int] = []
             
-            for i, image_path in enumerate(image_paths, 1):
+            # max_concurrent_pagesが2以上の場合は複数ページを並行して処理し、ページ順に受け取る
+            for i, page_result, error in self._iter_page_results(
+                image_paths, prompt, document=Path(pdf_path).name
+            ):
                 if progress_callback:
                     progress_callback(i, total_pages)
                 
-                try:
-                    # 一枚ずつ画像をOCR処理
-                    page_result = self.process_image(image_path, prompt)
+                if error is None:
                     results.append(page_result)
-                except Exception as e:
+                else:
                     # エラーが発生したページを記録
-                    error_msg = f"ページ {i} の処理に失敗しました: {e}"
+                    error_msg = f"ページ {i} の処理に失敗しました: {error}"
                     print(f"警告: {error_msg}", file=sys.stderr)
                     failed_pages.append(i)
                     results.append(f"<!-- {error_msg} -->\n")
@@ -232,11 +1010,13 @@ class DeepSeekOCR:
         progress_callback: Optional[callable] = None,
         keep_temp_images: bool = False,
         resume: bool = False,
+        token_callback: Optional[Callable[[int, str], None]] = None,
     ) -> str:
         """
         PDFファイルをOCR処理してファイルに保存する（逐次書き込み方式）
         
         メモリ効率を考慮し、各ページの処理結果を即座にファイルに書き込みます。
+        ストリーミングが有効な場合は、ページの生成途中からテキストを書き込みます。
         進捗情報も保存されるため、中断後も再開可能です。
         
         Args:
@@ -245,19 +1025,25 @@ class DeepSeekOCR:
             output_dir: 中間画像を保存するディレクトリ（Noneの場合は一時ディレクトリ）
             prompt: プロンプトテキスト（Noneの場合はデフォルト）
             progress_callback: 進捗コールバック関数
-            keep_temp_images: 一時画像を保持するか（デフォルト: False）
+            keep_temp_images: 一時画像を保持するか（デフォルト: False）。HuggingFace版で
+                Falseかつoutput_dirがNoneの場合は、中間画像を保存せずメモリ上で処理する
             resume: 中断した処理を再開するか（デフォルト: False）
+            token_callback: 書き込んだテキスト片ごとに（ページ番号, テキスト片）で呼ばれる
+                コールバック（ストリーミング時の進捗表示用）
             
         Returns:
             出力ファイルのパス
         """
-        from pdftexter.pdf.processor import validate_pdf, extract_pdf_pages_as_images
         
-        # PDFの検証
+        # PDFの検証（バックグラウンドで準備中のバックエンドと並行して行う）
+        prepare_start = time.perf_counter()
         is_valid, error_msg = validate_pdf(pdf_path)
         if not is_valid:
             raise ValueError(error_msg or "PDFファイルが無効です")
         
+        # リトライ予算はドキュメントごとにリセットする
+        self.retry_budget = RetryBudget(self.config.deepseek_ocr.retry_budget_per_document)
+        
         # 出力ファイルのパス
         output_path = Path(output_file)
         output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -266,30 +1052,44 @@ class DeepSeekOCR:
         progress_file = output_path.with_suffix(output_path.suffix + ".progress")
         
         # 出力ディレクトリの設定
+        # （HuggingFace版は、中間画像を保持しない場合はページ画像をPNGに保存せずメモリ上で渡す）
+        in_memory = self.accepts_memory_images and output_dir is None and not keep_temp_images
         is_temp_dir = False
-        if output_dir is None:
+        if output_dir is None and not in_memory:
             import tempfile
             output_dir = tempfile.mkdtemp(prefix="pdftexter_ocr_")
             is_temp_dir = True
-        else:
+        elif output_dir is not None:
             os.makedirs(output_dir, exist_ok=True)
         
         # 再開処理: 進捗ファイルから最後に処理したページを取得
         start_page = 1
         if resume and progress_file.exists():
             try:
+                # 進捗ファイルは page・total・timestamp の「キー:値」の行からなる
                 with open(progress_file, "r", encoding="utf-8") as f:
-                    last_line = f.read().strip().split("\n")[-1]
-                    if last_line.startswith("page:"):
-                        start_page = int(last_line.split(":")[1]) + 1
-                        print(f"進捗を再開します: ページ {start_page} から", file=sys.stderr)
+                    progress = dict(
+                        line.split(":", 1) for line in f.read().splitlines() if ":" in line
+                    )
+                if "page" in progress:
+                    start_page = int(progress["page"]) + 1
+                    print(f"進捗を再開します: ページ {start_page} から", file=sys.stderr)
             except Exception as e:
                 print(f"警告: 進捗ファイルの読み込みに失敗しました: {e}", file=sys.stderr)
                 start_page = 1
         
         try:
+            # ウォームアップはPDFの画像変換と並行して行い、最初のページの前に完了を待つ
+            warmup_thread = self._start_warm_up(prompt)
             # PDFを画像に変換
-            image_paths = extract_pdf_pages_as_images(pdf_path, output_dir)
+            if in_memory:
+                image_paths = rasterize_pdf_pages(pdf_path)
+                self._prefetch_while_preparing(image_paths, start_page - 1)
+            else:
+                image_paths = extract_pdf_pages_as_images(pdf_path, output_dir)
+            self._wait_for_pdf_start(prepare_start)
+            if warmup_thread is not None:
+                warmup_thread.join()
             total_pages = len(image_paths)
             
             # ファイルを開いて逐次書き込み
@@ -305,40 +1105,90 @@ class DeepSeekOCR:
                 failed_pages: List[int] = []
                 page_separator = "\n\n---\n\n" if self.config.deepseek_ocr.output_format == "markdown" else "\n\n"
                 
-                for i, image_path in enumerate(image_paths, start_page - 1):
-                    page_num = i + 1
-                    
-                    # 進捗コールバック
-                    if progress_callback:
-                        progress_callback(page_num, total_pages)
-                    
-                    try:
-                        # 一枚ずつ画像をOCR処理
-                        page_result = self.process_image(image_path, prompt)
-                        
-                        # 即座にファイルに書き込み（メモリに蓄積しない）
+                def save_progress(page_num: int) -> None:
+                    with open(progress_file, "w", encoding="utf-8") as pf:
+                        pf.write(f"page:{page_num}\n")
+                        pf.write(f"total:{total_pages}\n")
+                        pf.write(f"timestamp:{time.time()}\n")
+                
+                def record_failure(page_num: int, error: Exception) -> None:
+                    # エラーが発生したページを記録し、エラーコメントを書き込み
+                    error_msg = f"ページ {page_num} の処理に失敗しました: {error}"
+                    print(f"警告: {error_msg}", file=sys.stderr)
+                    failed_pages.append(page_num)
+                    f.write(f"<!-- {error_msg} -->\n")
+                    f.flush()
+                
+                if self.page_concurrency > 1:
+                    # 複数ページを並行して処理し、完了した結果をページ順に書き込む
+                    # （生成途中のテキストは書き込まない）
+                    for page_num, page_result, error in self._iter_page_results(
+                        image_paths, prompt, start_page=start_page, document=Path(pdf_path).name
+                    ):
+                        if progress_callback:
+                            progress_callback(page_num, total_pages)
                         if page_num > 1:
                             f.write(page_separator)
+                        if error is not None:
+                            record_failure(page_num, error)
+                            continue
                         f.write(page_result)
-                        f.flush()  # バッファをフラッシュして確実に書き込む
+                        f.flush()
+                        if token_callback:
+                            token_callback(page_num, page_result)
+                        save_progress(page_num)
+                else:
+                    # 先読みが有効な場合は、次のページの前処理を推論と並行して行う
+                    # （再開時は処理済みのページを飛ばし、start_pageから処理する）
+                    pages = self._iter_pages(image_paths, start_page - 1)
+                    for i, (image_path, preprocess_s, wait_s) in enumerate(pages, start_page - 1):
+                        page_num = i + 1
                         
-                        # 進捗を保存
-                        with open(progress_file, "w", encoding="utf-8") as pf:
-                            pf.write(f"page:{page_num}\n")
-                            pf.write(f"total:{total_pages}\n")
-                            pf.write(f"timestamp:{time.time()}\n")
+                        # 進捗コールバック
+                        if progress_callback:
+                            progress_callback(page_num, total_pages)
                         
-                    except Exception as e:
-                        # エラーが発生したページを記録
-                        error_msg = f"ページ {page_num} の処理に失敗しました: {e}"
-                        print(f"警告: {error_msg}", file=sys.stderr)
-                        failed_pages.append(page_num)
+                        page_stats = PageStats(page_num=page_num)
+                        page_stats.document = Path(pdf_path).name
+                        page_stats.preprocess_s = preprocess_s
+                        page_stats.prefetch_wait_s = wait_s
                         
-                        # エラーコメントを書き込み
+                        # ページ区切りを書き込み、本文の開始位置を記録する
                         if page_num > 1:
                             f.write(page_separator)
-                        f.write(f"<!-- {error_msg} -->\n")
-                        f.flush()
+                        body_start = f.tell()
+                        
+                        def write_text(text: str, page_num: int = page_num) -> None:
+                            # 即座にファイルに書き込み（メモリに蓄積しない）
+                            # ストリーミング時は生成途中のテキスト片ごとに呼ばれる
+                            f.write(text)
+                            f.flush()  # バッファをフラッシュして確実に書き込む
+                            if token_callback:
+                                token_callback(page_num, text)
+                        
+                        def discard_text(body_start: int = body_start) -> None:
+                            # リトライ・失敗時は書き込み途中の本文を取り消す
+                            f.seek(body_start)
+                            f.truncate()
+                        
+                        try:
+                            # 一枚ずつ画像をOCR処理
+                            self.process_image(
+                                image_path,
+                                prompt,
+                                page_stats=page_stats,
+                                on_token=write_text,
+                                on_reset=discard_text,
+                            )
+                        
+                            # 進捗を保存
+                            save_progress(page_num)
+                        
+                        except Exception as e:
+                            discard_text()
+                            record_failure(page_num, e)
+                        finally:
+                            self.run_stats.add_page(page_stats)
                 
                 # フッターを書き込み（オプション）
                 if self.config.deepseek_ocr.output_format == "markdown":
@@ -0,0 +1,327 @@
+"""
+vLLMエンドポイントの負荷分散モジュール
+
+複数のvLLMレプリカ（エンドポイント）に対して、重み付きの最少未処理リクエスト数で
+ページを振り分けます。エラーとレイテンシからの受動的な監視と、``/health`` への
+定期的な能動的チェックで各エンドポイントの状態を追跡し、失敗が続いたエンドポイントは
+サーキットブレーカーにより一定時間（クールダウン）振り分け対象から外します。
+"""
+
+import sys
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import requests
+
+from pdftexter.ocr.transport import create_session, is_unix_socket_url
+
+# 受動的なレイテンシ監視に使う指数移動平均の係数
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class Endpoint:
+    """1つのvLLMエンドポイントの状態"""
+
+    def __init__(self, url: str, weight: float = 1.0):
+        """
+        初期化
+
+        Args:
+            url: サーバーURL（``http+unix://`` 形式も可）
+            weight: 振り分けの重み（大きいほど多くのリクエストを受け持つ）
+
+        Raises:
+            ValueError: 重みが正の値でない場合
+        """
+        if weight <= 0:
+            raise ValueError(f"エンドポイントの重みは正の値である必要があります: {weight}")
+        self.url = url.rstrip("/")
+        self.weight = weight
+        # Unixドメインソケットはrequestsのモジュール関数では扱えないため専用セッションを使用する
+        self.session = create_session() if is_unix_socket_url(self.url) else None
+
+        self.outstanding = 0
+        self.requests_total = 0
+        self.failures_total = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.latency_ewma: Optional[float] = None
+
+    def http(self) -> Any:
+        """
+        リクエスト送信に使用するHTTPクライアントを返す
+
+        Returns:
+            Unixドメインソケットの場合はセッション、それ以外はrequestsモジュール
+        """
+        return self.session if self.session is not None else requests
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """
+        振り分け対象か判定する
+
+        クールダウンが明けたエンドポイントは再び振り分け対象になります（半開状態）。
+        半開状態で再度失敗した場合は、すぐに切り離されます。
+
+        Args:
+            now: 現在時刻（time.monotonic()、省略時は現在時刻）
+
+        Returns:
+            振り分け対象の場合True
+        """
+        return (now if now is not None else time.monotonic()) >= self.ejected_until
+
+    def score(self) -> float:
+        """振り分けの優先度（小さいほど優先、重みで正規化した未処理リクエスト数）"""
+        return (self.outstanding + 1) / self.weight
+
+
+class EndpointPool:
+    """
+    複数のvLLMエンドポイントへの振り分けを管理するクラス
+
+    スレッドセーフで、複数ページの同時処理から共有できます。
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        health_timeout: float = 5.0,
+    ):
+        """
+        初期化
+
+        Args:
+            endpoints: エンドポイントのリスト
+            failure_threshold: 切り離すまでの連続失敗回数
+            cooldown: 切り離してから再び振り分けるまでの時間（秒）
+            health_timeout: ``/health`` チェックのタイムアウト（秒）
+
+        Raises:
+            ValueError: エンドポイントが指定されていない場合
+        """
+        if not endpoints:
+            raise ValueError("エンドポイントが指定されていません")
+        self.endpoints = list(endpoints)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_timeout = health_timeout
+        self.failovers = 0
+
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._health_stop = threading.Event()
+
+    @classmethod
+    def from_urls(
+        cls,
+        urls: Sequence[Tuple[str, float]],
+        **kwargs: Any,
+    ) -> "EndpointPool":
+        """
+        （URL, 重み）のリストからエンドポイントプールを作成する
+
+        Args:
+            urls: （URL, 重み）のリスト
+            **kwargs: EndpointPoolの初期化引数
+
+        Returns:
+            EndpointPoolオブジェクト
+        """
+        return cls([Endpoint(url, weight) for url, weight in urls], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def acquire(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """
+        リクエストを送るエンドポイントを選び、未処理リクエスト数を増やす
+
+        振り分け対象のうち、重みで正規化した未処理リクエスト数が最も少ないものを選びます
+        （同数の場合はレイテンシの移動平均が小さいもの）。excludeに含まれるもの
+        （このページで失敗したエンドポイント）は、他に候補がない場合にのみ選びます。
+
+        Args:
+            exclude: できるだけ避けるエンドポイント
+
+        Returns:
+            選ばれたEndpointオブジェクト（release()で解放すること）
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e.is_available(now) and e not in exclude]
+            if not candidates:
+                candidates = [e for e in self.endpoints if e.is_available(now)]
+            if not candidates:
+                # すべて切り離されている場合は、最も早くクールダウンが明けるものを使う
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            endpoint = min(
+                candidates,
+                key=lambda e: (e.score(), e.latency_ewma if e.latency_ewma is not None else 0.0),
+            )
+            endpoint.outstanding += 1
+            endpoint.requests_total += 1
+            return endpoint
+
+    def release(
+        self,
+        endpoint: Endpoint,
+        success: bool,
+        latency: Optional[float] = None,
+        endpoint_failure: bool = True,
+    ) -> None:
+        """
+        リクエストの完了を記録する（受動的な監視）
+
+        Args:
+            endpoint: acquire()で取得したエンドポイント
+            success: リクエストが成功したか
+            latency: 成功したリクエストのレイテンシ（秒）
+            endpoint_failure: 失敗がエンドポイントの異常によるものか
+                （接続エラー・タイムアウト・5xxはTrue、4xxなどリクエスト側の問題はFalse）
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if success:
+                endpoint.consecutive_failures = 0
+                if latency is not None:
+                    if endpoint.latency_ewma is None:
+                        endpoint.latency_ewma = latency
+                    else:
+                        endpoint.latency_ewma += LATENCY_EWMA_ALPHA * (latency - endpoint.latency_ewma)
+                return
+            if not endpoint_failure:
+                return
+            endpoint.failures_total += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                self._eject(endpoint, "連続して失敗しました")
+
+    def has_alternative(self, endpoint: Endpoint) -> bool:
+        """
+        指定したエンドポイント以外に振り分け対象があるか判定する
+
+        Args:
+            endpoint: 除外するエンドポイント
+
+        Returns:
+            他に振り分け対象がある場合True
+        """
+        now = time.monotonic()
+        return any(e is not endpoint and e.is_available(now) for e in self.endpoints)
+
+    def record_failover(self) -> None:
+        """失敗したページを別のエンドポイントに再送したことを記録する"""
+        with self._lock:
+            self.failovers += 1
+
+    def _eject(self, endpoint: Endpoint, reason: str) -> None:
+        """エンドポイントを切り離す（ロックを取得した状態で呼ぶこと）"""
+        if len(self.endpoints) > 1 and endpoint.is_available():
+            print(
+                f"警告: エンドポイント {endpoint.url} を{self.cooldown:.0f}秒間切り離します（{reason}）",
+                file=sys.stderr,
+            )
+        if endpoint.is_available():
+            endpoint.ejections += 1
+        endpoint.ejected_until = time.monotonic() + self.cooldown
+
+    def check_health(self) -> None:
+        """
+        すべてのエンドポイントの ``/health`` を確認する（能動的な監視）
+
+        応答しないエンドポイントは切り離し、切り離し中に回復したエンドポイントは
+        クールダウンを待たずに振り分け対象に戻します。
+        """
+        for endpoint in self.endpoints:
+            try:
+                response = endpoint.http().get(f"{endpoint.url}/health", timeout=self.health_timeout)
+                healthy = response.status_code == 200
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy:
+                    if not endpoint.is_available():
+                        print(f"エンドポイント {endpoint.url} が回復しました", file=sys.stderr)
+                        endpoint.ejected_until = 0.0
+                        endpoint.consecutive_failures = 0
+                else:
+                    self._eject(endpoint, "/health に応答しません")
+
+    def start_health_checks(self, interval: float) -> None:
+        """
+        バックグラウンドで定期的に ``/health`` を確認する
+
+        Args:
+            interval: チェックの間隔（秒）
+        """
+        if self._health_thread is not None:
+            return
+        self._health_stop.clear()
+
+        def run() -> None:
+            while not self._health_stop.wait(interval):
+                self.check_health()
+
+        self._health_thread = threading.Thread(target=run, name="pdftexter-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self) -> None:
+        """定期的な ``/health`` の確認を停止する"""
+        if self._health_thread is None:
+            return
+        self._health_stop.set()
+        self._health_thread.join()
+        self._health_thread = None
+
+    def summary_lines(self) -> List[str]:
+        """
+        エンドポイントごとの集計を表示用の行リストとして返す
+
+        エンドポイントが1つで失敗もない場合は空のリストを返します。
+
+        Returns:
+            サマリーの各行
+        """
+        if len(self.endpoints) == 1 and not self.endpoints[0].failures_total:
+            return []
+        lines = []
+        for endpoint in self.endpoints:
+            latency = (
+                f", 平均 {endpoint.latency_ewma:.2f}秒" if endpoint.latency_ewma is not None else ""
+            )
+            lines.append(
+                f"エンドポイント {endpoint.url} (重み {endpoint.weight:g}): "
+                f"{endpoint.requests_total}件, 失敗 {endpoint.failures_total}件, "
+                f"切り離し {endpoint.ejections}回{latency}"
+            )
+        if self.failovers:
+            lines.append(f"別エンドポイントへの再送: {self.failovers}回")
+        return lines
+
+
+def is_endpoint_failure(exception: Exception) -> bool:
+    """
+    例外がエンドポイントの異常によるものか判定する
+
+    接続エラー・タイムアウト・5xxはエンドポイントの異常とみなし、
+    4xx（429を含む）はリクエスト側の問題または一時的な混雑とみなします。
+
+    Args:
+        exception: リクエストで発生した例外
+
+    Returns:
+        エンドポイントの異常によるものの場合True
+    """
+    response = getattr(exception, "response", None)
+    if response is None:
+        return isinstance(
+            exception,
+            (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError),
+        )
+    return response.status_code >= 500
+
@@ -0,0 +1,109 @@
+"""
+ヘッジリクエストモジュール
+
+混雑したレプリカで一部のページだけが極端に遅くなる（テールレイテンシ）と、
+ページ順に出力する場合はその1ページが全体を止めてしまいます。
+観測したレイテンシのパーセンタイルを超えたリクエストについて、同じページを
+別のエンドポイント（または同じサーバーの別スロット）にも送り、先に完了した方を
+採用します。ヘッジは全リクエストのごく一部に収まるよう予算で制限します。
+"""
+
+import threading
+from collections import deque
+from typing import Deque, List, Optional
+
+from pdftexter.ocr.stats import percentile
+
+
+class RequestCancelled(Exception):
+    """ヘッジで負けた（または中止された）リクエストを打ち切る際に送出される例外"""
+
+
+class HedgePolicy:
+    """ヘッジを送るタイミングと予算を管理するクラス（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        latency_percentile: float = 95.0,
+        max_ratio: float = 0.05,
+        min_samples: int = 20,
+        min_delay: float = 1.0,
+        window: int = 200,
+    ):
+        """
+        初期化
+
+        Args:
+            latency_percentile: ヘッジを送るまでの待ち時間に使うレイテンシのパーセンタイル
+            max_ratio: 全リクエストに対するヘッジの最大割合
+            min_samples: ヘッジを有効にするのに必要なレイテンシの観測数
+            min_delay: ヘッジを送るまでの最小の待ち時間（秒）
+            window: パーセンタイルの計算に使う直近の観測数
+        """
+        self.latency_percentile = latency_percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self.requests_total = 0
+        self.hedges_total = 0
+        self.hedge_wins = 0
+
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_latency(self, latency: float) -> None:
+        """
+        完了したリクエストのレイテンシを記録する
+
+        Args:
+            latency: レイテンシ（秒）
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def start_request(self) -> Optional[float]:
+        """
+        リクエストの開始を記録し、ヘッジを送るまでの待ち時間を返す
+
+        Returns:
+            待ち時間（秒）。観測数が足りない場合はNone（ヘッジしない）
+        """
+        with self._lock:
+            self.requests_total += 1
+            if len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, percentile(list(self._latencies), self.latency_percentile))
+
+    def try_acquire(self) -> bool:
+        """
+        ヘッジの予算を1回分消費する
+
+        Returns:
+            予算内でヘッジを送れる場合True
+        """
+        with self._lock:
+            if self.hedges_total + 1 > self.max_ratio * self.requests_total:
+                return False
+            self.hedges_total += 1
+            return True
+
+    def record_win(self) -> None:
+        """ヘッジが元のリクエストより先に完了したことを記録する"""
+        with self._lock:
+            self.hedge_wins += 1
+
+    def summary_lines(self) -> List[str]:
+        """
+        ヘッジの集計を表示用の行リストとして返す
+
+        Returns:
+            サマリーの各行（ヘッジを送っていない場合は空）
+        """
+        if not self.hedges_total:
+            return []
+        ratio = self.hedges_total / self.requests_total * 100 if self.requests_total else 0.0
+        return [
+            f"ヘッジリクエスト: {self.hedges_total}件（全{self.requests_total}件の{ratio:.1f}%, "
+            f"ヘッジが先に完了 {self.hedge_wins}件）"
+        ]
@@ -3,12 +3,24 @@ HuggingFace Transformers版DeepSeek-OCRラッパー
 vLLMサーバー不要で直接モデルを実行できる簡単な方法
 """
 
+import contextlib
 import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.ocr.memory_image import PageImage, is_image_path, memory_image_file
+from pdftexter.ocr.model_registry import LoadedModel, ModelRegistry, get_model_registry
+from pdftexter.ocr.prefetch import load_page_image, prepare_tiles
+from pdftexter.ocr.quantization import QUANTIZATION_MODES, quantize_language_model, quantized_cache_path
+from pdftexter.ocr.repetition import RepetitionDetector, trim_repetition
+from pdftexter.ocr.resolution import RESOLUTION_MODES, ResolutionMode
+from pdftexter.ocr.snapshot import load_prepared_model, save_prepared_model, snapshot_path
+from pdftexter.ocr.stats import PageStats
 
 try:
-    from transformers import AutoModel, AutoTokenizer
+    from transformers import AutoModel, AutoTokenizer, StoppingCriteriaList
     from PIL import Image
     import torch
     TRANSFORMERS_AVAILABLE = True
@@ -16,20 +28,367 @@ except ImportError:
     TRANSFORMERS_AVAILABLE = False
     torch = None
 
+# DeepSeek-OCRのinfer()がgenerate()に渡すmax_new_tokens
+HF_MAX_NEW_TOKENS = 8192
+
+
+class RepetitionStoppingCriteria:
+    """
+    生成ループを検出したらgenerate()を停止させる停止条件
+    
+    transformersのStoppingCriteriaと同じ呼び出し規約（input_ids, scores）に従い、
+    一定トークンごとに新しく生成された部分をデコードして検出器に渡します。
+    """
+    
+    def __init__(self, detector: RepetitionDetector, tokenizer: Any, check_every: int = 16):
+        """
+        初期化
+        
+        Args:
+            detector: 生成ループの検出器
+            tokenizer: 生成トークンのデコードに使用するトークナイザー
+            check_every: 検出器にテキストを渡す間隔（トークン数）
+        """
+        self.detector = detector
+        self.tokenizer = tokenizer
+        self.check_every = check_every
+        self.prompt_length: Optional[int] = None
+        self.generated_tokens = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._fed_tokens = 0
+    
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        if self.prompt_length is None:
+            # 最初の呼び出しは1トークン目の生成直後
+            self.prompt_length = input_ids.shape[-1] - 1
+            self.started_at = time.perf_counter()
+        self.generated_tokens = input_ids.shape[-1] - self.prompt_length
+        
+        stop = self.detector.detected
+        if not stop and self.generated_tokens - self._fed_tokens >= self.check_every:
+            text = self.tokenizer.decode(
+                input_ids[0, self.prompt_length + self._fed_tokens:],
+                skip_special_tokens=True,
+            )
+            # マルチバイト文字の途中で切れている場合は次回に回す
+            if not text.endswith("\ufffd"):
+                self._fed_tokens = self.generated_tokens
+                stop = self.detector.feed(text)
+                if stop:
+                    self.stopped_at = time.perf_counter()
+        
+        if torch is not None:
+            return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+        return stop
+    
+    @property
+    def seconds_per_token(self) -> float:
+        """停止までの1トークンあたりの生成時間（秒）"""
+        if self.started_at is None or self.stopped_at is None or self.generated_tokens <= 1:
+            return 0.0
+        return (self.stopped_at - self.started_at) / (self.generated_tokens - 1)
+
+
+def resolve_load_options(cpu_profile: Optional[CPUInferenceProfile] = None) -> Tuple[str, str, str]:
+    """
+    この環境でモデルを読み込む際の設定を決める
+    
+    Args:
+        cpu_profile: CPU推論プロファイル（CPUで推論する場合のdtypeの決定に使用）
+        
+    Returns:
+        （dtype, attention実装, デバイス）のタプル
+    """
+    try:
+        # flash-attnがインストールされているかチェック
+        import flash_attn  # noqa: F401
+        attn_implementation = "flash_attention_2"
+    except ImportError:
+        attn_implementation = "default"
+    if torch is not None and torch.cuda.is_available():
+        if cpu_profile is not None and cpu_profile.quantization is not None:
+            print("⚠ GPUで推論するため、量子化の設定は使用しません", file=sys.stderr)
+        return "bfloat16", attn_implementation, "cuda"
+    dtype = cpu_profile.resolve_dtype() if cpu_profile is not None else "float32"
+    return dtype, attn_implementation, "cpu"
+
+
+def _load_model(
+    model_path: str,
+    attn_implementation: str,
+    device: str,
+    dtype: str,
+    cpu_profile: Optional[CPUInferenceProfile] = None,
+) -> Tuple[Any, Any]:
+    """
+    トークナイザーとモデルを読み込む
+    
+    Args:
+        model_path: DeepSeek-OCRモデルのパス（HuggingFaceモデルIDまたはローカルパス）
+        attn_implementation: resolve_load_options()が返したattention実装
+        device: resolve_load_options()が返したデバイス
+        dtype: resolve_load_options()が返したdtype（量子化する場合は量子化方式）
+        cpu_profile: CPU推論プロファイル（low_cpu_mem_usage・torch.compile・量子化の設定に使用）
+        
+    Returns:
+        （トークナイザー, モデル）のタプル
+        
+    Raises:
+        RuntimeError: モデルの読み込みに失敗した場合
+    """
+    print(f"DeepSeek-OCRモデルを読み込み中: {model_path}...", file=sys.stderr)
+    
+    # Flash Attention 2関連のエラーを回避するため、モンキーパッチを適用
+    # DeepSeek-OCRモデルのカスタムコードがLlamaFlashAttention2をインポートしようとするのを防ぎます
+    # LlamaFlashAttention2のダミークラスを定義
+    class DummyLlamaFlashAttention2:
+        """LlamaFlashAttention2のダミークラス（互換性のため）"""
+        pass
+    
+    # transformers.models.llama.modeling_llamaモジュールにダミークラスを追加
+    # これにより、モデルのカスタムコードがインポートエラーを起こさないようにします
+    try:
+        import transformers.models.llama.modeling_llama as llama_module
+        if not hasattr(llama_module, 'LlamaFlashAttention2'):
+            # LlamaFlashAttention2が存在しない場合、ダミークラスを追加
+            llama_module.LlamaFlashAttention2 = DummyLlamaFlashAttention2
+    except ImportError:
+        pass
+    
+    try:
+        # Tokenizerとモデルを読み込み（公式の推奨方法）
+        # 参考: https://github.com/deepseek-ai/DeepSeek-OCR
+        tokenizer = AutoTokenizer.from_pretrained(
+            model_path,
+            trust_remote_code=True
+        )
+        
+        load_kwargs: Dict[str, Any] = {"trust_remote_code": True, "use_safetensors": True}
+        if cpu_profile is not None:
+            load_kwargs["low_cpu_mem_usage"] = cpu_profile.low_cpu_mem_usage
+        if device == "cpu" and dtype == "bfloat16":
+            # float32で展開してから変換するとピークメモリが倍になるため、読み込み時に変換する
+            load_kwargs["torch_dtype"] = torch.bfloat16
+        
+        # 準備済みモデルがあれば、from_pretrained()とdtypeの変換を省いてmmapで読み込む
+        snapshot = _prepared_snapshot_path(model_path, device, dtype, cpu_profile)
+        model = _load_prepared_snapshot(model_path, snapshot) if snapshot is not None else None
+        
+        # モデルの読み込み（公式の推奨方法に従う）
+        # 公式READMEでは _attn_implementation='flash_attention_2' を推奨
+        # ただし、flash-attnがインストールされていない場合はフォールバック
+        if model is not None:
+            print(f"✓ 準備済みモデルを読み込みました（{dtype}）: {snapshot}", file=sys.stderr)
+        elif dtype in QUANTIZATION_MODES:
+            model = _load_quantized_model(model_path, dtype, load_kwargs, cpu_profile)
+        elif attn_implementation == "flash_attention_2":
+            # 公式の推奨方法：flash_attention_2を使用
+            try:
+                model = AutoModel.from_pretrained(
+                    model_path,
+                    _attn_implementation='flash_attention_2',
+                    **load_kwargs,
+                )
+                print("✓ モデルを読み込みました（Flash Attention 2を使用）", file=sys.stderr)
+            except Exception as e:
+                # flash_attention_2が使えない場合は標準実装にフォールバック
+                error_msg = str(e)
+                print(f"⚠ Flash Attention 2の使用に失敗しました: {error_msg}", file=sys.stderr)
+                print("⚠ 標準のattention実装を使用します", file=sys.stderr)
+                model = AutoModel.from_pretrained(model_path, **load_kwargs)
+                print("✓ モデルを読み込みました（標準のattention実装を使用）", file=sys.stderr)
+        else:
+            # flash-attnがインストールされていない場合は標準実装を使用
+            model = AutoModel.from_pretrained(model_path, **load_kwargs)
+            print("✓ モデルを読み込みました（標準のattention実装を使用）", file=sys.stderr)
+            print("💡 ヒント: flash-attnをインストールすると、パフォーマンスが向上します", file=sys.stderr)
+        
+        # モデルを評価モードに設定し、GPUに移動
+        model = model.eval()
+        if device == "cuda":
+            try:
+                model = model.cuda().to(torch.bfloat16)
+                print("✓ GPUを使用して推論します", file=sys.stderr)
+            except Exception:
+                model = model.cuda()
+                print("✓ GPUを使用して推論します（bfloat16は使用できません）", file=sys.stderr)
+        else:
+            print("⚠ GPUが利用できないため、CPUで推論します", file=sys.stderr)
+            if cpu_profile is not None:
+                settings = cpu_profile.describe(torch)
+                print(
+                    f"✓ CPU推論の設定: dtype={settings['dtype']}, スレッド数={settings['threads']}"
+                    f"（inter-op {settings['interop_threads']}）, torch.compile={settings['compile']}",
+                    file=sys.stderr,
+                )
+        
+        if snapshot is not None and not snapshot.exists():
+            # torch.compileしたforwardは保存できないため、コンパイルの前に保存する
+            try:
+                save_prepared_model(model, snapshot, torch)
+                print(f"✓ 準備済みモデルを保存しました（次回から高速に読み込みます）: {snapshot}", file=sys.stderr)
+            except Exception as e:
+                print(f"⚠ 準備済みモデルを保存できませんでした: {e}", file=sys.stderr)
+        
+        if cpu_profile is not None and cpu_profile.compile:
+            # infer()はgenerate()経由でforwardを呼ぶため、forwardをコンパイルする
+            # （トークンごとに系列長が変わるため、動的な形状としてコンパイルする）
+            model.forward = torch.compile(model.forward, dynamic=True)
+            print("✓ torch.compileを有効にしました（最初のページはコンパイルのため遅くなります）", file=sys.stderr)
+        
+        print("✓ モデルの読み込みが完了しました", file=sys.stderr)
+        return tokenizer, model
+        
+    except Exception as e:
+        raise RuntimeError(
+            f"モデルの読み込みに失敗しました: {e}\n"
+            f"モデルパスを確認してください: {model_path}"
+        )
+
+
+def _import_remote_code(model_path: str) -> None:
+    """
+    モデルのリモートコード（モデルのクラス定義）をインポートする
+    
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+    """
+    from transformers import AutoConfig
+    from transformers.dynamic_module_utils import get_class_from_dynamic_module
+    
+    config = AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+    get_class_from_dynamic_module(config.auto_map["AutoModel"], model_path)
+
+
+def _library_versions() -> str:
+    """保存したモデルの互換性を決めるtorch・transformersのバージョンを返す"""
+    import transformers
+    
+    return f"torch-{torch.__version__}+transformers-{transformers.__version__}"
+
+
+def _prepared_snapshot_path(
+    model_path: str, device: str, dtype: str, cpu_profile: Optional[CPUInferenceProfile]
+) -> Optional[Path]:
+    """
+    準備済みモデルのファイルのパスを返す
+    
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        device: resolve_load_options()が返したデバイス
+        dtype: resolve_load_options()が返したdtype
+        cpu_profile: CPU推論プロファイル
+        
+    Returns:
+        準備済みモデルのパス（無効な場合、GPUで推論する場合、量子化する場合はNone）
+    """
+    if device != "cpu" or dtype in QUANTIZATION_MODES:
+        return None
+    if cpu_profile is None or not cpu_profile.prepared_snapshot:
+        return None
+    return snapshot_path(model_path, dtype, _library_versions(), cpu_profile.snapshot_dir)
+
+
+def _load_prepared_snapshot(model_path: str, path: Path) -> Optional[Any]:
+    """
+    準備済みモデルをmmapで読み込む
+    
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        path: 準備済みモデルのファイルのパス
+        
+    Returns:
+        モデル（ファイルがない場合、読み込めなかった場合はNone）
+    """
+    if not path.exists():
+        return None
+    try:
+        # 準備済みモデルはリモートコードのクラスを参照するため、先にインポートしておく
+        _import_remote_code(model_path)
+        return load_prepared_model(path, torch)
+    except Exception as e:
+        print(f"⚠ 準備済みモデルを読み込めませんでした（作成し直します）: {e}", file=sys.stderr)
+        path.unlink(missing_ok=True)
+        return None
+
+
+def _load_quantized_model(
+    model_path: str,
+    mode: str,
+    load_kwargs: Dict[str, Any],
+    cpu_profile: Optional[CPUInferenceProfile],
+) -> Any:
+    """
+    量子化済みのモデルを読み込む（キャッシュがない場合は量子化してキャッシュに保存する）
+    
+    Args:
+        model_path: DeepSeek-OCRモデルのパス
+        mode: 量子化方式
+        load_kwargs: from_pretrained()に渡す引数
+        cpu_profile: CPU推論プロファイル（キャッシュフォルダの設定に使用）
+        
+    Returns:
+        量子化済みのモデル
+    """
+    cache_dir = cpu_profile.quantization_cache_dir if cpu_profile is not None else None
+    cache_path = quantized_cache_path(model_path, mode, torch.__version__, cache_dir)
+    if cache_path.exists():
+        try:
+            # キャッシュはリモートコードのクラスを参照するため、先にインポートしておく
+            _import_remote_code(model_path)
+            model = load_prepared_model(cache_path, torch)
+            print(f"✓ 量子化済みモデルをキャッシュから読み込みました（{mode}）: {cache_path}", file=sys.stderr)
+            return model
+        except Exception as e:
+            print(f"⚠ 量子化済みモデルのキャッシュを読み込めませんでした（量子化し直します）: {e}", file=sys.stderr)
+    
+    # 動的量子化はfloat32の重みから行う
+    load_kwargs = {key: value for key, value in load_kwargs.items() if key != "torch_dtype"}
+    model = AutoModel.from_pretrained(model_path, **load_kwargs).eval()
+    names = quantize_language_model(model, torch)
+    print(f"✓ 言語モデルのLinear層を量子化しました（{mode}、{len(names)}層）", file=sys.stderr)
+    try:
+        save_prepared_model(model, cache_path, torch)
+        print(f"✓ 量子化済みモデルをキャッシュに保存しました: {cache_path}", file=sys.stderr)
+    except Exception as e:
+        print(f"⚠ 量子化済みモデルをキャッシュに保存できませんでした: {e}", file=sys.stderr)
+    return model
+
+
+def _inference_mode() -> Any:
+    """torch.inference_modeのコンテキスト（torchがない場合は何もしない）"""
+    if torch is None:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
 
 class HuggingFaceOCRWrapper:
     """HuggingFace Transformers版DeepSeek-OCRラッパー"""
     
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        registry: Optional[ModelRegistry] = None,
+        idle_timeout: Optional[float] = None,
+        cpu_profile: Optional[CPUInferenceProfile] = None,
+    ):
         """
         初期化
         
+        同じプロセス内で同じ設定のモデルが読み込み済みの場合は、それを共有します。
+        
         Args:
             model_path: DeepSeek-OCRモデルのパス（HuggingFaceモデルIDまたはローカルパス）
+            registry: モデルを共有するレジストリ（省略時はプロセス全体で共有するレジストリ）
+            idle_timeout: どこからも使われなくなったモデルを解放するまでの時間（秒、Noneの場合は保持し続ける）
+            cpu_profile: CPU推論プロファイル（Noneの場合はfloat32・torchの既定のスレッド数）。
+                torch.compileの有無は、同じモデルを最初に読み込んだときの設定に従う。
+                量子化したモデルは量子化方式をdtypeとして、量子化していないモデルとは別に共有する
             
         Raises:
             ImportError: transformersがインストールされていない場合
-            FileNotFoundError: モデルが見つからない場合
+            RuntimeError: モデルの読み込みに失敗した場合
         """
         if not TRANSFORMERS_AVAILABLE:
             raise ImportError(
@@ -41,132 +400,171 @@ class HuggingFaceOCRWrapper:
             )
         
         self.model_path = model_path
-        print(f"DeepSeek-OCRモデルを読み込み中: {model_path}...", file=sys.stderr)
+        self.registry = registry or get_model_registry()
+        if cpu_profile is not None:
+            cpu_profile.apply_threads(torch)
+        dtype, attn_implementation, device = resolve_load_options(cpu_profile)
+        self.device = device
+        self._entry: Optional[LoadedModel] = self.registry.acquire(
+            (model_path, dtype, attn_implementation, device),
+            lambda: _load_model(model_path, attn_implementation, device, dtype, cpu_profile),
+            idle_timeout=idle_timeout,
+        )
+        self.tokenizer = self._entry.tokenizer
+        self.model = self._entry.model
+    
+    def close(self) -> None:
+        """
+        モデルの参照を解放する（以後このインスタンスでは推論できない）
         
-        # Flash Attention 2関連のエラーを回避するため、モンキーパッチを適用
-        # DeepSeek-OCRモデルのカスタムコードがLlamaFlashAttention2をインポートしようとするのを防ぎます
-        # LlamaFlashAttention2のダミークラスを定義
-        class DummyLlamaFlashAttention2:
-            """LlamaFlashAttention2のダミークラス（互換性のため）"""
-            pass
+        他に参照がなければ、レジストリの設定に従ってモデルのメモリが解放されます。
+        """
+        if self._entry is None:
+            return
+        self.registry.release(self._entry)
+        self._entry = None
+        self.tokenizer = None
+        self.model = None
+    
+    @contextlib.contextmanager
+    def _generate_kwargs(self, extra_kwargs: Dict[str, Any]) -> Iterator[None]:
+        """
+        infer()内部のgenerate()呼び出しに引数を追加・上書きする
         
-        # transformers.models.llama.modeling_llamaモジュールにダミークラスを追加
-        # これにより、モデルのカスタムコードがインポートエラーを起こさないようにします
-        try:
-            import transformers.models.llama.modeling_llama as llama_module
-            if not hasattr(llama_module, 'LlamaFlashAttention2'):
-                # LlamaFlashAttention2が存在しない場合、ダミークラスを追加
-                llama_module.LlamaFlashAttention2 = DummyLlamaFlashAttention2
-        except ImportError:
-            pass
+        DeepSeek-OCRのinfer()はgenerate()の引数を外から指定できないため、
+        呼び出しの間だけインスタンスのgenerateを差し替えます。
+        
+        Args:
+            extra_kwargs: generate()に追加・上書きする引数
+        """
+        if not extra_kwargs:
+            yield
+            return
         
+        original_generate = self.model.generate
+        
+        def generate(*args: Any, **kwargs: Any) -> Any:
+            kwargs.update(extra_kwargs)
+            return original_generate(*args, **kwargs)
+        
+        self.model.generate = generate
         try:
-            # Tokenizerとモデルを読み込み（公式の推奨方法）
-            # 参考: https://github.com/deepseek-ai/DeepSeek-OCR
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                model_path,
-                trust_remote_code=True
-            )
-            
-            # モデルの読み込み（公式の推奨方法に従う）
-            # 公式READMEでは _attn_implementation='flash_attention_2' を推奨
-            # ただし、flash-attnがインストールされていない場合はフォールバック
-            use_flash_attention_2 = False
-            try:
-                # flash-attnがインストールされているかチェック
-                import flash_attn  # noqa: F401
-                use_flash_attention_2 = True
-            except ImportError:
-                # flash-attnがインストールされていない場合は標準実装を使用
-                use_flash_attention_2 = False
-            
-            if use_flash_attention_2:
-                # 公式の推奨方法：flash_attention_2を使用
-                try:
-                    self.model = AutoModel.from_pretrained(
-                        model_path,
-                        _attn_implementation='flash_attention_2',
-                        trust_remote_code=True,
-                        use_safetensors=True,
-                    )
-                    print("✓ モデルを読み込みました（Flash Attention 2を使用）", file=sys.stderr)
-                except Exception as e:
-                    # flash_attention_2が使えない場合は標準実装にフォールバック
-                    error_msg = str(e)
-                    print(f"⚠ Flash Attention 2の使用に失敗しました: {error_msg}", file=sys.stderr)
-                    print("⚠ 標準のattention実装を使用します", file=sys.stderr)
-                    self.model = AutoModel.from_pretrained(
-                        model_path,
-                        trust_remote_code=True,
-                        use_safetensors=True,
-                    )
-                    print("✓ モデルを読み込みました（標準のattention実装を使用）", file=sys.stderr)
-            else:
-                # flash-attnがインストールされていない場合は標準実装を使用
-                self.model = AutoModel.from_pretrained(
-                    model_path,
-                    trust_remote_code=True,
-                    use_safetensors=True,
-                )
-                print("✓ モデルを読み込みました（標準のattention実装を使用）", file=sys.stderr)
-                print("💡 ヒント: flash-attnをインストールすると、パフォーマンスが向上します", file=sys.stderr)
-            
-            # モデルを評価モードに設定し、GPUに移動
-            self.model = self.model.eval()
-            if torch is not None and torch.cuda.is_available():
-                try:
-                    self.model = self.model.cuda().to(torch.bfloat16)
-                    print("✓ GPUを使用して推論します", file=sys.stderr)
-                except Exception:
-                    self.model = self.model.cuda()
-                    print("✓ GPUを使用して推論します（bfloat16は使用できません）", file=sys.stderr)
-            else:
-                print("⚠ GPUが利用できないため、CPUで推論します", file=sys.stderr)
-            
-            print("✓ モデルの読み込みが完了しました", file=sys.stderr)
+            yield
+        finally:
+            del self.model.generate
+    
+    def prepare_image(self, image_path: PageImage, resolution: Optional[ResolutionMode] = None) -> PageImage:
+        """
+        infer()の前処理のうち、推論と切り離せる部分を先に済ませる
+        
+        画像を読み込み（向きの補正とRGBへの変換）、タイルに分割するモードでは分割も済ませます。
+        推論中の別のページと並行して呼び出せます（モデルのロックは取りません）。
+        
+        Args:
+            image_path: 画像ファイルのパス、またはメモリ上の画像
+            resolution: 解像度モード（Noneの場合はGundamモード）
             
-        except Exception as e:
-            raise RuntimeError(
-                f"モデルの読み込みに失敗しました: {e}\n"
-                f"モデルパスを確認してください: {model_path}"
-            )
+        Returns:
+            読み込んだPILの画像（process_image()にそのまま渡す）
+        """
+        if self._entry is None:
+            raise RuntimeError("モデルは解放済みです（close()の後は推論できません）")
+        image = load_page_image(image_path)
+        resolution = resolution or RESOLUTION_MODES["gundam"]
+        # infer()はタイルの大きさ以下の画像を分割しない
+        if resolution.crop_mode and max(image.size) > resolution.image_size:
+            prepare_tiles(image, self.model)
+        return image
     
     def process_image(
         self,
-        image_path: str,
+        image_path: PageImage,
         prompt: str = "<image>\n<|grounding|>Convert the document to markdown.",
+        page_stats: Optional[PageStats] = None,
+        detector: Optional[RepetitionDetector] = None,
+        generation_overrides: Optional[Dict[str, Any]] = None,
+        resolution: Optional[ResolutionMode] = None,
     ) -> str:
         """
         画像ファイルをOCR処理する
         
+        detectorを指定すると停止条件として生成ループを監視し、検出した時点で
+        生成を停止して繰り返しより前の部分を返します。
+        PILの画像・NumPy配列を渡した場合は、PNGに書き出さずにモデルの前処理へ直接渡します。
+        
         Args:
-            image_path: 画像ファイルのパス
+            image_path: 画像ファイルのパス、またはメモリ上の画像（PILの画像・RGB順のNumPy配列）
             prompt: プロンプトテキスト
+            page_stats: 出力トークン数とループ検出による節約量を記録するページ統計（省略可）
+            detector: 生成ループの検出器（省略時は検出しない）
+            generation_overrides: generate()に渡すサンプリング設定の上書き
+                （例: {"do_sample": True, "temperature": 0.5}）
+            resolution: 解像度モード（Noneの場合はGundamモード）
             
         Returns:
             OCR結果のテキスト（Markdown形式）
         """
-        image_file = Path(image_path)
-        if not image_file.exists():
+        if is_image_path(image_path) and not Path(image_path).exists():
             raise FileNotFoundError(f"画像ファイルが見つかりません: {image_path}")
+        if self._entry is None:
+            raise RuntimeError("モデルは解放済みです（close()の後は推論できません）")
         
         # DeepSeek-OCRの公式実装では`model.infer()`メソッドを使用
         # infer(self, tokenizer, prompt='', image_file='', output_path='', 
         #       base_size=1024, image_size=640, crop_mode=True, 
         #       test_compress=False, save_results=False)
         if hasattr(self.model, 'infer'):
+            resolution = resolution or RESOLUTION_MODES["gundam"]
+            extra_kwargs = dict(generation_overrides or {})
+            criteria = None
+            if detector is not None:
+                criteria = RepetitionStoppingCriteria(detector, self.tokenizer)
+                extra_kwargs["stopping_criteria"] = StoppingCriteriaList([criteria])
+            
             # 公式の推奨方法：`infer`メソッドを使用
-            result = self.model.infer(
-                self.tokenizer,
-                prompt=prompt,
-                image_file=str(image_path),
-                output_path='',  # 結果を保存しない
-                base_size=1024,
-                image_size=640,
-                crop_mode=True,
-                test_compress=False,
-                save_results=False,
-            )
+            # （モデルは他のインスタンスと共有されているため、推論中はロックする）
+            # inference_modeで勾配の記録とバージョン管理を省く
+            with (
+                self._entry.inference_lock,
+                self._generate_kwargs(extra_kwargs),
+                _inference_mode(),
+                memory_image_file(image_path, self.model) as image_file,
+            ):
+                infer_start = time.perf_counter()
+                result = self.model.infer(
+                    self.tokenizer,
+                    prompt=prompt,
+                    image_file=image_file,
+                    output_path='',  # 結果を保存しない
+                    test_compress=False,
+                    save_results=False,
+                    **resolution.infer_kwargs(),
+                )
+                infer_s = time.perf_counter() - infer_start
+            if page_stats is not None:
+                page_stats.request_s = infer_s
+            
+            if criteria is not None:
+                stopped_early = detector.detected
+                # 生成を打ち切った場合とmax_new_tokensまで生成が続いた場合だけ、
+                # デコード済みの結果全体から改めて繰り返し部分を取り除く
+                detector.reset()
+                trimmed = None
+                if stopped_early or criteria.generated_tokens >= HF_MAX_NEW_TOKENS:
+                    trimmed = trim_repetition(result, detector)
+                if trimmed is not None:
+                    print("警告: 生成ループを検出したため、生成を打ち切りました", file=sys.stderr)
+                    result = trimmed
+                if page_stats is not None and (stopped_early or trimmed is not None):
+                    page_stats.loop_detected = True
+                    if stopped_early:
+                        tokens_saved = max(0, HF_MAX_NEW_TOKENS - criteria.generated_tokens)
+                        page_stats.loop_tokens_saved += tokens_saved
+                        page_stats.loop_seconds_saved += tokens_saved * criteria.seconds_per_token
+            if page_stats is not None:
+                # infer()はトークン数を返さないため、出力を再トークン化して数える
+                page_stats.completion_tokens = len(self.tokenizer.encode(result, add_special_tokens=False))
+                page_stats.max_tokens = HF_MAX_NEW_TOKENS
             return result
         else:
             raise RuntimeError(
@@ -0,0 +1,124 @@
+"""
+メモリ上のページ画像の受け渡し
+
+DeepSeek-OCRのinfer()は画像ファイルのパスしか受け取らず、モデルのリモートコードの
+load_image()でファイルを開きます。PDFの画像変換やKindleのキャプチャで得た画像を
+PNGに書き出して読み直さずに済むよう、load_image()に登録済みの画像を返させ、
+画像の代わりに登録名をinfer()に渡します。
+"""
+
+import itertools
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Union
+
+from PIL import Image
+
+# 画像ファイルのパス、PILの画像、またはNumPy配列（RGB順）
+PageImage = Union[str, Path, Image.Image, Any]
+
+# infer()に渡す登録名の接頭辞（実在するファイルのパスと区別する）
+MEMORY_IMAGE_PREFIX = "pdftexter-memory://"
+
+_memory_images: Dict[str, Image.Image] = {}
+_memory_images_lock = threading.Lock()
+_counter = itertools.count(1)
+
+
+def is_image_path(image: PageImage) -> bool:
+    """
+    画像ファイルのパスか判定する
+
+    Args:
+        image: ページ画像
+
+    Returns:
+        パス（str・Path）の場合True
+    """
+    return isinstance(image, (str, Path))
+
+
+def to_pil_image(image: PageImage) -> Image.Image:
+    """
+    メモリ上のページ画像をPILの画像に変換する
+
+    Args:
+        image: PILの画像、またはNumPy配列（RGB順）
+
+    Returns:
+        PILの画像
+
+    Raises:
+        TypeError: 画像として扱えない型の場合
+    """
+    if isinstance(image, Image.Image):
+        return image
+    if hasattr(image, "__array_interface__"):
+        return Image.fromarray(image)
+    raise TypeError(f"画像ファイルのパス、PILの画像、またはNumPy配列を指定してください: {type(image)}")
+
+
+def _install_loader(module: Any) -> None:
+    """
+    モデルのリモートコードのload_image()を、登録済みの画像を返すものに置き換える（1回だけ）
+
+    Args:
+        module: load_image()を定義しているモジュール
+    """
+    original = module.load_image
+    if getattr(original, "_pdftexter_memory", False):
+        return
+
+    def load_image(image_path: Any) -> Any:
+        with _memory_images_lock:
+            image = _memory_images.get(str(image_path))
+        if image is not None:
+            return image
+        return original(image_path)
+
+    load_image._pdftexter_memory = True
+    module.load_image = load_image
+
+
+@contextmanager
+def memory_image_file(image: PageImage, model: Any) -> Iterator[str]:
+    """
+    ページ画像をinfer()のimage_fileとして渡せる文字列にする
+
+    パスはそのまま返します。メモリ上の画像は、モデルのリモートコードにload_image()が
+    あれば登録名を返し、ない場合（想定外のリモートコード）は一時ファイルに書き出します。
+
+    Args:
+        image: ページ画像
+        model: DeepSeek-OCRのモデル（リモートコードのモジュールの特定に使用）
+
+    Yields:
+        infer()に渡すimage_file
+    """
+    if is_image_path(image):
+        yield str(image)
+        return
+
+    pil_image = to_pil_image(image)
+    module = sys.modules.get(type(model).__module__)
+    if module is None or not callable(getattr(module, "load_image", None)):
+        print("警告: モデルのコードが画像の直接入力に対応していないため、一時ファイルを使用します", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix="pdftexter_page_") as tmpdir:
+            path = Path(tmpdir, "page.png")
+            pil_image.save(path, "PNG", compress_level=1)
+            yield str(path)
+        return
+
+    _install_loader(module)
+    name = f"{MEMORY_IMAGE_PREFIX}{next(_counter)}"
+    with _memory_images_lock:
+        _memory_images[name] = pil_image
+    try:
+        yield name
+    finally:
+        with _memory_images_lock:
+            _memory_images.pop(name, None)
+
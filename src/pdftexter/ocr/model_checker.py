@@ -42,14 +42,20 @@ def check_vllm_server(server_url: str = "http://localhost:8000") -> Tuple[bool,
     vLLMサーバーが起動しているかチェックする
     
     Args:
-        server_url: vLLMサーバーのURL
+        server_url: vLLMサーバーのURL（``http+unix://`` 形式も可）
         
     Returns:
         (起動しているか, メッセージ)のタプル
     """
     try:
         import requests
-        response = requests.get(f"{server_url}/health", timeout=5)
+        from pdftexter.ocr.transport import create_session, is_unix_socket_url
+        
+        if is_unix_socket_url(server_url):
+            with create_session(pool_maxsize=1) as session:
+                response = session.get(f"{server_url.rstrip('/')}/health", timeout=5)
+        else:
+            response = requests.get(f"{server_url}/health", timeout=5)
         if response.status_code == 200:
             return True, "vLLMサーバーは起動しています"
         else:
@@ -110,13 +116,16 @@ def verify_ocr_setup(config_path: Optional[str] = None) -> Tuple[bool, str]:
             print_setup_instructions()
             return False, f"モデルが見つかりません: {model_path}"
         
-        # vLLMサーバーのチェック
-        server_url = config.deepseek_ocr.vllm_server_url or "http://localhost:8000"
-        is_running, message = check_vllm_server(server_url)
-        
-        if not is_running:
+        # vLLMサーバーのチェック（複数のエンドポイントがある場合は1つ以上起動していればよい）
+        results = [
+            check_vllm_server(endpoint.url) for endpoint in config.deepseek_ocr.endpoint_list()
+        ]
+        if not any(is_running for is_running, _ in results):
             print_setup_instructions()
-            return False, message
+            return False, "; ".join(message for _, message in results)
+        for is_running, message in results:
+            if not is_running:
+                print(f"警告: {message}", file=sys.stderr)
         
         return True, "OCRセットアップは完了しています"
         
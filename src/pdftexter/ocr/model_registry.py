@@ -0,0 +1,204 @@
+"""
+HuggingFace版モデルのプロセス内レジストリ
+
+HuggingFace版はDeepSeekOCRを作成するたびにトークナイザーと数GBの重みを読み込み直します。
+（モデルパス, dtype, attention実装, デバイス）をキーに読み込み済みのモデルを保持し、
+同じプロセス内のDeepSeekOCR間で共有します。どこからも参照されなくなったモデルは、
+明示的に解放するか、指定したアイドル時間の経過後に解放します。
+"""
+
+import gc
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# （モデルパス, dtype, attention実装, デバイス）
+ModelKey = Tuple[str, str, str, str]
+
+
+class LoadedModel:
+    """読み込み済みのトークナイザーとモデル"""
+
+    def __init__(self, key: ModelKey, tokenizer: Any, model: Any):
+        """
+        初期化
+
+        Args:
+            key: レジストリのキー
+            tokenizer: トークナイザー
+            model: モデル
+        """
+        self.key = key
+        self.tokenizer = tokenizer
+        self.model = model
+        self.references = 0
+        self.last_released: Optional[float] = None
+        self.idle_timeout: Optional[float] = None
+        # モデルは共有されるため、推論（generateの差し替えを含む）はこのロックの中で行う
+        self.inference_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """読み込み済みモデルの共有・解放を管理するクラス（スレッドセーフ）"""
+
+    def __init__(self):
+        """初期化"""
+        self._models: Dict[ModelKey, LoadedModel] = {}
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._timers: Dict[ModelKey, threading.Timer] = {}
+
+    def acquire(
+        self,
+        key: ModelKey,
+        loader: Callable[[], Tuple[Any, Any]],
+        idle_timeout: Optional[float] = None,
+    ) -> LoadedModel:
+        """
+        モデルを取得する（読み込まれていない場合は読み込む）
+
+        同じキーのモデルを複数のスレッドが同時に要求した場合も、読み込みは1回だけ行います。
+
+        Args:
+            key: （モデルパス, dtype, attention実装, デバイス）
+            loader: （トークナイザー, モデル）を返す読み込み関数
+            idle_timeout: 参照がなくなってから解放するまでの時間（秒、Noneの場合は自動で解放しない）
+
+        Returns:
+            LoadedModelオブジェクト（使い終わったらrelease()を呼ぶこと）
+        """
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._take(entry, idle_timeout)
+                    print(f"読み込み済みのモデルを再利用します: {key[0]}", file=sys.stderr)
+                    return entry
+
+            tokenizer, model = loader()
+            entry = LoadedModel(key, tokenizer, model)
+            with self._lock:
+                self._models[key] = entry
+                self._take(entry, idle_timeout)
+            return entry
+
+    def _take(self, entry: LoadedModel, idle_timeout: Optional[float]) -> None:
+        """参照を増やし、解放の予約を取り消す（ロックを取得した状態で呼ぶこと）"""
+        entry.references += 1
+        entry.idle_timeout = idle_timeout
+        timer = self._timers.pop(entry.key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def release(self, entry: LoadedModel) -> None:
+        """
+        モデルの参照を解放する
+
+        参照がなくなったモデルは、アイドル時間が指定されていればその経過後に解放し、
+        指定されていなければevict()が呼ばれるまで再利用に備えて保持します。
+
+        Args:
+            entry: acquire()が返したLoadedModelオブジェクト
+        """
+        with self._lock:
+            if self._models.get(entry.key) is not entry or entry.references <= 0:
+                return
+            entry.references -= 1
+            if entry.references > 0:
+                return
+            entry.last_released = time.monotonic()
+            if entry.idle_timeout is None:
+                return
+            timer = threading.Timer(entry.idle_timeout, self._evict_if_idle, args=(entry,))
+            timer.daemon = True
+            self._timers[entry.key] = timer
+            timer.start()
+
+    def _evict_if_idle(self, entry: LoadedModel) -> None:
+        """アイドル時間の経過後、まだ参照されていなければモデルを解放する"""
+        with self._lock:
+            if self._models.get(entry.key) is not entry or entry.references > 0:
+                return
+            self._timers.pop(entry.key, None)
+            del self._models[entry.key]
+        print(f"アイドル状態のモデルを解放しました: {entry.key[0]}", file=sys.stderr)
+        _free_memory(entry)
+
+    def evict(self, key: Optional[ModelKey] = None, force: bool = False) -> List[ModelKey]:
+        """
+        モデルを解放する
+
+        Args:
+            key: 解放するモデルのキー（Noneの場合はすべて）
+            force: 参照中のモデルも解放するか（参照中のインスタンスは以後使用できない）
+
+        Returns:
+            解放したモデルのキーのリスト
+        """
+        with self._lock:
+            keys = [key] if key is not None else list(self._models)
+            evicted = []
+            for candidate in keys:
+                entry = self._models.get(candidate)
+                if entry is None or (entry.references > 0 and not force):
+                    continue
+                timer = self._timers.pop(candidate, None)
+                if timer is not None:
+                    timer.cancel()
+                del self._models[candidate]
+                evicted.append(entry)
+        for entry in evicted:
+            _free_memory(entry)
+        return [entry.key for entry in evicted]
+
+    def loaded_keys(self) -> List[ModelKey]:
+        """
+        読み込み済みのモデルのキーを返す
+
+        Returns:
+            キーのリスト
+        """
+        with self._lock:
+            return list(self._models)
+
+
+def _free_memory(entry: LoadedModel) -> None:
+    """解放したモデルのメモリを回収する"""
+    entry.tokenizer = None
+    entry.model = None
+    gc.collect()
+    # torchを読み込んでいない（HuggingFace版を使っていない）場合はインポートしない
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+# プロセス全体で共有するレジストリ
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    プロセス全体で共有するモデルレジストリを返す
+
+    Returns:
+        ModelRegistryオブジェクト
+    """
+    return _registry
+
+
+def release_models(force: bool = False) -> List[ModelKey]:
+    """
+    プロセス全体で共有しているモデルを解放する
+
+    Args:
+        force: 参照中のモデルも解放するか
+
+    Returns:
+        解放したモデルのキーのリスト
+    """
+    return _registry.evict(force=force)
@@ -0,0 +1,175 @@
+"""
+HuggingFace版の前処理の先読み
+
+DeepSeek-OCRのinfer()は、画像の読み込み、タイルへの分割、正規化、トークン化を推論と同じ
+スレッドで行うため、その間は演算が止まります。ページNの推論中に別スレッドでページN+1の
+画像の変換・読み込み（向きの補正、RGBへの変換）とタイルへの分割を済ませておき、
+infer()の中の前処理の時間を短くします。
+
+タイルへの分割はモデルのリモートコードのdynamic_preprocess()を先に呼んで結果を保持し、
+infer()が同じ画像で呼んだときにその結果を返させます（memory_image.pyのload_image()と同じ方式）。
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+from pdftexter.ocr.memory_image import PageImage, is_image_path, to_pil_image
+
+# 先にタイルに分割した結果（内容のキー → dynamic_preprocess()の戻り値）
+_tiles: Dict[Tuple[Any, ...], Any] = {}
+_tiles_lock = threading.Lock()
+# 保持する結果の上限（先読みは1ページ先までのため、使われなかった結果が溜まらないようにする）
+_MAX_CACHED_TILES = 2
+
+
+def load_page_image(image: PageImage) -> Image.Image:
+    """
+    ページ画像を読み込み、向きの補正とRGBへの変換を済ませる
+
+    Args:
+        image: 画像ファイルのパス、またはメモリ上の画像
+
+    Returns:
+        RGBのPILの画像
+    """
+    if is_image_path(image):
+        with Image.open(image) as opened:
+            loaded = ImageOps.exif_transpose(opened)
+            loaded.load()
+    else:
+        loaded = to_pil_image(image)
+    if loaded.mode != "RGB":
+        loaded = loaded.convert("RGB")
+    return loaded
+
+
+def _image_key(image: Image.Image, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    dynamic_preprocess()の呼び出しのキーを作る
+
+    infer()は渡した画像をRGBに変換し直す（別のオブジェクトになる）ため、画像の内容で照合します。
+
+    Args:
+        image: 分割する画像
+        args: 画像以外の位置引数
+        kwargs: キーワード引数
+
+    Returns:
+        キーのタプル
+    """
+    return (image.size, image.mode, hash(image.tobytes()), args, tuple(sorted(kwargs.items())))
+
+
+def _install_tile_cache(module: Any) -> None:
+    """
+    モデルのリモートコードのdynamic_preprocess()を、先に分割した結果を返すものに置き換える（1回だけ）
+
+    Args:
+        module: dynamic_preprocess()を定義しているモジュール
+    """
+    original = module.dynamic_preprocess
+    if getattr(original, "_pdftexter_prefetch", False):
+        return
+
+    def dynamic_preprocess(image: Any, *args: Any, **kwargs: Any) -> Any:
+        if isinstance(image, Image.Image):
+            with _tiles_lock:
+                if _tiles:
+                    cached = _tiles.pop(_image_key(image, args, kwargs), None)
+                    if cached is not None:
+                        return cached
+        return original(image, *args, **kwargs)
+
+    dynamic_preprocess._pdftexter_prefetch = True
+    dynamic_preprocess._pdftexter_original = original
+    module.dynamic_preprocess = dynamic_preprocess
+
+
+def prepare_tiles(image: Image.Image, model: Any) -> bool:
+    """
+    infer()がGundamモードで行うタイルへの分割を先に済ませる
+
+    Args:
+        image: load_page_image()で読み込んだページ画像
+        model: DeepSeek-OCRのモデル（リモートコードのモジュールの特定に使用）
+
+    Returns:
+        分割を済ませた場合True（リモートコードにdynamic_preprocess()がない場合はFalse）
+    """
+    module = sys.modules.get(type(model).__module__)
+    if module is None or not callable(getattr(module, "dynamic_preprocess", None)):
+        return False
+    _install_tile_cache(module)
+    tiles = module.dynamic_preprocess._pdftexter_original(image)
+    with _tiles_lock:
+        while len(_tiles) >= _MAX_CACHED_TILES:
+            _tiles.pop(next(iter(_tiles)))
+        _tiles[_image_key(image, (), {})] = tiles
+    return True
+
+
+class PagePrefetcher:
+    """
+    ページを順に準備し、次のページの準備を現在のページの処理と並行して行う
+
+    準備に失敗したページは準備前のページをそのまま返し、通常の処理の中でエラーにします。
+    """
+
+    def __init__(
+        self,
+        pages: Sequence[PageImage],
+        prepare: Callable[[PageImage], PageImage],
+        start: int = 0,
+    ):
+        """
+        初期化
+
+        Args:
+            pages: ページ画像のシーケンス（PdfPageImagesの場合は参照した時点で画像に変換される）
+            prepare: ページを準備する関数（別スレッドで呼ばれる）
+            start: 最初に返すページのインデックス（それより前のページは参照しない）
+        """
+        self.pages = pages
+        self.prepare = prepare
+        self.start = start
+
+    def _prepare(self, index: int) -> Tuple[PageImage, float]:
+        """
+        1ページを準備する（先読みのスレッドで実行）
+
+        Args:
+            index: ページのインデックス
+
+        Returns:
+            （準備したページ, 準備にかかった時間（秒））
+        """
+        start = time.perf_counter()
+        page = self.pages[index]
+        try:
+            page = self.prepare(page)
+        except Exception as e:
+            print(f"警告: ページ {index + 1} の前処理の先読みに失敗しました: {e}", file=sys.stderr)
+        return page, time.perf_counter() - start
+
+    def __iter__(self) -> Iterator[Tuple[PageImage, float, float]]:
+        """
+        準備したページを順に返す
+
+        Yields:
+            （準備したページ, 準備にかかった時間（秒）, 準備の完了を待った時間（秒））
+        """
+        if self.start >= len(self.pages):
+            return
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdftexter-prefetch") as executor:
+            future: Optional[Any] = executor.submit(self._prepare, self.start)
+            for index in range(self.start, len(self.pages)):
+                wait_start = time.perf_counter()
+                page, preprocess_s = future.result()
+                wait_s = time.perf_counter() - wait_start
+                future = executor.submit(self._prepare, index + 1) if index + 1 < len(self.pages) else None
+                yield page, preprocess_s, wait_s
@@ -0,0 +1,117 @@
+"""
+HuggingFace版のCPU推論向けの動的int8量子化
+
+言語モデル部分のLinear層の重みをint8に量子化し（活性は推論時に動的に量子化）、
+重みのメモリと行列積の時間を削減します。視覚エンコーダー（SAM・CLIP）とプロジェクターは
+量子化による精度低下が大きく、計算量に占める割合も小さいためfloat32のまま残します。
+量子化したモデルはディスクにキャッシュし、次回からは量子化済みのモデルを直接読み込みます。
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Any, Optional, Set
+
+QUANTIZATION_MODES = ("int8-dynamic",)
+
+# 量子化しないDeepSeek-OCRのモジュール（視覚エンコーダーとプロジェクター）
+VISION_MODULE_NAMES = ("sam_model", "vision_model", "projector")
+
+# フィンガープリントに含めるモデルフォルダのファイル（重み・設定・リモートコード）
+_FINGERPRINT_SUFFIXES = (".json", ".safetensors", ".bin", ".py")
+
+
+def default_quantization_cache_dir() -> Path:
+    """
+    量子化済みモデルの既定のキャッシュフォルダを返す
+
+    Returns:
+        ~/.cache/pdftexter/quantized
+    """
+    return Path.home() / ".cache" / "pdftexter" / "quantized"
+
+
+def model_fingerprint(model_path: str, mode: str, torch_version: str) -> str:
+    """
+    量子化済みモデルのキャッシュの識別子を計算する
+
+    モデルフォルダのファイル（名前・サイズ・更新時刻）、量子化方式、torchのバージョンから計算し、
+    モデルの更新やtorchの更新（量子化済みの重みの形式が変わり得る）でキャッシュを無効にします。
+
+    Args:
+        model_path: モデルのパス（HuggingFaceモデルIDの場合はIDのみを使用）
+        mode: 量子化方式
+        torch_version: torchのバージョン
+
+    Returns:
+        16桁の16進文字列
+    """
+    digest = hashlib.sha256(f"{mode}\0{torch_version}\0".encode("utf-8"))
+    model_dir = Path(model_path)
+    if model_dir.is_dir():
+        digest.update(str(model_dir.resolve()).encode("utf-8"))
+        for path in sorted(model_dir.iterdir()):
+            if path.is_file() and path.suffix in _FINGERPRINT_SUFFIXES:
+                stat = path.stat()
+                digest.update(f"\0{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8"))
+    else:
+        digest.update(model_path.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def quantized_cache_path(
+    model_path: str, mode: str, torch_version: str, cache_dir: Optional[str] = None
+) -> Path:
+    """
+    量子化済みモデルのキャッシュファイルのパスを返す
+
+    Args:
+        model_path: モデルのパス
+        mode: 量子化方式
+        torch_version: torchのバージョン
+        cache_dir: キャッシュフォルダ（Noneの場合は既定のフォルダ）
+
+    Returns:
+        キャッシュファイルのパス
+    """
+    name = Path(model_path.rstrip("/\\")).name or "model"
+    fingerprint = model_fingerprint(model_path, mode, torch_version)
+    return Path(cache_dir or default_quantization_cache_dir()) / f"{name}-{mode}-{fingerprint}.pt"
+
+
+def language_linear_names(model: Any, linear_type: type) -> Set[str]:
+    """
+    量子化の対象にする言語モデル部分のLinear層の名前を返す
+
+    Args:
+        model: モデル（named_modules()を持つオブジェクト）
+        linear_type: Linear層のクラス（torch.nn.Linear）
+
+    Returns:
+        モジュール名の集合
+    """
+    names = set()
+    for name, module in model.named_modules():
+        if not isinstance(module, linear_type):
+            continue
+        if any(part in VISION_MODULE_NAMES for part in name.split(".")):
+            continue
+        names.add(name)
+    return names
+
+
+def quantize_language_model(model: Any, torch: Any) -> Set[str]:
+    """
+    言語モデル部分のLinear層を動的int8量子化する（モデルをその場で書き換える）
+
+    Args:
+        model: float32のモデル
+        torch: torchモジュール
+
+    Returns:
+        量子化したモジュール名の集合
+    """
+    names = language_linear_names(model, torch.nn.Linear)
+    # inplace=Trueでコピーを作らずに置き換え、量子化中のピークメモリを抑える
+    torch.ao.quantization.quantize_dynamic(model, names, dtype=torch.qint8, inplace=True)
+    return names
+
@@ -0,0 +1,232 @@
+"""
+生成ループ（繰り返し出力）検出モジュール
+
+DeepSeek-OCRは表やリーダー罫（……）で同じ行やパターンを延々と出力し続けることがあり、
+その場合はmax_tokensまで生成が止まりません。生成途中のテキストを逐次監視し、
+ループを検出した時点で生成を打ち切れるようにします。
+"""
+
+from typing import Optional
+
+
+class RepetitionDetector:
+    """
+    生成途中のテキストからループを検出するクラス
+
+    次の2種類の繰り返しを監視します。
+
+    - 同一行の連続（空行を除く。表の空行・区切り行やリーダー罫のように文字を含まない
+      構造的な行は、本来の内容でも連続しやすいため別の回数で判定する）
+    - 末尾の周期パターン（直近の文字n-gramが隙間なく繰り返されている状態。改行を含まない
+      リーダー罫や、複数行にまたがる繰り返しも検出できる）
+    """
+
+    def __init__(
+        self,
+        max_repeated_lines: int = 10,
+        max_repeated_structural_lines: int = 50,
+        min_repeat_chars: int = 512,
+        min_repeats: int = 6,
+        max_period: int = 256,
+        check_interval: int = 64,
+    ):
+        """
+        初期化
+
+        Args:
+            max_repeated_lines: 同一行がこの回数連続したらループとみなす
+            max_repeated_structural_lines: 構造的な行（文字を含まない行）がこの回数連続したら
+                ループとみなす。周期パターンが構造的な場合も、この回数以上の繰り返しを必要とする
+            min_repeat_chars: 周期パターンの繰り返し部分がこの文字数以上になったらループとみなす
+            min_repeats: 周期パターンとみなす最小の繰り返し回数
+            max_period: 検出する周期パターンの最大長（文字数）
+            check_interval: 周期パターンを検査する間隔（追加された文字数）
+        """
+        self.max_repeated_lines = max_repeated_lines
+        self.max_repeated_structural_lines = max_repeated_structural_lines
+        self.min_repeat_chars = min_repeat_chars
+        self.min_repeats = min_repeats
+        self.max_period = max_period
+        self.check_interval = check_interval
+
+        self.reset()
+
+    def reset(self) -> None:
+        """検出状態を初期化する（リトライで生成をやり直す場合に使用）"""
+        self.text = ""
+        self.detected = False
+        self.loop_start: Optional[int] = None
+
+        self._line_start = 0
+        self._last_line: Optional[str] = None
+        self._repeat_count = 0
+        self._repeat_start = 0
+        self._since_check = 0
+
+    def spawn(self) -> "RepetitionDetector":
+        """
+        同じ設定の新しい検出器を作成する（並行する別の試行用）
+
+        Returns:
+            RepetitionDetectorオブジェクト
+        """
+        return RepetitionDetector(
+            max_repeated_lines=self.max_repeated_lines,
+            max_repeated_structural_lines=self.max_repeated_structural_lines,
+            min_repeat_chars=self.min_repeat_chars,
+            min_repeats=self.min_repeats,
+            max_period=self.max_period,
+            check_interval=self.check_interval,
+        )
+
+    def load_state(self, other: "RepetitionDetector") -> None:
+        """
+        別の検出器の状態を引き継ぐ（並行した試行のうち採用した方の結果を反映する）
+
+        Args:
+            other: 状態を引き継ぐ検出器
+        """
+        self.__dict__.update(other.__dict__)
+
+    def feed(self, piece: str) -> bool:
+        """
+        生成されたテキスト片を追加する
+
+        Args:
+            piece: テキスト片
+
+        Returns:
+            ループを検出した場合True（以降の追加は無視される）
+        """
+        if self.detected or not piece:
+            return self.detected
+
+        offset = len(self.text)
+        self.text += piece
+
+        # 完成した行ごとに同一行の連続を数える
+        search_from = offset
+        while True:
+            newline = self.text.find("\n", search_from)
+            if newline < 0:
+                break
+            self._on_line(self._line_start, newline)
+            self._line_start = newline + 1
+            search_from = newline + 1
+            if self.detected:
+                return True
+
+        self._since_check += len(piece)
+        if self._since_check >= self.check_interval:
+            self._since_check = 0
+            self._check_periodic_tail()
+
+        return self.detected
+
+    def _on_line(self, start: int, end: int) -> None:
+        """1行分のテキストが確定したときの処理"""
+        line = self.text[start:end].strip()
+        if not line:
+            return
+        if line == self._last_line:
+            self._repeat_count += 1
+        else:
+            self._last_line = line
+            self._repeat_count = 1
+            self._repeat_start = start
+        threshold = self.max_repeated_structural_lines if is_structural(line) else self.max_repeated_lines
+        if self._repeat_count >= threshold:
+            # 最初の1行は残し、2回目以降を繰り返し部分とする
+            first_end = self.text.find("\n", self._repeat_start)
+            self._mark_detected(first_end + 1 if first_end >= 0 else end)
+
+    def _check_periodic_tail(self) -> None:
+        """末尾が周期パターンの繰り返しになっていないか検査する"""
+        text = self.text
+        length = len(text)
+        window = max(self.min_repeat_chars, self.max_period * self.min_repeats)
+        if length < self.min_repeat_chars:
+            return
+        for period in range(1, min(self.max_period, length // self.min_repeats) + 1):
+            unit = text[length - period:]
+            # 末尾から周期periodで一致する範囲を求める
+            repeats = 1
+            pos = length - period
+            limit = max(0, length - window - period)
+            while pos - period >= limit and text[pos - period:pos] == unit:
+                repeats += 1
+                pos -= period
+            repeated_chars = repeats * period
+            min_repeats = self.min_repeats
+            if is_structural(unit):
+                min_repeats = max(min_repeats, self.max_repeated_structural_lines)
+            if repeats >= min_repeats and repeated_chars >= self.min_repeat_chars:
+                # 検査範囲より前から続いている繰り返しも含めて開始位置を求める
+                while pos - period >= 0 and text[pos - period:pos] == unit:
+                    pos -= period
+                # 周期の途中から始まっている分も1文字ずつ遡る
+                while pos > 0 and text[pos - 1] == text[pos - 1 + period]:
+                    pos -= 1
+                # 繰り返しの最初の1周期分は残す（複数行のパターンは行末まで）
+                loop_start = pos + period
+                if "\n" in unit:
+                    loop_start = text.index("\n", loop_start - 1) + 1
+                self._mark_detected(loop_start)
+                return
+
+    def finish(self) -> bool:
+        """
+        生成の終了時に、未検査の末尾を含めて周期パターンを検査する
+
+        Returns:
+            ループを検出した場合True
+        """
+        if not self.detected:
+            self._check_periodic_tail()
+        return self.detected
+
+    def _mark_detected(self, loop_start: int) -> None:
+        """ループ検出を記録する"""
+        self.detected = True
+        self.loop_start = loop_start
+
+    @property
+    def prefix(self) -> str:
+        """繰り返し部分を除いたテキスト（未検出の場合は全体）"""
+        if self.loop_start is None:
+            return self.text
+        return self.text[:self.loop_start]
+
+
+def is_structural(text: str) -> bool:
+    """
+    文字（英数字・かな・漢字など）を含まない構造的なテキストか判定する
+
+    表の空行（| | |）や区切り行（|---|）、リーダー罫（……）が該当します。
+
+    Args:
+        text: 判定するテキスト
+
+    Returns:
+        構造的なテキストの場合True
+    """
+    return not any(ch.isalnum() for ch in text)
+
+
+def trim_repetition(text: str, detector: Optional[RepetitionDetector] = None) -> Optional[str]:
+    """
+    生成済みのテキストからループ部分を取り除く
+
+    Args:
+        text: 生成済みのテキスト
+        detector: 使用する検出器（Noneの場合はデフォルト設定）
+
+    Returns:
+        ループを検出した場合は繰り返し部分を除いたテキスト、検出しなかった場合はNone
+    """
+    detector = detector or RepetitionDetector()
+    # 行単位の検出と周期検査の両方が働くよう、行ごとに追加する
+    for line in text.splitlines(keepends=True):
+        if detector.feed(line):
+            return detector.prefix
+    return detector.prefix if detector.finish() else None
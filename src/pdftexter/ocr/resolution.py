@@ -0,0 +1,190 @@
+"""
+DeepSeek-OCRの解像度モード
+
+DeepSeek-OCRは入力画像の解像度（視覚トークン数）の異なるモードを持ちます。
+
+| モード | base_size | image_size | crop_mode | 視覚トークン数 |
+|--------|-----------|------------|-----------|----------------|
+| tiny   | 512       | 512        | False     | 64             |
+| small  | 640       | 640        | False     | 100            |
+| base   | 1024      | 1024       | False     | 256            |
+| large  | 1280      | 1280       | False     | 400            |
+| gundam | 1024      | 640        | True      | 256 + 640pxタイルごとに100 |
+
+文字の大きい小説などのページは小さいモードでも正しく読めることが多く、
+"auto"ではページの大きさと文字の密度（インク量）からページごとにモードを選びます。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from pdftexter.ocr.memory_image import PageImage, is_image_path, to_pil_image
+from pdftexter.ocr.token_budget import INK_SAMPLE_WIDTH, INK_THRESHOLD
+
+RESOLUTION_MODE_NAMES = ("tiny", "small", "base", "large", "gundam", "auto")
+
+# vLLM版のDeepSeek-OCRはGundamモード固定で前処理し、長辺がこの大きさを超える画像をタイルに分割する
+GUNDAM_TILE_SIZE = 640
+
+# "auto"の選択基準（インク率: 幅256pxに縮小したページ画像で暗い画素が占める割合）
+AUTO_TINY_MAX_INK_RATIO = 0.005  # ほぼ白紙のページ
+AUTO_SMALL_MAX_INK_RATIO = 0.06  # 文字の大きいページ（小説など）
+AUTO_BASE_MAX_INK_RATIO = 0.12  # 一般的な文書のページ
+# 縦横比がこれを超える細長いページは、正方形に縮小すると文字が潰れるためタイルに分割する
+AUTO_MAX_ASPECT_RATIO = 2.0
+
+
+class ResolutionMode:
+    """DeepSeek-OCRの解像度モード"""
+
+    def __init__(self, name: str, base_size: int, image_size: int, crop_mode: bool):
+        """
+        初期化
+
+        Args:
+            name: モード名
+            base_size: 全体画像（グローバルビュー）の大きさ
+            image_size: タイルの大きさ（crop_modeがFalseの場合はbase_sizeと同じ）
+            crop_mode: 画像をタイルに分割するか
+        """
+        self.name = name
+        self.base_size = base_size
+        self.image_size = image_size
+        self.crop_mode = crop_mode
+
+    @property
+    def upload_long_edge(self) -> Optional[int]:
+        """
+        vLLM版で送信する画像の長辺の最大ピクセル数（Noneの場合は縮小しない）
+
+        vLLM版のサーバーはGundamモード固定のため、タイルに分割させない大きさ
+        （長辺640px以下）に縮小して送ることで、同じ視覚トークン数に近づけます。
+        """
+        if self.crop_mode:
+            return None
+        return min(self.base_size, GUNDAM_TILE_SIZE)
+
+    def infer_kwargs(self) -> Dict[str, Any]:
+        """
+        HuggingFace版のinfer()に渡す解像度の引数を返す
+
+        Returns:
+            base_size, image_size, crop_mode の辞書
+        """
+        return {"base_size": self.base_size, "image_size": self.image_size, "crop_mode": self.crop_mode}
+
+    def __repr__(self) -> str:
+        return f"ResolutionMode({self.name!r})"
+
+
+RESOLUTION_MODES = {
+    "tiny": ResolutionMode("tiny", 512, 512, False),
+    "small": ResolutionMode("small", 640, 640, False),
+    "base": ResolutionMode("base", 1024, 1024, False),
+    "large": ResolutionMode("large", 1280, 1280, False),
+    "gundam": ResolutionMode("gundam", 1024, 640, True),
+}
+
+# 小さいものから順に並べたモード（"auto"で使用）
+_MODES_BY_SIZE = ("tiny", "small", "base", "large")
+
+
+def _measure_image(image: Image.Image) -> Tuple[Tuple[int, int], float]:
+    """
+    PILの画像の大きさとインク率を計測する
+
+    Args:
+        image: ページ画像
+
+    Returns:
+        （（幅, 高さ）, インク率）のタプル
+    """
+    gray = image.convert("L")
+    if gray.width > INK_SAMPLE_WIDTH:
+        height = max(1, round(gray.height * INK_SAMPLE_WIDTH / gray.width))
+        gray = gray.resize((INK_SAMPLE_WIDTH, height), Image.Resampling.BILINEAR)
+    ink = sum(gray.histogram()[:INK_THRESHOLD])
+    pixels = gray.width * gray.height
+    return image.size, ink / pixels if pixels else 0.0
+
+
+def measure_page(image: PageImage) -> Optional[Tuple[Tuple[int, int], float]]:
+    """
+    ページ画像の大きさとインク率を計測する
+
+    Args:
+        image: 画像ファイルのパス、またはメモリ上の画像
+
+    Returns:
+        （（幅, 高さ）, インク率）のタプル（画像を読み込めない場合はNone）
+    """
+    if not is_image_path(image):
+        return _measure_image(to_pil_image(image))
+    try:
+        with Image.open(image) as opened:
+            return _measure_image(opened)
+    except OSError:
+        return None
+
+
+def choose_resolution_mode(size: Tuple[int, int], ink_ratio: float) -> ResolutionMode:
+    """
+    ページの大きさとインク率から解像度モードを選ぶ
+
+    インク率が高い（文字が密な）ページほど大きいモードを選び、細長いページと
+    Baseモードでも足りない密度のページはGundamモードにします。ただし、画像の長辺を
+    超える大きさのモードは拡大するだけで精度に寄与しないため選びません。
+
+    Args:
+        size: ページ画像の大きさ（幅, 高さ）
+        ink_ratio: インク率（0-1）
+
+    Returns:
+        ResolutionModeオブジェクト
+    """
+    width, height = size
+    long_edge = max(width, height)
+    if min(width, height) and long_edge / min(width, height) > AUTO_MAX_ASPECT_RATIO:
+        return RESOLUTION_MODES["gundam"]
+
+    if ink_ratio <= AUTO_TINY_MAX_INK_RATIO:
+        name = "tiny"
+    elif ink_ratio <= AUTO_SMALL_MAX_INK_RATIO:
+        name = "small"
+    elif ink_ratio <= AUTO_BASE_MAX_INK_RATIO:
+        name = "base"
+    else:
+        name = "gundam"
+
+    # 画像の長辺が収まる最小のモードより大きいモードは選ばない
+    for smaller in _MODES_BY_SIZE:
+        if long_edge <= RESOLUTION_MODES[smaller].base_size:
+            if name == "gundam" or _MODES_BY_SIZE.index(smaller) < _MODES_BY_SIZE.index(name):
+                name = smaller
+            break
+    return RESOLUTION_MODES[name]
+
+
+def resolve_resolution_mode(mode: str, image_path: PageImage) -> ResolutionMode:
+    """
+    設定の解像度モードをページに適用するモードに変換する
+
+    Args:
+        mode: 設定の解像度モード（"tiny", "small", "base", "large", "gundam", "auto"）
+        image_path: ページ画像のパスまたはメモリ上の画像（"auto"の場合に計測する）
+
+    Returns:
+        ResolutionModeオブジェクト（"auto"で画像を計測できない場合はGundamモード）
+
+    Raises:
+        ValueError: モード名が不正な場合
+    """
+    if mode not in RESOLUTION_MODE_NAMES:
+        raise ValueError(f"resolution mode must be one of {RESOLUTION_MODE_NAMES}: {mode}")
+    if mode != "auto":
+        return RESOLUTION_MODES[mode]
+    measured = measure_page(image_path)
+    if measured is None:
+        return RESOLUTION_MODES["gundam"]
+    return choose_resolution_mode(*measured)
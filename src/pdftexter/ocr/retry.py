@@ -0,0 +1,165 @@
+"""
+vLLM API呼び出しのリトライポリシーモジュール
+
+指数バックオフ（フルジッター）、Retry-Afterヘッダーの尊重、
+リトライ不可能なエラーの判定、ドキュメント単位のリトライ予算を提供します。
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+# リトライしても結果が変わらない4xxのうち、例外的に再試行するステータス
+RETRYABLE_CLIENT_STATUSES = (408, 425, 429)
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """
+    Retry-Afterヘッダーの値を秒数に変換する
+
+    Args:
+        value: ヘッダーの値（秒数またはHTTP日付）
+
+    Returns:
+        待機秒数（解釈できない場合はNone）
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryBudget:
+    """ドキュメント単位のリトライ予算（スレッドセーフ）"""
+
+    def __init__(self, max_retries: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            max_retries: ドキュメント全体で許可するリトライ回数（Noneの場合は無制限）
+        """
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """
+        リトライ1回分の予算を消費する
+
+        Returns:
+            予算が残っていた場合True
+        """
+        with self._lock:
+            if self.max_retries is not None and self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+    @property
+    def exhausted(self) -> bool:
+        """予算を使い切ったか"""
+        return self.max_retries is not None and self.used >= self.max_retries
+
+
+class RetryPolicy:
+    """
+    リトライポリシー
+
+    サーバー過負荷時に全ワーカーが同じタイミングで再送しないよう、
+    待機時間は [0, min(max_delay, base_delay * 2^attempt)] の一様乱数（フルジッター）にします。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 5.0,
+        max_delay: float = 60.0,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            max_attempts: 最大試行回数（初回を含む）
+            base_delay: バックオフの基準待機時間（秒）
+            max_delay: 待機時間の上限（秒）
+            rng: 乱数生成器（テスト用）
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    @staticmethod
+    def is_retryable_status(status_code: int) -> bool:
+        """
+        HTTPステータスコードがリトライ可能か判定する
+
+        Args:
+            status_code: HTTPステータスコード
+
+        Returns:
+            リトライ可能な場合True（5xx、408、425、429）
+        """
+        return status_code >= 500 or status_code in RETRYABLE_CLIENT_STATUSES
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        フルジッター付きの指数バックオフ待機時間を計算する
+
+        Args:
+            attempt: 失敗した試行の番号（0始まり）
+
+        Returns:
+            待機秒数
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return self._rng.uniform(0, ceiling)
+
+    def next_delay(
+        self,
+        attempt: int,
+        response: Optional[Any] = None,
+        budget: Optional[RetryBudget] = None,
+    ) -> Optional[float]:
+        """
+        失敗した試行の次の待機時間を決定する
+
+        Args:
+            attempt: 失敗した試行の番号（0始まり）
+            response: エラーレスポンス（接続エラー・タイムアウトの場合はNone）
+            budget: ドキュメント単位のリトライ予算
+
+        Returns:
+            待機秒数（リトライしない場合はNone）
+        """
+        if attempt + 1 >= self.max_attempts:
+            return None
+
+        retry_after = None
+        status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int):
+            if not self.is_retryable_status(status_code):
+                return None
+            if status_code in (429, 503):
+                headers = getattr(response, "headers", None) or {}
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+
+        if budget is not None and not budget.try_acquire():
+            return None
+
+        if retry_after is not None:
+            # 同じRetry-Afterを受け取った複数ワーカーが同時に再送しないよう少しずらす
+            return min(self.max_delay, retry_after) + self._rng.uniform(0, self.base_delay)
+        return self.backoff_delay(attempt)
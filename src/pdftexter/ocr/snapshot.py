@@ -0,0 +1,88 @@
+"""
+HuggingFace版の準備済みモデルのスナップショット
+
+from_pretrained()は読み込みのたびに、モデルのリモートコードのインポート、重みの読み込み、
+初期化、dtypeの変換を行い、ページ数の少ないドキュメントでは処理時間の大半を占めます。
+初回の読み込み後にdtypeの変換（と量子化）を済ませたモデルを保存し、次回からは
+mmapで読み込むことで、変換と重みのコピーを省きます。mmapした重みは使われた部分だけが
+ディスクから読まれ、同じファイルを読み込んだプロセス間ではページキャッシュを共有します。
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from pdftexter.ocr.quantization import model_fingerprint
+
+
+def default_snapshot_dir() -> Path:
+    """
+    準備済みモデルの既定の保存フォルダを返す
+
+    Returns:
+        ~/.cache/pdftexter/prepared
+    """
+    return Path.home() / ".cache" / "pdftexter" / "prepared"
+
+
+def snapshot_path(
+    model_path: str, dtype: str, library_versions: str, snapshot_dir: Optional[str] = None
+) -> Path:
+    """
+    準備済みモデルのファイルのパスを返す
+
+    保存したモデルはtorchとtransformersのクラスを参照するため、どちらかを更新すると
+    別のファイルになるよう、バージョンを識別子に含めます。
+
+    Args:
+        model_path: モデルのパス
+        dtype: 変換後のdtype
+        library_versions: torch・transformersのバージョンを表す文字列
+        snapshot_dir: 保存フォルダ（Noneの場合は既定のフォルダ）
+
+    Returns:
+        準備済みモデルのファイルのパス
+    """
+    name = Path(model_path.rstrip("/\\")).name or "model"
+    fingerprint = model_fingerprint(model_path, dtype, library_versions)
+    return Path(snapshot_dir or default_snapshot_dir()) / f"{name}-{dtype}-{fingerprint}.pt"
+
+
+def save_prepared_model(model: Any, path: Path, torch: Any) -> None:
+    """
+    変換（量子化）済みのモデルを保存する
+
+    量子化済みのLinear層はsave_pretrained()で保存できないため、モデル全体をtorch.saveで保存します。
+    途中で中断しても壊れたファイルが残らないよう、一時ファイルに書き込んでから置き換えます。
+
+    Args:
+        model: 変換済みのモデル
+        path: 保存先のパス
+        torch: torchモジュール
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def load_prepared_model(path: Path, torch: Any) -> Any:
+    """
+    保存した準備済みモデルをmmapで読み込む
+
+    モデルのクラスはリモートコードで定義されているため、事前にリモートコードを
+    インポートしておく必要があります。
+
+    Args:
+        path: 準備済みモデルのファイルのパス
+        torch: torchモジュール
+
+    Returns:
+        準備済みのモデル
+    """
+    # 自分で作成したファイルのみを読み込むため、モデル全体の復元（weights_only=False）を許可する
+    return torch.load(path, mmap=True, weights_only=False).eval()
@@ -0,0 +1,394 @@
+"""
+OCR実行統計モジュール
+
+ページ単位の計測値（PageStats）と、実行全体の集計（RunStats）を管理します。
+"""
+
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    パーセンタイル値を計算する（最近傍法）
+
+    Args:
+        values: 計測値のリスト
+        q: パーセンタイル（0-100）
+
+    Returns:
+        パーセンタイル値（空の場合は0.0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class PageStats:
+    """1ページ分のOCR処理の計測値"""
+
+    def __init__(self, page_num: int = 0):
+        """
+        初期化
+
+        Args:
+            page_num: ページ番号（1始まり、画像単体の処理では0）
+        """
+        self.page_num = page_num
+        self.document: Optional[str] = None  # 処理中のドキュメント名（バッチ処理での集計用）
+
+        # アップロード前処理（vLLM版のみ）
+        self.upload_mode: Optional[str] = None
+        self.original_bytes: Optional[int] = None
+        self.upload_bytes: Optional[int] = None
+        self.upload_size: Optional[tuple] = None
+        self.resolution_mode: Optional[str] = None  # 使用した解像度モード（"small", "gundam"など）
+
+        # リトライ・エンドポイント
+        self.retries = 0
+        self.retry_wait_s = 0.0
+        self.endpoint: Optional[str] = None  # 最後にリクエストを送ったエンドポイント
+        self.failovers = 0  # 別のエンドポイントへ再送した回数
+        self.hedged = False  # ヘッジリクエストを送ったか
+        self.hedge_won = False  # ヘッジの方が先に完了したか
+
+        # 処理期限と縮退
+        self.deadline_s: Optional[float] = None  # 最初の段に設定した処理期限
+        self.deadline_misses = 0  # 期限を超えて次の段へ縮退した回数
+        self.degradation: Optional[str] = None  # 結果を生成した段（"full"は縮退なし）
+
+        # レイテンシ
+        self.latency_s: Optional[float] = None  # ページ全体（リトライ待機を含む）
+        self.request_s: Optional[float] = None  # 成功したリクエスト1回分
+        self.preprocess_s: Optional[float] = None  # 先読みした前処理（HuggingFace版のみ）
+        self.prefetch_wait_s: Optional[float] = None  # 先読みした前処理の完了を待った時間
+
+        # ストリーミング（vLLM版のstream有効時のみ）
+        self.ttft_s: Optional[float] = None
+        self.itl_mean_s: Optional[float] = None
+        self.itl_p95_s: Optional[float] = None
+        self.stream_chunks = 0
+
+        # トークン使用量（サーバーが報告した値）
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.finish_reason: Optional[str] = None  # "stop", "length"（max_tokensで打ち切り）など
+        self.max_tokens: Optional[int] = None  # リクエストしたmax_tokens
+        self.token_budget: Optional[int] = None  # 見積もったmax_tokens（適応制御の有効時）
+        self.budget_retries = 0  # 打ち切られて予算を増やして再試行した回数
+        self.server_prompt_s: Optional[float] = None  # サーバーが報告したプレフィル時間
+        self.server_generation_s: Optional[float] = None  # サーバーが報告した生成時間
+
+        # 生成ループの検出
+        self.loop_detected = False
+        self.loop_retried = False
+        self.loop_tokens_saved = 0  # 打ち切りにより生成せずに済んだトークン数（推定）
+        self.loop_seconds_saved = 0.0  # 打ち切りにより短縮できた時間（推定）
+
+    def update_from(self, other: "PageStats") -> None:
+        """
+        別の試行（ヘッジなど）で記録した計測値を取り込む
+
+        Args:
+            other: 取り込む計測値（page_num, document, latency_sは取り込まない）
+        """
+        for key, value in vars(other).items():
+            if key not in ("page_num", "document", "latency_s"):
+                setattr(self, key, value)
+
+    @property
+    def bytes_saved(self) -> int:
+        """アップロード前処理で削減できたバイト数（負の値は増加）"""
+        if self.original_bytes is None or self.upload_bytes is None:
+            return 0
+        return self.original_bytes - self.upload_bytes
+
+    @property
+    def truncated(self) -> bool:
+        """max_tokensに達して生成が打ち切られたか"""
+        return self.finish_reason == "length"
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """出力トークンの生成速度（サーバーの生成時間がない場合はリクエスト時間から計算）"""
+        seconds = self.server_generation_s or self.request_s
+        if not self.completion_tokens or not seconds:
+            return None
+        return self.completion_tokens / seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        辞書形式に変換する
+
+        Returns:
+            計測値の辞書
+        """
+        return {
+            "document": self.document,
+            "page": self.page_num,
+            "upload_mode": self.upload_mode,
+            "original_bytes": self.original_bytes,
+            "upload_bytes": self.upload_bytes,
+            "bytes_saved": self.bytes_saved,
+            "resolution_mode": self.resolution_mode,
+            "retries": self.retries,
+            "retry_wait_s": round(self.retry_wait_s, 3),
+            "endpoint": self.endpoint,
+            "failovers": self.failovers,
+            "hedged": self.hedged,
+            "hedge_won": self.hedge_won,
+            "deadline_s": self.deadline_s,
+            "deadline_misses": self.deadline_misses,
+            "degradation": self.degradation,
+            "latency_s": self.latency_s,
+            "request_s": self.request_s,
+            "preprocess_s": self.preprocess_s,
+            "prefetch_wait_s": self.prefetch_wait_s,
+            "ttft_s": self.ttft_s,
+            "itl_mean_s": self.itl_mean_s,
+            "itl_p95_s": self.itl_p95_s,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "finish_reason": self.finish_reason,
+            "max_tokens": self.max_tokens,
+            "token_budget": self.token_budget,
+            "budget_retries": self.budget_retries,
+            "server_prompt_s": self.server_prompt_s,
+            "server_generation_s": self.server_generation_s,
+            "loop_detected": self.loop_detected,
+            "loop_retried": self.loop_retried,
+            "loop_tokens_saved": self.loop_tokens_saved,
+            "loop_seconds_saved": round(self.loop_seconds_saved, 3),
+        }
+
+
+class RunStats:
+    """実行全体（1ドキュメントまたはバッチ）の統計"""
+
+    def __init__(self):
+        """初期化"""
+        self.pages: List[PageStats] = []
+        self._lock = threading.Lock()
+        self._summary_sources: List[Callable[[], List[str]]] = []
+
+    def add_page(self, page_stats: PageStats) -> None:
+        """
+        ページの計測値を追加する（スレッドセーフ）
+
+        Args:
+            page_stats: ページの計測値
+        """
+        with self._lock:
+            self.pages.append(page_stats)
+
+    def add_summary_source(self, source: Callable[[], List[str]]) -> None:
+        """
+        サマリーに追加する行の取得元を登録する（エンドポイントごとの集計など）
+
+        Args:
+            source: サマリーの各行を返す呼び出し
+        """
+        self._summary_sources.append(source)
+
+    @property
+    def total_bytes_saved(self) -> int:
+        """アップロード前処理で削減できた合計バイト数"""
+        return sum(p.bytes_saved for p in self.pages)
+
+    def summary_lines(self) -> List[str]:
+        """
+        実行サマリーを表示用の行リストとして返す
+
+        Returns:
+            サマリーの各行
+        """
+        lines = [f"処理ページ数: {len(self.pages)}"]
+
+        latencies = [p.latency_s for p in self.pages if p.latency_s is not None]
+        if latencies:
+            lines.append(
+                f"ページ処理時間: p50 {percentile(latencies, 50):.2f}秒, "
+                f"p95 {percentile(latencies, 95):.2f}秒, 最大 {max(latencies):.2f}秒"
+            )
+
+        ttfts = [p.ttft_s for p in self.pages if p.ttft_s is not None]
+        if ttfts:
+            itls = [p.itl_mean_s for p in self.pages if p.itl_mean_s is not None]
+            itl_text = f", トークン間 平均 {sum(itls) / len(itls) * 1000:.1f}ms" if itls else ""
+            lines.append(
+                f"TTFT: p50 {percentile(ttfts, 50):.2f}秒, p95 {percentile(ttfts, 95):.2f}秒"
+                f"{itl_text}"
+            )
+
+        uploaded = [p for p in self.pages if p.upload_bytes is not None]
+        if uploaded:
+            original = sum(p.original_bytes or 0 for p in uploaded)
+            sent = sum(p.upload_bytes or 0 for p in uploaded)
+            ratio = (sent / original * 100) if original else 100.0
+            file_pages = sum(1 for p in uploaded if p.upload_mode == "file")
+            if file_pages:
+                lines.append(f"file:// 参照で送信したページ: {file_pages}/{len(uploaded)}")
+            lines.append(
+                f"アップロード: {sent / 1024 / 1024:.2f} MB "
+                f"(元画像 {original / 1024 / 1024:.2f} MB, {ratio:.1f}%, "
+                f"削減 {self.total_bytes_saved / 1024 / 1024:.2f} MB)"
+            )
+
+        modes: Dict[str, int] = {}
+        for p in self.pages:
+            if p.resolution_mode is not None:
+                modes[p.resolution_mode] = modes.get(p.resolution_mode, 0) + 1
+        if modes and set(modes) != {"gundam"}:
+            # 既定のGundamモードのみの場合は表示しない
+            lines.append("解像度モード: " + ", ".join(f"{mode} {count}" for mode, count in modes.items()))
+
+        prefetched = [p for p in self.pages if p.preprocess_s is not None]
+        if prefetched:
+            # 待った時間を除いた分は、前のページの推論と並行して済ませた前処理
+            preprocess = sum(p.preprocess_s for p in prefetched)
+            wait = sum(p.prefetch_wait_s or 0.0 for p in prefetched)
+            lines.append(
+                f"前処理の先読み: {len(prefetched)}ページ（前処理 {preprocess:.1f}秒のうち "
+                f"{max(0.0, preprocess - wait):.1f}秒を推論と並行して実行, 待ち {wait:.1f}秒）"
+            )
+
+        retries = sum(p.retries for p in self.pages)
+        if retries:
+            wait = sum(p.retry_wait_s for p in self.pages)
+            retried_pages = sum(1 for p in self.pages if p.retries)
+            lines.append(
+                f"リトライ: {retries}回（{retried_pages}ページ, 待機合計 {wait:.1f}秒）"
+            )
+
+        lines.extend(self.token_usage_lines(self.pages))
+        documents = self.documents()
+        if len(documents) > 1:
+            for document, pages in documents.items():
+                lines.extend(f"  {document}: {line}" for line in self.token_usage_lines(pages))
+
+        budgeted = [p for p in self.pages if p.token_budget is not None and p.completion_tokens]
+        if budgeted:
+            # 見積もりの精度（見積もり / 実際の出力）。1未満のページは再試行が必要だった
+            ratios = [p.token_budget / p.completion_tokens for p in budgeted]
+            reserved = sum(p.max_tokens or 0 for p in budgeted)
+            used = sum(p.completion_tokens for p in budgeted)
+            retried = sum(1 for p in budgeted if p.budget_retries)
+            lines.append(
+                f"トークン予算: 見積もり/実際 p50 {percentile(ratios, 50):.2f}倍, "
+                f"不足 {sum(1 for r in ratios if r < 1)}ページ（再試行 {retried}ページ）, "
+                f"予約 {reserved} / 使用 {used}トークン"
+            )
+
+        missed = [p for p in self.pages if p.deadline_misses]
+        if missed:
+            rungs: Dict[str, int] = {}
+            for p in missed:
+                rung = p.degradation or "失敗"
+                rungs[rung] = rungs.get(rung, 0) + 1
+            breakdown = ", ".join(f"{rung} {count}" for rung, count in rungs.items())
+            lines.append(f"処理期限の超過: {len(missed)}ページ（結果を生成した段: {breakdown}）")
+
+        looped = [p for p in self.pages if p.loop_detected]
+        if looped:
+            tokens_saved = sum(p.loop_tokens_saved for p in looped)
+            seconds_saved = sum(p.loop_seconds_saved for p in looped)
+            retried = sum(1 for p in looped if p.loop_retried)
+            lines.append(
+                f"生成ループ検出: {len(looped)}ページ（打ち切りで約{tokens_saved}トークン / "
+                f"{seconds_saved:.1f}秒を節約, 再試行 {retried}ページ）"
+            )
+
+        for source in self._summary_sources:
+            lines.extend(source())
+
+        return lines
+
+    def documents(self) -> Dict[str, List[PageStats]]:
+        """
+        ページの計測値をドキュメントごとにまとめる
+
+        Returns:
+            ドキュメント名 → ページの計測値のリスト（処理順）
+        """
+        documents: Dict[str, List[PageStats]] = {}
+        for page in self.pages:
+            documents.setdefault(page.document or "-", []).append(page)
+        return documents
+
+    @staticmethod
+    def token_usage(pages: Sequence[PageStats]) -> Dict[str, Any]:
+        """
+        トークン使用量を集計する
+
+        Args:
+            pages: 集計対象のページの計測値
+
+        Returns:
+            トークン数の合計・ページあたりの分布・生成速度・打ち切られたページの辞書
+        """
+        counted = [p for p in pages if p.completion_tokens is not None]
+        completion = [p.completion_tokens for p in counted]
+        rates = [p.tokens_per_second for p in counted if p.tokens_per_second is not None]
+        return {
+            "pages": len(pages),
+            "pages_with_usage": len(counted),
+            "prompt_tokens": sum(p.prompt_tokens or 0 for p in counted),
+            "completion_tokens": sum(completion),
+            "completion_tokens_p50": percentile(completion, 50),
+            "completion_tokens_p95": percentile(completion, 95),
+            "completion_tokens_max": max(completion) if completion else 0,
+            "tokens_per_second_mean": sum(rates) / len(rates) if rates else None,
+            "truncated_pages": [p.page_num for p in pages if p.truncated],
+        }
+
+    def token_usage_lines(self, pages: Sequence[PageStats]) -> List[str]:
+        """
+        トークン使用量を表示用の行リストとして返す
+
+        Args:
+            pages: 集計対象のページの計測値
+
+        Returns:
+            サマリーの各行（使用量が報告されていない場合は空）
+        """
+        usage = self.token_usage(pages)
+        if not usage["pages_with_usage"]:
+            return []
+        rate = usage["tokens_per_second_mean"]
+        rate_text = f", 生成速度 平均 {rate:.1f}トークン/秒" if rate is not None else ""
+        lines = [
+            f"トークン: 入力 {usage['prompt_tokens']} / 出力 {usage['completion_tokens']}"
+            f"（出力/ページ p50 {usage['completion_tokens_p50']}, p95 {usage['completion_tokens_p95']}, "
+            f"最大 {usage['completion_tokens_max']}{rate_text}）"
+        ]
+        truncated = usage["truncated_pages"]
+        if truncated:
+            lines.append(f"max_tokensで打ち切られたページ: {len(truncated)}ページ {truncated}")
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        実行全体の統計を辞書形式に変換する（JSON出力用）
+
+        Returns:
+            全体・ドキュメントごとのトークン使用量と、ページごとの計測値の辞書
+        """
+        return {
+            "token_usage": self.token_usage(self.pages),
+            "documents": {
+                document: self.token_usage(pages) for document, pages in self.documents().items()
+            },
+            "pages": [p.to_dict() for p in self.pages],
+        }
+
+    def format_summary(self) -> str:
+        """
+        実行サマリーを文字列として返す
+
+        Returns:
+            サマリー文字列
+        """
+        return "\n".join(self.summary_lines())
@@ -0,0 +1,153 @@
+"""
+max_tokensの適応制御モジュール
+
+すべてのページを一律のmax_tokensでリクエストすると、余白の多いページでも
+サーバーはmax_tokens分のKVキャッシュを見込んでスケジューリングするため、
+同時に処理できるリクエスト数が減ります。ページ画像のインク量（文字などの暗い画素の数）
+または直前のページの出力長から必要なトークン数を見積もり、余裕を持たせた値で
+リクエストします。見積もりが足りずmax_tokensで打ち切られたページは、
+予算を増やして再試行します。
+"""
+
+import math
+import threading
+from typing import Optional, Tuple
+
+from PIL import Image
+
+# インク量の計測に使う縮小後の画像幅（ピクセル）
+INK_SAMPLE_WIDTH = 256
+
+# この輝度（0-255）未満の画素をインクとみなす
+INK_THRESHOLD = 160
+
+# 実測値がない間に使う、インク1画素あたりのトークン数
+# （幅256pxに縮小したA4の文字ページで、インク約1万画素・出力約2000トークンを想定）
+DEFAULT_TOKENS_PER_INK_PIXEL = 0.2
+
+TOKEN_BUDGET_ESTIMATORS = ("ink", "previous_page")
+
+
+def measure_ink(image_path: str, sample_width: int = INK_SAMPLE_WIDTH) -> Optional[int]:
+    """
+    ページ画像のインク量（縮小後の暗い画素の数）を計測する
+
+    Args:
+        image_path: 画像ファイルのパス
+        sample_width: 計測前に縮小する画像幅（ピクセル）
+
+    Returns:
+        インク画素数（画像を読み込めない場合はNone）
+    """
+    try:
+        with Image.open(image_path) as image:
+            gray = image.convert("L")
+            if gray.width > sample_width:
+                height = max(1, round(gray.height * sample_width / gray.width))
+                gray = gray.resize((sample_width, height), Image.Resampling.BILINEAR)
+            histogram = gray.histogram()
+    except OSError:
+        return None
+    return sum(histogram[:INK_THRESHOLD])
+
+
+class TokenBudget:
+    """
+    ページごとのmax_tokensを見積もるクラス（スレッドセーフ）
+
+    インク量から見積もる場合は、完了したページの実際の出力トークン数で
+    インク1画素あたりのトークン数を補正していきます。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4096,
+        min_tokens: int = 256,
+        headroom: float = 1.5,
+        estimator: str = "ink",
+        calibration_alpha: float = 0.2,
+    ):
+        """
+        初期化
+
+        Args:
+            max_tokens: 予算の上限（再試行時もこれを超えない）
+            min_tokens: 予算の下限
+            headroom: 見積もりに掛ける余裕の倍率
+            estimator: 見積もり方法（"ink": ページ画像のインク量、
+                "previous_page": 直前に完了したページの出力トークン数）
+            calibration_alpha: インク1画素あたりのトークン数を補正する指数移動平均の係数
+
+        Raises:
+            ValueError: 見積もり方法が不正な場合
+        """
+        if estimator not in TOKEN_BUDGET_ESTIMATORS:
+            raise ValueError(f"estimator must be one of {TOKEN_BUDGET_ESTIMATORS}: {estimator}")
+        self.max_tokens = max_tokens
+        self.min_tokens = min(min_tokens, max_tokens)
+        self.headroom = headroom
+        self.estimator = estimator
+        self.calibration_alpha = calibration_alpha
+
+        self.tokens_per_ink_pixel = DEFAULT_TOKENS_PER_INK_PIXEL
+        self.calibration_samples = 0
+        self.last_completion_tokens: Optional[int] = None
+
+        self._lock = threading.Lock()
+
+    def estimate(self, image_path: str) -> Tuple[int, Optional[int]]:
+        """
+        ページに必要なmax_tokensを見積もる
+
+        Args:
+            image_path: ページ画像のパス
+
+        Returns:
+            (max_tokens, インク画素数)のタプル。インク量を使わない場合や
+            画像を読み込めない場合、インク画素数はNone
+        """
+        ink = measure_ink(image_path) if self.estimator == "ink" else None
+        with self._lock:
+            if ink is not None:
+                needed = ink * self.tokens_per_ink_pixel
+            elif self.last_completion_tokens is not None:
+                needed = self.last_completion_tokens
+            else:
+                # 手がかりがない最初のページは上限で送る
+                return self.max_tokens, ink
+        return self.clamp(math.ceil(needed * self.headroom)), ink
+
+    def grow(self, budget: int) -> int:
+        """
+        打ち切られたページを再試行する際の予算を返す
+
+        Args:
+            budget: 打ち切られたときの予算
+
+        Returns:
+            倍にした予算（上限を超えない）
+        """
+        return self.clamp(budget * 2)
+
+    def clamp(self, tokens: int) -> int:
+        """予算を下限・上限の範囲に収める"""
+        return min(max(tokens, self.min_tokens), self.max_tokens)
+
+    def record(self, ink: Optional[int], completion_tokens: int) -> None:
+        """
+        打ち切られずに完了したページの出力トークン数を記録し、見積もりを補正する
+
+        Args:
+            ink: estimate()が返したインク画素数
+            completion_tokens: 実際の出力トークン数
+        """
+        with self._lock:
+            self.last_completion_tokens = completion_tokens
+            if not ink:
+                return
+            ratio = completion_tokens / ink
+            if self.calibration_samples == 0:
+                self.tokens_per_ink_pixel = ratio
+            else:
+                self.tokens_per_ink_pixel += self.calibration_alpha * (ratio - self.tokens_per_ink_pixel)
+            self.calibration_samples += 1
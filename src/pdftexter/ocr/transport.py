@@ -0,0 +1,190 @@
+"""
+vLLMサーバーとのHTTPトランスポートモジュール
+
+通常のTCP（http://, https://）に加えて、同一ホスト上のサーバーと
+Unixドメインソケット経由で通信する ``http+unix://`` 形式のURLをサポートします。
+
+URLの形式（ソケットパスはURLエンコードする）::
+
+    http+unix://%2Frun%2Fvllm.sock
+    http+unix://%2Frun%2Fvllm.sock/v1/chat/completions
+"""
+
+import socket
+import threading
+from typing import Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+UNIX_SOCKET_SCHEME = "http+unix"
+
+
+def is_unix_socket_url(url: str) -> bool:
+    """
+    URLがUnixドメインソケット形式か判定する
+
+    Args:
+        url: サーバーURL
+
+    Returns:
+        ``http+unix://`` 形式の場合True
+    """
+    return url.lower().startswith(f"{UNIX_SOCKET_SCHEME}://")
+
+
+def split_unix_socket_url(url: str) -> Tuple[str, str]:
+    """
+    Unixドメインソケット形式のURLをソケットパスとリクエストパスに分割する
+
+    Args:
+        url: ``http+unix://`` 形式のURL
+
+    Returns:
+        (ソケットパス, リクエストパス)のタプル
+
+    Raises:
+        ValueError: URLの形式が不正な場合
+    """
+    if not is_unix_socket_url(url):
+        raise ValueError(f"Unixドメインソケット形式のURLではありません: {url}")
+    parts = urlsplit(url)
+    socket_path = unquote(parts.netloc)
+    if not socket_path:
+        raise ValueError(f"ソケットパスが指定されていません: {url}")
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return socket_path, path
+
+
+def make_unix_socket_url(socket_path: str) -> str:
+    """
+    ソケットパスから ``http+unix://`` 形式のURLを生成する
+
+    Args:
+        socket_path: Unixドメインソケットのパス
+
+    Returns:
+        サーバーURL
+    """
+    return f"{UNIX_SOCKET_SCHEME}://{quote(socket_path, safe='')}"
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """Unixドメインソケットに接続するurllib3のHTTPConnection"""
+
+    def __init__(self, socket_path: str, **kwargs):
+        """
+        初期化
+
+        Args:
+            socket_path: Unixドメインソケットのパス
+        """
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        """ソケットを作成して接続する（TCPの代わりにAF_UNIXを使用）"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class UnixHTTPConnectionPool(HTTPConnectionPool):
+    """Unixドメインソケット用のコネクションプール"""
+
+    def __init__(self, socket_path: str, **kwargs):
+        """
+        初期化
+
+        Args:
+            socket_path: Unixドメインソケットのパス
+        """
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> UnixHTTPConnection:
+        """新しい接続を作成する"""
+        self.num_connections += 1
+        return UnixHTTPConnection(
+            self.socket_path,
+            timeout=self.timeout.connect_timeout,
+        )
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """
+    ``http+unix://`` URLを処理するrequestsのトランスポートアダプタ
+
+    ソケットパスごとにコネクションプールを保持するため、
+    同一セッション内ではKeep-Aliveで接続が再利用されます。
+    """
+
+    def __init__(self, pool_maxsize: int = 10, **kwargs):
+        """
+        初期化
+
+        Args:
+            pool_maxsize: ソケットごとに保持する接続数の上限
+        """
+        super().__init__(pool_maxsize=pool_maxsize, **kwargs)
+        self._unix_pool_maxsize = pool_maxsize
+        self._unix_pools: dict = {}
+        self._unix_pools_lock = threading.Lock()
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        """ソケットパスに対応するコネクションプールを返す"""
+        return self.get_connection(request.url, proxies)
+
+    def get_connection(self, url, proxies=None):
+        """ソケットパスに対応するコネクションプールを返す（旧バージョンのrequests互換）"""
+        socket_path, _ = split_unix_socket_url(url)
+        with self._unix_pools_lock:
+            pool = self._unix_pools.get(socket_path)
+            if pool is None:
+                pool = UnixHTTPConnectionPool(socket_path, maxsize=self._unix_pool_maxsize)
+                self._unix_pools[socket_path] = pool
+        return pool
+
+    def request_url(self, request, proxies) -> str:
+        """コネクションプールに渡すパス部分を返す"""
+        return split_unix_socket_url(request.url)[1]
+
+    def close(self) -> None:
+        """すべてのコネクションプールを閉じる"""
+        super().close()
+        with self._unix_pools_lock:
+            for pool in self._unix_pools.values():
+                pool.close()
+            self._unix_pools.clear()
+
+
+def create_session(pool_maxsize: int = 10) -> requests.Session:
+    """
+    vLLMサーバー通信用のrequestsセッションを作成する
+
+    TCPのURLに加えて ``http+unix://`` 形式のURLも扱えるよう、
+    UnixSocketAdapterをマウントします。
+
+    Args:
+        pool_maxsize: ホスト（ソケット）ごとに保持する接続数の上限
+
+    Returns:
+        requests.Sessionオブジェクト
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.mount(f"{UNIX_SOCKET_SCHEME}://", UnixSocketAdapter(pool_maxsize=pool_maxsize))
+    return session
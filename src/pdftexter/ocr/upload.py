@@ -0,0 +1,141 @@
+"""
+vLLMアップロード用の画像前処理モジュール
+
+ページ画像をモデルの入力解像度まで縮小し、再エンコードしてから送信することで、
+リクエストサイズとサーバー側のデコード時間を削減します。
+"""
+
+import io
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+
+# DeepSeek-OCRは640pxのタイルを最大3段まで並べる（Gundamモード）ため、
+# 長辺1920pxを超える解像度はサーバー側で縮小されるだけで精度に寄与しない
+DEFAULT_MAX_LONG_EDGE = 1920
+
+UPLOAD_FORMATS = ("original", "png", "jpeg")
+
+_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+}
+
+
+class UploadImage:
+    """アップロード用に前処理された画像データ"""
+
+    def __init__(
+        self,
+        data: bytes,
+        mime_type: str,
+        original_bytes: int,
+        size: Tuple[int, int],
+    ):
+        """
+        初期化
+
+        Args:
+            data: 送信する画像データ
+            mime_type: 画像のMIMEタイプ
+            original_bytes: 元画像ファイルのバイト数
+            size: 送信する画像のサイズ（幅, 高さ）
+        """
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.size = size
+
+    @property
+    def bytes_saved(self) -> int:
+        """元画像と比べて削減できたバイト数"""
+        return self.original_bytes - len(self.data)
+
+
+def _scaled_size(size: Tuple[int, int], max_long_edge: Optional[int]) -> Tuple[int, int]:
+    """
+    長辺がmax_long_edge以下になるサイズを計算する
+
+    Args:
+        size: 元のサイズ（幅, 高さ）
+        max_long_edge: 長辺の最大値（Noneまたは0以下の場合は縮小しない）
+
+    Returns:
+        縮小後のサイズ（幅, 高さ）
+    """
+    width, height = size
+    long_edge = max(width, height)
+    if not max_long_edge or max_long_edge <= 0 or long_edge <= max_long_edge:
+        return size
+    scale = max_long_edge / long_edge
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_upload_image(
+    image_path: str,
+    max_long_edge: Optional[int] = DEFAULT_MAX_LONG_EDGE,
+    image_format: str = "png",
+    jpeg_quality: int = 90,
+    png_compress_level: int = 1,
+) -> UploadImage:
+    """
+    画像ファイルをアップロード用に縮小・再エンコードする
+
+    縮小が不要で、元ファイルが指定形式と同じ場合は元のバイト列をそのまま使用します
+    （再エンコードでかえってサイズが増えるのを避けるため）。
+
+    Args:
+        image_path: 画像ファイルのパス
+        max_long_edge: 長辺の最大ピクセル数（Noneの場合は縮小しない）
+        image_format: 出力形式（"original", "png", "jpeg"）
+        jpeg_quality: JPEG品質（1-95）
+        png_compress_level: PNG圧縮レベル（0-9、小さいほど高速）
+
+    Returns:
+        UploadImageオブジェクト
+
+    Raises:
+        ValueError: 出力形式が不正な場合
+    """
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError(f"image_format must be one of {UPLOAD_FORMATS}: {image_format}")
+
+    raw = Path(image_path).read_bytes()
+
+    with Image.open(io.BytesIO(raw)) as img:
+        source_format = img.format or "PNG"
+        target_size = _scaled_size(img.size, max_long_edge)
+
+        if image_format == "original":
+            target_format = source_format if source_format in _MIME_TYPES else "PNG"
+        else:
+            target_format = image_format.upper()
+
+        # 縮小不要かつ同一形式なら、元ファイルをそのまま送信する
+        if target_size == img.size and target_format == source_format:
+            return UploadImage(
+                data=raw,
+                mime_type=_MIME_TYPES[target_format],
+                original_bytes=len(raw),
+                size=img.size,
+            )
+
+        converted = img
+        if target_format == "JPEG" and img.mode not in ("RGB", "L"):
+            converted = img.convert("RGB")
+        if target_size != img.size:
+            converted = converted.resize(target_size, Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        if target_format == "JPEG":
+            converted.save(buffer, "JPEG", quality=jpeg_quality)
+        else:
+            converted.save(buffer, "PNG", compress_level=png_compress_level)
+
+    return UploadImage(
+        data=buffer.getvalue(),
+        mime_type=_MIME_TYPES[target_format],
+        original_bytes=len(raw),
+        size=target_size,
+    )
@@ -3,12 +3,78 @@ vLLM版DeepSeek-OCRラッパーモジュール
 """
 
 import base64
+import json
+import queue
+import sys
+import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
 
 import requests
 
+from pdftexter.ocr.concurrency import ConcurrencyLimiter, classify_failure
+from pdftexter.ocr.deadline import DeadlineExceeded
+from pdftexter.ocr.endpoints import Endpoint, EndpointPool, is_endpoint_failure
+from pdftexter.ocr.hedging import HedgePolicy, RequestCancelled
+from pdftexter.ocr.repetition import RepetitionDetector
+from pdftexter.ocr.retry import RetryBudget, RetryPolicy
+from pdftexter.ocr.stats import PageStats, percentile
+from pdftexter.ocr.upload import DEFAULT_MAX_LONG_EDGE, prepare_upload_image
+
+
+def iter_sse_data(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    サーバー送信イベント（SSE）のバイト列からdataフィールドを取り出す
+    
+    Args:
+        chunks: 受信したバイト列のチャンク
+        
+    Yields:
+        各イベントのdataフィールドの文字列
+    """
+    buffer = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            line = line.rstrip(b"\r")
+            if line.startswith(b"data:"):
+                yield line[5:].strip().decode("utf-8")
+    if buffer.startswith(b"data:"):
+        yield buffer[5:].strip().decode("utf-8")
+
+
+def record_usage(page_stats: Optional[PageStats], event: Dict[str, Any]) -> None:
+    """
+    応答（またはストリーミングのイベント）からトークン使用量と終了理由を記録する
+    
+    ``usage`` のトークン数、``choices[0].finish_reason`` に加え、サーバーが
+    ``timings``（prompt_ms, predicted_ms）を報告する場合はその時間も記録します。
+    
+    Args:
+        page_stats: 計測値を記録するページ統計（Noneの場合は何もしない）
+        event: 応答またはイベントのJSON
+    """
+    if page_stats is None:
+        return
+    usage = event.get("usage") or {}
+    if usage.get("prompt_tokens") is not None:
+        page_stats.prompt_tokens = usage["prompt_tokens"]
+    if usage.get("completion_tokens") is not None:
+        page_stats.completion_tokens = usage["completion_tokens"]
+    choices = event.get("choices") or []
+    if choices and choices[0].get("finish_reason"):
+        page_stats.finish_reason = choices[0]["finish_reason"]
+    timings = event.get("timings") or {}
+    if timings.get("prompt_ms") is not None:
+        page_stats.server_prompt_s = timings["prompt_ms"] / 1000
+    if timings.get("predicted_ms") is not None:
+        page_stats.server_generation_s = timings["predicted_ms"] / 1000
+
 
 class VLLMWrapper:
     """vLLMサーバーとの通信を管理するラッパークラス"""
@@ -20,22 +86,82 @@ class VLLMWrapper:
         timeout: int = 300,
         max_retries: int = 3,
         retry_delay: int = 5,
+        upload_max_long_edge: Optional[int] = DEFAULT_MAX_LONG_EDGE,
+        upload_format: str = "png",
+        upload_jpeg_quality: int = 90,
+        upload_png_compress_level: int = 1,
+        upload_mode: str = "base64",
+        local_media_path_map: Optional[Dict[str, str]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        stream: bool = False,
+        endpoints: Optional[EndpointPool] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
     ):
         """
         初期化
         
         Args:
-            server_url: vLLMサーバーのURL（Noneの場合はローカル実行を想定）
+            server_url: vLLMサーバーのURL（Noneの場合はローカル実行を想定）。
+                ``http+unix://%2Frun%2Fvllm.sock`` 形式でUnixドメインソケットも指定可能
             model_name: モデル名（vLLM APIで使用）
             timeout: タイムアウト時間（秒）
-            max_retries: 最大リトライ回数
-            retry_delay: リトライ間隔（秒）
+            max_retries: 最大試行回数（retry_policy未指定時に使用）
+            retry_delay: バックオフの基準待機時間（秒、retry_policy未指定時に使用）
+            upload_max_long_edge: アップロード画像の長辺の最大ピクセル数（Noneの場合は縮小しない）
+            upload_format: アップロード画像の形式（"original", "png", "jpeg"）
+            upload_jpeg_quality: JPEG形式で送信する場合の品質
+            upload_png_compress_level: PNG形式で送信する場合の圧縮レベル（0-9）
+            upload_mode: 画像の送信方法（"base64": データURLで埋め込み、
+                "file": file:// URLで参照。サーバー側で--allowed-local-media-pathが必要）
+            local_media_path_map: file://モードでのパス変換表
+                （クライアント側のパス接頭辞 → サーバー側のパス接頭辞）
+            retry_policy: リトライポリシー（Noneの場合はmax_retries/retry_delayから作成）
+            stream: ストリーミング（SSE）で応答を受信するか
+            endpoints: 複数のvLLMレプリカに振り分ける場合のエンドポイントプール
+                （Noneの場合はserver_urlのみのプールを作成する）
+            hedge_policy: ヘッジリクエストのポリシー（Noneの場合はヘッジしない）
+            concurrency_limiter: 同時実行数のリミッター（Noneの場合は呼び出し側の並列度に従う）
         """
-        self.server_url = server_url or "http://localhost:8000"
+        self.endpoints = endpoints or EndpointPool(
+            [Endpoint(server_url or "http://localhost:8000")]
+        )
+        # 単一サーバー前提の呼び出し元のため、最初のエンドポイントをserver_urlとして公開する
+        self.server_url = self.endpoints.endpoints[0].url
         self.model_name = model_name
         self.timeout = timeout
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=max_retries,
+            base_delay=retry_delay,
+        )
+        self.upload_max_long_edge = upload_max_long_edge
+        self.upload_format = upload_format
+        self.upload_jpeg_quality = upload_jpeg_quality
+        self.upload_png_compress_level = upload_png_compress_level
+        self.upload_mode = upload_mode
+        self.local_media_path_map = local_media_path_map or {}
+        # サーバーがローカルメディアを拒否した場合はFalseにしてbase64に切り替える
+        self.local_media_enabled = upload_mode == "file"
+        self.stream = stream
+        self.hedge_policy = hedge_policy
+        self.concurrency_limiter = concurrency_limiter
+    
+    def _http(self) -> Any:
+        """
+        最初のエンドポイントへのリクエスト送信に使用するHTTPクライアントを返す
+        
+        Returns:
+            Unixドメインソケットの場合はセッション、それ以外はrequestsモジュール
+        """
+        return self.endpoints.endpoints[0].http()
+    
+    def close(self) -> None:
+        """エンドポイントのヘルスチェックと ``/metrics`` の取得のバックグラウンドスレッドを停止する"""
+        self.endpoints.stop_health_checks()
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.stop_metrics_polling()
     
     def encode_image(self, image_path: str) -> str:
         """
@@ -51,27 +177,113 @@ class VLLMWrapper:
             encoded = base64.b64encode(image_file.read()).decode("utf-8")
             return encoded
     
+    def map_local_path(self, image_path: str) -> str:
+        """
+        クライアント側の画像パスをサーバーから見えるパスに変換する
+        
+        local_media_path_mapのうち最も長く一致する接頭辞を置換します。
+        
+        Args:
+            image_path: 画像ファイルのパス
+            
+        Returns:
+            サーバー側の絶対パス（POSIX形式）
+        """
+        local_path = Path(image_path).resolve().as_posix()
+        for local_prefix in sorted(self.local_media_path_map, key=len, reverse=True):
+            normalized = Path(local_prefix).resolve().as_posix()
+            if local_path == normalized or local_path.startswith(normalized.rstrip("/") + "/"):
+                server_prefix = self.local_media_path_map[local_prefix].rstrip("/")
+                return server_prefix + local_path[len(normalized.rstrip("/")):]
+        return local_path
+    
+    def build_image_url(
+        self,
+        image_path: str,
+        page_stats: Optional[PageStats] = None,
+        upload_mode: Optional[str] = None,
+        upload_max_long_edge: Optional[int] = None,
+    ) -> str:
+        """
+        リクエストに埋め込む画像URLを生成する
+        
+        base64モードでは画像をモデルの入力解像度まで縮小・再エンコードして
+        データURLにします。fileモードではサーバーが直接読み込むため、
+        画像は加工せずfile:// URLのみを送信します。
+        
+        Args:
+            image_path: 画像ファイルのパス
+            page_stats: アップロードサイズを記録するページ統計（省略可）
+            upload_mode: 送信方法（Noneの場合は現在の設定に従う）
+            upload_max_long_edge: 長辺の最大ピクセル数の上書き（縮退時の低解像度送信用）。
+                fileモードでも指定された場合はbase64で縮小して送る
+            
+        Returns:
+            画像URL
+        """
+        if upload_mode is None:
+            upload_mode = "file" if self.local_media_enabled else "base64"
+        if upload_max_long_edge is not None:
+            # サーバーが読み込むfile:// URLでは縮小できないため、縮小した画像を埋め込む
+            upload_mode = "base64"
+        
+        if upload_mode == "file":
+            server_path = self.map_local_path(image_path)
+            if page_stats is not None:
+                page_stats.upload_mode = "file"
+                page_stats.original_bytes = Path(image_path).stat().st_size
+                page_stats.upload_bytes = 0
+            return "file://" + quote(server_path)
+        
+        # 画像を縮小・再エンコードしてbase64エンコード
+        upload = prepare_upload_image(
+            image_path,
+            max_long_edge=upload_max_long_edge or self.upload_max_long_edge,
+            image_format=self.upload_format,
+            jpeg_quality=self.upload_jpeg_quality,
+            png_compress_level=self.upload_png_compress_level,
+        )
+        image_data = base64.b64encode(upload.data).decode("utf-8")
+        
+        if page_stats is not None:
+            page_stats.upload_mode = "base64"
+            page_stats.original_bytes = upload.original_bytes
+            page_stats.upload_bytes = len(upload.data)
+            page_stats.upload_size = upload.size
+        
+        return f"data:{upload.mime_type};base64,{image_data}"
+    
     def create_request(
         self,
         image_path: str,
         prompt: str = "<image>\n<|grounding|>Convert the document to markdown.",
         max_tokens: int = 4096,
         temperature: float = 0.1,
+        page_stats: Optional[PageStats] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
+        upload_max_long_edge: Optional[int] = None,
     ) -> Dict[str, Any]:
         """
         vLLMリクエストを作成する
         
+        画像はbuild_image_url()で生成したURL（データURLまたはfile:// URL）で参照します。
+        
         Args:
             image_path: 画像ファイルのパス
             prompt: プロンプトテキスト
             max_tokens: 最大トークン数
             temperature: 温度パラメータ
+            page_stats: アップロードサイズを記録するページ統計（省略可）
+            sampling_overrides: 上書きするサンプリングパラメータ
+                （例: {"temperature": 0.5, "repetition_penalty": 1.05}）
+            upload_max_long_edge: 送信する画像の長辺の最大ピクセル数の上書き
             
         Returns:
             リクエストデータの辞書
         """
-        # 画像をbase64エンコード
-        image_data = self.encode_image(image_path)
+        image_url = self.build_image_url(
+            image_path, page_stats=page_stats, upload_max_long_edge=upload_max_long_edge
+        )
         
         # vLLM APIリクエスト形式
         request_data = {
@@ -83,7 +295,7 @@ class VLLMWrapper:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{image_data}"
+                                "url": image_url
                             }
                         },
                         {
@@ -96,24 +308,75 @@ class VLLMWrapper:
             "max_tokens": max_tokens,
             "temperature": temperature,
         }
+        if sampling_overrides:
+            request_data.update(sampling_overrides)
+        if self.stream:
+            request_data["stream"] = True
+            request_data["stream_options"] = {"include_usage": True}
         
         return request_data
     
+    @staticmethod
+    def is_local_media_rejection(response: requests.Response) -> bool:
+        """
+        レスポンスがローカルメディア（file:// URL）の拒否によるエラーか判定する
+        
+        vLLMは--allowed-local-media-pathが未指定、または許可範囲外のパスの場合に
+        400系エラーを返します。
+        
+        Args:
+            response: vLLM APIのレスポンス
+            
+        Returns:
+            ローカルメディアの拒否によるエラーの場合True
+        """
+        if response.status_code not in (400, 403, 415, 422):
+            return False
+        text = (response.text or "").lower()
+        return "allowed-local-media-path" in text or (
+            "local" in text and ("media" in text or "file" in text)
+        )
+    
     def call_vllm_api(
         self,
         image_path: str,
         prompt: str = "<image>\n<|grounding|>Convert the document to markdown.",
         max_tokens: int = 4096,
         temperature: float = 0.1,
+        page_stats: Optional[PageStats] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        on_reset: Optional[Callable[[], None]] = None,
+        detector: Optional[RepetitionDetector] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        upload_max_long_edge: Optional[int] = None,
     ) -> str:
         """
         vLLM APIを呼び出してOCR処理を実行する
         
+        失敗時のリトライはretry_policyに従います（指数バックオフ・Retry-After・
+        リトライ不可能な4xxの即時失敗）。
+        
+        detectorを指定すると生成ループを監視します。ストリーミング時はループを検出した
+        時点で接続を閉じて生成を中止させ、非ストリーミング時は受信後に繰り返し部分を
+        取り除きます。いずれも繰り返しより前の部分を結果として返します。
+        
         Args:
             image_path: 画像ファイルのパス
             prompt: プロンプトテキスト
             max_tokens: 最大トークン数
             temperature: 温度パラメータ
+            page_stats: 計測値を記録するページ統計（省略可）
+            retry_budget: ドキュメント単位のリトライ予算（省略時は無制限）
+            on_token: ストリーミング時に受信したテキスト片ごとに呼ばれるコールバック
+            on_reset: ストリーミング途中で失敗してリトライする前に呼ばれるコールバック
+                （それまでにon_tokenへ渡したテキストを破棄させるため）
+            detector: 生成ループの検出器（省略時は検出しない）
+            sampling_overrides: 上書きするサンプリングパラメータ（ループ再試行時など）
+            deadline: リトライを含めたページの処理期限（秒、Noneの場合は期限なし）。
+                各リクエストのタイムアウトは期限までの残り時間に短縮される
+            upload_max_long_edge: 送信する画像の長辺の最大ピクセル数の上書き（縮退時）
             
         Returns:
             OCR結果のテキスト
@@ -121,46 +384,528 @@ class VLLMWrapper:
         Raises:
             requests.RequestException: API呼び出しに失敗した場合
             TimeoutError: タイムアウトした場合
+            DeadlineExceeded: 処理期限を超えた場合
+        """
+        options: Dict[str, Any] = {"upload_max_long_edge": upload_max_long_edge}
+        if deadline is not None:
+            options["deadline_at"] = time.perf_counter() + deadline
+        if self.hedge_policy is not None:
+            return self._call_hedged(
+                image_path, prompt, max_tokens, temperature, page_stats,
+                retry_budget, on_token, on_reset, detector, sampling_overrides, **options,
+            )
+        return self._call_with_retries(
+            image_path, prompt, max_tokens, temperature, page_stats,
+            retry_budget, on_token, on_reset, detector, sampling_overrides, **options,
+        )
+    
+    def _call_hedged(
+        self,
+        image_path: str,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        page_stats: Optional[PageStats],
+        retry_budget: Optional[RetryBudget],
+        on_token: Optional[Callable[[str], None]],
+        on_reset: Optional[Callable[[], None]],
+        detector: Optional[RepetitionDetector],
+        sampling_overrides: Optional[Dict[str, Any]],
+        **options: Any,
+    ) -> str:
+        """
+        ヘッジ付きでvLLM APIを呼び出す
+        
+        リクエストが観測レイテンシのパーセンタイルを超えても完了しない場合、予算の範囲で
+        同じページを別のエンドポイント（他にない場合は同じサーバーの別スロット）にも送り、
+        先に成功した方を採用します。負けた方には中止を通知し、ストリーミング時は
+        接続を閉じてサーバー側の生成も中止させます（非ストリーミング時は応答を破棄するのみ）。
+        
+        ストリーミングのテキスト片は元のリクエストの分だけon_tokenへ逐次渡し、
+        ヘッジが勝った場合はon_reset()の後にヘッジの結果全体を渡します。
+        
+        引数と戻り値はcall_vllm_api()と同じです（optionsは_call_with_retries()へ渡す）。
         """
-        request_data = self.create_request(image_path, prompt, max_tokens, temperature)
+        started_at = time.perf_counter()
+        hedge_delay = self.hedge_policy.start_request()
+        if hedge_delay is None:
+            result = self._call_with_retries(
+                image_path, prompt, max_tokens, temperature, page_stats,
+                retry_budget, on_token, on_reset, detector, sampling_overrides, **options,
+            )
+            self.hedge_policy.record_latency(time.perf_counter() - started_at)
+            return result
+        
+        results: "queue.Queue" = queue.Queue()
+        output_lock = threading.Lock()
+        winner: Dict[str, Optional[str]] = {"name": None}
+        attempts: Dict[str, Dict[str, Any]] = {}
+        primary_endpoints: List[Endpoint] = []
         
-        # APIエンドポイント
-        api_url = f"{self.server_url}/v1/chat/completions"
+        def guarded(name: str, callback: Optional[Callable]) -> Optional[Callable]:
+            # 勝敗が決まった後は、負けた方の出力を呼び出し元へ渡さない
+            if callback is None:
+                return None
+            
+            def call(*args: Any) -> None:
+                with output_lock:
+                    if winner["name"] in (None, name):
+                        callback(*args)
+            
+            return call
+        
+        def start(name: str, exclude: List[Endpoint], used: Optional[List[Endpoint]]) -> None:
+            attempt = {
+                "stats": PageStats(page_stats.page_num if page_stats is not None else 0),
+                "detector": detector.spawn() if detector is not None else None,
+                "cancel": threading.Event(),
+            }
+            attempts[name] = attempt
+            live_output = name == "primary"
+            
+            def run() -> None:
+                try:
+                    result = self._call_with_retries(
+                        image_path, prompt, max_tokens, temperature, attempt["stats"],
+                        retry_budget,
+                        guarded(name, on_token) if live_output else None,
+                        guarded(name, on_reset) if live_output else None,
+                        attempt["detector"],
+                        sampling_overrides,
+                        cancel_event=attempt["cancel"],
+                        exclude_endpoints=exclude,
+                        used_endpoints=used,
+                        **options,
+                    )
+                except Exception as e:
+                    results.put((name, None, e))
+                else:
+                    results.put((name, result, None))
+            
+            threading.Thread(target=run, name=f"pdftexter-{name}", daemon=True).start()
+        
+        start("primary", [], primary_endpoints)
+        pending = 1
+        hedged = False
+        try:
+            outcome = results.get(timeout=hedge_delay)
+        except queue.Empty:
+            outcome = None
+            if self.hedge_policy.try_acquire():
+                # 元のリクエストが使用中のエンドポイントはできるだけ避ける
+                start("hedge", list(primary_endpoints), None)
+                pending += 1
+                hedged = True
+        
+        errors = []
+        while True:
+            name, result, error = outcome if outcome is not None else results.get()
+            outcome = None
+            pending -= 1
+            if error is None:
+                break
+            errors.append(error)
+            if pending == 0:
+                raise errors[0]
+        
+        with output_lock:
+            winner["name"] = name
+            if name == "hedge" and self.stream and on_token is not None:
+                if on_reset is not None:
+                    on_reset()
+                on_token(result)
+        for other_name, attempt in attempts.items():
+            if other_name != name:
+                attempt["cancel"].set()
+        
+        won = attempts[name]
+        if detector is not None:
+            detector.load_state(won["detector"])
+        if page_stats is not None:
+            page_stats.update_from(won["stats"])
+            page_stats.hedged = hedged
+            page_stats.hedge_won = name == "hedge"
+        if name == "hedge":
+            self.hedge_policy.record_win()
+        self.hedge_policy.record_latency(time.perf_counter() - started_at)
+        return result
+    
+    def _call_with_retries(
+        self,
+        image_path: str,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        page_stats: Optional[PageStats],
+        retry_budget: Optional[RetryBudget],
+        on_token: Optional[Callable[[str], None]],
+        on_reset: Optional[Callable[[], None]],
+        detector: Optional[RepetitionDetector],
+        sampling_overrides: Optional[Dict[str, Any]],
+        cancel_event: Optional[threading.Event] = None,
+        exclude_endpoints: Optional[List[Endpoint]] = None,
+        used_endpoints: Optional[List[Endpoint]] = None,
+        deadline_at: Optional[float] = None,
+        upload_max_long_edge: Optional[int] = None,
+    ) -> str:
+        """
+        リトライ付きでvLLM APIを1ページ分呼び出す
+        
+        引数はcall_vllm_api()と同じで、ヘッジ用などに次の引数を追加で受け取ります。
+        
+        Args:
+            cancel_event: セットされたら処理を打ち切るイベント
+            exclude_endpoints: できるだけ避けるエンドポイント
+            used_endpoints: 使用したエンドポイントを追加していくリスト
+            deadline_at: 処理期限の時刻（time.perf_counter()、Noneの場合は期限なし）
+            upload_max_long_edge: 送信する画像の長辺の最大ピクセル数の上書き
+            
+        Raises:
+            RequestCancelled: cancel_eventがセットされた場合
+            DeadlineExceeded: 処理期限を超えた場合
+        """
+        request_data = self.create_request(
+            image_path,
+            prompt,
+            max_tokens,
+            temperature,
+            page_stats=page_stats,
+            sampling_overrides=sampling_overrides,
+            upload_max_long_edge=upload_max_long_edge,
+        )
+        
+        if page_stats is not None:
+            page_stats.max_tokens = request_data["max_tokens"]
+        
+        post_options: Dict[str, Any] = {"timeout": self.timeout}
+        if self.stream:
+            # ストリーミング時のtimeoutはトークン間の無応答時間に対して適用される
+            post_options["stream"] = True
         
         last_exception = None
-        for attempt in range(self.max_retries):
+        failed_endpoints: List[Endpoint] = list(exclude_endpoints or [])
+        for attempt in range(self.retry_policy.max_attempts):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelled()
+            if deadline_at is not None:
+                remaining = deadline_at - time.perf_counter()
+                if remaining <= 0:
+                    raise DeadlineExceeded("ページの処理期限を超えました")
+                # 期限までの残り時間より長くは待たない
+                post_options["timeout"] = min(self.timeout, remaining)
+            if attempt > 0:
+                if on_reset is not None:
+                    on_reset()
+                if detector is not None:
+                    detector.reset()
+            
+            # 同時実行数の枠を確保してから、未処理リクエストが最も少ないエンドポイントを選ぶ
+            # （このページで失敗したものは避ける）
+            if self.concurrency_limiter is not None:
+                # 枠の空きを待つのも処理期限までとする
+                acquire_timeout = None
+                if deadline_at is not None:
+                    acquire_timeout = max(0.0, deadline_at - time.perf_counter())
+                acquired = self.concurrency_limiter.acquire(
+                    timeout=acquire_timeout, cancel_event=cancel_event
+                )
+                if not acquired:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RequestCancelled()
+                    raise DeadlineExceeded("ページの処理期限までに同時実行の枠を確保できませんでした")
+                # 枠を待つ間にヘッジの勝敗が決まった場合は、リクエストを送らずに枠を返す
+                if cancel_event is not None and cancel_event.is_set():
+                    self.concurrency_limiter.release(outcome="error")
+                    raise RequestCancelled()
+            endpoint = self.endpoints.acquire(exclude=failed_endpoints)
+            if used_endpoints is not None:
+                used_endpoints.append(endpoint)
+            api_url = f"{endpoint.url}/v1/chat/completions"
+            if page_stats is not None:
+                page_stats.endpoint = endpoint.url
+            sent_at = time.perf_counter()
             try:
-                response = requests.post(
+                response = endpoint.http().post(
                     api_url,
                     json=request_data,
-                    timeout=self.timeout,
+                    **post_options,
                 )
+                
+                # サーバーがローカルメディアを拒否した場合はbase64で即座に再送する
+                if self.local_media_enabled and self.is_local_media_rejection(response):
+                    print(
+                        "警告: vLLMサーバーがfile:// URLを拒否しました"
+                        "（--allowed-local-media-pathを確認してください）。base64送信に切り替えます",
+                        file=sys.stderr,
+                    )
+                    self.local_media_enabled = False
+                    request_data = self.create_request(
+                        image_path,
+                        prompt,
+                        max_tokens,
+                        temperature,
+                        page_stats=page_stats,
+                        sampling_overrides=sampling_overrides,
+                        upload_max_long_edge=upload_max_long_edge,
+                    )
+                    response = endpoint.http().post(
+                        api_url,
+                        json=request_data,
+                        **post_options,
+                    )
+                
                 response.raise_for_status()
                 
-                # レスポンスからテキストを抽出
-                result = response.json()
-                if "choices" in result and len(result["choices"]) > 0:
-                    content = result["choices"][0].get("message", {}).get("content", "")
-                    return content
+                if self.stream:
+                    content = self.read_stream(
+                        response,
+                        sent_at,
+                        page_stats,
+                        on_token,
+                        detector=detector,
+                        on_reset=on_reset,
+                        endpoint=endpoint,
+                        cancel_event=cancel_event,
+                        deadline_at=deadline_at,
+                    )
+                    if page_stats is not None:
+                        page_stats.request_s = time.perf_counter() - sent_at
+                        if detector is not None and detector.detected:
+                            # 打ち切らなければmax_tokensまで生成が続いたとみなして節約量を推定する
+                            tokens_saved = max(0, max_tokens - page_stats.stream_chunks)
+                            page_stats.loop_detected = True
+                            page_stats.loop_tokens_saved += tokens_saved
+                            page_stats.loop_seconds_saved += tokens_saved * (page_stats.itl_mean_s or 0.0)
                 else:
-                    raise ValueError("Invalid response format from vLLM API")
+                    # レスポンスからテキストを抽出
+                    result = response.json()
+                    if "choices" not in result or len(result["choices"]) == 0:
+                        raise ValueError("Invalid response format from vLLM API")
+                    content = result["choices"][0].get("message", {}).get("content", "")
+                    record_usage(page_stats, result)
+                    if page_stats is not None:
+                        page_stats.request_s = time.perf_counter() - sent_at
+                    finish_reason = result["choices"][0].get("finish_reason")
+                    if detector is not None and finish_reason == "length":
+                        # max_tokensまで生成が続いた場合だけ、繰り返し部分を取り除く
+                        # （正常に終了したレスポンスは、繰り返しがあっても本来の内容とみなす）
+                        for line in content.splitlines(keepends=True):
+                            if detector.feed(line):
+                                break
+                        if detector.finish():
+                            print("警告: 生成ループを検出したため、繰り返し部分を取り除きました", file=sys.stderr)
+                            content = detector.prefix
+                            if page_stats is not None:
+                                page_stats.loop_detected = True
                     
-            except requests.Timeout:
-                last_exception = TimeoutError(f"Request timeout after {self.timeout} seconds")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                raise last_exception
-                
             except requests.RequestException as e:
-                last_exception = e
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                raise last_exception
+                if isinstance(e, requests.Timeout):
+                    if deadline_at is not None and time.perf_counter() >= deadline_at:
+                        self.endpoints.release(endpoint, success=False, endpoint_failure=False)
+                        if self.concurrency_limiter is not None:
+                            self.concurrency_limiter.release(outcome="timeout")
+                        raise DeadlineExceeded("ページの処理期限を超えました") from e
+                    last_exception = TimeoutError(f"Request timeout after {post_options['timeout']:.0f} seconds")
+                else:
+                    last_exception = e
+                
+                endpoint_failure = is_endpoint_failure(e)
+                self.endpoints.release(endpoint, success=False, endpoint_failure=endpoint_failure)
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release(outcome=classify_failure(e))
+                if endpoint_failure:
+                    failed_endpoints.append(endpoint)
+                
+                # リトライ不可能なエラー（400/413など）や予算切れの場合は即座に失敗させる
+                delay = self.retry_policy.next_delay(
+                    attempt, getattr(e, "response", None), budget=retry_budget
+                )
+                if delay is None:
+                    raise last_exception
+                
+                # エンドポイントの異常で失敗した場合は、待機せずに別のエンドポイントへ再送する
+                if endpoint_failure and self.endpoints.has_alternative(endpoint):
+                    self.endpoints.record_failover()
+                    if page_stats is not None:
+                        page_stats.failovers += 1
+                    delay = 0.0
+                
+                if deadline_at is not None and time.perf_counter() + delay >= deadline_at:
+                    raise DeadlineExceeded("ページの処理期限までにリトライできません") from e
+                
+                if page_stats is not None:
+                    page_stats.retries += 1
+                    page_stats.retry_wait_s += delay
+                if cancel_event is not None:
+                    cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
+            except DeadlineExceeded:
+                # 期限は詰まったページ側の都合のため、エンドポイントの異常とはみなさない
+                self.endpoints.release(endpoint, success=False, endpoint_failure=False)
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release(outcome="timeout")
+                raise
+            except Exception:
+                self.endpoints.release(endpoint, success=False, endpoint_failure=False)
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release(outcome="error")
+                raise
+            else:
+                latency = time.perf_counter() - sent_at
+                self.endpoints.release(endpoint, success=True, latency=latency)
+                if self.concurrency_limiter is not None:
+                    # ストリーミング時は出力長に左右されにくいTTFT（待ち行列の長さを反映する）を使う
+                    if self.stream and page_stats is not None and page_stats.ttft_s is not None:
+                        latency = page_stats.ttft_s
+                    self.concurrency_limiter.release(latency=latency)
+                return content
         
         raise last_exception or Exception("Failed to call vLLM API")
     
+    def read_stream(
+        self,
+        response: requests.Response,
+        sent_at: float,
+        page_stats: Optional[PageStats] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        detector: Optional[RepetitionDetector] = None,
+        on_reset: Optional[Callable[[], None]] = None,
+        endpoint: Optional[Endpoint] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline_at: Optional[float] = None,
+    ) -> str:
+        """
+        ストリーミング応答（SSE）を読み取り、テキスト片をコールバックに渡す
+        
+        最初のトークンまでの時間（TTFT）とトークン間レイテンシ、トークン使用量を
+        ページ統計に記録します。
+        detectorが生成ループを検出した場合は受信を打ち切って接続を閉じます
+        （vLLMはクライアントの切断を検知してリクエストを中止する）。
+        
+        Args:
+            response: stream=Trueで取得したレスポンス
+            sent_at: リクエスト送信時刻（time.perf_counter()）
+            page_stats: 計測値を記録するページ統計（省略可）
+            on_token: テキスト片ごとに呼ばれるコールバック
+            detector: 生成ループの検出器（省略可）
+            on_reset: ループ検出時にon_tokenへ渡したテキストを破棄させるコールバック。
+                呼び出し後、繰り返しより前の部分がon_tokenへ改めて渡される
+            endpoint: 受信中のエンドポイント。受信中に切り離された場合は
+                ConnectionErrorを送出し、呼び出し元で別のエンドポイントへ再送させる
+            cancel_event: セットされたら受信を打ち切るイベント（ヘッジで負けた場合など）
+            deadline_at: 処理期限の時刻（time.perf_counter()）。超えたら受信を打ち切る
+            
+        Returns:
+            受信したテキスト全体（ループ検出時は繰り返しより前の部分）
+            
+        Raises:
+            requests.ConnectionError: 受信中にエンドポイントが切り離された場合
+            RequestCancelled: cancel_eventがセットされた場合
+            DeadlineExceeded: 処理期限を超えた場合
+        """
+        parts = []
+        first_at: Optional[float] = None
+        last_at = 0.0
+        gaps = []
+        finish_reason = None
+        try:
+            for data in iter_sse_data(response.iter_content(chunk_size=None)):
+                if data == "[DONE]":
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled()
+                if deadline_at is not None and time.perf_counter() >= deadline_at:
+                    raise DeadlineExceeded("ページの処理期限を超えたため受信を中止しました")
+                if endpoint is not None and not endpoint.is_available():
+                    raise requests.ConnectionError(
+                        f"エンドポイント {endpoint.url} が切り離されたため受信を中止しました"
+                    )
+                event = json.loads(data)
+                # 終了理由は最後のチャンク、usageはinclude_usage指定時の追加チャンクに含まれる
+                record_usage(page_stats, event)
+                choices = event.get("choices") or []
+                if not choices:
+                    continue
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if not delta:
+                    continue
+                now = time.perf_counter()
+                if first_at is None:
+                    first_at = now
+                else:
+                    gaps.append(now - last_at)
+                last_at = now
+                parts.append(delta)
+                if detector is not None and detector.feed(delta):
+                    break
+                if on_token is not None:
+                    on_token(delta)
+        finally:
+            response.close()
+        
+        if page_stats is not None:
+            page_stats.ttft_s = first_at - sent_at if first_at is not None else None
+            page_stats.stream_chunks = len(parts)
+            page_stats.itl_mean_s = sum(gaps) / len(gaps) if gaps else None
+            page_stats.itl_p95_s = percentile(gaps, 95) if gaps else None
+        
+        # 受信中に検出しなかった場合は、max_tokensまで生成が続いたときだけ末尾を検査する
+        # （正常に終了した生成は、繰り返しがあっても本来の内容とみなす）
+        if detector is not None and (
+            detector.detected or (finish_reason == "length" and detector.finish())
+        ):
+            print(
+                f"警告: 生成ループを検出したため、{len(parts)}チャンク目で生成を打ち切りました",
+                file=sys.stderr,
+            )
+            content = detector.prefix
+            if on_token is not None and on_reset is not None:
+                on_reset()
+                on_token(content)
+            return content
+        
+        return "".join(parts)
+    
+    def warm_up(
+        self,
+        image_path: str,
+        prompt: str = "<image>\n<|grounding|>Convert the document to markdown.",
+        max_tokens: int = 16,
+    ) -> List[str]:
+        """
+        すべてのエンドポイントに合成ページを1回ずつ送り、サーバー側のキャッシュを温める
+        
+        実際のページと同じ画像の前処理・プロンプトで送信しますが、エンドポイントの
+        振り分け・同時実行数・ヘッジの統計には記録しません。失敗しても例外は送出しません。
+        
+        Args:
+            image_path: 合成ページの画像パス
+            prompt: 実際のページで使用するプロンプト
+            max_tokens: 生成させるトークン数
+            
+        Returns:
+            ウォームアップに失敗したエンドポイントのURLのリスト
+        """
+        request_data = self.create_request(image_path, prompt, max_tokens, temperature=0.0)
+        request_data.pop("stream", None)
+        request_data.pop("stream_options", None)
+        
+        failed = []
+        for endpoint in self.endpoints.endpoints:
+            try:
+                response = endpoint.http().post(
+                    f"{endpoint.url}/v1/chat/completions",
+                    json=request_data,
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"警告: エンドポイント {endpoint.url} のウォームアップに失敗しました: {e}", file=sys.stderr)
+                failed.append(endpoint.url)
+        return failed
+    
     def process_pdf(
         self,
         pdf_path: str,
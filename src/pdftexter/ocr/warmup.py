@@ -0,0 +1,50 @@
+"""
+ウォームアップ用の合成ページモジュール
+
+実行の最初の数ページは、vLLMではプレフィックスキャッシュやCUDAグラフ、
+HuggingFace版ではカーネルの遅延初期化やメモリアロケータの拡張のために
+定常状態よりも大幅に遅くなります。実際のページと同じ大きさ・プロンプトの
+小さな合成ページを先に処理させることで、この初期化を済ませておきます。
+"""
+
+from pathlib import Path
+from typing import Tuple
+
+from PIL import Image, ImageDraw
+
+# 200dpiで変換したA4ページと同じ大きさ（extract_pdf_pages_as_imagesの既定値）
+WARMUP_PAGE_SIZE = (1654, 2339)
+
+# ウォームアップで生成させるトークン数（プレフィルとデコードの経路を一通り通せればよい）
+WARMUP_MAX_TOKENS = 16
+
+
+def create_warmup_page(output_path: str, size: Tuple[int, int] = WARMUP_PAGE_SIZE) -> str:
+    """
+    見出しと本文らしき行を描いた合成ページ画像を保存する
+
+    Args:
+        output_path: 保存先のパス（PNG形式）
+        size: 画像の大きさ（幅, 高さ）
+
+    Returns:
+        保存した画像のパス
+    """
+    width, height = size
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    margin = width // 10
+    draw.text((margin, margin), "Warm-up page", fill="black")
+    for i in range(8):
+        top = margin * 2 + i * 40
+        draw.text((margin, top), f"{i + 1}. The quick brown fox jumps over the lazy dog.", fill="black")
+    # 表の罫線（レイアウト解析の経路も通す）
+    table_top = margin * 2 + 8 * 40 + 40
+    for row in range(4):
+        y = table_top + row * 40
+        draw.line((margin, y, width - margin, y), fill="black", width=2)
+
+    path = Path(output_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    image.save(path, format="PNG")
+    return str(path)
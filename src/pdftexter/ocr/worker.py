@@ -0,0 +1,711 @@
+"""
+HuggingFace版の常駐OCRワーカー
+
+CPUでのDeepSeek-OCRの読み込みには数分かかり、``pdf-to-text`` を実行するたびにその時間を
+払うことになります。``pdftexter worker`` はモデルを一度だけ読み込んで常駐し、
+VLLMWrapperと同じOpenAI互換のプロトコル（``/v1/chat/completions``, ``/health``）で
+Unixドメインソケットまたはローカルのhttpから推論を受け付けます。
+HuggingFace版の設定で起動したCLIは、ワーカーが起動していれば自動的にそれを使用します。
+
+ワーカーは監視プロセス（WorkerSupervisor）の子プロセスとして動作し、
+異常終了した場合や推論が応答しなくなった場合は監視プロセスが再起動します。
+"""
+
+import base64
+import binascii
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from pdftexter.ocr.config import OCRConfig
+from pdftexter.ocr.endpoints import Endpoint
+from pdftexter.ocr.repetition import RepetitionDetector
+from pdftexter.ocr.stats import PageStats
+from pdftexter.ocr.transport import is_unix_socket_url, make_unix_socket_url, split_unix_socket_url
+
+# Unixドメインソケットが使えない環境（Windows）で待ち受けるポート
+DEFAULT_WORKER_PORT = 8765
+
+# /health の応答でワーカーを識別する名前（同じポートのvLLMサーバーと区別する）
+WORKER_NAME = "pdftexter-worker"
+
+# データURLのMIMEタイプ → 一時ファイルの拡張子
+_IMAGE_SUFFIXES = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+
+
+def default_worker_url() -> str:
+    """
+    ワーカーが待ち受ける既定のURLを返す
+
+    Returns:
+        Unixドメインソケットが使える環境ではユーザーごとのソケット、それ以外はローカルのhttp
+    """
+    if os.name == "nt" or not hasattr(socket, "AF_UNIX"):
+        return f"http://127.0.0.1:{DEFAULT_WORKER_PORT}"
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or str(Path.home() / ".cache" / "pdftexter")
+    return make_unix_socket_url(str(Path(runtime_dir) / "pdftexter-worker.sock"))
+
+
+def resolve_worker_url(url: Optional[str]) -> str:
+    """
+    設定されたワーカーのURLを返す（未設定の場合は既定のURL）
+
+    Args:
+        url: 設定されたURL
+
+    Returns:
+        ワーカーのURL
+    """
+    return url or default_worker_url()
+
+
+def find_worker(url: str, model_path: Optional[str] = None, timeout: float = 0.5) -> bool:
+    """
+    ワーカーが起動していて推論を受け付けられるか確認する
+
+    Args:
+        url: ワーカーのURL
+        model_path: 期待するモデルのパス（指定時は異なるモデルを読み込んだワーカーを使わない）
+        timeout: ``/health`` のタイムアウト（秒）
+
+    Returns:
+        使用できるワーカーが起動している場合True
+    """
+    if is_unix_socket_url(url) and not Path(split_unix_socket_url(url)[0]).exists():
+        return False
+    try:
+        response = Endpoint(url).http().get(f"{url}/health", timeout=timeout)
+        if response.status_code != 200:
+            return False
+        health = response.json()
+    except (requests.RequestException, ValueError):
+        return False
+    if health.get("worker") != WORKER_NAME:
+        return False
+    return model_path is None or health.get("model_path") == model_path
+
+
+def load_hf_backend(config: OCRConfig) -> Any:
+    """
+    設定に従ってHuggingFace版のバックエンドを読み込む（ワーカープロセスで実行される）
+
+    Args:
+        config: OCR設定
+
+    Returns:
+        HuggingFaceOCRWrapperオブジェクト
+    """
+    from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+    from pdftexter.ocr.hf_wrapper import HuggingFaceOCRWrapper
+
+    return HuggingFaceOCRWrapper(
+        model_path=config.deepseek_ocr.model_path,
+        cpu_profile=CPUInferenceProfile.from_config(config.deepseek_ocr),
+    )
+
+
+def _generation_overrides(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    リクエストのサンプリング設定をgenerate()の引数に変換する
+
+    Args:
+        request: ``/v1/chat/completions`` のリクエスト
+
+    Returns:
+        generate()に渡す引数の上書き
+    """
+    overrides: Dict[str, Any] = {}
+    temperature = request.get("temperature")
+    if temperature:
+        # infer()は貪欲法で生成するため、温度が指定された場合はサンプリングを有効にする
+        overrides["do_sample"] = True
+        overrides["temperature"] = temperature
+    if request.get("repetition_penalty") is not None:
+        overrides["repetition_penalty"] = request["repetition_penalty"]
+    return overrides
+
+
+def _parse_messages(request: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    リクエストのメッセージから画像URLとプロンプトを取り出す
+
+    Args:
+        request: ``/v1/chat/completions`` のリクエスト
+
+    Returns:
+        (画像URL, プロンプト)のタプル
+
+    Raises:
+        ValueError: 画像が含まれていない場合
+    """
+    image_url = None
+    texts = []
+    for message in request.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                image_url = (part.get("image_url") or {}).get("url")
+            elif part.get("type") == "text":
+                texts.append(part.get("text", ""))
+    if not image_url:
+        raise ValueError("リクエストに画像が含まれていません")
+    return image_url, "\n".join(texts)
+
+
+class OCRWorkerServer:
+    """
+    OCRバックエンドをOpenAI互換のAPIで公開するサーバー
+
+    バックエンドはHuggingFaceOCRWrapperと同じprocess_image()を持つオブジェクトです。
+    推論は1件ずつ実行し、実行中は開始時刻をbusy_sinceに書き込みます（監視プロセスがハングの検知に使用）。
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        url: str,
+        model_name: str = "deepseek-ocr",
+        model_path: Optional[str] = None,
+        detector: Optional[RepetitionDetector] = None,
+        busy_since: Optional[Any] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            backend: OCRバックエンド（process_image()を持つオブジェクト）
+            url: 待ち受けるURL（``http+unix://`` 形式またはローカルの ``http://host:port``）
+            model_name: ``/v1/models`` で公開するモデル名
+            model_path: ``/health`` で公開するモデルのパス
+            detector: 生成ループの検出器の雛形（リクエストごとに複製して使用、Noneの場合は検出しない）
+            busy_since: 推論の開始時刻（time.monotonic()、待機中は0）を書き込む共有値
+                （multiprocessing.Value、省略可）
+        """
+        self.backend = backend
+        self.model_name = model_name
+        self.model_path = model_path
+        self.detector = detector
+        self.busy_since = busy_since
+        self.requests_total = 0
+        self.errors_total = 0
+
+        if is_unix_socket_url(url):
+            self.socket_path: Optional[str] = split_unix_socket_url(url)[0]
+            self.host, self.port = "", 0
+        else:
+            parts = urlsplit(url)
+            self.socket_path = None
+            self.host, self.port = (
+                parts.hostname or "127.0.0.1",
+                parts.port if parts.port is not None else DEFAULT_WORKER_PORT,
+            )
+
+        self._inference_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._server: Optional[socketserver.BaseServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """クライアントから接続するためのURL"""
+        if self.socket_path:
+            return make_unix_socket_url(self.socket_path)
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "OCRWorkerServer":
+        """
+        サーバーを別スレッドで起動する
+
+        Returns:
+            自身（メソッドチェーン用）
+        """
+        handler = _make_handler(self)
+        if self.socket_path:
+            Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+            if Path(self.socket_path).exists():
+                # 前回のワーカーが残したソケットファイル
+                os.unlink(self.socket_path)
+            self._server = _UnixHTTPServer(self.socket_path, handler)
+        else:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+            self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """サーバーを停止する"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.socket_path and Path(self.socket_path).exists():
+            os.unlink(self.socket_path)
+
+    def __enter__(self) -> "OCRWorkerServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def run_ocr(self, request: Dict[str, Any]) -> Tuple[str, PageStats]:
+        """
+        リクエストの画像をOCR処理する
+
+        Args:
+            request: ``/v1/chat/completions`` のリクエスト
+
+        Returns:
+            (OCR結果のテキスト, ページ統計)のタプル
+
+        Raises:
+            ValueError: リクエストの形式が不正な場合
+            FileNotFoundError: file:// URLの画像が見つからない場合
+        """
+        image_url, prompt = _parse_messages(request)
+        page_stats = PageStats()
+        detector = self.detector.spawn() if self.detector is not None else None
+        overrides = _generation_overrides(request)
+
+        temp_path = None
+        try:
+            if image_url.startswith("file://"):
+                image_path = unquote(urlsplit(image_url).path)
+                if os.name == "nt" and image_path.startswith("/"):
+                    # file:///C:/... → C:/...
+                    image_path = image_path[1:]
+            elif image_url.startswith("data:"):
+                header, _, data = image_url.partition(",")
+                mime_type = header[len("data:"):].split(";", 1)[0]
+                try:
+                    image_bytes = base64.b64decode(data, validate=True)
+                except binascii.Error:
+                    raise ValueError("画像データのbase64デコードに失敗しました")
+                fd, temp_path = tempfile.mkstemp(suffix=_IMAGE_SUFFIXES.get(mime_type, ".png"))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(image_bytes)
+                image_path = temp_path
+            else:
+                raise ValueError(f"対応していない画像URLです: {image_url[:64]}")
+
+            with self._inference_lock:
+                self._set_busy(time.monotonic())
+                try:
+                    result = self.backend.process_image(
+                        image_path=image_path,
+                        prompt=prompt,
+                        page_stats=page_stats,
+                        detector=detector,
+                        generation_overrides=overrides,
+                    )
+                finally:
+                    self._set_busy(0.0)
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
+        return result, page_stats
+
+    def _set_busy(self, value: float) -> None:
+        """推論の開始時刻を共有値に書き込む"""
+        if self.busy_since is not None:
+            self.busy_since.value = value
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unixドメインソケットで待ち受けるHTTPサーバー"""
+
+    daemon_threads = True
+
+
+def _make_handler(server: OCRWorkerServer) -> type:
+    """
+    ワーカー用のリクエストハンドラクラスを作成する
+
+    Args:
+        server: OCRWorkerServerオブジェクト
+
+    Returns:
+        BaseHTTPRequestHandlerのサブクラス
+    """
+
+    class OCRWorkerHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def address_string(self) -> str:
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._send_json(200, {
+                    "status": "ok",
+                    "worker": WORKER_NAME,
+                    "model_path": server.model_path,
+                    "busy": server._inference_lock.locked(),
+                })
+            elif self.path == "/v1/models":
+                self._send_json(200, {
+                    "object": "list",
+                    "data": [{"id": server.model_name, "object": "model"}],
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            if self.path != "/v1/chat/completions":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(raw)
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid JSON"}})
+                return
+
+            with server._stats_lock:
+                server.requests_total += 1
+            try:
+                result, page_stats = server.run_ocr(request)
+            except (ValueError, FileNotFoundError) as e:
+                # リトライしても成功しないエラー
+                self._send_json(400, {"error": {"message": str(e)}})
+                return
+            except Exception as e:
+                with server._stats_lock:
+                    server.errors_total += 1
+                print(f"エラー: ワーカーでの推論に失敗しました: {e}", file=sys.stderr)
+                self._send_json(500, {"error": {"message": str(e)}})
+                return
+
+            completion_tokens = page_stats.completion_tokens or 0
+            usage = {
+                "prompt_tokens": 0,
+                "completion_tokens": completion_tokens,
+                "total_tokens": completion_tokens,
+            }
+            completion_id = f"worker-{time.time_ns()}"
+            model = request.get("model", server.model_name)
+            if request.get("stream"):
+                self._send_stream(request, completion_id, model, result, usage)
+                return
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": result},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        def _send_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_event(self, payload: Any) -> None:
+            data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            self._send_chunk(f"data: {data}\n\n".encode("utf-8"))
+
+        def _send_stream(
+            self,
+            request: Dict[str, Any],
+            completion_id: str,
+            model: str,
+            result: str,
+            usage: Dict[str, int],
+        ) -> None:
+            """SSE（チャンク転送）で結果を送信する（infer()は生成途中のテキストを返さないため1チャンク）"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(delta: Dict[str, Any], reason: Optional[str] = None) -> Dict[str, Any]:
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+                }
+
+            try:
+                self._send_event(chunk({"role": "assistant", "content": result}))
+                self._send_event(chunk({}, "stop"))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._send_event({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [],
+                        "usage": usage,
+                    })
+                self._send_event("[DONE]")
+                self._send_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    return OCRWorkerHandler
+
+
+def _serve_worker(
+    backend_factory: Callable[[], Any],
+    url: str,
+    model_name: str,
+    model_path: Optional[str],
+    detector: Optional[RepetitionDetector],
+    busy_since: Any,
+    ready: Any,
+) -> None:
+    """ワーカープロセスの本体（モデルを読み込んでから待ち受けを開始する）"""
+    backend = backend_factory()
+    server = OCRWorkerServer(
+        backend,
+        url,
+        model_name=model_name,
+        model_path=model_path,
+        detector=detector,
+        busy_since=busy_since,
+    ).start()
+    ready.set()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+class WorkerSupervisor:
+    """
+    ワーカープロセスを起動・監視し、異常終了やハングの際に再起動するクラス
+    """
+
+    def __init__(
+        self,
+        backend_factory: Callable[[], Any],
+        url: str,
+        model_name: str = "deepseek-ocr",
+        model_path: Optional[str] = None,
+        detector: Optional[RepetitionDetector] = None,
+        inference_timeout: float = 600.0,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        """
+        初期化
+
+        Args:
+            backend_factory: ワーカープロセスでバックエンドを作成する関数
+                （子プロセスに渡せるよう、モジュールレベルの関数かそのfunctools.partial）
+            url: 待ち受けるURL
+            model_name: ``/v1/models`` で公開するモデル名
+            model_path: ``/health`` で公開するモデルのパス
+            detector: 生成ループの検出器の雛形（Noneの場合は検出しない）
+            inference_timeout: 1件の推論がこの時間（秒）を超えたらハングとみなして再起動する
+            restart_delay: 再起動までの待機時間（秒）。起動完了前に終了した場合は倍にしていく
+            max_restart_delay: 再起動までの待機時間の上限（秒）
+            poll_interval: ワーカープロセスを確認する間隔（秒）
+        """
+        self.backend_factory = backend_factory
+        self.url = url
+        self.model_name = model_name
+        self.model_path = model_path
+        self.detector = detector
+        self.inference_timeout = inference_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.poll_interval = poll_interval
+        self.restarts = 0
+
+        # 監視スレッドがある状態でforkすると子プロセスがデッドロックしうるため、spawn方式で起動する
+        self._context = multiprocessing.get_context("spawn")
+        self._busy_since = self._context.Value("d", 0.0)
+        self._ready = self._context.Event()
+        self._process: Optional[Any] = None
+        self._stop = threading.Event()
+        self._next_delay = restart_delay
+        # 監視スレッドによる再起動とstop()が同時にプロセスを操作しないようにする
+        self._process_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """ワーカープロセスがモデルを読み込み、推論を受け付けているか"""
+        return self._ready.is_set() and self._process is not None and self._process.is_alive()
+
+    @property
+    def pid(self) -> Optional[int]:
+        """ワーカープロセスのプロセスID"""
+        return self._process.pid if self._process is not None else None
+
+    def _spawn(self) -> None:
+        """ワーカープロセスを起動する（監視スレッドの開始後はロックを取得した状態で呼ぶこと）"""
+        self._busy_since.value = 0.0
+        self._ready.clear()
+        self._process = self._context.Process(
+            target=_serve_worker,
+            args=(
+                self.backend_factory,
+                self.url,
+                self.model_name,
+                self.model_path,
+                self.detector,
+                self._busy_since,
+                self._ready,
+            ),
+            name="pdftexter-worker",
+            daemon=True,
+        )
+        self._process.start()
+
+    def _terminate(self) -> None:
+        """ワーカープロセスを停止する"""
+        with self._process_lock:
+            process, self._process = self._process, None
+            self._ready.clear()
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _restart(self, reason: str) -> None:
+        """ワーカープロセスを再起動する"""
+        was_ready = self._ready.is_set()
+        self._terminate()
+        # 起動に失敗し続ける場合（モデルが読み込めないなど）は間隔を空けていく
+        self._next_delay = self.restart_delay if was_ready else min(
+            self._next_delay * 2, self.max_restart_delay
+        )
+        print(f"ワーカーを再起動します（{reason}、{self._next_delay:.0f}秒後）", file=sys.stderr)
+        if self._stop.wait(self._next_delay):
+            return
+        with self._process_lock:
+            if self._stop.is_set():
+                return
+            self.restarts += 1
+            self._spawn()
+
+    def check(self) -> None:
+        """ワーカープロセスを確認し、異常終了やハングしている場合は再起動する"""
+        process = self._process
+        if process is None:
+            return
+        if not process.is_alive():
+            self._restart(f"ワーカープロセスが終了しました（終了コード {process.exitcode}）")
+            return
+        busy_since = self._busy_since.value
+        if busy_since and time.monotonic() - busy_since > self.inference_timeout:
+            self._restart(f"推論が{self.inference_timeout:.0f}秒以上応答しません")
+
+    def start(self) -> "WorkerSupervisor":
+        """
+        ワーカープロセスを起動し、別スレッドで監視を開始する
+
+        Returns:
+            自身（メソッドチェーン用）
+        """
+        self._stop.clear()
+        self._spawn()
+
+        def run() -> None:
+            while not self._stop.wait(self.poll_interval):
+                self.check()
+
+        threading.Thread(target=run, name="pdftexter-worker-supervisor", daemon=True).start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        ワーカープロセスが推論を受け付けられるようになるまで待機する
+
+        Args:
+            timeout: 待機時間の上限（秒、Noneの場合は無制限）
+
+        Returns:
+            準備ができた場合True
+        """
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        """監視を終了し、ワーカープロセスを停止する"""
+        self._stop.set()
+        self._terminate()
+
+    def serve_forever(self) -> None:
+        """ワーカーを起動して監視を続ける（Ctrl+Cで停止）"""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def build_worker_supervisor(
+    config: OCRConfig,
+    url: Optional[str] = None,
+    inference_timeout: Optional[float] = None,
+) -> WorkerSupervisor:
+    """
+    設定からHuggingFace版のワーカーの監視プロセスを作成する
+
+    Args:
+        config: OCR設定
+        url: 待ち受けるURL（Noneの場合は設定値、未設定なら既定のURL）
+        inference_timeout: ハングとみなす推論時間（秒、Noneの場合は設定値）
+
+    Returns:
+        WorkerSupervisorオブジェクト
+    """
+    detector = None
+    if config.deepseek_ocr.loop_detection:
+        detector = RepetitionDetector(
+            max_repeated_lines=config.deepseek_ocr.loop_max_repeated_lines,
+            max_repeated_structural_lines=config.deepseek_ocr.loop_max_repeated_structural_lines,
+            min_repeat_chars=config.deepseek_ocr.loop_min_repeat_chars,
+        )
+    return WorkerSupervisor(
+        partial(load_hf_backend, config),
+        resolve_worker_url(url or config.deepseek_ocr.worker_url),
+        model_name=config.deepseek_ocr.model_name,
+        model_path=config.deepseek_ocr.model_path,
+        detector=detector,
+        inference_timeout=inference_timeout or config.deepseek_ocr.worker_inference_timeout,
+    )
@@ -4,11 +4,100 @@ PDF処理ユーティリティモジュール
 
 import os
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 from PIL import Image
 
 
+class PdfPageImages(Sequence):
+    """
+    PDFの各ページを参照された時点で1ページずつ画像に変換するシーケンス
+    
+    全ページを一度に変換してメモリ上に保持すると、数百ページの書籍では数GBになるため、
+    ページごとに変換し、処理の終わったページの画像は保持しません。
+    """
+    
+    def __init__(self, pdf_path: str, dpi: int = 200):
+        """
+        初期化
+        
+        Args:
+            pdf_path: PDFファイルのパス
+            dpi: 画像の解像度（デフォルト: 200）
+            
+        Raises:
+            ImportError: pdf2imageがインストールされていない場合
+            FileNotFoundError: PDFファイルが見つからない場合
+        """
+        try:
+            from pdf2image import pdfinfo_from_path
+        except ImportError:
+            raise ImportError(
+                "pdf2image is required for PDF processing. "
+                "Install it with: pip install pdf2image"
+            )
+        
+        if not Path(pdf_path).exists():
+            raise FileNotFoundError(f"PDFファイルが見つかりません: {pdf_path}")
+        
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.page_count = int(pdfinfo_from_path(pdf_path)["Pages"])
+        # prefetch()で先に変換したページ（参照されるまで1ページだけ保持する）
+        self._prefetched: Optional[Tuple[int, Image.Image]] = None
+    
+    def __len__(self) -> int:
+        return self.page_count
+    
+    def __getitem__(self, index: int) -> Image.Image:
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError(index)
+        prefetched = self._prefetched
+        if prefetched is not None and prefetched[0] == index:
+            self._prefetched = None
+            return prefetched[1]
+        return self._convert(index)
+    
+    def prefetch(self, index: int) -> None:
+        """
+        ページを先に画像に変換して保持する（次にそのページが参照されたときに返す）
+        
+        OCRのバックエンドの準備を待つ間に最初のページを変換しておくために使います。
+        
+        Args:
+            index: ページのインデックス（0始まり）
+        """
+        self._prefetched = (index, self._convert(index))
+    
+    def _convert(self, index: int) -> Image.Image:
+        """1ページを画像に変換する"""
+        from pdf2image import convert_from_path
+        
+        return convert_from_path(
+            self.pdf_path, dpi=self.dpi, first_page=index + 1, last_page=index + 1
+        )[0]
+
+
+def rasterize_pdf_pages(pdf_path: str, dpi: int = 200) -> PdfPageImages:
+    """
+    PDFファイルの各ページを画像に変換する（ファイルには保存しない）
+    
+    Args:
+        pdf_path: PDFファイルのパス
+        dpi: 画像の解像度（デフォルト: 200）
+        
+    Returns:
+        ページ順のPILの画像のシーケンス（各ページは参照された時点で変換される）
+        
+    Raises:
+        ImportError: pdf2imageがインストールされていない場合
+        FileNotFoundError: PDFファイルが見つからない場合
+    """
+    return PdfPageImages(pdf_path, dpi=dpi)
+
+
 def extract_pdf_pages_as_images(
     pdf_path: str,
     output_dir: str,
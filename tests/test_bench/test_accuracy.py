@@ -0,0 +1,30 @@
+"""
+OCR結果の精度評価のテスト
+"""
+
+import pytest
+
+from pdftexter.bench.accuracy import character_error_rate, corpus_error_rate
+
+
+class TestCharacterErrorRate:
+    """文字誤り率の計算のテスト"""
+    
+    @pytest.mark.parametrize("reference,hypothesis,expected", [
+        ("吾輩は猫である", "吾輩は猫である", 0.0),
+        ("吾輩は猫である", "吾輩は 猫で\nある", 0.0),
+        ("吾輩は猫である", "吾輩は犬である", 1 / 7),
+        ("吾輩は猫である", "吾輩は猫", 3 / 7),
+        ("", "", 0.0),
+        ("", "余分", 1.0),
+    ])
+    def test_character_error_rate(self, reference, hypothesis, expected):
+        """空白を無視した編集距離を正解の文字数で割ることを確認"""
+        assert character_error_rate(reference, hypothesis) == pytest.approx(expected)
+    
+    def test_corpus_error_rate(self):
+        """全ページの合計とページ単位の最大値を計算することを確認"""
+        result = corpus_error_rate([("abcd", "abcd"), ("abcdef", "abcxyz")])
+        
+        assert result["cer"] == pytest.approx(3 / 10)
+        assert result["max_page_cer"] == pytest.approx(0.5)
@@ -0,0 +1,93 @@
+"""
+代替サーバーと負荷試験ハーネスのテスト
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+import requests
+
+from pdftexter.bench.client import create_sample_page, make_page_call, run_load_test
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.model_checker import check_vllm_server
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+
+def _fast_config(**overrides) -> FakeServerConfig:
+    """テスト用に高速に応答する設定を作成する"""
+    options = dict(
+        latency_distribution="constant",
+        latency_mean=0.0,
+        token_rate=100000.0,
+        output_tokens=(10, 10),
+        seed=0,
+    )
+    options.update(overrides)
+    return FakeServerConfig(**options)
+
+
+@pytest.fixture
+def page_image():
+    """負荷試験用の合成ページ画像"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield create_sample_page(tmpdir, size=(200, 300))
+
+
+class TestFakeVLLMServer:
+    """FakeVLLMServerクラスのテスト"""
+    
+    def test_wrapper_round_trip(self, page_image):
+        """VLLMWrapperが代替サーバーからOCR結果を受け取れることを確認"""
+        with FakeVLLMServer(_fast_config()) as server:
+            assert check_vllm_server(server.url)[0]
+            
+            wrapper = VLLMWrapper(server_url=server.url)
+            result = wrapper.call_vllm_api(page_image)
+        
+        assert len(result.split()) == 10
+        assert server.requests_total == 1
+    
+    def test_max_tokens_truncates_output(self, page_image):
+        """max_tokensを超える生成はfinish_reason=lengthで打ち切られることを確認"""
+        with FakeVLLMServer(_fast_config(output_tokens=(50, 50))) as server:
+            wrapper = VLLMWrapper(server_url=server.url)
+            request_data = wrapper.create_request(page_image, max_tokens=20)
+            response = requests.post(
+                f"{server.url}/v1/chat/completions", json=request_data, timeout=10
+            ).json()
+        
+        assert response["choices"][0]["finish_reason"] == "length"
+        assert response["usage"]["completion_tokens"] == 20
+    
+    def test_error_injection_is_retried(self, page_image):
+        """注入したエラーがリトライで回復し、すべて失敗すると例外になることを確認"""
+        config = _fast_config(error_rate=1.0, error_statuses=(503,), retry_after=0)
+        with FakeVLLMServer(config) as server:
+            wrapper = VLLMWrapper(server_url=server.url, max_retries=3, retry_delay=0.01)
+            with pytest.raises(requests.HTTPError):
+                wrapper.call_vllm_api(page_image)
+        
+        assert server.requests_total == 3
+        assert server.errors_total == 3
+    
+    def test_concurrency_cap_limits_running_requests(self, page_image):
+        """同時処理数がmax_num_seqsを超えないことを確認"""
+        config = _fast_config(latency_mean=0.05, max_num_seqs=2)
+        with FakeVLLMServer(config) as server:
+            call = make_page_call(server.url, page_image)
+            result = run_load_test(call, concurrency=6, total_requests=12)
+        
+        assert result.completed == 12
+        assert result.errors == 0
+        assert server.max_running == 2
+    
+    @pytest.mark.skipif(os.name != "posix", reason="Unixドメインソケットが必要")
+    def test_unix_socket_server(self, page_image):
+        """Unixドメインソケットで待ち受けた代替サーバーに接続できることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            socket_path = str(Path(tmpdir, "fake.sock"))
+            with FakeVLLMServer(_fast_config(), socket_path=socket_path) as server:
+                wrapper = VLLMWrapper(server_url=server.url)
+                assert wrapper.call_vllm_api(page_image)
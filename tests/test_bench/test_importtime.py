@@ -0,0 +1,42 @@
+"""
+CLI起動時のインポート時間計測のテスト
+"""
+
+import pytest
+
+from pdftexter.bench.importtime import IMPORT_TARGETS, measure_import_time, parse_importtime
+
+
+class TestParseImporttime:
+    """-X importtime の出力解析のテスト"""
+    
+    def test_keeps_top_level_modules_after_site(self):
+        """インタプリタ起動（site以前）と字下げされた子モジュールを除外する"""
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   encodings.aliases",
+            "import time:       200 |        300 | encodings",
+            "import time:      4000 |       4000 | site",
+            "import time:        50 |         50 |     json.decoder",
+            "import time:       150 |        200 |   json",
+            "import time:       500 |        700 | pdftexter.cli.__main__",
+            "import time:        30 |         30 | textwrap",
+        ])
+        
+        entries = parse_importtime(stderr)
+        
+        assert entries == [("pdftexter.cli.__main__", 500, 700), ("textwrap", 30, 30)]
+
+
+class TestCliImports:
+    """CLI起動時に重いモジュールを読み込まないことのテスト"""
+    
+    @pytest.mark.parametrize("target", list(IMPORT_TARGETS))
+    def test_no_heavy_modules(self, target):
+        """--help とvLLM版のpdf-to-textでtorch・transformers・GUI系を読み込まない"""
+        code, _ = IMPORT_TARGETS[target]
+        
+        result = measure_import_time(code)
+        
+        assert result["heavy_modules"] == []
+        assert result["total_ms"] > 0
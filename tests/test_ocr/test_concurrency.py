@@ -0,0 +1,114 @@
+"""
+同時実行数の適応制御モジュールのテスト
+"""
+
+import threading
+import time
+
+import requests
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.concurrency import (
+    ConcurrencyLimiter,
+    classify_failure,
+    fetch_server_load,
+    parse_prometheus_metrics,
+)
+from pdftexter.ocr.endpoints import Endpoint
+
+
+class TestPrometheusMetrics:
+    """メトリクスの取得のテスト"""
+    
+    def test_parse_sums_labeled_series(self):
+        """ラベルの異なる系列が合計され、コメント行が無視されることを確認"""
+        text = (
+            "# HELP vllm:num_requests_waiting Requests waiting\n"
+            "# TYPE vllm:num_requests_waiting gauge\n"
+            'vllm:num_requests_waiting{model_name="a"} 2.0\n'
+            'vllm:num_requests_waiting{model_name="b"} 3.0\n'
+            "vllm:gpu_cache_usage_perc 0.5\n"
+        )
+        
+        metrics = parse_prometheus_metrics(text)
+        
+        assert metrics["vllm:num_requests_waiting"] == 5.0
+        assert metrics["vllm:gpu_cache_usage_perc"] == 0.5
+    
+    def test_fetch_server_load_from_fake_server(self):
+        """代替サーバーの/metricsから負荷を取得できることを確認"""
+        with FakeVLLMServer(FakeServerConfig()) as server:
+            load = fetch_server_load([Endpoint(server.url)])
+        
+        assert load == {"running": 0.0, "waiting": 0.0, "kv_cache_usage": 0.0}
+    
+    def test_classify_failure(self):
+        """429/503とタイムアウトが混雑として分類されることを確認"""
+        response = requests.Response()
+        response.status_code = 503
+        
+        assert classify_failure(requests.HTTPError(response=response)) == "overload"
+        assert classify_failure(requests.Timeout()) == "timeout"
+        assert classify_failure(ValueError()) == "error"
+
+
+class TestConcurrencyLimiter:
+    """ConcurrencyLimiterクラスのテスト"""
+    
+    def test_increases_while_latency_stable(self):
+        """上限まで使い切っていてレイテンシが安定している間は同時実行数が増えることを確認"""
+        limiter = ConcurrencyLimiter(initial_limit=2, max_limit=4, verbose=False)
+        
+        for _ in range(20):
+            inflight = limiter.current_limit
+            for _ in range(inflight):
+                limiter.acquire()
+            for _ in range(inflight):
+                limiter.release(latency=1.0)
+        
+        assert limiter.current_limit == 4
+    
+    def test_decreases_on_latency_rise_and_overload(self):
+        """レイテンシの上昇と429/503で同時実行数が乗算的に減ることを確認"""
+        limiter = ConcurrencyLimiter(initial_limit=10, max_limit=10, verbose=False)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+        
+        limiter.acquire()
+        limiter.release(latency=1.0)
+        assert limiter.current_limit == 7
+        
+        # 直後の混雑通知は同じ混雑によるものとみなして減らさない
+        limiter.acquire()
+        limiter.release(outcome="overload")
+        assert limiter.current_limit == 7
+        
+        limiter._last_decrease = time.monotonic() - 10
+        limiter.acquire()
+        limiter.release(outcome="overload")
+        assert limiter.current_limit == 4
+        assert limiter.decreases == 2
+    
+    def test_acquire_stops_waiting_when_cancelled(self):
+        """枠の空きを待っている間に中止が通知されたら、枠を確保せずに戻ることを確認"""
+        limiter = ConcurrencyLimiter(initial_limit=1, max_limit=1, verbose=False)
+        limiter.acquire()
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        
+        start = time.perf_counter()
+        acquired = limiter.acquire(cancel_event=cancel_event)
+        
+        assert not acquired
+        assert time.perf_counter() - start < 2.0
+        assert limiter.inflight == 1
+    
+    def test_server_saturation_caps_limit_at_running(self):
+        """KVキャッシュが埋まり待ちが発生している場合、処理中の数まで絞ることを確認"""
+        limiter = ConcurrencyLimiter(initial_limit=8, max_limit=8, verbose=False)
+        
+        limiter.apply_server_load({"running": 3.0, "waiting": 5.0, "kv_cache_usage": 0.95})
+        
+        assert limiter.current_limit == 3
+        assert "サーバー飽和" in limiter.decisions[-1][2]
@@ -111,3 +111,21 @@ class TestOCRConfig:
             elif "DEEPSEEK_OCR_MODEL_NAME" in os.environ:
                 del os.environ["DEEPSEEK_OCR_MODEL_NAME"]
 
+    
+    def test_endpoint_list_prefers_vllm_endpoints(self):
+        """vllm_endpointsが指定された場合はvllm_server_urlより優先されることを確認"""
+        single = DeepSeekOCRConfig(model_path="/test", vllm_server_url="http://gpu0:8000")
+        multi = DeepSeekOCRConfig(
+            model_path="/test",
+            vllm_server_url="http://gpu0:8000",
+            vllm_endpoints=[
+                {"url": "http://gpu1:8000", "weight": 2},
+                {"url": "http+unix://%2Frun%2Fvllm.sock"},
+            ],
+        )
+        
+        assert [e.url for e in single.endpoint_list()] == ["http://gpu0:8000"]
+        assert [(e.url, e.weight) for e in multi.endpoint_list()] == [
+            ("http://gpu1:8000", 2.0),
+            ("http+unix://%2Frun%2Fvllm.sock", 1.0),
+        ]
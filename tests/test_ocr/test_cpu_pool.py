@@ -0,0 +1,133 @@
+"""
+HuggingFace版のCPU推論のマルチプロセスプールのテスト
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from pdftexter.ocr.cpu_pool import CPUWorkerPool, fork_supported, split_cores
+from pdftexter.ocr.repetition import RepetitionDetector
+from pdftexter.ocr.stats import PageStats
+
+pytestmark = pytest.mark.skipif(not fork_supported(), reason="forkが使えない環境")
+
+
+class FakeBackend:
+    """HuggingFaceOCRWrapperと同じprocess_image()を持つ代替バックエンド"""
+    
+    def __init__(self):
+        # forkした子プロセスが親の読み込み済みの状態を共有していることの確認用
+        self.loaded_in = os.getpid()
+    
+    def process_image(
+        self, image_path, prompt, page_stats=None, detector=None, generation_overrides=None, resolution=None
+    ):
+        if "warm" in prompt:
+            # ウォームアップしたワーカーのPIDを記録する
+            Path(image_path, str(os.getpid())).touch()
+            return ""
+        if "hang" in prompt:
+            time.sleep(30)
+        if "crash" in prompt:
+            os._exit(3)
+        if "fail" in prompt:
+            raise ValueError("推論に失敗しました")
+        if page_stats is not None:
+            page_stats.completion_tokens = 5
+        if detector is not None:
+            detector.feed("abc")
+        return f"{prompt} {image_path.size[0]} {self.loaded_in} {os.getpid()}"
+
+
+@pytest.fixture
+def pool():
+    pool = CPUWorkerPool(FakeBackend(), num_workers=2, inference_timeout=2.0, cores=[0]).start()
+    yield pool
+    pool.close()
+
+
+class TestSplitCores:
+    """コアの割り当てのテスト"""
+    
+    def test_splits_evenly(self):
+        """コアを重ならない部分集合に分けること"""
+        assert split_cores([0, 1, 2, 3, 4], 2) == [[0, 1, 2], [3, 4]]
+    
+    def test_shares_when_fewer_cores(self):
+        """コアがワーカー数より少ない場合は1コアずつ共有すること"""
+        assert split_cores([0, 1], 3) == [[0], [1], [0]]
+
+
+class TestCPUWorkerPool:
+    """ワーカープロセスのプールのテスト"""
+    
+    def test_pages_processed_in_forked_workers(self, pool):
+        """親で読み込んだバックエンドを共有するワーカーで、複数のページを並行して処理すること"""
+        image = Image.new("RGB", (40, 30), "white")
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: pool.process_image(image, f"page{i}"), range(6)))
+        
+        parent = os.getpid()
+        for i, result in enumerate(results):
+            prompt, width, loaded_in, worker_pid = result.split()
+            assert (prompt, width, int(loaded_in)) == (f"page{i}", "40", parent)
+            assert int(worker_pid) in pool.pids
+        assert pool.pages == 6
+    
+    def test_warm_up_runs_once_per_worker(self, pool):
+        """ウォームアップを各ワーカーで1回ずつ実行し、処理したページ数に数えないこと"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pool.warm_up(tmpdir, "warm")
+            warmed = sorted(int(name) for name in os.listdir(tmpdir))
+        
+        assert warmed == sorted(pool.pids)
+        assert pool.pages == 0
+    
+    def test_stats_and_detector_returned(self, pool):
+        """ワーカーで更新したページ統計と検出器を呼び出し元に反映すること"""
+        page_stats = PageStats(page_num=3)
+        page_stats.resolution_mode = "small"
+        detector = RepetitionDetector()
+        pool.process_image(Image.new("RGB", (8, 8)), "page", page_stats=page_stats, detector=detector)
+        
+        assert page_stats.completion_tokens == 5
+        assert page_stats.resolution_mode == "small"
+        assert page_stats.page_num == 3
+        assert detector.text == "abc"
+    
+    def test_error_propagated(self, pool):
+        """バックエンドの例外を呼び出し元で送出すること"""
+        with pytest.raises(ValueError, match="推論に失敗しました"):
+            pool.process_image(Image.new("RGB", (8, 8)), "fail")
+        assert pool.restarts == 0
+    
+    def test_hang_restarts_worker(self, pool):
+        """推論がタイムアウトしたワーカーを再起動し、以降のページを処理できること"""
+        with pytest.raises(TimeoutError):
+            pool.process_image(Image.new("RGB", (8, 8)), "hang")
+        assert pool.restarts == 1
+        assert pool.process_image(Image.new("RGB", (8, 8)), "page").startswith("page 8")
+    
+    def test_crash_restarts_worker(self, pool):
+        """異常終了したワーカーを再起動すること"""
+        with pytest.raises(RuntimeError, match="異常終了"):
+            pool.process_image(Image.new("RGB", (8, 8)), "crash")
+        assert pool.restarts == 1
+        assert len(pool.pids) == 2
+    
+    def test_closed_pool_rejects_pages(self, pool):
+        """終了したプールは処理を受け付けないこと"""
+        pids = pool.pids
+        pool.close()
+        with pytest.raises(RuntimeError):
+            pool.process_image(Image.new("RGB", (8, 8)), "page")
+        assert pool.pids == []
+        for pid in pids:
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
@@ -0,0 +1,56 @@
+"""
+HuggingFace版のCPU推論プロファイルのテスト
+"""
+
+from unittest.mock import MagicMock, mock_open, patch
+
+import pytest
+
+from pdftexter.ocr.config import DeepSeekOCRConfig
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile, cpu_supports_bfloat16
+
+
+class TestCPUInferenceProfile:
+    """CPUInferenceProfileクラスのテスト"""
+    
+    @pytest.mark.parametrize("flags,expected", [
+        ("fpu sse2 avx2 avx512f avx512_bf16", True),
+        ("fpu sse2 avx2 avx512f", False),
+    ])
+    def test_auto_dtype_follows_cpu_flags(self, flags, expected):
+        """autoではCPUがbfloat16の演算命令を持つ場合のみbfloat16を使うことを確認"""
+        cpuinfo = f"processor\t: 0\nflags\t\t: {flags}\n"
+        with patch("builtins.open", mock_open(read_data=cpuinfo)):
+            assert cpu_supports_bfloat16() is expected
+            assert CPUInferenceProfile(dtype="auto").resolve_dtype() == (
+                "bfloat16" if expected else "float32"
+            )
+            assert CPUInferenceProfile(dtype="float32").resolve_dtype() == "float32"
+    
+    def test_apply_threads(self):
+        """指定したスレッド数だけを設定し、inter-opの設定失敗は無視することを確認"""
+        torch = MagicMock()
+        torch.set_num_interop_threads.side_effect = RuntimeError("already started")
+        
+        CPUInferenceProfile(num_threads=8, interop_threads=2).apply_threads(torch)
+        torch.set_num_threads.assert_called_once_with(8)
+        
+        torch.reset_mock()
+        CPUInferenceProfile().apply_threads(torch)
+        torch.set_num_threads.assert_not_called()
+        torch.set_num_interop_threads.assert_not_called()
+    
+    def test_from_config(self):
+        """設定ファイルの値からプロファイルを作成し、不正なdtypeを拒否することを確認"""
+        config = DeepSeekOCRConfig(
+            model_path="/models/ocr", cpu_num_threads=16, cpu_dtype="bfloat16", torch_compile=True
+        )
+        
+        profile = CPUInferenceProfile.from_config(config)
+        
+        assert profile.num_threads == 16
+        assert profile.dtype == "bfloat16"
+        assert profile.compile is True
+        assert profile.low_cpu_mem_usage is True
+        with pytest.raises(ValueError):
+            DeepSeekOCRConfig(model_path="/models/ocr", cpu_dtype="float16")
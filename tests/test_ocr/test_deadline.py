@@ -0,0 +1,124 @@
+"""
+ページ単位の処理期限モジュールのテスト
+"""
+
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.concurrency import ConcurrencyLimiter
+from pdftexter.ocr.config import DeepSeekOCRConfig, OCRConfig, OutputConfig
+from pdftexter.ocr.deadline import (
+    FREE_OCR_PROMPT,
+    DeadlineExceeded,
+    DeadlinePolicy,
+    build_degradation_ladder,
+)
+from pdftexter.ocr.deepseek import DeepSeekOCR
+from pdftexter.ocr.stats import PageStats
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+
+class TestDeadlinePolicy:
+    """DeadlinePolicyクラスのテスト"""
+    
+    def test_deadline_follows_observed_latency(self):
+        """観測数が揃うまではタイムアウトを使い、その後は観測値から期限を決めることを確認"""
+        policy = DeadlinePolicy(max_deadline=300, multiplier=2.0, min_deadline=5, min_samples=3)
+        
+        assert policy.deadline() == 300
+        for latency in (4.0, 5.0, 6.0):
+            policy.record_latency(latency)
+        assert policy.deadline() == 12.0
+        
+        policy.record_latency(1000.0)
+        assert policy.deadline() == 300
+    
+    def test_ladder_accumulates_rungs(self):
+        """縮退ラダーの各段が前の段の設定を引き継ぐことを確認"""
+        ladder = build_degradation_ladder(["low_resolution", "free_ocr", "tight_budget"])
+        
+        assert [name for name, _ in ladder] == ["full", "low_resolution", "free_ocr", "tight_budget"]
+        assert ladder[0][1] == {}
+        assert ladder[3][1] == {
+            "upload_max_long_edge": 1024, "prompt": FREE_OCR_PROMPT, "max_tokens": 1024,
+        }
+        with pytest.raises(ValueError):
+            build_degradation_ladder(["unknown"])
+
+
+class TestPageDeadline:
+    """ページの処理期限と縮退のテスト"""
+    
+    def test_stream_stops_at_deadline(self):
+        """ストリーミング中に処理期限を超えたら受信を打ち切ることを確認"""
+        from PIL import Image
+        
+        config = FakeServerConfig(
+            latency_distribution="constant", latency_mean=0.0,
+            token_rate=20.0, output_tokens=(200, 200),
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with FakeVLLMServer(config) as server:
+                wrapper = VLLMWrapper(server_url=server.url, stream=True)
+                with pytest.raises(DeadlineExceeded):
+                    wrapper.call_vllm_api(str(img_path), deadline=0.3)
+    
+    def test_deadline_bounds_wait_for_concurrency_slot(self):
+        """同時実行の枠の空きを処理期限を超えて待たないことを確認"""
+        from PIL import Image
+        
+        limiter = ConcurrencyLimiter(initial_limit=1, max_limit=1, verbose=False)
+        limiter.acquire()
+        wrapper = VLLMWrapper(server_url="http://localhost:8000", concurrency_limiter=limiter)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            start = time.perf_counter()
+            with patch("requests.post") as mock_post:
+                with pytest.raises(DeadlineExceeded):
+                    wrapper.call_vllm_api(str(img_path), deadline=0.3)
+            elapsed = time.perf_counter() - start
+        
+        assert elapsed < 2.0
+        mock_post.assert_not_called()
+        assert limiter.inflight == 1
+    
+    def test_deadline_miss_degrades_to_next_rung(self):
+        """期限を超えたページが次の段で処理され、その段が記録されることを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                page_deadline=True,
+                degradation_ladder=["low_resolution", "free_ocr"],
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        
+        def fake_call(image_path, upload_max_long_edge=None, **kwargs):
+            if upload_max_long_edge is None:
+                raise DeadlineExceeded("ページの処理期限を超えました")
+            return "low resolution result"
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            img_path.touch()
+            page_stats = PageStats(page_num=1)
+            with patch.object(ocr.vllm_wrapper, "call_vllm_api", side_effect=fake_call) as mock_call:
+                result = ocr.process_image(str(img_path), page_stats=page_stats)
+        
+        assert result == "low resolution result"
+        assert mock_call.call_count == 2
+        assert mock_call.call_args.kwargs["deadline"] == 300
+        assert page_stats.deadline_misses == 1
+        assert page_stats.degradation == "low_resolution"
@@ -4,6 +4,8 @@ DeepSeek-OCR統合モジュールのテスト
 
 import os
 import tempfile
+import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, Mock, patch
 
@@ -157,3 +159,495 @@ class TestDeepSeekOCR:
                         # ユーザー指定のディレクトリは残っている
                         assert user_output_dir.exists(), "ユーザー指定のディレクトリが削除されています"
 
+    
+    def test_process_pdf_to_file_discards_partial_stream_on_failure(self):
+        """ストリーミング途中で失敗したページの書きかけテキストが取り消されることを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                stream=True,
+            ),
+            output=OutputConfig(),
+        )
+        
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        
+        def fake_process_image(image_path, prompt, page_stats=None, on_token=None, on_reset=None):
+            if image_path.endswith("page_0001.png"):
+                on_token("Page 1 ")
+                on_token("result")
+                return "Page 1 result"
+            on_token("partial garbage")
+            raise RuntimeError("stream broken")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir, "test.pdf")
+            pdf_path.touch()
+            output_file = Path(tmpdir, "out.md")
+            
+            with patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images") as mock_extract:
+                with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)):
+                    mock_extract.return_value = [
+                        str(Path(tmpdir, "page_0001.png")),
+                        str(Path(tmpdir, "page_0002.png")),
+                    ]
+                    with patch.object(ocr, "process_image", side_effect=fake_process_image):
+                        ocr.process_pdf_to_file(str(pdf_path), str(output_file), output_dir=tmpdir)
+            
+            text = output_file.read_text(encoding="utf-8")
+            assert "Page 1 result" in text
+            assert "partial garbage" not in text
+            assert "ページ 2 の処理に失敗しました" in text
+    
+    def test_resume_processes_only_remaining_pages(self):
+        """再開時は処理済みのページを飛ばし、残りのページだけを正しいページ番号で処理することを確認"""
+        for max_concurrent_pages in (1, 2):
+            config = OCRConfig(
+                deepseek_ocr=DeepSeekOCRConfig(
+                    model_path="/test/path",
+                    vllm_server_url="http://localhost:8000",
+                    max_concurrent_pages=max_concurrent_pages,
+                ),
+                output=OutputConfig(),
+            )
+            ocr = DeepSeekOCR(config, verify_setup=False)
+            processed = []
+            
+            def fake_process_image(image_path, prompt, page_stats=None, on_token=None, **kwargs):
+                processed.append((Path(image_path).name, page_stats.page_num))
+                result = f"{Path(image_path).stem} result"
+                if on_token is not None:
+                    on_token(result)
+                return result
+            
+            with tempfile.TemporaryDirectory() as tmpdir:
+                pdf_path = Path(tmpdir, "test.pdf")
+                pdf_path.touch()
+                output_file = Path(tmpdir, "out.md")
+                output_file.write_text("# OCR結果\n\npage_0001 result\n\n---\n\npage_0002 result", encoding="utf-8")
+                Path(tmpdir, "out.md.progress").write_text("page:2\ntotal:3\n", encoding="utf-8")
+                
+                with patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images") as mock_extract:
+                    with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)):
+                        mock_extract.return_value = [
+                            str(Path(tmpdir, f"page_{i:04d}.png")) for i in range(1, 4)
+                        ]
+                        with patch.object(ocr, "process_image", side_effect=fake_process_image):
+                            ocr.process_pdf_to_file(
+                                str(pdf_path), str(output_file), output_dir=tmpdir, resume=True
+                            )
+                
+                text = output_file.read_text(encoding="utf-8")
+            
+            assert processed == [("page_0003.png", 3)]
+            assert text.count("page_0001 result") == 1
+            assert "page_0002 result\n\n---\n\npage_0003 result" in text
+    
+    def test_process_image_retries_loop_with_different_sampling(self):
+        """ループを検出したページがサンプリング設定を変えて再試行されることを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                loop_detection=True,
+                loop_retry=True,
+                loop_retry_temperature=0.7,
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        
+        def fake_call(image_path, detector=None, sampling_overrides=None, **kwargs):
+            if sampling_overrides is None:
+                text = "表\n" + "| a |\n" * 50
+            else:
+                text = "表\n| a |\n| b |\n"
+            detector.feed(text)
+            detector.finish()
+            return detector.prefix
+        
+        from pdftexter.ocr.stats import PageStats
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            img_path.touch()
+            page_stats = PageStats(page_num=1)
+            with patch.object(ocr.vllm_wrapper, "call_vllm_api", side_effect=fake_call) as mock_call:
+                result = ocr.process_image(str(img_path), page_stats=page_stats)
+        
+        assert result == "表\n| a |\n| b |\n"
+        assert mock_call.call_count == 2
+        assert mock_call.call_args.kwargs["sampling_overrides"]["temperature"] == 0.7
+        assert page_stats.loop_retried
+    
+    def test_process_image_applies_resolution_mode(self):
+        """解像度モードをvLLM版では画像の縮小に変換し、使用したモードをページ統計に記録することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                resolution_mode="auto",
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        
+        from PIL import Image
+        
+        from pdftexter.ocr.stats import PageStats
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            blank_path = Path(tmpdir, "blank.png")
+            Image.new("RGB", (1200, 1600), "white").save(blank_path)
+            page_stats = PageStats(page_num=1)
+            with patch.object(ocr.vllm_wrapper, "call_vllm_api", return_value="") as mock_call:
+                ocr.process_image(str(blank_path), page_stats=page_stats)
+        
+        assert page_stats.resolution_mode == "tiny"
+        assert mock_call.call_args.kwargs["upload_max_long_edge"] == 512
+    
+    def test_process_pdf_passes_memory_images_to_hf_backend(self):
+        """HuggingFace版では中間画像を保存せず、ページ画像をメモリ上のまま渡すことを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        ocr.use_hf = True
+        ocr.hf_wrapper = Mock()
+        ocr.hf_wrapper.process_image.side_effect = lambda image_path, **kwargs: f"{image_path.size[0]}px"
+        ocr.hf_wrapper.prepare_image.side_effect = lambda image_path, resolution: image_path
+        
+        from PIL import Image
+        
+        pages = [Image.new("RGB", (100, 140), "white"), Image.new("RGB", (200, 280), "white")]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir, "test.pdf")
+            pdf_path.touch()
+            with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)), \
+                    patch("pdftexter.ocr.deepseek.rasterize_pdf_pages", return_value=pages), \
+                    patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images") as mock_extract, \
+                    patch("tempfile.mkdtemp") as mock_mkdtemp:
+                result = ocr.process_pdf(str(pdf_path))
+        
+        assert result == "100px\n\n---\n\n200px"
+        mock_extract.assert_not_called()
+        mock_mkdtemp.assert_not_called()
+        with pytest.raises(ValueError):
+            ocr.use_hf = False
+            ocr.process_image(pages[0])
+    
+    def test_hf_prefetches_next_page(self):
+        """HuggingFace版では、次のページの前処理を推論と並行して行い、計測値を記録することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        ocr.use_hf = True
+        ocr.hf_wrapper = Mock()
+        prepared = threading.Event()
+        
+        def prepare_image(image_path, resolution):
+            if image_path == "page2":
+                prepared.set()
+            return f"prepared-{image_path}"
+        
+        def process_image(image_path, **kwargs):
+            # ページ1の推論中に、ページ2の前処理が済むことを確認する
+            if image_path == "prepared-page1":
+                assert prepared.wait(5)
+            return image_path
+        
+        ocr.hf_wrapper.prepare_image.side_effect = prepare_image
+        ocr.hf_wrapper.process_image.side_effect = process_image
+        
+        with patch("pdftexter.ocr.deepseek.Path.exists", return_value=True):
+            results = list(ocr._iter_page_results(["page1", "page2"], None))
+        
+        assert [result for _, result, _ in results] == ["prepared-page1", "prepared-page2"]
+        assert all(page.preprocess_s is not None for page in ocr.run_stats.pages)
+        assert any(line.startswith("前処理の先読み: 2ページ") for line in ocr.run_stats.summary_lines())
+        
+        ocr.config.deepseek_ocr.hf_prefetch = False
+        ocr.hf_wrapper.prepare_image.reset_mock()
+        with patch("pdftexter.ocr.deepseek.Path.exists", return_value=True):
+            list(ocr._iter_page_results(["page1"], None))
+        ocr.hf_wrapper.prepare_image.assert_not_called()
+    
+    def test_hf_pool_processes_pages(self):
+        """CPUワーカープールがある場合は、ワーカー数のページをプールで並行処理することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        ocr.use_hf = True
+        ocr.hf_wrapper = Mock()
+        ocr.hf_pool = Mock(num_workers=3)
+        ocr.hf_pool.process_image.return_value = "pooled"
+        
+        assert ocr.page_concurrency == 3
+        with tempfile.TemporaryDirectory() as tmpdir:
+            image_path = Path(tmpdir, "page.png")
+            image_path.touch()
+            assert ocr.process_image(str(image_path)) == "pooled"
+        ocr.hf_wrapper.process_image.assert_not_called()
+        
+        ocr.close()
+        ocr.hf_pool.close.assert_called_once()
+    
+    def test_warm_up_uses_hf_pool_workers(self):
+        """CPUワーカープールがある場合、ウォームアップはこのプロセスでは推論せずワーカーで行うことを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        ocr.use_hf = True
+        ocr.hf_wrapper = Mock()
+        ocr.hf_pool = Mock(num_workers=2)
+        
+        assert ocr.warm_up() is not None
+        
+        ocr.hf_pool.warm_up.assert_called_once()
+        ocr.hf_wrapper.process_image.assert_not_called()
+    
+    def test_background_init_overlaps_pdf_rasterization(self):
+        """バックエンドの準備がPDFの画像変換と並行して行われ、起動の経過時間を記録することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        rasterized = threading.Event()
+        overlapped = []
+        
+        def slow_wrapper(**kwargs):
+            # 画像変換が始まるまでバックエンドの準備を終えない
+            overlapped.append(rasterized.wait(5))
+            return Mock(stream=False, call_vllm_api=Mock(return_value="text"))
+        
+        from PIL import Image
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir, "test.pdf")
+            pdf_path.touch()
+            image_path = Path(tmpdir, "page_0001.png")
+            Image.new("RGB", (40, 60), "white").save(image_path)
+            
+            def fake_extract(pdf_path, output_dir):
+                rasterized.set()
+                return [str(image_path)]
+            
+            with patch("pdftexter.ocr.deepseek.VLLMWrapper", side_effect=slow_wrapper):
+                ocr = DeepSeekOCR(config, verify_setup=False, background_init=True)
+                with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)), \
+                        patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images", side_effect=fake_extract):
+                    result = ocr.process_pdf(str(pdf_path), output_dir=tmpdir)
+        
+        assert result == "text"
+        assert overlapped == [True]
+        assert set(ocr.startup_timings) == {"backend_s", "pdf_prepare_s", "backend_wait_s", "ocr_start_s"}
+        assert any(line.startswith("起動: OCR開始まで") for line in ocr.run_stats.summary_lines())
+    
+    def test_background_init_skipped_for_hf_worker_pool(self):
+        """CPUワーカーのプールを使う場合は、バックエンドを呼び出し元のスレッドで準備することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                use_huggingface=True,
+                use_worker=False,
+                hf_num_workers=2,
+            ),
+            output=OutputConfig(),
+        )
+        init_threads = []
+        
+        with patch.object(
+            DeepSeekOCR, "_init_backend", lambda self, verify_setup: init_threads.append(threading.current_thread())
+        ):
+            ocr = DeepSeekOCR(config, background_init=True)
+        
+        assert init_threads == [threading.current_thread()]
+        assert ocr._backend_thread is None
+    
+    def test_background_init_failure_raised_at_ocr(self):
+        """バックグラウンドでのセットアップ検証の失敗を、OCR処理の開始時に送出することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+            ),
+            output=OutputConfig(),
+        )
+        with patch(
+            "pdftexter.ocr.model_checker.verify_ocr_setup", return_value=(False, "サーバーに接続できません")
+        ):
+            ocr = DeepSeekOCR(config, background_init=True)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                pdf_path = Path(tmpdir, "test.pdf")
+                pdf_path.touch()
+                with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)), \
+                        patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images", return_value=[]):
+                    with pytest.raises(RuntimeError, match="サーバーに接続できません"):
+                        ocr.process_pdf(str(pdf_path), output_dir=tmpdir)
+        
+        assert isinstance(ocr.backend_error, RuntimeError)
+        ocr.close()
+    
+    def test_close_stops_background_polling(self):
+        """close()でエンドポイントのヘルスチェックと/metricsの取得のスレッドが停止することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_endpoints=[{"url": "http://gpu0:8000"}, {"url": "http://gpu1:8000"}],
+                endpoint_health_check_interval=60,
+                adaptive_concurrency=True,
+                max_concurrent_pages=4,
+                concurrency_metrics_interval=60,
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        health_thread = ocr.vllm_wrapper.endpoints._health_thread
+        metrics_thread = ocr.vllm_wrapper.concurrency_limiter._metrics_thread
+        assert health_thread.is_alive() and metrics_thread.is_alive()
+        
+        ocr.close()
+        
+        assert not health_thread.is_alive()
+        assert not metrics_thread.is_alive()
+    
+    def test_process_pdf_concurrent_pages_keep_order(self):
+        """複数ページを並行して処理しても、結果がページ順に並ぶことを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                max_concurrent_pages=4,
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        
+        def fake_process_image(image_path, prompt, page_stats=None):
+            # 先のページほど遅く完了させる
+            page = int(Path(image_path).stem.split("_")[1])
+            time.sleep(0.05 * (5 - page))
+            return f"Page {page} result"
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir, "test.pdf")
+            pdf_path.touch()
+            image_paths = [str(Path(tmpdir, f"page_{i:04d}.png")) for i in range(1, 5)]
+            
+            with patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images", return_value=image_paths):
+                with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)):
+                    with patch.object(ocr, "process_image", side_effect=fake_process_image):
+                        result = ocr.process_pdf(str(pdf_path), output_dir=tmpdir)
+        
+        positions = [result.index(f"Page {i} result") for i in range(1, 5)]
+        assert positions == sorted(positions)
+        assert len(ocr.run_stats.pages) == 4
+    
+    def test_concurrent_pages_are_rasterized_lazily(self):
+        """複数ページを並行処理する場合も、ページ画像を処理する時点で1ページずつ参照することを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                max_concurrent_pages=2,
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        accessed = []
+        first_result = threading.Event()
+        
+        class LazyPages:
+            """参照されたページを記録するPdfPageImagesの代わり"""
+            
+            def __len__(self):
+                return 8
+            
+            def __getitem__(self, index):
+                accessed.append(index)
+                return f"page_{index + 1}"
+        
+        def fake_process_image(image_path, prompt, page_stats=None):
+            # 3ページ目以降は、呼び出し元が最初の結果を受け取るまで待たせる
+            if image_path not in ("page_1", "page_2"):
+                assert first_result.wait(5)
+            return image_path
+        
+        with patch.object(ocr, "process_image", side_effect=fake_process_image):
+            results = ocr._iter_page_results(LazyPages(), None)
+            first = next(results)
+            accessed_before_first = len(accessed)
+            first_result.set()
+            rest = list(results)
+        
+        assert first[1] == "page_1"
+        # 同時に処理する2ページと、それぞれの次のページまでしか変換していない
+        assert accessed_before_first <= 4
+        assert [result for _, result, _ in rest] == [f"page_{i}" for i in range(2, 9)]
+    
+    def test_warm_up_runs_alongside_rasterization_without_stats(self):
+        """ウォームアップが画像変換と並行して1回だけ実行され、実行統計に記録されないことを確認"""
+        config = OCRConfig(
+            deepseek_ocr=DeepSeekOCRConfig(
+                model_path="/test/path",
+                vllm_server_url="http://localhost:8000",
+                warmup=True,
+            ),
+            output=OutputConfig(),
+        )
+        ocr = DeepSeekOCR(config, verify_setup=False)
+        events = []
+        
+        def fake_warm_up(image_path, prompt, max_tokens=16):
+            events.append(("warmup_start", prompt))
+            time.sleep(0.1)
+            events.append(("warmup_end", None))
+            return []
+        
+        def fake_extract(pdf_path, output_dir):
+            events.append(("extract", None))
+            return [str(Path(output_dir, "page_0001.png"))]
+        
+        def fake_process_image(image_path, prompt, page_stats=None):
+            events.append(("page", None))
+            return "Page 1 result"
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir, "test.pdf")
+            pdf_path.touch()
+            with patch("pdftexter.ocr.deepseek.extract_pdf_pages_as_images", side_effect=fake_extract):
+                with patch("pdftexter.ocr.deepseek.validate_pdf", return_value=(True, None)):
+                    with patch.object(ocr.vllm_wrapper, "warm_up", side_effect=fake_warm_up):
+                        with patch.object(ocr, "process_image", side_effect=fake_process_image):
+                            ocr.process_pdf(str(pdf_path), output_dir=tmpdir)
+                            ocr.process_pdf(str(pdf_path), output_dir=tmpdir)
+        
+        names = [name for name, _ in events]
+        # 画像変換はウォームアップの完了を待たずに始まり、最初のページはウォームアップ後に処理される
+        assert names.index("extract") < names.index("warmup_end") < names.index("page")
+        assert names.count("warmup_start") == 1
+        assert dict(events)["warmup_start"] == "<image>\n<|grounding|>Convert the document to markdown."
+        assert len(ocr.run_stats.pages) == 2
@@ -0,0 +1,109 @@
+"""
+エンドポイント負荷分散モジュールのテスト
+"""
+
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.endpoints import Endpoint, EndpointPool, is_endpoint_failure
+from pdftexter.ocr.retry import RetryPolicy
+from pdftexter.ocr.stats import PageStats
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+
+def unused_url() -> str:
+    """接続を受け付けないローカルURLを返す"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+class TestEndpointPool:
+    """EndpointPoolクラスのテスト"""
+    
+    def test_acquire_prefers_fewest_outstanding_by_weight(self):
+        """重みで正規化した未処理リクエスト数が最も少ないエンドポイントが選ばれることを確認"""
+        pool = EndpointPool.from_urls([("http://a", 1.0), ("http://b", 2.0)])
+        
+        chosen = [pool.acquire().url for _ in range(6)]
+        
+        # 重み2のbが2倍のリクエストを受け持つ
+        assert chosen.count("http://b") == 4
+        assert chosen.count("http://a") == 2
+    
+    def test_circuit_breaker_ejects_and_recovers_after_cooldown(self):
+        """連続失敗で切り離され、クールダウン後に再び振り分けられることを確認"""
+        pool = EndpointPool.from_urls(
+            [("http://a", 1.0), ("http://b", 1.0)], failure_threshold=2, cooldown=0.05
+        )
+        a = pool.endpoints[0]
+        for _ in range(2):
+            pool.release(pool.acquire(exclude=[pool.endpoints[1]]), success=False)
+        
+        assert not a.is_available()
+        assert a.ejections == 1
+        assert all(pool.acquire() is pool.endpoints[1] for _ in range(3))
+        
+        time.sleep(0.06)
+        assert a.is_available()
+        assert pool.acquire() is a
+    
+    def test_client_errors_do_not_count_as_endpoint_failures(self):
+        """4xxはエンドポイントの異常として数えず、接続エラーと5xxは数えることを確認"""
+        response_400 = requests.Response()
+        response_400.status_code = 400
+        response_503 = requests.Response()
+        response_503.status_code = 503
+        
+        assert not is_endpoint_failure(requests.HTTPError(response=response_400))
+        assert is_endpoint_failure(requests.HTTPError(response=response_503))
+        assert is_endpoint_failure(requests.ConnectionError())
+    
+    def test_check_health_ejects_unreachable_endpoint(self):
+        """/healthに応答しないエンドポイントが切り離されることを確認"""
+        with FakeVLLMServer(FakeServerConfig()) as server:
+            pool = EndpointPool([Endpoint(server.url), Endpoint(unused_url())], health_timeout=1.0)
+            pool.check_health()
+        
+        assert pool.endpoints[0].is_available()
+        assert not pool.endpoints[1].is_available()
+
+
+class TestVLLMWrapperFailover:
+    """VLLMWrapperのフェイルオーバーのテスト"""
+    
+    def test_failed_page_is_resubmitted_to_other_endpoint_without_backoff(self):
+        """停止したレプリカで失敗したページが待機なしで別のレプリカに再送されることを確認"""
+        from PIL import Image
+        
+        config = FakeServerConfig(latency_distribution="constant", latency_mean=0.0, output_tokens=(5, 5))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with FakeVLLMServer(config) as server:
+                # 停止しているレプリカの方が重みが大きく、最初に選ばれる
+                pool = EndpointPool([Endpoint(unused_url(), weight=2.0), Endpoint(server.url)])
+                wrapper = VLLMWrapper(
+                    endpoints=pool,
+                    retry_policy=RetryPolicy(max_attempts=3, base_delay=30.0),
+                )
+                page_stats = PageStats(page_num=1)
+                
+                start = time.perf_counter()
+                result = wrapper.call_vllm_api(str(img_path), page_stats=page_stats)
+                elapsed = time.perf_counter() - start
+        
+        assert result
+        assert elapsed < 5.0
+        assert page_stats.failovers == 1
+        assert page_stats.endpoint == server.url
+        assert pool.failovers == 1
+        assert pool.endpoints[0].failures_total == 1
+        assert any("別エンドポイントへの再送: 1回" in line for line in pool.summary_lines())
@@ -0,0 +1,108 @@
+"""
+ヘッジリクエストモジュールのテスト
+"""
+
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.concurrency import ConcurrencyLimiter
+from pdftexter.ocr.endpoints import Endpoint, EndpointPool
+from pdftexter.ocr.hedging import HedgePolicy, RequestCancelled
+from pdftexter.ocr.stats import PageStats
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+
+
+class TestHedgePolicy:
+    """HedgePolicyクラスのテスト"""
+    
+    def test_no_hedge_until_enough_samples(self):
+        """観測数が足りない間はヘッジしないことを確認"""
+        policy = HedgePolicy(min_samples=3, min_delay=0.0)
+        
+        assert policy.start_request() is None
+        for latency in (1.0, 2.0, 10.0):
+            policy.record_latency(latency)
+        
+        assert policy.start_request() == 10.0
+    
+    def test_budget_limits_hedge_ratio(self):
+        """ヘッジの割合が予算を超えないことを確認"""
+        policy = HedgePolicy(max_ratio=0.1, min_samples=0)
+        
+        hedges = 0
+        for _ in range(100):
+            policy.start_request()
+            if policy.try_acquire():
+                hedges += 1
+        
+        assert hedges == 10
+        assert policy.hedges_total == 10
+
+
+class TestVLLMWrapperHedging:
+    """VLLMWrapperのヘッジのテスト"""
+    
+    def test_hedge_to_fast_endpoint_wins_and_replaces_stream(self):
+        """遅いレプリカへのリクエストがヘッジされ、先に完了した結果が採用されることを確認"""
+        from PIL import Image
+        
+        slow = FakeServerConfig(latency_distribution="constant", latency_mean=3.0, output_tokens=(5, 5))
+        fast = FakeServerConfig(latency_distribution="constant", latency_mean=0.0, output_tokens=(5, 5))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with FakeVLLMServer(slow) as slow_server, FakeVLLMServer(fast) as fast_server:
+                # 遅いレプリカの方が重みが大きく、元のリクエストはそちらへ送られる
+                pool = EndpointPool([Endpoint(slow_server.url, weight=2.0), Endpoint(fast_server.url)])
+                policy = HedgePolicy(max_ratio=1.0, min_samples=0, min_delay=0.2)
+                wrapper = VLLMWrapper(endpoints=pool, hedge_policy=policy, stream=True)
+                written = []
+                page_stats = PageStats(page_num=1)
+                
+                start = time.perf_counter()
+                result = wrapper.call_vllm_api(
+                    str(img_path),
+                    page_stats=page_stats,
+                    on_token=written.append,
+                    on_reset=written.clear,
+                )
+                elapsed = time.perf_counter() - start
+        
+        assert elapsed < 2.0
+        assert "".join(written) == result
+        assert page_stats.hedged
+        assert page_stats.hedge_won
+        assert page_stats.endpoint == fast_server.url
+        assert policy.hedge_wins == 1
+        assert policy.summary_lines()
+    
+    def test_cancelled_while_queued_does_not_send_request(self):
+        """同時実行の枠を待っている間に負けた試行は、リクエストを送らずに中止することを確認"""
+        from PIL import Image
+        
+        limiter = ConcurrencyLimiter(initial_limit=1, max_limit=1, verbose=False)
+        limiter.acquire()
+        wrapper = VLLMWrapper(server_url="http://localhost:8000", concurrency_limiter=limiter)
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with patch("requests.post") as mock_post:
+                with pytest.raises(RequestCancelled):
+                    wrapper._call_with_retries(
+                        str(img_path), "prompt", 16, 0.0, None, None, None, None, None, None,
+                        cancel_event=cancel_event,
+                    )
+        
+        mock_post.assert_not_called()
+        assert limiter.inflight == 1
@@ -0,0 +1,81 @@
+"""
+メモリ上のページ画像の受け渡しのテスト
+"""
+
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pdftexter.ocr.memory_image import memory_image_file, to_pil_image
+
+
+def make_remote_model(with_loader: bool = True):
+    """load_image()を持つリモートコードのモジュールと、そのモデルを作成する"""
+    module = types.ModuleType("fake_remote_deepseek_ocr")
+    loaded = []
+    
+    def load_image(image_path):
+        loaded.append(image_path)
+        return Image.open(image_path)
+    
+    if with_loader:
+        module.load_image = load_image
+    model_class = type("FakeDeepseekOCR", (), {"__module__": module.__name__})
+    sys.modules[module.__name__] = module
+    return module, model_class(), loaded
+
+
+@pytest.fixture
+def remote_model():
+    module, model, loaded = make_remote_model()
+    yield module, model, loaded
+    del sys.modules[module.__name__]
+
+
+class TestMemoryImageFile:
+    """memory_image_file()のテスト"""
+    
+    def test_passes_memory_image_to_load_image(self, remote_model):
+        """メモリ上の画像をファイルに書き出さずにload_image()から返すことを確認"""
+        module, model, loaded = remote_model
+        image = Image.new("RGB", (64, 32), "white")
+        
+        with memory_image_file(image, model) as image_file:
+            assert not Path(image_file).exists()
+            assert module.load_image(image_file) is image
+        
+        assert loaded == []
+        with pytest.raises(OSError):
+            module.load_image(image_file)
+    
+    def test_paths_are_passed_through(self, remote_model, tmp_path):
+        """画像ファイルのパスはそのまま元のload_image()で読み込むことを確認"""
+        module, model, loaded = remote_model
+        page = tmp_path / "page.png"
+        Image.new("RGB", (64, 32), "white").save(page)
+        
+        with memory_image_file(page, model) as image_file:
+            assert image_file == str(page)
+            assert module.load_image(image_file).size == (64, 32)
+        
+        assert loaded == [str(page)]
+    
+    def test_falls_back_to_temp_file(self):
+        """load_image()がないリモートコードでは一時ファイルに書き出すことを確認"""
+        module, model, _ = make_remote_model(with_loader=False)
+        try:
+            with memory_image_file(np.zeros((32, 64, 3), dtype=np.uint8), model) as image_file:
+                with Image.open(image_file) as image:
+                    assert image.size == (64, 32)
+            assert not Path(image_file).exists()
+        finally:
+            del sys.modules[module.__name__]
+    
+    def test_rejects_unknown_types(self):
+        """画像として扱えない型はTypeErrorになることを確認"""
+        with pytest.raises(TypeError):
+            to_pil_image(b"not an image")
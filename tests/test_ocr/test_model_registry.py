@@ -0,0 +1,108 @@
+"""
+HuggingFace版モデルのレジストリのテスト
+"""
+
+import threading
+import time
+
+from pdftexter.ocr.model_registry import ModelRegistry
+
+KEY = ("/models/DeepSeek-OCR", "float32", "default", "cpu")
+
+
+class CountingLoader:
+    """呼び出し回数を数える読み込み関数"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+    
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return object(), object()
+
+
+class TestModelRegistry:
+    """ModelRegistryクラスのテスト"""
+    
+    def test_shares_loaded_model(self):
+        """同じキーのモデルは1回だけ読み込まれ、異なるキーは別に読み込まれることを確認"""
+        registry = ModelRegistry()
+        loader = CountingLoader()
+        
+        first = registry.acquire(KEY, loader)
+        second = registry.acquire(KEY, loader)
+        other = registry.acquire(KEY[:3] + ("cuda",), loader)
+        
+        assert first is second
+        assert first.model is second.model
+        assert other is not first
+        assert loader.calls == 2
+        assert first.references == 2
+    
+    def test_concurrent_acquire_loads_once(self):
+        """複数のスレッドが同時に要求しても読み込みは1回だけであることを確認"""
+        registry = ModelRegistry()
+        loader = CountingLoader(delay=0.05)
+        entries = []
+        
+        threads = [
+            threading.Thread(target=lambda: entries.append(registry.acquire(KEY, loader)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert loader.calls == 1
+        assert len({id(entry) for entry in entries}) == 1
+        assert entries[0].references == 4
+    
+    def test_released_model_is_kept_until_evicted(self):
+        """参照を解放したモデルはevict()まで保持され、参照中のモデルはforceなしでは解放されないことを確認"""
+        registry = ModelRegistry()
+        loader = CountingLoader()
+        entry = registry.acquire(KEY, loader)
+        
+        assert registry.evict() == []
+        
+        registry.release(entry)
+        assert registry.acquire(KEY, loader) is entry
+        registry.release(entry)
+        
+        assert registry.evict() == [KEY]
+        assert registry.loaded_keys() == []
+        assert entry.model is None
+        
+        registry.acquire(KEY, loader)
+        assert loader.calls == 2
+    
+    def test_idle_eviction(self):
+        """アイドル時間の経過後に解放され、その前に再取得すれば解放が取り消されることを確認"""
+        registry = ModelRegistry()
+        loader = CountingLoader()
+        entry = registry.acquire(KEY, loader, idle_timeout=0.05)
+        
+        registry.release(entry)
+        assert registry.acquire(KEY, loader, idle_timeout=0.05) is entry
+        time.sleep(0.1)
+        assert registry.loaded_keys() == [KEY]
+        
+        registry.release(entry)
+        time.sleep(0.2)
+        assert registry.loaded_keys() == []
+        assert loader.calls == 1
+    
+    def test_force_evict_in_use(self):
+        """forceを指定すると参照中のモデルも解放し、その後のreleaseは無視されることを確認"""
+        registry = ModelRegistry()
+        entry = registry.acquire(KEY, CountingLoader())
+        
+        assert registry.evict(KEY, force=True) == [KEY]
+        registry.release(entry)
+        
+        assert registry.loaded_keys() == []
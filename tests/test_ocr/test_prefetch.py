@@ -0,0 +1,105 @@
+"""
+HuggingFace版の前処理の先読みのテスト
+"""
+
+import sys
+import tempfile
+import threading
+import types
+from pathlib import Path
+
+from PIL import Image
+
+from pdftexter.ocr import prefetch
+from pdftexter.ocr.prefetch import PagePrefetcher, load_page_image, prepare_tiles
+
+
+class TestPagePrefetcher:
+    """次のページの準備を並行して行うテスト"""
+    
+    def test_prepares_next_page_during_current(self):
+        """現在のページの処理中に次のページを準備し、ページ順に返すことを確認"""
+        prepared = {index: threading.Event() for index in range(3)}
+        
+        def prepare(page):
+            prepared[page].set()
+            return page * 10
+        
+        results = []
+        for page, preprocess_s, wait_s in PagePrefetcher([0, 1, 2], prepare):
+            # 呼び出し元が処理している間に、次のページの準備が済む
+            if page < 20:
+                assert prepared[page // 10 + 1].wait(5)
+            results.append(page)
+            assert preprocess_s >= 0 and wait_s >= 0
+        
+        assert results == [0, 10, 20]
+    
+    def test_starts_from_given_index(self):
+        """開始位置より前のページは参照も準備もしないことを確認"""
+        prepared = []
+        
+        def prepare(page):
+            prepared.append(page)
+            return page
+        
+        pages = [page for page, _, _ in PagePrefetcher(["a", "b", "c", "d"], prepare, start=2)]
+        
+        assert pages == ["c", "d"]
+        assert prepared == ["c", "d"]
+    
+    def test_failed_page_falls_back(self):
+        """準備に失敗したページは準備前のページを返し、後続のページは準備することを確認"""
+        def prepare(page):
+            if page == "broken":
+                raise OSError("読み込めません")
+            return page.upper()
+        
+        pages = [page for page, _, _ in PagePrefetcher(["a", "broken", "c"], prepare)]
+        
+        assert pages == ["A", "broken", "C"]
+    
+    def test_empty(self):
+        """ページがない場合は何も返さないことを確認"""
+        assert list(PagePrefetcher([], lambda page: page)) == []
+
+
+class TestPreparedImage:
+    """画像の読み込みとタイルへの分割の先読みのテスト"""
+    
+    def test_load_page_image_converts_to_rgb(self):
+        """ファイル・メモリ上の画像をRGBで読み込むことを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, "page.png")
+            Image.new("L", (30, 20), 255).save(path)
+            loaded = load_page_image(str(path))
+        
+        assert loaded.mode == "RGB"
+        assert loaded.size == (30, 20)
+        assert load_page_image(Image.new("RGBA", (5, 5))).mode == "RGB"
+    
+    def test_tiles_are_reused_by_infer(self):
+        """先に分割したタイルを、infer()が同じ内容の画像で分割するときに返すことを確認"""
+        calls = []
+        module = types.ModuleType("fake_deepseek_prefetch")
+        module.dynamic_preprocess = lambda image, *args, **kwargs: calls.append(image.size) or ["tiles"]
+        model_class = type("FakeModel", (), {"__module__": module.__name__})
+        sys.modules[module.__name__] = module
+        try:
+            image = Image.new("RGB", (40, 30), "white")
+            assert prepare_tiles(image, model_class())
+            assert len(calls) == 1
+            
+            # infer()は画像をRGBに変換し直す（別のオブジェクトになる）
+            assert module.dynamic_preprocess(image.convert("RGB")) == ["tiles"]
+            assert len(calls) == 1
+            # 結果は1回だけ使い、2回目は元の関数で分割する
+            module.dynamic_preprocess(image.convert("RGB"))
+            assert len(calls) == 2
+        finally:
+            del sys.modules[module.__name__]
+            prefetch._tiles.clear()
+    
+    def test_without_remote_code(self):
+        """リモートコードにdynamic_preprocess()がない場合は分割しないことを確認"""
+        assert not prepare_tiles(Image.new("RGB", (10, 10)), object())
@@ -0,0 +1,73 @@
+"""
+HuggingFace版の動的int8量子化のテスト
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.ocr.quantization import language_linear_names, quantized_cache_path
+
+
+class FakeLinear:
+    """torch.nn.Linearの代わりのクラス"""
+
+
+class FakeModel:
+    """named_modules()を持つ代替モデル"""
+    
+    def named_modules(self):
+        return [
+            ("", object()),
+            ("model.sam_model.blocks.0.attn.qkv", FakeLinear()),
+            ("model.vision_model.transformer.layers.0.mlp.fc1", FakeLinear()),
+            ("model.projector.layers", FakeLinear()),
+            ("model.layers.0.self_attn.q_proj", FakeLinear()),
+            ("model.layers.0.mlp.experts.0.gate_proj", FakeLinear()),
+            ("model.layers.0.input_layernorm", object()),
+            ("lm_head", FakeLinear()),
+        ]
+
+
+class TestQuantization:
+    """量子化の対象と量子化済みモデルのキャッシュのテスト"""
+    
+    def test_only_language_model_linears(self):
+        """視覚エンコーダーとプロジェクターを除いたLinear層だけを量子化の対象にすることを確認"""
+        names = language_linear_names(FakeModel(), FakeLinear)
+        
+        assert names == {
+            "model.layers.0.self_attn.q_proj",
+            "model.layers.0.mlp.experts.0.gate_proj",
+            "lm_head",
+        }
+    
+    def test_cache_path_changes_with_model_files(self):
+        """モデルの重み・torchのバージョンが変わるとキャッシュのパスが変わることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            model_dir = Path(tmpdir, "DeepSeek-OCR")
+            model_dir.mkdir()
+            weights = model_dir / "model.safetensors"
+            weights.write_bytes(b"weights")
+            
+            path = quantized_cache_path(str(model_dir), "int8-dynamic", "2.4.0", cache_dir=tmpdir)
+            
+            assert path.parent == Path(tmpdir)
+            assert path.name.startswith("DeepSeek-OCR-int8-dynamic-")
+            assert path == quantized_cache_path(str(model_dir), "int8-dynamic", "2.4.0", cache_dir=tmpdir)
+            assert path != quantized_cache_path(str(model_dir), "int8-dynamic", "2.5.0", cache_dir=tmpdir)
+            
+            weights.write_bytes(b"updated weights")
+            os.utime(weights, ns=(0, 0))
+            assert path != quantized_cache_path(str(model_dir), "int8-dynamic", "2.4.0", cache_dir=tmpdir)
+    
+    def test_profile_uses_quantization_as_dtype(self):
+        """量子化する場合は量子化方式を（量子化しないモデルと区別する）dtypeとして扱うことを確認"""
+        profile = CPUInferenceProfile(dtype="bfloat16", quantization="int8-dynamic")
+        
+        assert profile.resolve_dtype() == "int8-dynamic"
+        with pytest.raises(ValueError):
+            CPUInferenceProfile(quantization="int4")
@@ -0,0 +1,66 @@
+"""
+生成ループ検出モジュールのテスト
+"""
+
+from pdftexter.ocr.repetition import RepetitionDetector, trim_repetition
+
+
+class TestRepetitionDetector:
+    """RepetitionDetectorクラスのテスト"""
+    
+    def test_detects_repeated_lines_and_keeps_first(self):
+        """同一行の連続を検出し、最初の1行までを残すことを確認"""
+        detector = RepetitionDetector(max_repeated_lines=5)
+        
+        detected_at = None
+        for i in range(20):
+            if detector.feed("| cell | cell |\n"):
+                detected_at = i
+                break
+        
+        assert detected_at == 4
+        assert detector.prefix == "| cell | cell |\n"
+    
+    def test_detects_dot_leader_without_newlines(self):
+        """改行を含まないリーダー罫の繰り返しを検出することを確認"""
+        detector = RepetitionDetector(min_repeat_chars=256)
+        detector.feed("第1章 はじめに ")
+        
+        fed = 0
+        while not detector.feed("." * 8):
+            fed += 8
+            assert fed < 2000, "ループが検出されませんでした"
+        
+        assert detector.prefix == "第1章 はじめに ."
+    
+    def test_normal_text_is_not_detected(self):
+        """繰り返しのない文章や短いリーダー罫は検出しないことを確認"""
+        text = "".join(f"## 第{i}節\n本文 {i} の内容です。\n目次 {'.' * 40} {i}\n" for i in range(100))
+        
+        assert trim_repetition(text) is None
+    
+    def test_structural_lines_use_separate_threshold(self):
+        """表の空行のような構造的な行は、通常の行より多く連続しないと検出しないことを確認"""
+        table = "| 項目 | 数 |\n|---|---|\n" + "| | |\n" * 12 + "| 合計 | 3 |\n"
+        
+        assert trim_repetition(table) is None
+        assert trim_repetition("| | |\n" * 60) == "| | |\n"
+    
+    def test_trim_repetition_multi_line_pattern(self):
+        """複数行にまたがる繰り返しを取り除くことを確認"""
+        text = "見出し\n" + "項目A\n項目B\n" * 200
+        
+        assert trim_repetition(text) == "見出し\n項目A\n項目B\n"
+    
+    def test_reset_clears_state(self):
+        """reset()で検出状態が初期化されることを確認"""
+        detector = RepetitionDetector(max_repeated_lines=3)
+        for _ in range(3):
+            detector.feed("same\n")
+        assert detector.detected
+        
+        detector.reset()
+        
+        assert not detector.detected
+        assert detector.text == ""
+        assert not detector.feed("same\n")
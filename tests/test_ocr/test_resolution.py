@@ -0,0 +1,60 @@
+"""
+DeepSeek-OCRの解像度モードのテスト
+"""
+
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+from pdftexter.ocr.resolution import (
+    RESOLUTION_MODES,
+    choose_resolution_mode,
+    measure_page,
+    resolve_resolution_mode,
+)
+
+
+class TestResolutionMode:
+    """解像度モードの選択のテスト"""
+    
+    @pytest.mark.parametrize("size,ink_ratio,expected", [
+        ((1200, 1700), 0.001, "tiny"),
+        ((1200, 1700), 0.04, "small"),
+        ((1200, 1700), 0.10, "base"),
+        ((1200, 1700), 0.20, "gundam"),
+        ((600, 2400), 0.04, "gundam"),
+        ((480, 600), 0.20, "small"),
+        ((400, 500), 0.10, "tiny"),
+    ])
+    def test_choose_resolution_mode(self, size, ink_ratio, expected):
+        """インク率・縦横比・画像の大きさからモードを選ぶことを確認"""
+        assert choose_resolution_mode(size, ink_ratio).name == expected
+    
+    def test_upload_long_edge(self):
+        """vLLM版ではGundam以外のモードをタイルに分割されない大きさへの縮小で再現することを確認"""
+        assert RESOLUTION_MODES["tiny"].upload_long_edge == 512
+        assert RESOLUTION_MODES["large"].upload_long_edge == 640
+        assert RESOLUTION_MODES["gundam"].upload_long_edge is None
+        assert RESOLUTION_MODES["small"].infer_kwargs() == {
+            "base_size": 640, "image_size": 640, "crop_mode": False
+        }
+    
+    def test_auto_measures_page(self):
+        """autoではページ画像を計測してモードを選び、読み込めない画像はGundamモードにすることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page = Path(tmpdir, "page.png")
+            image = Image.new("L", (1200, 1600), 255)
+            ImageDraw.Draw(image).rectangle((100, 100, 400, 400), fill=0)
+            image.save(page)
+            broken = Path(tmpdir, "broken.png")
+            broken.write_bytes(b"not an image")
+            
+            size, ink_ratio = measure_page(str(page))
+            
+            assert size == (1200, 1600)
+            assert ink_ratio == pytest.approx(300 * 300 / (1200 * 1600), rel=0.1)
+            assert resolve_resolution_mode("auto", str(page)).name == "small"
+            assert resolve_resolution_mode("auto", str(broken)).name == "gundam"
+            assert resolve_resolution_mode("base", str(broken)).name == "base"
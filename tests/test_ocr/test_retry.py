@@ -0,0 +1,69 @@
+"""
+リトライポリシーモジュールのテスト
+"""
+
+import random
+from unittest.mock import Mock
+
+from pdftexter.ocr.retry import RetryBudget, RetryPolicy, parse_retry_after
+
+
+class TestRetryPolicy:
+    """RetryPolicyクラスのテスト"""
+    
+    def test_backoff_delay_is_capped_full_jitter(self):
+        """待機時間が [0, min(上限, 基準 * 2^n)] の範囲に収まることを確認"""
+        policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=5.0, rng=random.Random(0))
+        
+        for attempt in range(8):
+            delay = policy.backoff_delay(attempt)
+            assert 0 <= delay <= min(5.0, 2 ** attempt)
+    
+    def test_non_retryable_client_errors_are_not_retried(self):
+        """400/413などはリトライされず、429/503はリトライされることを確認"""
+        policy = RetryPolicy(max_attempts=3, base_delay=0.1)
+        
+        for status in (400, 401, 404, 413, 422):
+            assert policy.next_delay(0, Mock(status_code=status, headers={})) is None
+        for status in (408, 429, 500, 502, 503):
+            assert policy.next_delay(0, Mock(status_code=status, headers={})) is not None
+    
+    def test_retry_after_is_honored(self):
+        """429/503のRetry-Afterヘッダーが待機時間に反映されることを確認"""
+        policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=60.0)
+        response = Mock(status_code=503, headers={"Retry-After": "7"})
+        
+        delay = policy.next_delay(0, response)
+        
+        assert 7.0 <= delay <= 7.5
+    
+    def test_max_attempts_stops_retry(self):
+        """最後の試行の後はリトライしないことを確認"""
+        policy = RetryPolicy(max_attempts=2, base_delay=0.1)
+        
+        assert policy.next_delay(0) is not None
+        assert policy.next_delay(1) is None
+    
+    def test_budget_limits_retries(self):
+        """ドキュメント単位の予算を使い切るとリトライしないことを確認"""
+        policy = RetryPolicy(max_attempts=5, base_delay=0.1)
+        budget = RetryBudget(max_retries=2)
+        
+        assert policy.next_delay(0, budget=budget) is not None
+        assert policy.next_delay(0, budget=budget) is not None
+        assert policy.next_delay(0, budget=budget) is None
+        assert budget.exhausted
+
+
+class TestParseRetryAfter:
+    """parse_retry_after関数のテスト"""
+    
+    def test_parse_seconds_and_invalid_values(self):
+        """秒数は数値に変換され、不正な値はNoneになることを確認"""
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after("soon") is None
+        assert parse_retry_after(None) is None
+    
+    def test_parse_http_date(self):
+        """HTTP日付形式が残り秒数に変換されることを確認"""
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,87 @@
+"""
+HuggingFace版の準備済みモデルのスナップショットのテスト
+"""
+
+import pickle
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from pdftexter.ocr.cpu_profile import CPUInferenceProfile
+from pdftexter.ocr.hf_wrapper import _prepared_snapshot_path
+from pdftexter.ocr.snapshot import load_prepared_model, save_prepared_model, snapshot_path
+
+
+class FakeModel:
+    """eval()を持つ代替モデル"""
+    
+    def __init__(self, weights):
+        self.weights = weights
+        self.evaluated = False
+    
+    def eval(self):
+        self.evaluated = True
+        return self
+
+
+class FakeTorch:
+    """torch.save・torch.loadの代わりのモジュール"""
+    
+    def __init__(self, fail_save: bool = False):
+        self.fail_save = fail_save
+        self.load_kwargs = None
+    
+    def save(self, obj, path):
+        Path(path).write_bytes(pickle.dumps(obj))
+        if self.fail_save:
+            raise OSError("ディスクがいっぱいです")
+    
+    def load(self, path, **kwargs):
+        self.load_kwargs = kwargs
+        return pickle.loads(Path(path).read_bytes())
+
+
+class TestSnapshot:
+    """準備済みモデルの保存と読み込みのテスト"""
+    
+    def test_path_depends_on_dtype_and_versions(self):
+        """dtype・ライブラリのバージョンごとに別のファイルになることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = snapshot_path("deepseek-ai/DeepSeek-OCR", "bfloat16", "torch-2.4", snapshot_dir=tmpdir)
+            
+            assert path.parent == Path(tmpdir)
+            assert path.name.startswith("DeepSeek-OCR-bfloat16-")
+            assert path != snapshot_path("deepseek-ai/DeepSeek-OCR", "float32", "torch-2.4", snapshot_dir=tmpdir)
+            assert path != snapshot_path("deepseek-ai/DeepSeek-OCR", "bfloat16", "torch-2.5", snapshot_dir=tmpdir)
+    
+    def test_round_trip_with_mmap(self):
+        """保存したモデルをmmapで読み込み、評価モードにすることを確認"""
+        torch = FakeTorch()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, "prepared", "model.pt")
+            save_prepared_model(FakeModel([1, 2, 3]), path, torch)
+            model = load_prepared_model(path, torch)
+            
+            assert list(Path(tmpdir, "prepared").iterdir()) == [path]
+        assert model.weights == [1, 2, 3]
+        assert model.evaluated
+        assert torch.load_kwargs["mmap"] is True
+    
+    def test_interrupted_save_leaves_no_file(self):
+        """保存に失敗した場合は書きかけのファイルを残さないことを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, "model.pt")
+            with pytest.raises(OSError):
+                save_prepared_model(FakeModel([1]), path, FakeTorch(fail_save=True))
+            
+            assert list(Path(tmpdir).iterdir()) == []
+    
+    def test_only_for_unquantized_cpu_models(self):
+        """有効にしたCPU推論の量子化しないモデルだけを保存の対象にすることを確認"""
+        enabled = CPUInferenceProfile(dtype="float32", prepared_snapshot=True)
+        
+        assert _prepared_snapshot_path("model", "cuda", "bfloat16", enabled) is None
+        assert _prepared_snapshot_path("model", "cpu", "int8-dynamic", enabled) is None
+        assert _prepared_snapshot_path("model", "cpu", "float32", CPUInferenceProfile()) is None
+        assert _prepared_snapshot_path("model", "cpu", "float32", None) is None
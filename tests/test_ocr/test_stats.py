@@ -0,0 +1,49 @@
+"""
+OCR実行統計モジュールのテスト
+"""
+
+from pdftexter.ocr.stats import PageStats, RunStats
+
+
+def make_page(document, page_num, completion_tokens, finish_reason="stop", request_s=1.0):
+    """テスト用のページ統計を作成する"""
+    page = PageStats(page_num=page_num)
+    page.document = document
+    page.prompt_tokens = 100
+    page.completion_tokens = completion_tokens
+    page.finish_reason = finish_reason
+    page.request_s = request_s
+    return page
+
+
+class TestRunStatsTokenUsage:
+    """RunStatsのトークン使用量の集計のテスト"""
+    
+    def test_token_usage_aggregates_pages(self):
+        """トークン数の合計・分布・打ち切られたページが集計されることを確認"""
+        stats = RunStats()
+        stats.add_page(make_page("a.pdf", 1, 200))
+        stats.add_page(make_page("a.pdf", 2, 4096, finish_reason="length", request_s=4.0))
+        stats.add_page(make_page("b.pdf", 1, 400))
+        
+        usage = stats.token_usage(stats.pages)
+        
+        assert usage["prompt_tokens"] == 300
+        assert usage["completion_tokens"] == 4696
+        assert usage["completion_tokens_max"] == 4096
+        assert usage["truncated_pages"] == [2]
+        assert usage["tokens_per_second_mean"] == (200 + 1024 + 400) / 3
+    
+    def test_summary_breaks_down_by_document(self):
+        """複数のドキュメントを処理した場合、ドキュメントごとの集計も表示されることを確認"""
+        stats = RunStats()
+        stats.add_page(make_page("a.pdf", 1, 200))
+        stats.add_page(make_page("b.pdf", 1, 4096, finish_reason="length"))
+        
+        summary = stats.format_summary()
+        result = stats.to_dict()
+        
+        assert "トークン: 入力 200 / 出力 4296" in summary
+        assert "  b.pdf: max_tokensで打ち切られたページ: 1ページ [1]" in summary
+        assert result["documents"]["a.pdf"]["completion_tokens"] == 200
+        assert result["pages"][1]["finish_reason"] == "length"
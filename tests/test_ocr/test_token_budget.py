@@ -0,0 +1,97 @@
+"""
+max_tokensの適応制御モジュールのテスト
+"""
+
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+from pdftexter.ocr.config import DeepSeekOCRConfig, OCRConfig, OutputConfig
+from pdftexter.ocr.deepseek import DeepSeekOCR
+from pdftexter.ocr.stats import PageStats
+from pdftexter.ocr.token_budget import TokenBudget, measure_ink
+
+
+def save_page(path, lines):
+    """テキスト行の代わりに黒い帯を描いたページ画像を保存する"""
+    image = Image.new("RGB", (1024, 1448), "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(lines):
+        top = 80 + i * 40
+        draw.rectangle((80, top, 940, top + 16), fill="black")
+    image.save(path)
+
+
+class TestTokenBudget:
+    """TokenBudgetクラスのテスト"""
+    
+    def test_ink_grows_with_text_lines(self):
+        """文字の多いページほどインク量が多いことを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            blank, sparse, dense = (Path(tmpdir, f"{n}.png") for n in ("blank", "sparse", "dense"))
+            save_page(blank, 0)
+            save_page(sparse, 3)
+            save_page(dense, 30)
+            
+            assert measure_ink(str(blank)) == 0
+            assert 0 < measure_ink(str(sparse)) < measure_ink(str(dense))
+    
+    def test_estimate_is_calibrated_by_actual_output(self):
+        """実際の出力トークン数で見積もりが補正され、上限・下限に収まることを確認"""
+        budget = TokenBudget(max_tokens=4096, min_tokens=64, headroom=1.5)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page = Path(tmpdir, "page.png")
+            save_page(page, 10)
+            
+            _, ink = budget.estimate(str(page))
+            budget.record(ink, 1000)
+            estimate, _ = budget.estimate(str(page))
+        
+        assert estimate == 1500
+        assert budget.grow(estimate) == 3000
+        assert budget.grow(3000) == 4096
+    
+    def test_previous_page_estimator(self):
+        """直前のページの出力長から見積もり、最初のページは上限で送ることを確認"""
+        budget = TokenBudget(max_tokens=4096, headroom=2.0, estimator="previous_page")
+        
+        assert budget.estimate("unused.png") == (4096, None)
+        budget.record(None, 300)
+        assert budget.estimate("unused.png") == (600, None)
+
+
+class TestAdaptiveMaxTokens:
+    """DeepSeekOCRの適応的なmax_tokensのテスト"""
+    
+    def test_truncated_page_is_retried_with_larger_budget(self):
+        """見積もりが足りず打ち切られたページが、予算を増やして再試行されることを確認"""
+        server_config = FakeServerConfig(
+            latency_distribution="constant", latency_mean=0.0,
+            token_rate=20000.0, output_tokens=(300, 300),
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page = Path(tmpdir, "page.png")
+            save_page(page, 0)
+            
+            with FakeVLLMServer(server_config) as server:
+                config = OCRConfig(
+                    deepseek_ocr=DeepSeekOCRConfig(
+                        model_path="/test/path",
+                        vllm_server_url=server.url,
+                        adaptive_max_tokens=True,
+                        token_budget_min=128,
+                    ),
+                    output=OutputConfig(),
+                )
+                ocr = DeepSeekOCR(config, verify_setup=False)
+                page_stats = PageStats(page_num=1)
+                ocr.process_image(str(page), page_stats=page_stats)
+        
+        # 白紙のページは下限の128から始まり、256 → 512 で打ち切られずに完了する
+        assert page_stats.token_budget == 128
+        assert page_stats.budget_retries == 2
+        assert page_stats.max_tokens == 512
+        assert page_stats.completion_tokens == 300
+        assert not page_stats.truncated
@@ -0,0 +1,92 @@
+"""
+トランスポートモジュールのテスト
+"""
+
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+from pdftexter.ocr.model_checker import check_vllm_server
+from pdftexter.ocr.transport import (
+    create_session,
+    make_unix_socket_url,
+    split_unix_socket_url,
+)
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="Unixドメインソケットが必要")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """接続元のポート番号の代わりに接続ごとのIDを返すハンドラ"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def address_string(self) -> str:
+        return "unix"
+    
+    def log_message(self, format, *args) -> None:
+        pass
+    
+    def do_GET(self) -> None:
+        body = json.dumps({"path": self.path, "conn": id(self.connection)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def unix_server():
+    """Unixドメインソケットで待ち受けるHTTPサーバー"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = str(Path(tmpdir, "server.sock"))
+        server = _UnixServer(socket_path, _Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield socket_path
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestUnixSocketTransport:
+    """http+unix:// トランスポートのテスト"""
+    
+    def test_split_unix_socket_url(self):
+        """URLがソケットパスとリクエストパスに分割されることを確認"""
+        url = make_unix_socket_url("/run/vllm.sock") + "/v1/chat/completions?x=1"
+        
+        assert url.startswith("http+unix://%2Frun%2Fvllm.sock/")
+        assert split_unix_socket_url(url) == ("/run/vllm.sock", "/v1/chat/completions?x=1")
+    
+    def test_session_reuses_connection(self, unix_server):
+        """同一セッションの連続リクエストで接続が再利用されることを確認"""
+        url = make_unix_socket_url(unix_server)
+        
+        with create_session() as session:
+            first = session.get(f"{url}/health", timeout=5).json()
+            second = session.get(f"{url}/health", timeout=5).json()
+        
+        assert first["path"] == "/health"
+        assert first["conn"] == second["conn"]
+    
+    def test_check_vllm_server_over_unix_socket(self, unix_server):
+        """check_vllm_serverがUnixドメインソケット経由で動作することを確認"""
+        is_running, _ = check_vllm_server(make_unix_socket_url(unix_server))
+        assert is_running
+        
+        is_running, message = check_vllm_server(make_unix_socket_url(unix_server + ".missing"))
+        assert not is_running
+        assert "接続できません" in message
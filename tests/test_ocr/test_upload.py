@@ -0,0 +1,70 @@
+"""
+アップロード前処理モジュールのテスト
+"""
+
+import io
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from pdftexter.ocr.upload import prepare_upload_image
+
+
+def _save_noise_image(path: Path, size: tuple) -> None:
+    """圧縮が効きにくいノイズ画像を保存する"""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(data).save(path, "PNG")
+
+
+class TestPrepareUploadImage:
+    """prepare_upload_image関数のテスト"""
+    
+    def test_small_png_is_sent_unchanged(self):
+        """縮小不要な同一形式の画像は元のバイト列がそのまま使われることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            Image.new("RGB", (100, 200), color=(255, 255, 255)).save(img_path)
+            
+            upload = prepare_upload_image(str(img_path), max_long_edge=1024, image_format="png")
+            
+            assert upload.data == img_path.read_bytes()
+            assert upload.mime_type == "image/png"
+            assert upload.bytes_saved == 0
+    
+    def test_large_image_is_downscaled_to_max_long_edge(self):
+        """長辺がmax_long_edgeまで縮小され、アスペクト比が保たれることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            _save_noise_image(img_path, (1000, 2000))
+            
+            upload = prepare_upload_image(str(img_path), max_long_edge=500, image_format="png")
+            
+            assert upload.size == (250, 500)
+            with Image.open(io.BytesIO(upload.data)) as img:
+                assert img.size == (250, 500)
+            assert upload.bytes_saved > 0
+    
+    def test_jpeg_format_reencodes(self):
+        """JPEG形式を指定した場合、JPEGとして再エンコードされることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            Image.new("RGBA", (100, 100), color=(0, 0, 0, 255)).save(img_path)
+            
+            upload = prepare_upload_image(str(img_path), image_format="jpeg", jpeg_quality=80)
+            
+            assert upload.mime_type == "image/jpeg"
+            with Image.open(io.BytesIO(upload.data)) as img:
+                assert img.format == "JPEG"
+    
+    def test_invalid_format_raises(self):
+        """不正な形式を指定した場合、例外が発生することを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "page.png")
+            Image.new("RGB", (10, 10)).save(img_path)
+            
+            with pytest.raises(ValueError, match="image_format"):
+                prepare_upload_image(str(img_path), image_format="webp")
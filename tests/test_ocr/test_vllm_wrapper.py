@@ -119,3 +119,283 @@ class TestVLLMWrapper:
                 # リトライ回数分呼ばれることを確認
                 assert mock_post.call_count == 2
 
+    
+    def test_create_request_records_upload_bytes(self):
+        """縮小したアップロードサイズがページ統計に記録されることを確認"""
+        from PIL import Image
+        from pdftexter.ocr.stats import PageStats
+        
+        wrapper = VLLMWrapper(upload_max_long_edge=50, upload_format="jpeg")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img = Image.new('RGB', (100, 200), color=(255, 0, 0))
+            img_path = Path(tmpdir, "test.png")
+            img.save(img_path)
+            
+            page_stats = PageStats(page_num=1)
+            request_data = wrapper.create_request(str(img_path), page_stats=page_stats)
+            
+            image_url = request_data["messages"][0]["content"][0]["image_url"]["url"]
+            assert image_url.startswith("data:image/jpeg;base64,")
+            assert page_stats.original_bytes == img_path.stat().st_size
+            assert page_stats.upload_size == (25, 50)
+            assert page_stats.upload_bytes == len(base64.b64decode(image_url.split(",")[1]))
+    
+    def test_create_request_file_mode_uses_mapped_path(self):
+        """fileモードではパス変換表を適用したfile:// URLが使用されることを確認"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            from PIL import Image
+            img_path = Path(tmpdir, "page 1.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            wrapper = VLLMWrapper(
+                upload_mode="file",
+                local_media_path_map={tmpdir: "/mnt/shared"},
+            )
+            request_data = wrapper.create_request(str(img_path))
+            
+            image_url = request_data["messages"][0]["content"][0]["image_url"]["url"]
+            assert image_url == "file:///mnt/shared/page%201.png"
+    
+    def test_call_vllm_api_falls_back_to_base64_on_local_media_rejection(self):
+        """サーバーがfile:// URLを拒否した場合、base64で再送されることを確認"""
+        wrapper = VLLMWrapper(upload_mode="file", max_retries=1)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            from PIL import Image
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with patch("requests.post") as mock_post:
+                mock_post.side_effect = [
+                    Mock(
+                        status_code=400,
+                        text="Cannot load local files without `--allowed-local-media-path`.",
+                    ),
+                    Mock(
+                        status_code=200,
+                        raise_for_status=Mock(),
+                        json=Mock(return_value={
+                            "choices": [{"message": {"content": "OCR result"}}]
+                        }),
+                    ),
+                ]
+                
+                result = wrapper.call_vllm_api(str(img_path))
+                
+                assert result == "OCR result"
+                assert wrapper.local_media_enabled is False
+                first_url = mock_post.call_args_list[0].kwargs["json"]["messages"][0]["content"][0]["image_url"]["url"]
+                second_url = mock_post.call_args_list[1].kwargs["json"]["messages"][0]["content"][0]["image_url"]["url"]
+                assert first_url.startswith("file://")
+                assert second_url.startswith("data:image/png;base64,")
+    
+    def test_call_vllm_api_does_not_retry_client_errors(self):
+        """400エラーはリトライされず、即座に例外が発生することを確認"""
+        wrapper = VLLMWrapper(max_retries=3, retry_delay=0.1)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            from PIL import Image
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with patch("requests.post") as mock_post:
+                error_response = Mock(status_code=400, headers={})
+                error = requests.HTTPError("Bad Request", response=error_response)
+                mock_post.return_value = Mock(
+                    status_code=400, raise_for_status=Mock(side_effect=error)
+                )
+                
+                with pytest.raises(requests.HTTPError):
+                    wrapper.call_vllm_api(str(img_path))
+                
+                assert mock_post.call_count == 1
+    
+    def test_call_vllm_api_records_retries(self):
+        """リトライ回数と待機時間がページ統計に記録されることを確認"""
+        from pdftexter.ocr.stats import PageStats
+        
+        wrapper = VLLMWrapper(max_retries=3, retry_delay=0.01)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            from PIL import Image
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with patch("requests.post") as mock_post:
+                mock_post.side_effect = [
+                    requests.ConnectionError("refused"),
+                    Mock(
+                        status_code=200,
+                        raise_for_status=Mock(),
+                        json=Mock(return_value={"choices": [{"message": {"content": "ok"}}]}),
+                    ),
+                ]
+                
+                page_stats = PageStats(page_num=1)
+                assert wrapper.call_vllm_api(str(img_path), page_stats=page_stats) == "ok"
+                
+                assert page_stats.retries == 1
+                assert 0 <= page_stats.retry_wait_s <= 0.01
+    
+    def test_call_vllm_api_streams_tokens(self):
+        """ストリーミング時にテキスト片がコールバックに渡され、TTFTが記録されることを確認"""
+        from PIL import Image
+        from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+        from pdftexter.ocr.stats import PageStats
+        
+        config = FakeServerConfig(
+            latency_distribution="constant", latency_mean=0.05,
+            token_rate=2000.0, output_tokens=(30, 30),
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with FakeVLLMServer(config) as server:
+                wrapper = VLLMWrapper(server_url=server.url, stream=True)
+                pieces = []
+                page_stats = PageStats(page_num=1)
+                result = wrapper.call_vllm_api(
+                    str(img_path), page_stats=page_stats, on_token=pieces.append
+                )
+        
+        assert len(pieces) == 30
+        assert "".join(pieces) == result
+        assert page_stats.ttft_s >= 0.05
+        assert page_stats.itl_mean_s is not None
+    
+    def test_call_vllm_api_records_token_usage(self):
+        """ストリーミングの有無にかかわらず、トークン使用量と打ち切りが記録されることを確認"""
+        from PIL import Image
+        from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+        from pdftexter.ocr.stats import PageStats
+        
+        config = FakeServerConfig(
+            latency_distribution="constant", latency_mean=0.0,
+            token_rate=5000.0, output_tokens=(50, 50),
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            with FakeVLLMServer(config) as server:
+                for stream in (False, True):
+                    wrapper = VLLMWrapper(server_url=server.url, stream=stream)
+                    page_stats = PageStats(page_num=1)
+                    wrapper.call_vllm_api(str(img_path), max_tokens=20, page_stats=page_stats)
+                    
+                    assert page_stats.completion_tokens == 20
+                    assert page_stats.prompt_tokens > 0
+                    assert page_stats.max_tokens == 20
+                    assert page_stats.truncated
+    
+    def test_call_vllm_api_stream_aborts_on_repetition_loop(self):
+        """ストリーミング中にループを検出したら受信を打ち切り、繰り返しより前の部分を返すことを確認"""
+        import json
+        from PIL import Image
+        from pdftexter.ocr.repetition import RepetitionDetector
+        from pdftexter.ocr.stats import PageStats
+        
+        received = []
+        
+        def sse_chunks():
+            pieces = ["# 表\n"] + ["| 1 | 2 |\n"] * 1000
+            for piece in pieces:
+                received.append(piece)
+                event = {"choices": [{"delta": {"content": piece}}]}
+                yield f"data: {json.dumps(event)}\n\n".encode("utf-8")
+            yield b"data: [DONE]\n\n"
+        
+        mock_response = Mock()
+        mock_response.iter_content.return_value = sse_chunks()
+        mock_response.raise_for_status = Mock()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            wrapper = VLLMWrapper(server_url="http://localhost:8000", stream=True)
+            written = []
+            page_stats = PageStats(page_num=1)
+            with patch('requests.post', return_value=mock_response):
+                result = wrapper.call_vllm_api(
+                    str(img_path),
+                    max_tokens=4096,
+                    page_stats=page_stats,
+                    on_token=written.append,
+                    on_reset=written.clear,
+                    detector=RepetitionDetector(max_repeated_lines=10),
+                )
+        
+        assert result == "# 表\n| 1 | 2 |\n"
+        assert "".join(written) == result
+        assert len(received) == 11
+        mock_response.close.assert_called_once()
+        assert page_stats.loop_detected
+        assert page_stats.loop_tokens_saved == 4096 - 11
+    
+    def test_call_vllm_api_trims_repetition_only_when_truncated(self):
+        """非ストリーミング時は、max_tokensで打ち切られたレスポンスだけ繰り返し部分を取り除くことを確認"""
+        from PIL import Image
+        from pdftexter.ocr.repetition import RepetitionDetector
+        
+        content = "# 表\n" + "| 1 | 2 |\n" * 30
+        
+        def response(finish_reason):
+            return Mock(
+                status_code=200,
+                raise_for_status=Mock(),
+                json=Mock(return_value={
+                    "choices": [{"message": {"content": content}, "finish_reason": finish_reason}]
+                }),
+            )
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            wrapper = VLLMWrapper(server_url="http://localhost:8000")
+            with patch('requests.post', side_effect=[response("stop"), response("length")]):
+                completed = wrapper.call_vllm_api(str(img_path), detector=RepetitionDetector())
+                truncated = wrapper.call_vllm_api(str(img_path), detector=RepetitionDetector())
+        
+        assert completed == content
+        assert truncated == "# 表\n| 1 | 2 |\n"
+    
+    def test_create_request_applies_sampling_overrides(self):
+        """ループ再試行用のサンプリング設定がリクエストに反映されることを確認"""
+        from PIL import Image
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_path = Path(tmpdir, "test.png")
+            Image.new('RGB', (10, 10)).save(img_path)
+            
+            wrapper = VLLMWrapper(server_url="http://localhost:8000")
+            request = wrapper.create_request(
+                str(img_path),
+                temperature=0.1,
+                sampling_overrides={"temperature": 0.5, "repetition_penalty": 1.05},
+            )
+        
+        assert request["temperature"] == 0.5
+        assert request["repetition_penalty"] == 1.05
+    
+    def test_warm_up_reaches_every_endpoint(self):
+        """ウォームアップがすべてのエンドポイントに送られ、振り分けの統計に記録されないことを確認"""
+        from pdftexter.bench.fake_server import FakeServerConfig, FakeVLLMServer
+        from pdftexter.ocr.endpoints import Endpoint, EndpointPool
+        from pdftexter.ocr.warmup import create_warmup_page
+        
+        config = FakeServerConfig(latency_distribution="constant", latency_mean=0.0, output_tokens=(5, 5))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            image_path = create_warmup_page(str(Path(tmpdir, "warmup.png")))
+            
+            with FakeVLLMServer(config) as first, FakeVLLMServer(config) as second:
+                pool = EndpointPool([Endpoint(first.url), Endpoint(second.url)])
+                wrapper = VLLMWrapper(endpoints=pool, stream=True)
+                
+                assert wrapper.warm_up(image_path) == []
+                assert first.requests_total == 1
+                assert second.requests_total == 1
+                assert all(e.requests_total == 0 for e in pool.endpoints)
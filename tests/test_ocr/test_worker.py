@@ -0,0 +1,136 @@
+"""
+HuggingFace版の常駐OCRワーカーのテスト
+"""
+
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+import pytest
+import requests
+from PIL import Image
+
+from pdftexter.ocr.config import DeepSeekOCRConfig, OCRConfig, OutputConfig
+from pdftexter.ocr.deepseek import DeepSeekOCR
+from pdftexter.ocr.transport import make_unix_socket_url
+from pdftexter.ocr.vllm_wrapper import VLLMWrapper
+from pdftexter.ocr.worker import OCRWorkerServer, WorkerSupervisor, find_worker
+
+
+class FakeBackend:
+    """HuggingFaceOCRWrapperと同じprocess_image()を持つ代替バックエンド"""
+    
+    def __init__(self, hang_seconds: float = 0.0):
+        self.hang_seconds = hang_seconds
+        self.calls = []
+    
+    def process_image(
+        self, image_path, prompt, page_stats=None, detector=None, generation_overrides=None
+    ):
+        self.calls.append((image_path, prompt, generation_overrides))
+        if "hang" in prompt:
+            time.sleep(self.hang_seconds)
+        with Image.open(image_path) as image:
+            size = image.size
+        if page_stats is not None:
+            page_stats.completion_tokens = 3
+        return f"{prompt.splitlines()[-1]} {size[0]}x{size[1]}"
+
+
+def create_fake_backend(hang_seconds: float = 0.0) -> FakeBackend:
+    """ワーカープロセスで代替バックエンドを作成する"""
+    return FakeBackend(hang_seconds)
+
+
+@pytest.fixture
+def page_image():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir, "page_0001.png")
+        Image.new("RGB", (120, 80), "white").save(path)
+        yield str(path)
+
+
+@pytest.fixture
+def socket_dir():
+    # Unixドメインソケットのパス長の上限を超えないよう短いディレクトリを使う
+    with tempfile.TemporaryDirectory(dir="/tmp") as tmpdir:
+        yield tmpdir
+
+
+class TestOCRWorkerServer:
+    """OCRWorkerServerクラスのテスト"""
+    
+    @pytest.mark.parametrize("upload_mode,stream", [("file", False), ("base64", True)])
+    def test_serves_vllm_protocol(self, page_image, socket_dir, upload_mode, stream):
+        """VLLMWrapperからfile:// URL・データURL、通常・ストリーミングの各形式で推論できることを確認"""
+        backend = FakeBackend()
+        url = make_unix_socket_url(str(Path(socket_dir, "worker.sock")))
+        
+        with OCRWorkerServer(backend, url, model_path="/models/ocr") as server:
+            wrapper = VLLMWrapper(
+                server_url=server.url,
+                upload_mode=upload_mode,
+                upload_max_long_edge=None,
+                stream=stream,
+            )
+            result = wrapper.call_vllm_api(page_image, prompt="<image>\nFree OCR.", temperature=0.5)
+            
+            assert find_worker(server.url, model_path="/models/ocr")
+            assert not find_worker(server.url, model_path="/models/other")
+        
+        assert result == "Free OCR. 120x80"
+        image_path, _, overrides = backend.calls[0]
+        assert (image_path == page_image) == (upload_mode == "file")
+        assert overrides == {"do_sample": True, "temperature": 0.5}
+        assert not find_worker(url)
+    
+    def test_deepseek_uses_running_worker(self, page_image):
+        """HuggingFace版の設定でもワーカーが起動していればモデルを読み込まずに使うことを確認"""
+        backend = FakeBackend()
+        
+        with OCRWorkerServer(backend, "http://127.0.0.1:0", model_path="/models/ocr") as server:
+            config = OCRConfig(
+                deepseek_ocr=DeepSeekOCRConfig(
+                    model_path="/models/ocr",
+                    use_huggingface=True,
+                    worker_url=server.url,
+                ),
+                output=OutputConfig(),
+            )
+            ocr = DeepSeekOCR(config)
+            result = ocr.process_image(page_image, prompt="<image>\nFree OCR.")
+        
+        assert ocr.use_hf is False
+        assert ocr.worker_url == server.url
+        assert result == "Free OCR. 120x80"
+
+
+class TestWorkerSupervisor:
+    """WorkerSupervisorクラスのテスト"""
+    
+    def test_restarts_hung_worker(self, page_image, socket_dir):
+        """推論がタイムアウトを超えたワーカープロセスを再起動し、その後の推論が成功することを確認"""
+        url = make_unix_socket_url(str(Path(socket_dir, "worker.sock")))
+        supervisor = WorkerSupervisor(
+            partial(create_fake_backend, hang_seconds=30.0),
+            url,
+            inference_timeout=0.5,
+            restart_delay=0.1,
+            poll_interval=0.1,
+        ).start()
+        try:
+            assert supervisor.wait_ready(10)
+            first_pid = supervisor.pid
+            wrapper = VLLMWrapper(server_url=url, upload_mode="file", timeout=10, max_retries=1)
+            
+            # 再起動でワーカープロセスが終了し、処理中の接続は切断される
+            with pytest.raises(requests.ConnectionError):
+                wrapper.call_vllm_api(page_image, prompt="<image>\nhang")
+            
+            assert supervisor.wait_ready(10)
+            assert supervisor.restarts == 1
+            assert supervisor.pid != first_pid
+            assert wrapper.call_vllm_api(page_image, prompt="<image>\nFree OCR.") == "Free OCR. 120x80"
+        finally:
+            supervisor.stop()
@@ -0,0 +1,51 @@
+"""
+PDF処理ユーティリティのテスト
+"""
+
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from pdftexter.pdf.processor import rasterize_pdf_pages
+
+
+class TestRasterizePdfPages:
+    """rasterize_pdf_pages()のテスト"""
+    
+    def test_rasterizes_pages_on_access(self, tmp_path):
+        """ページはファイルに保存せず、参照された時点で1ページずつ変換されることを確認"""
+        pdf_path = tmp_path / "book.pdf"
+        pdf_path.touch()
+        
+        def fake_convert(path, dpi, first_page, last_page):
+            return [Image.new("RGB", (10 * first_page, 10), "white")]
+        
+        with patch("pdf2image.pdfinfo_from_path", return_value={"Pages": 3}), \
+                patch("pdf2image.convert_from_path", side_effect=fake_convert) as mock_convert:
+            pages = rasterize_pdf_pages(str(pdf_path))
+            
+            assert len(pages) == 3
+            assert mock_convert.call_count == 0
+            assert [page.size for page in pages] == [(10, 10), (20, 10), (30, 10)]
+            assert pages[-1].size == (30, 10)
+            with pytest.raises(IndexError):
+                pages[3]
+        
+        assert list(tmp_path.iterdir()) == [pdf_path]
+    
+    def test_prefetched_page_returned_once(self, tmp_path):
+        """先に変換したページは次の参照で返し、保持し続けないことを確認"""
+        pdf_path = tmp_path / "book.pdf"
+        pdf_path.touch()
+        
+        with patch("pdf2image.pdfinfo_from_path", return_value={"Pages": 2}), \
+                patch("pdf2image.convert_from_path", return_value=[Image.new("RGB", (10, 10))]) as mock_convert:
+            pages = rasterize_pdf_pages(str(pdf_path))
+            pages.prefetch(1)
+            assert mock_convert.call_count == 1
+            
+            pages[1]
+            assert mock_convert.call_count == 1
+            pages[1]
+            assert mock_convert.call_count == 2